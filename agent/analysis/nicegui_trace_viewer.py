@@ -8,6 +8,9 @@ from typing import Dict, List, Any
 from datetime import datetime
 import re
 
+from analysis.trace_loader import load_trace_file
+from core.checkpoint import unpack_nodes
+
 
 def format_content(content, format="display"):
     """Format message content for display"""
@@ -72,12 +75,12 @@ def extract_nodes(data: Dict[str, Any]) -> List[Dict]:
 
     if isinstance(actors, list):
         for actor in actors:
-            for node in actor.get("data", []):
+            for node in unpack_nodes(actor.get("data") or []):
                 if node.get("data", {}).get("messages"):
                     nodes.append(node)
     else:
         for actor in actors.values():
-            for node in actor.get("data", []):
+            for node in unpack_nodes(actor.get("data") or []):
                 if node.get("data", {}).get("messages"):
                     nodes.append(node)
 
@@ -267,8 +270,7 @@ def main():
         sys.exit(1)
 
     try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
+        data = load_trace_file(file_path)
 
         nodes = extract_nodes(data)
         chains = build_conversation_chains(nodes)
@@ -282,7 +284,7 @@ def main():
                 print("=" * 100)
                 print()
 
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         print(f"❌ Error parsing JSON: {e}")
         sys.exit(1)
     except Exception as e:
@@ -1,3 +1,4 @@
+import gzip
 import ujson as json
 import boto3
 from pathlib import Path
@@ -9,6 +10,19 @@ from log import get_logger
 logger = get_logger(__name__)
 
 
+def _decode(content: bytes) -> Dict[str, Any]:
+    """Parse a trace file, plain or gzipped JSON (snapshots stored in S3 by api.snapshot_utils are gzipped)."""
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    return json.loads(content)
+
+
+def load_trace_file(path: str | Path) -> Dict[str, Any]:
+    """Load a local trace file, plain or gzipped JSON."""
+    with open(path, "rb") as f:
+        return _decode(f.read())
+
+
 class TraceLoader:
     """Utility class to load traces from either local filesystem or S3."""
 
@@ -171,8 +185,7 @@ class TraceLoader:
 
     def _load_local_file(self, path: str) -> Dict[str, Any]:
         """Load a file from local filesystem."""
-        with open(path, "r") as f:
-            return json.load(f)
+        return load_trace_file(path)
 
     def _load_s3_file(self, key: str) -> Dict[str, Any]:
         """Load a file from S3."""
@@ -181,7 +194,7 @@ class TraceLoader:
         try:
             response = s3_client.get_object(Bucket=self.bucket_or_path, Key=key)
             content = response["Body"].read()
-            return json.loads(content)
+            return _decode(content)
         except Exception:
             logger.exception(f"Error loading S3 file {key}")
             raise
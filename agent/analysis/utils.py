@@ -4,6 +4,7 @@ from typing import List, Dict, Any
 import os
 from glob import glob
 
+from analysis.trace_loader import load_trace_file
 from core.statemachine import StateMachine
 from trpc_agent.application import ApplicationContext, FSMEvent, FSMApplication, Node
 from trpc_agent.actors import ConcurrentActor, DraftActor, TrpcActor
@@ -90,8 +91,7 @@ def main(dumps_path: str, output_path: str):
     for dump_file in dump_files:
         print(f"Processing {dump_file}...")
         try:
-            with open(dump_file, "r") as f:
-                dump_data = json.load(f)
+            dump_data = load_trace_file(dump_file)
             trajectories = extract_trajectories_from_dump(dump_data)
             final_result[os.path.basename(dump_file)] = trajectories
             output_file = os.path.join(output_path, os.path.basename(dump_file))
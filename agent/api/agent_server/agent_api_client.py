@@ -10,6 +10,7 @@ import atexit
 from typing import List, Optional, Tuple
 from log import get_logger
 from api.agent_server.agent_client import AgentApiClient
+from api.event_stream import StreamCompression, StreamMode
 from api.agent_server.models import AgentSseEvent, FileEntry
 from datetime import datetime
 from patch_ng import PatchSet
@@ -503,6 +504,8 @@ async def run_chatbot_client(
     autosave=False,
     template_id: Optional[str] = None,
     use_databricks: bool = False,
+    stream_mode: Optional[StreamMode] = None,
+    stream_compression: Optional[StreamCompression] = None,
 ) -> None:
     """
     Async interactive Agent CLI chat.
@@ -641,7 +644,9 @@ async def run_chatbot_client(
                     f"\033[35m📝 Commit Message: {event.message.commit_message}\033[0m\n"
                 )
 
-    async with AgentApiClient(base_url=base_url) as client:
+    async with AgentApiClient(
+        base_url=base_url, stream_mode=stream_mode, stream_compression=stream_compression
+    ) as client:
         with project_dir_context() as project_dir:
             while True:
                 try:
@@ -1237,6 +1242,8 @@ def cli(
     state_file: str = "/tmp/agent_chat_state.json",
     template_id: Optional[str] = None,
     use_databricks: bool = False,
+    stream_mode: Optional[StreamMode] = None,
+    stream_compression: Optional[StreamCompression] = None,
 ):
     if not host:
         with spawn_local_server() as (local_host, local_port):
@@ -1249,6 +1256,8 @@ def cli(
                 False,
                 template_id,
                 use_databricks,
+                stream_mode,
+                stream_compression,
                 backend="asyncio",
             )
     else:
@@ -1261,6 +1270,8 @@ def cli(
             False,
             template_id,
             use_databricks,
+            stream_mode,
+            stream_compression,
             backend="asyncio",
         )
 
@@ -5,6 +5,7 @@ from httpx import AsyncClient, ASGITransport
 
 from api.agent_server.models import AgentSseEvent, AgentRequest, UserMessage, ConversationMessage, FileEntry, MessageKind
 from api.agent_server.async_server import app, CONFIG
+from api.event_stream import EventStreamDecoder, StreamCompression, StreamMode
 from log import get_logger
 
 logger = get_logger(__name__)
@@ -21,15 +22,26 @@ _NOT_PROVIDED = object()
 class AgentApiClient:
     """Reusable client for interacting with the Agent API server"""
 
-    def __init__(self, app_instance=None, base_url=None):
+    def __init__(self,
+                 app_instance=None,
+                 base_url=None,
+                 stream_mode: Optional[StreamMode] = None,
+                 stream_compression: Optional[StreamCompression] = None,
+                 stream_deltas: Optional[bool] = None):
         """Initialize the client with an optional app instance or base URL
 
         Args:
             app_instance: FastAPI app instance for direct ASGI transport
             base_url: External base URL to test against (e.g., "http://18.237.53.81")
+            stream_mode: Event stream mode requested from the server, see api.event_stream
+            stream_compression: Event payload compression requested from the server
+            stream_deltas: Ask for StreamDelta events with the model output as it is generated
         """
         self.app = app_instance or app
         self.base_url = base_url
+        self.stream_mode = stream_mode
+        self.stream_compression = stream_compression
+        self.stream_deltas = stream_deltas
         self.transport = ASGITransport(app=self.app) if base_url is None else None
         self.client = None
 
@@ -55,10 +67,15 @@ class AgentApiClient:
                           template_id: Optional[str] = None,
                           settings: Optional[Dict[str, Any]] = None,
                           auth_token: Optional[str] = _NOT_PROVIDED,
-                          stream_cb: Optional[Callable[[AgentSseEvent], None]] = None
+                          stream_cb: Optional[Callable[[AgentSseEvent], None]] = None,
+                          session_state: Optional[Dict[str, Any]] = None
                          ) -> Tuple[List[AgentSseEvent], AgentRequest]:
 
-        """Send a message to the agent and return the parsed SSE events"""
+        """Send a message to the agent and return the parsed SSE events
+
+        session_state is the agent state of a versioned session (request.session_id) at request.state_version,
+        state deltas are applied to it to restore agentState.
+        """
 
         if self.client is None:
             raise RuntimeError("Client not initialized. Use 'async with AgentApiClient(...) as client:' pattern.")
@@ -69,6 +86,12 @@ class AgentApiClient:
             logger.info(f"Using existing request with trace ID: {request.trace_id}, ignoring some parameters like message, all_files")
             if all_files is not None:
                 request.all_files = [FileEntry(**f) for f in all_files]
+        if self.stream_mode is not None:
+            request.stream_mode = self.stream_mode
+        if self.stream_compression is not None:
+            request.stream_compression = self.stream_compression
+        if self.stream_deltas is not None:
+            request.stream_deltas = self.stream_deltas
 
         # Resolve auth token at call time, so that environment variables loaded
         # later (e.g. via `load_dotenv()`) are picked up even after module import.
@@ -99,7 +122,7 @@ class AgentApiClient:
                 except (json.JSONDecodeError, ValueError):
                     error_detail = response.text or "No response content"
                 raise ValueError(f"Request failed with status code {response.status_code}: {error_detail}")
-            events = await self.parse_sse_events(response, stream_cb)
+            events = await self.parse_sse_events(response, stream_cb, session_state)
         return events, request
 
     async def continue_conversation(self,
@@ -175,30 +198,39 @@ class AgentApiClient:
         )
 
     @staticmethod
-    async def parse_sse_events(response, stream_cb: Optional[Callable[[AgentSseEvent], None]] = None) -> List[AgentSseEvent]:
-        """Parse the SSE events from a response stream"""
+    async def parse_sse_events(response,
+                               stream_cb: Optional[Callable[[AgentSseEvent], None]] = None,
+                               state: Optional[Dict[str, Any]] = None) -> List[AgentSseEvent]:
+        """Parse the SSE events from a response stream, reassembling delta and compressed streams
+
+        state is the session state the stream continues from, see EventStreamDecoder.
+        """
         event_objects = []
-        buffer = ""
+        decoder = EventStreamDecoder(state)
+        event_type = "message"
+        data_lines: List[str] = []
 
         async for line in response.aiter_lines():
-            buffer += line
             if line.strip() == "":  # End of SSE event marked by empty line
-                if buffer.startswith("data:"):
-                    data_parts = buffer.split("data:", 1)
-                    if len(data_parts) > 1:
-                        data_str = data_parts[1].strip()
-                        try:
-                            event_obj = AgentSseEvent.from_json(data_str)
-                            event_objects.append(event_obj)
-                            if stream_cb:
-                                try:
-                                    stream_cb(event_obj)
-                                except Exception:
-                                    logger.exception("Callback failed")
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"JSON decode error: {e}, data: {data_str[:100]}...")
-                        except Exception as e:
-                            logger.warning(f"Error parsing SSE event: {e}, data: {data_str[:100]}...")
-                buffer = ""
+                if data_lines:
+                    data_str = "\n".join(data_lines)
+                    try:
+                        event_obj = decoder.decode(data_str, event_type)
+                        event_objects.append(event_obj)
+                        if stream_cb:
+                            try:
+                                stream_cb(event_obj)
+                            except Exception:
+                                logger.exception("Callback failed")
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"JSON decode error: {e}, data: {data_str[:100]}...")
+                    except Exception as e:
+                        logger.warning(f"Error parsing SSE event: {e}, data: {data_str[:100]}...")
+                event_type = "message"
+                data_lines = []
+            elif line.startswith("event:"):
+                event_type = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
 
         return event_objects
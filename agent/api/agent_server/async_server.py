@@ -14,6 +14,7 @@ from typing import AsyncGenerator
 from contextlib import asynccontextmanager
 
 import anyio
+import anyio.to_thread
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -28,6 +29,7 @@ os.environ["OTEL_TRACES_EXPORTER"] = "none"
 os.environ["OTEL_METRICS_EXPORTER"] = "none"
 os.environ["OTEL_LOGS_EXPORTER"] = "none"
 
+import copy
 import dagger
 import json
 from brotli_asgi import BrotliMiddleware
@@ -41,12 +43,18 @@ from api.agent_server.models import (
     MessageKind,
     ErrorResponse,
     ExternalContentBlock,
+    FileEntry,
 )
 from api.agent_server.interface import AgentInterface
 from trpc_agent.agent_session import TrpcAgentSession
 from nicegui_agent.agent_session import NiceguiAgentSession
 from api.agent_server.template_diff_impl import TemplateDiffAgentImplementation
 from api.config import CONFIG
+from api.dagger_pool import dagger_pool
+from core.check_scheduler import check_stats
+from api.snapshot_utils import snapshot_saver
+from api.session_store import Session, SessionStore, StaleSessionError
+from api.event_stream import EventStreamEncoder
 
 from log import get_logger, configure_uvicorn_logging, set_trace_id, clear_trace_id
 from llm.telemetry import save_cumulative_stats
@@ -70,8 +78,13 @@ async def lifespan(app: FastAPI):
         f"GEMINI_API_KEY: {'SET' if os.getenv('GEMINI_API_KEY') else 'NOT_SET'}"
     )
 
-    yield
-    logger.info("Shutting down Async Agent Server API")
+    # keep warm Dagger engine sessions for the lifetime of the server
+    async with dagger_pool:
+        yield
+        logger.info("Shutting down Async Agent Server API")
+
+    # store the snapshots of the last events before the process exits
+    await anyio.to_thread.run_sync(snapshot_saver.close)
 
     # save cumulative telemetry stats on shutdown
     save_cumulative_stats()
@@ -119,8 +132,42 @@ async def verify_token(
 
 
 class SessionManager:
-    def __init__(self):
+    def __init__(self, store: SessionStore | None = None):
         self.sessions = {}
+        self.store = store if store is not None else SessionStore.from_env()
+
+    async def resume(self, request: AgentRequest) -> Session | None:
+        """
+        Restore the stored state and files of a versioned session into the request.
+
+        Returns None for clients using the full-state protocol. A request that carries agentState
+        anyway (e.g. after the session was evicted) restarts the session from that state.
+        """
+        if request.session_id is None:
+            return None
+        async with self.store.lock(request.session_id):
+            return await self._resume(request, request.session_id)
+
+    async def _resume(self, request: AgentRequest, session_id: str) -> Session:
+        if request.agent_state is not None:
+            stored = await self.store.get(session_id)
+            session = Session(session_id, stored.version if stored else 0, copy.deepcopy(request.agent_state))
+        else:
+            session = await self.store.resume(session_id, request.state_version or 0)
+            # the agent updates the state it is given in place, the session keeps the version the client has
+            request.agent_state = copy.deepcopy(session.state)
+
+        if request.all_files is not None:
+            session.files = {entry.path: entry.content for entry in request.all_files}
+        for entry in request.changed_files or []:
+            session.files[entry.path] = entry.content
+        for path in request.deleted_files or []:
+            session.files.pop(path, None)
+        # file changes are relative to the previous request, keep them even if this one fails
+        await self.store.save(session)
+        if session.files:
+            request.all_files = [FileEntry(path=path, content=content) for path, content in session.files.items()]
+        return session
 
     def get_or_create_session[T: AgentInterface](
         self,
@@ -157,16 +204,15 @@ async def run_agent[T: AgentInterface](
     request: AgentRequest,
     agent_class: type[T],
     *args,
+    session: Session | None = None,
     **kwargs,
 ) -> AsyncGenerator[str, None]:
     logger.info(
         f"Running agent for session {request.application_id}:{request.trace_id}"
     )
 
-    async with dagger.Connection(
-        dagger.Config(log_output=open(os.devnull, "w"))
-    ) as client:
-        # Establish Dagger connection for the agent's execution context
+    async with dagger_pool.lease() as client:
+        # Lease a pooled Dagger session for the agent's execution context
         agent = session_manager.get_or_create_session(
             client, request, agent_class, *args, **kwargs
         )
@@ -178,6 +224,7 @@ async def run_agent[T: AgentInterface](
             event_tx.clone()
         )  # Clone the sender for use in the keep-alive task
         final_state = None
+        encoder = EventStreamEncoder(request.stream_mode, request.stream_compression)
 
         # Use this flag to control the keep-alive task
         keep_alive_running = True
@@ -226,10 +273,17 @@ async def run_agent[T: AgentInterface](
                         # Keep track of the last state in events with non-null state
                         if event.message and event.message.agent_state:
                             final_state = event.message.agent_state
-
-                        # Format SSE event properly with data: prefix and double newline at the end
-                        # This ensures compatibility with SSE standard
-                        yield f"data: {event.to_json()}\n\n"
+                            if session is not None:
+                                # versioned sessions get the changes only, the full state stays on the server
+                                version, delta = await session_manager.store.commit(session, final_state)
+                                event.message.agent_state = None
+                                event.message.session_id = session.session_id
+                                event.message.state_version = version
+                                event.message.state_delta = delta
+
+                        # Format SSE event in the stream mode the client asked for, the default is a plain
+                        # data: prefix and double newline at the end, compatible with the SSE standard
+                        yield encoder.encode(event)
 
                         if event.status == AgentStatus.IDLE:
                             keep_alive_running = False
@@ -278,7 +332,7 @@ async def run_agent[T: AgentInterface](
                     ),
                 )
                 # Format error SSE event properly
-                yield f"data: {error_event.to_json()}\n\n"
+                yield encoder.encode(error_event)
 
                 # On error, remove the session entirely
                 session_manager.cleanup_session(
@@ -313,6 +367,10 @@ async def message(
     - traceId: str - required - a string used in SSE events
     - agentState: {..} or null - the full state of the Agent to restore from
     - settings: {...} - json with settings with number of iterations etc
+    - streamMode, streamCompression: snapshot + delta and/or compressed events, see api.event_stream
+    - streamDeltas: StreamDelta events with the model output as it is generated
+    - sessionId, stateVersion, changedFiles, deletedFiles: versioned session instead of
+      agentState and allFiles, see api.session_store
 
     SSE Response:
     - status: "running" | "idle" - defines if the Agent stopped or continues running
@@ -348,10 +406,15 @@ async def message(
             )
             template_id = CONFIG.agent_type
 
+        session = await session_manager.resume(request)
         return StreamingResponse(
-            run_agent(request, agent_types[template_id]), media_type="text/event-stream"
+            run_agent(request, agent_types[template_id], session=session),
+            media_type="text/event-stream",
         )
 
+    except StaleSessionError as e:
+        logger.info(f"Rejecting request for stale session: {str(e)}")
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing message request: {str(e)}")
         # Return an HTTP error response for non-SSE errors
@@ -371,9 +434,7 @@ async def list_templates():
 @app.get("/health")
 async def dagger_healthcheck():
     """Dagger connection health check endpoint"""
-    async with dagger.Connection(
-        dagger.Config(log_output=open(os.devnull, "w"))
-    ) as client:
+    async with dagger_pool.lease() as client:
         # Try a simple Dagger operation to verify connectivity
         container = client.container().from_("alpine:latest")
         version = await container.with_exec(["cat", "/etc/alpine-release"]).stdout()
@@ -381,9 +442,22 @@ async def dagger_healthcheck():
             "status": "healthy",
             "dagger_connection": "successful",
             "alpine_version": version.strip(),
+            "dagger_pool": dagger_pool.metrics(),
         }
 
 
+@app.get("/health/pool")
+async def dagger_pool_metrics():
+    """Dagger session pool saturation and lease wait metrics"""
+    return dagger_pool.metrics()
+
+
+@app.get("/health/checks")
+async def check_scheduler_metrics():
+    """Validation check durations, failure rates and fail-fast cancellations"""
+    return check_stats.metrics()
+
+
 def main(
     host: str = "0.0.0.0",
     port: int = 8001,
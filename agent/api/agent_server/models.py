@@ -31,6 +31,7 @@ class MessageKind(str, Enum):
     REVIEW_RESULT = "ReviewResult"  # generation completed successfully
     KEEP_ALIVE = "KeepAlive"  # empty event to keep the connection alive
     WIP_UPDATE = "WipUpdate"  # work in progress update, used to send intermediate results
+    STREAM_DELTA = "StreamDelta"  # model output as it is generated, sent only if the request asks for streamDeltas
 
 
 class UserMessage(BaseModel):
@@ -61,6 +62,14 @@ class ExternalContentBlock(BaseModel):
     content: str = Field(..., description="The content of the block.")
     #timestamp: datetime.datetime = Field(..., description="The timestamp of the block.")
 
+class StreamDeltaBlock(BaseModel):
+    """A piece of the model output, the final message follows in the usual event of the step."""
+    type: Literal["text", "thinking", "tool_use"] = Field(..., description="Kind of the output the piece belongs to.")
+    text: str = Field(..., description="Text to append: message or thinking text, or a fragment of the tool input JSON.")
+    tool_name: Optional[str] = Field(None, alias="toolName", description="Name of the tool being called, for tool_use pieces.")
+    tool_use_id: Optional[str] = Field(None, alias="toolUseId", description="Id of the tool call, for tool_use pieces.")
+
+
 class AgentMessage(BaseModel):
     """The detailed message payload from the agent."""
     role: Literal["assistant"] = Field("assistant", description="Fixed field for client to detect assistant message in the history")
@@ -96,6 +105,25 @@ class AgentMessage(BaseModel):
         None,
         description="Generated commit message suitable for use in Git commits."
     )
+    session_id: Optional[str] = Field(
+        None,
+        alias="sessionId",
+        description="Server-side session the state belongs to. Present only for clients using the versioned state protocol."
+    )
+    state_version: Optional[int] = Field(
+        None,
+        alias="stateVersion",
+        description="Version of the session state after this message, to be sent with the next request."
+    )
+    state_delta: Optional[Any] = Field(
+        None,
+        alias="stateDelta",
+        description="Changes to the agent state since the previous state message, replaces agentState for versioned sessions."
+    )
+    delta: Optional[StreamDeltaBlock] = Field(
+        None,
+        description="Piece of the model output, present only in StreamDelta messages."
+    )
 
     def to_json(self) -> str:
         """Serialize the model to JSON string."""
@@ -127,6 +155,7 @@ class AgentSseEvent(BaseModel):
     trace_id: Optional[str] = Field(None, alias="traceId", description="The trace ID corresponding to the POST request.")
     message: AgentMessage = Field(..., description="The detailed message payload from the agent.")
     timestamp: str = Field(default_factory=lambda: datetime.datetime.utcnow().isoformat(), description="UTC timestamp when the event was created in ISO format.")
+    seq: Optional[int] = Field(None, description="Sequence number of the event in the response, present only for delta or compressed streams.")
 
     def to_json(self) -> str:
         """Serialize the model to JSON string."""
@@ -160,6 +189,41 @@ class AgentRequest(BaseModel):
         None,
         description="Settings for the agent execution, such as maximum number of iterations."
     )
+    session_id: Optional[str] = Field(
+        None,
+        alias="sessionId",
+        description="Server-side session to continue instead of sending agentState, opts into the versioned state protocol."
+    )
+    state_version: Optional[int] = Field(
+        None,
+        alias="stateVersion",
+        description="Version of the session state the client has, 0 or omitted for a new session."
+    )
+    changed_files: Optional[List[FileEntry]] = Field(
+        None,
+        alias="changedFiles",
+        description="Files added or modified since the previous request of the session."
+    )
+    deleted_files: Optional[List[str]] = Field(
+        None,
+        alias="deletedFiles",
+        description="Paths of files deleted since the previous request of the session."
+    )
+    stream_mode: Optional[Literal["full", "delta"]] = Field(
+        None,
+        alias="streamMode",
+        description="How agentState is sent in events: full state in every event (default) or a snapshot followed by deltas."
+    )
+    stream_compression: Optional[Literal["zlib"]] = Field(
+        None,
+        alias="streamCompression",
+        description="Compress event payloads, sent as `event: zlib` with base64 of a deflate stream shared by the response."
+    )
+    stream_deltas: Optional[bool] = Field(
+        None,
+        alias="streamDeltas",
+        description="Also send the model output as it is generated in StreamDelta events, these carry no state."
+    )
 
     def to_json(self) -> str:
         """Serialize the model to JSON string."""
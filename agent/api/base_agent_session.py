@@ -8,7 +8,7 @@ import dagger
 
 from anyio.streams.memory import MemoryObjectSendStream
 
-from llm.common import ContentBlock, InternalMessage, TextRaw
+from llm.common import ContentBlock, InternalMessage, StreamDelta, TextDelta, TextRaw, ThinkingDelta, ToolUseDelta
 from llm.utils import get_ultra_fast_llm_client, get_universal_llm_client
 from api.fsm_tools import FSMToolProcessor, FSMStatus, FSMInterface
 from api.snapshot_utils import snapshot_saver
@@ -23,6 +23,7 @@ from api.agent_server.models import (
     AgentStatus,
     ExternalContentBlock,
     MessageKind,
+    StreamDeltaBlock,
     format_internal_message_for_display,
 )
 from api.agent_server.interface import AgentInterface
@@ -140,6 +141,9 @@ class BaseAgentSession(AgentInterface, ABC):
                     app_name=metadata["app_name"],
                 )
 
+            async def emit_delta(delta: StreamDelta) -> None:
+                await self.send_delta(event_tx, delta)
+
             fsm_settings = {
                 **self.settings,
                 "event_callback": emit_intermediate_message,
@@ -178,6 +182,8 @@ class BaseAgentSession(AgentInterface, ABC):
                 fsm_app=fsm_app,
                 settings=fsm_settings,
                 event_callback=emit_intermediate_message,
+                # the top-level turn is what the user waits on, its output goes out as it is generated
+                delta_callback=emit_delta if request.stream_deltas else None,
             )
             agent_state: AgentState = {
                 "fsm_messages": fsm_message_history,
@@ -470,3 +476,22 @@ class BaseAgentSession(AgentInterface, ABC):
             data=event.model_dump(),
         )
         self._sse_counter += 1
+
+    async def send_delta(
+        self, event_tx: MemoryObjectSendStream[AgentSseEvent], delta: StreamDelta
+    ) -> None:
+        """Send a piece of the model output, no state and no snapshot: the complete message follows."""
+        match delta:
+            case TextDelta(text):
+                block = StreamDeltaBlock(type="text", text=text)
+            case ThinkingDelta(thinking):
+                block = StreamDeltaBlock(type="thinking", text=thinking)
+            case ToolUseDelta(id, name, partial_input):
+                block = StreamDeltaBlock(type="tool_use", text=partial_input, toolName=name, toolUseId=id)
+        await event_tx.send(
+            AgentSseEvent(
+                status=AgentStatus.RUNNING,
+                traceId=self.trace_id,
+                message=AgentMessage(kind=MessageKind.STREAM_DELTA, delta=block),
+            )
+        )
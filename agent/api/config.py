@@ -21,5 +21,21 @@ class Config:
     def snapshot_bucket(self):
         return os.getenv("SNAPSHOT_BUCKET", None)
 
+    @property
+    def snapshot_endpoint_url(self):
+        return os.getenv("SNAPSHOT_ENDPOINT_URL", None)
+
+    @property
+    def dagger_pool_size(self) -> int:
+        return int(os.getenv("DAGGER_POOL_SIZE", "4"))
+
+    @property
+    def dagger_pool_min_idle(self) -> int:
+        return int(os.getenv("DAGGER_POOL_MIN_IDLE", "1"))
+
+    @property
+    def dagger_pool_session_leases(self) -> int:
+        return int(os.getenv("DAGGER_POOL_SESSION_LEASES", "8"))
+
 
 CONFIG = Config()
@@ -0,0 +1,322 @@
+"""
+Pool of long-lived Dagger engine sessions shared by the agent server.
+
+Opening a `dagger.Connection` provisions an engine session which is expensive
+compared to the work done by a single health check or a short agent turn, so
+the server keeps a bounded set of warm sessions and leases them to requests.
+A Dagger client serves concurrent queries, so leases are not exclusive: a lease
+gets the least loaded session, a new one is opened while all sessions carry
+`session_leases` leases or more and `max_size` isn't reached, past that the
+sessions are shared further. A lease never waits for another lease to end.
+
+Sessions without leases are health checked before reuse, sessions failing with
+transport errors are discarded, and on shutdown the pool drains outstanding
+leases. Leases still running when the drain times out are cancelled and fail
+with PoolDrainingError instead of using closed sessions.
+"""
+
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable
+
+import anyio
+import dagger
+from anyio.abc import TaskGroup
+
+from api.config import CONFIG
+from log import get_logger
+
+logger = get_logger(__name__)
+
+
+def default_connect() -> AsyncContextManager[dagger.Client]:
+    return dagger.Connection(dagger.Config(log_output=open(os.devnull, "w")))
+
+
+async def default_health_check(client: dagger.Client) -> None:
+    await client.default_platform()
+
+
+class PoolDrainingError(RuntimeError):
+    pass
+
+
+@dataclass(eq=False)
+class _Session:
+    client: dagger.Client | None = None
+    closed: anyio.Event = field(default_factory=anyio.Event)
+    last_used: float = field(default_factory=time.monotonic)
+    leases: int = 0
+
+
+class DaggerSessionPool:
+    def __init__(
+        self,
+        max_size: int = 4,
+        min_idle: int = 1,
+        session_leases: int = 8,
+        health_check_after: float = 30.0,
+        health_check_timeout: float = 10.0,
+        drain_timeout: float = 60.0,
+        connect: Callable[[], AsyncContextManager[dagger.Client]] = default_connect,
+        health_check: Callable[[dagger.Client], Awaitable[None]] = default_health_check,
+        wait_samples: int = 1024,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if session_leases < 1:
+            raise ValueError("session_leases must be at least 1")
+        self.max_size = max_size
+        self.min_idle = min(min_idle, max_size)
+        self.session_leases = session_leases
+        self.health_check_after = health_check_after
+        self.health_check_timeout = health_check_timeout
+        self.drain_timeout = drain_timeout
+        self._connect = connect
+        self._health_check = health_check
+
+        self._sessions: set[_Session] = set()
+        # sessions being opened count against max_size from the moment they are reserved
+        self._opening = 0
+        self._warming = 0
+        self._changed: anyio.Event | None = None
+        self._lease_scopes: set[anyio.CancelScope] = set()
+        self._leased = 0
+        self._waiting = 0
+        self._draining = False
+        # created lazily in __aenter__ since the module-level pool is built outside of an event loop
+        self._tg: TaskGroup | None = None
+
+        self._wait_samples: deque[float] = deque(maxlen=wait_samples)
+        self.total_leases = 0
+        self.ephemeral_leases = 0
+        self.sessions_created = 0
+        self.sessions_discarded = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._tg is not None
+
+    async def __aenter__(self) -> "DaggerSessionPool":
+        self._draining = False
+        self._changed = anyio.Event()
+        self._tg = anyio.create_task_group()
+        await self._tg.__aenter__()
+        self._tg.start_soon(self._warm)
+        logger.info(
+            f"Dagger session pool started (max_size={self.max_size}, min_idle={self.min_idle}, "
+            f"session_leases={self.session_leases})"
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> bool | None:
+        tg = self._tg
+        try:
+            await self.drain()
+        finally:
+            self._tg = None
+            self._changed = None
+        return await tg.__aexit__(*exc_info)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[dagger.Client]:
+        if self._tg is None:
+            # pool is not running (e.g. app used without lifespan), fall back to a one-off connection
+            self.ephemeral_leases += 1
+            async with self._connect() as client:
+                yield client
+            return
+
+        wait_started = time.monotonic()
+        self._waiting += 1
+        try:
+            session = await self._checkout()
+        finally:
+            self._waiting -= 1
+        self._wait_samples.append(time.monotonic() - wait_started)
+
+        session.leases += 1
+        self._leased += 1
+        self.total_leases += 1
+        healthy = True
+        scope = anyio.CancelScope()
+        self._lease_scopes.add(scope)
+        try:
+            assert session.client is not None
+            with scope:
+                yield session.client
+        except dagger.TransportError:
+            healthy = False
+            raise
+        finally:
+            self._lease_scopes.discard(scope)
+            session.leases -= 1
+            self._leased -= 1
+            session.last_used = time.monotonic()
+            if not healthy or self._draining:
+                self._forget(session)
+                self._replenish()
+        if scope.cancelled_caught:
+            raise PoolDrainingError("Dagger session pool was drained while the lease was in use")
+
+    async def drain(self, timeout: float | None = None) -> None:
+        self._draining = True
+        timeout = self.drain_timeout if timeout is None else timeout
+        with anyio.move_on_after(timeout):
+            while self._leased:
+                await anyio.sleep(0.05)
+        if self._leased:
+            logger.warning(f"Dagger session pool drain timed out, cancelling {self._leased} outstanding leases")
+            for scope in list(self._lease_scopes):
+                scope.cancel()
+
+        for session in list(self._sessions):
+            self._forget(session)
+
+    def metrics(self) -> dict:
+        samples = sorted(self._wait_samples)
+
+        def percentile(q: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+        return {
+            "max_size": self.max_size,
+            "session_leases": self.session_leases,
+            "open": len(self._sessions),
+            "idle": self._idle_count(),
+            "leased": self._leased,
+            "waiting": self._waiting,
+            "saturation": self._leased / (self.max_size * self.session_leases),
+            "draining": self._draining,
+            "total_leases": self.total_leases,
+            "ephemeral_leases": self.ephemeral_leases,
+            "sessions_created": self.sessions_created,
+            "sessions_discarded": self.sessions_discarded,
+            "lease_wait_avg": sum(samples) / len(samples) if samples else 0.0,
+            "lease_wait_p50": percentile(0.5),
+            "lease_wait_p95": percentile(0.95),
+            "lease_wait_max": samples[-1] if samples else 0.0,
+        }
+
+    def _idle_count(self) -> int:
+        return sum(1 for session in self._sessions if session.leases == 0)
+
+    async def _checkout(self) -> _Session:
+        while True:
+            if self._draining:
+                raise PoolDrainingError("Dagger session pool is draining")
+            # least loaded first, among equals the most recently used so stale ones stay unused
+            candidates = sorted(
+                (s for s in self._sessions if not s.closed.is_set()),
+                key=lambda s: (s.leases, -s.last_used),
+            )
+            session = candidates[0] if candidates else None
+            if session is not None and session.leases == 0:
+                if time.monotonic() - session.last_used > self.health_check_after:
+                    if not await self._is_healthy(session):
+                        self._forget(session)
+                        continue
+                return session
+            if (session is None or session.leases >= self.session_leases) and self._reserve():
+                return await self._open_session()
+            if session is not None:
+                return session
+            # the free slots are taken by sessions being warmed, wait for one of them
+            assert self._changed is not None
+            await self._changed.wait()
+
+    async def _is_healthy(self, session: _Session) -> bool:
+        with anyio.move_on_after(self.health_check_timeout):
+            try:
+                await self._health_check(session.client)
+                session.last_used = time.monotonic()
+                return True
+            except Exception as e:
+                logger.warning(f"Discarding unhealthy Dagger session: {e}")
+                return False
+        logger.warning("Discarding Dagger session: health check timed out")
+        return False
+
+    def _reserve(self) -> bool:
+        """Take a slot for a new session, checked and taken without yielding so concurrent openers can't overshoot."""
+        if len(self._sessions) + self._opening >= self.max_size:
+            return False
+        self._opening += 1
+        return True
+
+    def _notify(self) -> None:
+        """Wake up checkouts waiting for a session."""
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = anyio.Event()
+
+    async def _open_session(self) -> _Session:
+        """Open a session in a slot taken by _reserve."""
+        assert self._tg is not None
+        session = _Session()
+        try:
+            await self._tg.start(self._run_session, session)
+            self.sessions_created += 1
+            if self._draining:
+                # opened while the drain closed the others, nobody would close it later
+                self._forget(session)
+                raise PoolDrainingError("Dagger session pool is draining")
+            self._sessions.add(session)
+            return session
+        finally:
+            self._opening -= 1
+            self._notify()
+
+    async def _run_session(self, session: _Session, *, task_status=anyio.TASK_STATUS_IGNORED):
+        started = False
+        try:
+            async with self._connect() as client:
+                session.client = client
+                started = True
+                task_status.started()
+                await session.closed.wait()
+        except Exception:
+            if not started:
+                raise
+            logger.exception("Dagger session terminated unexpectedly")
+        finally:
+            if started:
+                self._forget(session)
+
+    def _forget(self, session: _Session) -> None:
+        if not session.closed.is_set():
+            session.closed.set()
+            self.sessions_discarded += 1
+        self._sessions.discard(session)
+        self._notify()
+
+    def _replenish(self) -> None:
+        if self._tg is not None and not self._draining and self._idle_count() < self.min_idle:
+            self._tg.start_soon(self._warm)
+
+    async def _warm(self) -> None:
+        while (
+            not self._draining
+            and self._idle_count() + self._warming < self.min_idle
+            and self._reserve()
+        ):
+            self._warming += 1
+            try:
+                await self._open_session()
+            except Exception as e:
+                logger.warning(f"Failed to warm Dagger session: {e}")
+                return
+            finally:
+                self._warming -= 1
+
+
+dagger_pool = DaggerSessionPool(
+    max_size=CONFIG.dagger_pool_size,
+    min_idle=CONFIG.dagger_pool_min_idle,
+    session_leases=CONFIG.dagger_pool_session_leases,
+)
@@ -0,0 +1,103 @@
+"""
+Delta-encoded, optionally compressed SSE event stream.
+
+In the default "full" mode every event that carries agentState repeats the whole state (FSM checkpoint
+plus every fsm_message), so long sessions push megabytes per event. A request with `streamMode: "delta"`
+gets a numbered stream instead:
+
+- every event carries `seq`, starting at 0
+- the first event with a state carries the full `agentState` snapshot, later ones only `stateDelta`
+  against the previous state of the stream (api.session_store.make_delta format)
+
+The encoder copies the state once and then only the deltas: the previous state is advanced with
+apply_delta, which shares the unchanged parts, and is never handed out, so the agent mutating its
+state in place can't change it.
+
+`streamCompression: "zlib"` additionally sends each event as `event: zlib` with base64 of a raw deflate
+stream shared by the whole response, so repeated keys and text are compressed across events. Events have
+to be decoded in order, EventStreamDecoder restores them on the client.
+"""
+
+import base64
+import copy
+import zlib
+from typing import Any, Literal
+from api.agent_server.models import AgentSseEvent
+from api.session_store import apply_delta, make_delta
+
+StreamMode = Literal["full", "delta"]
+StreamCompression = Literal["zlib"]
+
+COMPRESSED_EVENT = "zlib"
+
+
+class EventStreamError(Exception):
+    """The event stream can't be reassembled, e.g. an event is missing."""
+
+
+class EventStreamEncoder:
+    def __init__(self, mode: StreamMode | None = None, compression: StreamCompression | None = None):
+        self.mode = mode or "full"
+        self.compression = compression
+        self.seq = 0
+        self._state: dict[str, Any] | None = None
+        self._compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS) if compression == COMPRESSED_EVENT else None
+
+    def encode(self, event: AgentSseEvent) -> str:
+        """SSE frame for the event, the event itself is left untouched."""
+        if self.mode == "full" and self._compressor is None:
+            return f"data: {event.to_json()}\n\n"
+
+        update: dict[str, Any] = {}
+        if self.mode == "delta" and (state := event.message.agent_state) is not None:
+            if self._state is None:
+                # the agent keeps mutating parts of the state it has sent, e.g. metadata
+                self._state = copy.deepcopy(state)
+            else:
+                # the delta refers to objects of the agent's state, copied for the same reason
+                delta = copy.deepcopy(make_delta(self._state, state))
+                self._state = apply_delta(self._state, delta)
+                update["message"] = event.message.model_copy(update={"agent_state": None, "state_delta": delta})
+        event = event.model_copy(update={**update, "seq": self.seq})
+        self.seq += 1
+
+        payload = event.to_json()
+        if self._compressor is None:
+            return f"data: {payload}\n\n"
+        data = self._compressor.compress(payload.encode()) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return f"event: {COMPRESSED_EVENT}\ndata: {base64.b64encode(data).decode()}\n\n"
+
+
+class EventStreamDecoder:
+    """
+    Client side of EventStreamEncoder, accepts any mode and restores the full agentState of delta events.
+
+    `state` is the state the stream continues from, only needed for versioned sessions (api.session_store).
+    Without it the delta events of such a session keep agentState unset rather than a partial state.
+    """
+
+    def __init__(self, state: dict[str, Any] | None = None):
+        self.state = state
+        self.seq = 0
+        self._decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+
+    def decode(self, data: str, event_type: str = "message") -> AgentSseEvent:
+        if event_type == COMPRESSED_EVENT:
+            data = self._decompressor.decompress(base64.b64decode(data)).decode()
+        event = AgentSseEvent.from_json(data)
+        if event.seq is not None:
+            if event.seq != self.seq:
+                raise EventStreamError(f"Expected event {self.seq}, got {event.seq}")
+            self.seq += 1
+
+        message = event.message
+        if message.agent_state is not None:
+            self.state = message.agent_state
+        elif message.state_delta is not None:
+            if self.state is None:
+                # a versioned session continues from the stored state, without it the state is unknown
+                return event
+            self.state = apply_delta(self.state, message.state_delta)
+            message.agent_state = self.state
+        return event
+
@@ -5,8 +5,12 @@ from fire import Fire
 
 import enum
 from core.application import ApplicationBase
-from llm.utils import AsyncLLM, extract_tag
-from llm.common import InternalMessage, ToolUse, ToolResult as CommonToolResult, ToolUseResult, TextRaw, Tool
+from llm.utils import AsyncLLM
+from llm.scheduler import estimate_tokens, llm_priority, PRIORITY_INTERACTIVE
+from api.thread_compaction import ThreadCompactor
+from core import tool_engine
+from core.tool_engine import Effect, EXCLUSIVE, PURE
+from llm.common import DeltaCallback, InternalMessage, ToolUse, ToolResult as CommonToolResult, ToolUseResult, TextRaw, Tool, stream_completion
 from log import get_logger
 import ujson as json
 import os
@@ -69,6 +73,7 @@ class FSMToolProcessor:
         settings: Dict[str, Any] | None = None,
         event_callback: Callable[[str], Awaitable[None]] | None = None,
         max_messages_tokens: int = 512 * 1024,
+        delta_callback: DeltaCallback | None = None,
     ):
         """
         Initialize the FSM Tool Processor
@@ -78,13 +83,17 @@ class FSMToolProcessor:
             fsm_app: Optional existing FSM application instance
             settings: Optional dictionary of settings for the FSM/LLM
             event_callback: Optional callback to emit intermediate SSE events with diffs
+            max_messages_tokens: Estimated thread size the rolling compaction keeps requests under
+            delta_callback: Optional callback receiving the model output as it is generated
         """
         self.fsm_class = fsm_class
         self.fsm_app = fsm_app
         self.settings = settings or {}
         self.client = client
         self.event_callback = event_callback
+        self.delta_callback = delta_callback
         self.max_messages_tokens = max_messages_tokens
+        self.compactor = ThreadCompactor(max_messages_tokens)
 
         # Define tool definitions for the AI agent using the common Tool structure
         self.tool_definitions: list[Tool] = [
@@ -310,67 +319,29 @@ class FSMToolProcessor:
             return CommonToolResult(content=f"Failed to analyze spreadsheet: {str(e)}", is_error=True)
 
     async def compact_thread(self, messages: list[InternalMessage], llm: AsyncLLM) -> list[InternalMessage]:
-        last_message = messages[-1]
-        match last_message.role:
-            case "assistant":
-                thread = messages  # we can keep the whole thread for compacting
-                residual_messages = []
-            case "user":
-                thread = messages[:-1]  # remove the last user message
-                residual_messages = [last_message]  # keep the last user message for context
-
-        formatted_thread = json.dumps([msg.to_dict() for msg in thread], indent=2, ensure_ascii=False)
-
-        prompt = f"""You need to compact a conversation thread to fit within a token limit.
-        Make sure to keep the context and important information, but remove any parts that are not essential for understanding the conversation or outdated.
-        Code snippets are not crucial for understanding the conversation, so they can be dropped or replaced with a summary.
-        Keep all the details about the user intent, and current status of generation.
-        Final output is expected to be ~10 times smaller than the original thread.
-
-        The final output should be structured as two parts: user message and assistant message. Wrap each part in <user> and <assistant> tags respectively.
-
-        Example:
-        <user>
-        I want to build a web application that allows users to share photos. It should have user authentication, photo upload, and a feed where users can see photos from others.
-        </user>
-
-        <assistant>
-        After some work, the application is ready and verified to be working correctly. It includes user authentication, photo upload functionality, and a feed where users can see photos from others.
-        I used tools to verify the application and ensure it meets the requirements.
-        Feel free to ask for any additional features or improvements!
-        </assistant>
-
-        The conversation thread is as follows:
-        {formatted_thread}
-        """
-
-        user_message = None
-        assistant_message = None
-
-        result = await llm.completion(
-            messages=[InternalMessage.from_dict({"role": "user", "content": [{"type": "text", "text": prompt}]})],
-            max_tokens=64 * 1024,
-        )
-        (content,) = result.content
-
-        match content:
-            case TextRaw(text):
-                user_message = extract_tag(text, "user")
-                assistant_message = extract_tag(text, "assistant")
+        return await self.compactor.compact(messages, llm)
+
+    def tool_effect(self, block: ToolUse) -> Effect:
+        """FSM tools drive the same application and run in order, lookups run alongside them."""
+        if block.name == "analyze_spreadsheet" or block.name not in self.tool_mapping:
+            return PURE
+        return EXCLUSIVE
+
+    async def run_tool(self, block: ToolUse) -> ToolUseResult:
+        match self.tool_mapping.get(block.name):
+            case None:
+                return ToolUseResult.from_tool_use(
+                    tool_use=block,
+                    content=f"Unknow tool name: {block.name}",
+                    is_error=True,
+                )
+            case tool_method if isinstance(block.input, dict):
+                result = await tool_method(**block.input)
+                logger.info(f"Tool call: {block.name} with input: {block.input}")
+                logger.debug(f"Tool result: {result.content}")
+                return ToolUseResult.from_tool_use(tool_use=block, content=result.content)
             case _:
-                raise ValueError(f"Unexpected content type in LLM response: {type(content)}")
-
-        if not user_message or not assistant_message:
-            raise ValueError("Compacted thread does not contain both user and assistant messages.")
-
-        thread = [
-            InternalMessage.from_dict({"role": "user", "content": [{"type": "text", "text": user_message}]}),
-            InternalMessage.from_dict({"role": "assistant", "content": [{"type": "text", "text": assistant_message}]}),
-        ]
-        logger.info(f"New compacted user message: {user_message}")
-        logger.info(f"New compacted assistant message: {assistant_message}")
-        thread += residual_messages  # add back the last user message if it was removed
-        return thread
+                raise RuntimeError(f"Invalid tool call: {block}")
 
     async def step(
         self, messages: list[InternalMessage], llm: AsyncLLM, model_params: dict
@@ -381,8 +352,19 @@ class FSMToolProcessor:
             **model_params,
         }
 
+        # decided before the request, the thread must never overflow the model context
+        reserve = estimate_tokens([], self.system_prompt, self.tool_definitions) + model_params.get("max_tokens", 0)
+        if self.compactor.should_compact(messages, reserve):
+            logger.info(f"Thread is close to max tokens ({self.max_messages_tokens}), compacting before the request")
+            messages = await self.compact_thread(messages, llm)
+
         try:
-            response = await llm.completion(messages, **model_args)
+            # the user is waiting on this call, it goes ahead of queued beam search requests
+            with llm_priority(PRIORITY_INTERACTIVE):
+                if self.delta_callback is not None:
+                    response = await stream_completion(llm, self.delta_callback, messages=messages, **model_args)
+                else:
+                    response = await llm.completion(messages, **model_args)
         except Exception as e:
             msg_sizes = [len(json.dumps(msg.to_dict())) for msg in messages]
             last_message = messages[-1] if messages else None
@@ -393,31 +375,15 @@ class FSMToolProcessor:
             logger.error(f"LLM completion failed with messages of sizes: {msg_sizes}, last message side: {last_side}")
             # FixMe: this is a workaround for debugging, remove it later
             raise e
-        input_tokens = response.input_tokens
-        output_tokens = response.output_tokens
 
-        tool_results = []
+        tool_uses = []
         for block in response.content:
             match block:
                 case TextRaw(text):
                     logger.info(f"LLM Message: {text}")
-                case ToolUse(name):
-                    match self.tool_mapping.get(name):
-                        case None:
-                            tool_results.append(
-                                ToolUseResult.from_tool_use(
-                                    tool_use=block,
-                                    content=f"Unknow tool name: {name}",
-                                    is_error=True,
-                                )
-                            )
-                        case tool_method if isinstance(block.input, dict):
-                            result = await tool_method(**block.input)
-                            logger.info(f"Tool call: {name} with input: {block.input}")
-                            logger.debug(f"Tool result: {result.content}")
-                            tool_results.append(ToolUseResult.from_tool_use(tool_use=block, content=result.content))
-                        case _:
-                            raise RuntimeError(f"Invalid tool call: {block}")
+                case ToolUse():
+                    tool_uses.append(block)
+        tool_results = await tool_engine.execute(tool_uses, self.tool_effect, self.run_tool)
 
         thread = [InternalMessage(role="assistant", content=response.content)]
         if tool_results:
@@ -435,9 +401,6 @@ class FSMToolProcessor:
                 fsm_status = FSMStatus.WIP  # continue processing
 
         full_thread = messages + thread
-        if input_tokens + output_tokens > self.max_messages_tokens:
-            logger.info(f"Message size exceeds max tokens ({self.max_messages_tokens}), compacting thread")
-            full_thread = await self.compact_thread(full_thread, llm)
 
         return thread, fsm_status, full_thread
 
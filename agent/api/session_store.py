@@ -0,0 +1,195 @@
+"""
+Server-side session state with versioned deltas.
+
+The original protocol has the client send the whole agentState and allFiles with every request and
+receive the whole state back with every event, so request size and parse time grow with the project.
+Clients that send a `sessionId` opt into the versioned protocol:
+
+- the server keeps the agent state and the file snapshot of each session in a SessionStore
+- a request carries `sessionId` + `stateVersion` (0 for a new session) and only the files that
+  changed since the last request (`changedFiles`, `deletedFiles`)
+- events carry `stateDelta` against the previous state the client saw plus the new `stateVersion`
+  instead of the full `agentState`; make_delta / apply_delta define the delta format
+
+Requests on the same session are serialized per session while they restore their files, and a commit
+from a request that started at an older version than the stored one raises StaleSessionError instead of
+overwriting the newer state.
+
+Requests without a session id keep the full-state protocol. Sessions live in a bounded in-memory
+LRU, setting SESSION_STORE_PATH keeps them in SQLite on disk instead (see kv_storage).
+"""
+
+import copy
+import os
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field
+from typing import Any
+from weakref import WeakValueDictionary
+import anyio
+import anyio.to_thread
+from kv_storage import SqliteStorage
+from log import get_logger
+
+logger = get_logger(__name__)
+
+_SET = "$set"
+_APPEND = "$append"
+
+
+def make_delta(old: Any, new: Any) -> Any:
+    """
+    JSON merge patch (RFC 7386) from `old` to `new` with two extensions: `{"$append": [...]}` extends a
+    list that kept its prefix, `{"$set": value}` replaces a value that a plain patch can't express
+    (null, or a dict replacing a non-dict).
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch: dict[str, Any] = {key: None for key in old.keys() - new.keys()}
+        for key, value in new.items():
+            if key not in old:
+                patch[key] = {_SET: value} if value is None or isinstance(value, dict) else value
+            elif old[key] != value:
+                patch[key] = make_delta(old[key], value)
+        return patch
+    if isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and new[: len(old)] == old:
+        return {_APPEND: new[len(old) :]}
+    return {_SET: new} if new is None or isinstance(new, dict) else new
+
+
+def apply_delta(old: Any, delta: Any) -> Any:
+    """Apply a make_delta patch, `old` is left untouched."""
+    if not isinstance(delta, dict):
+        return delta
+    if _SET in delta and len(delta) == 1:
+        return delta[_SET]
+    if _APPEND in delta and len(delta) == 1:
+        return [*old, *delta[_APPEND]]
+    result = dict(old) if isinstance(old, dict) else {}
+    for key, value in delta.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_delta(result.get(key), value)
+    return result
+
+
+class StaleSessionError(Exception):
+    """The client's state version is not the one stored for its session."""
+
+
+@dataclass
+class Session:
+    session_id: str
+    version: int = 0
+    state: dict[str, Any] | None = None
+    files: dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {"version": self.version, "state": self.state, "files": self.files}
+
+    @classmethod
+    def from_dict(cls, session_id: str, data: dict) -> "Session":
+        return cls(session_id, data["version"], data["state"], data["files"])
+
+
+class MemorySessionBackend(MutableMapping[str, dict]):
+    """Bounded LRU of session records, the least recently used sessions fall back to the full-state protocol."""
+
+    def __init__(self, max_sessions: int = 512):
+        self.max_sessions = max_sessions
+        self._data: OrderedDict[str, dict] = OrderedDict()
+
+    def __getitem__(self, key: str) -> dict:
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def __setitem__(self, key: str, value: dict) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_sessions:
+            evicted, _ = self._data.popitem(last=False)
+            logger.info(f"Evicting session {evicted} from memory")
+
+    def __delitem__(self, key: str) -> None:
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SessionStore:
+    def __init__(self, backend: MutableMapping[str, dict] | None = None):
+        self.backend = backend if backend is not None else MemorySessionBackend()
+        # SQLite reads and writes of large states should not block the event loop
+        self._offload = not isinstance(self.backend, MemorySessionBackend)
+        self._locks: WeakValueDictionary[str, anyio.Lock] = WeakValueDictionary()
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        if path := os.getenv("SESSION_STORE_PATH"):
+            return cls(SqliteStorage(path))
+        return cls()
+
+    def lock(self, session_id: str) -> anyio.Lock:
+        """Lock for a read-modify-write of the session, the store methods don't take it themselves."""
+        if (lock := self._locks.get(session_id)) is None:
+            lock = self._locks[session_id] = anyio.Lock()
+        return lock
+
+    async def _run(self, fn, *args):
+        return await anyio.to_thread.run_sync(fn, *args) if self._offload else fn(*args)
+
+    def _load(self, session_id: str) -> Session | None:
+        data = self.backend.get(session_id)
+        if data is None:
+            return None
+        # records on disk are decoded fresh, in memory they must not share objects with the caller
+        return Session.from_dict(session_id, data if self._offload else copy.deepcopy(data))
+
+    def _version(self, session_id: str) -> int | None:
+        data = self.backend.get(session_id)
+        return None if data is None else data["version"]
+
+    def _save(self, session: Session) -> None:
+        data = session.to_dict()
+        self.backend[session.session_id] = data if self._offload else copy.deepcopy(data)
+
+    async def get(self, session_id: str) -> Session | None:
+        return await self._run(self._load, session_id)
+
+    async def resume(self, session_id: str, version: int) -> Session:
+        """Session the client continues from, a version other than the stored one is a conflict."""
+        session = await self.get(session_id)
+        if session is None:
+            if version != 0:
+                raise StaleSessionError(f"Session {session_id} is unknown, send the full agent state")
+            return Session(session_id)
+        if session.version != version:
+            raise StaleSessionError(
+                f"Session {session_id} is at version {session.version}, request was for version {version}"
+            )
+        return session
+
+    async def save(self, session: Session) -> None:
+        await self._run(self._save, session)
+
+    async def commit(self, session: Session, state: dict[str, Any]) -> tuple[int, Any]:
+        """
+        Store a new state version, returns it with the delta from the previous version.
+
+        Raises StaleSessionError when another request committed since `session` was loaded.
+        """
+        async with self.lock(session.session_id):
+            stored = await self._run(self._version, session.session_id)
+            if stored is not None and stored != session.version:
+                raise StaleSessionError(
+                    f"Session {session.session_id} moved to version {stored} while this request ran from version {session.version}"
+                )
+            delta = make_delta(session.state or {}, state)
+            session.state = copy.deepcopy(state)
+            session.version += 1
+            await self.save(session)
+        return session.version, delta
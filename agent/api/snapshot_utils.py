@@ -1,15 +1,39 @@
+"""
+Background persistence of FSM snapshots and SSE events.
+
+`save_snapshot` is called from the agent while it streams events, so it only serializes the data and
+puts it on a bounded queue; worker threads compress and upload it. A snapshot that is still queued
+is replaced in place when the same trace saves the same key again, and when the queue is full the
+oldest event snapshot is dropped rather than blocking the agent. FSM state snapshots (the input and
+final state of a session) are never dropped, the queue grows past its bound for them instead.
+Pending snapshots are flushed on close, which runs at interpreter exit and on server shutdown.
+
+Snapshots go to a local directory if SNAPSHOT_BUCKET is an existing directory, otherwise to the S3
+bucket of that name; SNAPSHOT_ENDPOINT_URL points the client at any S3-compatible store. Local
+snapshots are plain JSON, S3 bodies are gzipped (ContentEncoding=gzip); analysis.trace_loader reads both.
+"""
+
+import atexit
+import gzip
 import ujson as json
 import boto3
+import threading
+from botocore.config import Config as BotoConfig
+from collections import OrderedDict
 from log import get_logger
 from api.config import CONFIG
 import os
 import logging
+from typing import Protocol
 from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type, before_sleep_log
 from botocore.exceptions import ClientError, BotoCoreError
 
 
 logger = get_logger(__name__)
 
+# keys of the snapshots that may be dropped when the queue is full
+DROPPABLE_PREFIX = "sse_events/"
+
 
 # retry decorator for S3 operations
 retry_s3_errors = retry(
@@ -20,57 +44,200 @@ retry_s3_errors = retry(
 )
 
 
-class FSMSnapshotSaver:
-    def __init__(self):
-        self.bucket_name = CONFIG.snapshot_bucket or ""
+class SnapshotSink(Protocol):
+    def put(self, trace_id: str, key: str, body: bytes) -> None: ...
 
-        if os.path.exists(self.bucket_name) and os.path.isdir(self.bucket_name):
-            self.is_local = True
-            self.is_available = True
-        else:
-            self.is_local = False
-            self.is_available = self.check_bucket_available()
 
-    def check_bucket_available(self) -> bool:
-        if not self.bucket_name:
-            logger.info("Saving snapshots disabled. No bucket name provided.")
-            return False
+class LocalDirSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def put(self, trace_id: str, key: str, body: bytes) -> None:
+        if os.path.sep in key:
+           key = key.replace(os.path.sep, "_")
 
+        with open(os.path.join(self.path, f"{trace_id}-{key}.json"), "wb") as f:
+            f.write(body)
+
+
+class S3Sink:
+    def __init__(
+        self,
+        bucket_name: str,
+        endpoint_url: str | None = None,
+        client=None,
+        max_connections: int = 10,
+        compress: bool = True,
+    ):
+        self.bucket_name = bucket_name
+        self.compress = compress
+        # a single client shared by all workers, boto3 clients are thread safe and pool their connections
+        self.client = client or boto3.client(
+            "s3", endpoint_url=endpoint_url, config=BotoConfig(max_pool_connections=max_connections)
+        )
+
+    def check_available(self) -> bool:
         try:
-            boto3.resource('s3').meta.client.head_bucket(Bucket=self.bucket_name)
+            self.client.head_bucket(Bucket=self.bucket_name)
             logger.info("Saving snapshots enabled.")
             return True
         except Exception as e:
             logger.info(f"Saving snapshots disabled {e}")
             return False
 
-    def save_local(self, trace_id: str, key: str, data: object):
-        if os.path.sep in key:
-           key = key.replace(os.path.sep, "_")
+    def put(self, trace_id: str, key: str, body: bytes) -> None:
+        extra = {}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            extra = {"ContentEncoding": "gzip"}
+        self._put_object(trace_id, key, body, extra)
+
+    @retry_s3_errors
+    def _put_object(self, trace_id: str, key: str, body: bytes, extra: dict) -> None:
+        logger.info(f"Storing snapshot for trace: {trace_id}/{key}")
+        self.client.put_object(
+            Bucket=self.bucket_name,
+            Key=f"{trace_id}/{key}.json",
+            Body=body,
+            ContentType="application/json",
+            **extra,
+        )
+
+
+def default_sink() -> SnapshotSink | None:
+    bucket_name = CONFIG.snapshot_bucket or ""
+    if os.path.isdir(bucket_name):
+        return LocalDirSink(bucket_name)
+    if not bucket_name:
+        logger.info("Saving snapshots disabled. No bucket name provided.")
+        return None
+    sink = S3Sink(bucket_name, endpoint_url=CONFIG.snapshot_endpoint_url)
+    return sink if sink.check_available() else None
 
-        with open(os.path.join(self.bucket_name, f"{trace_id}-{key}.json"), "w") as f:
-            json.dump(data, f)
+
+class FSMSnapshotSaver:
+    def __init__(
+        self,
+        sink: SnapshotSink | None = None,
+        max_pending: int = 1024,
+        workers: int = 4,
+    ):
+        self.sink = sink
+        self.is_available = sink is not None
+        self.max_pending = max_pending
+        self.workers = workers
+
+        self._pending: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+        self._in_flight: set[tuple[str, str]] = set()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+        self._atexit_registered = False
+
+        self.saved = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
 
     def save_snapshot(self, trace_id: str, key: str, data: object):
+        """Queue a snapshot, returns without waiting for storage."""
         if not self.is_available:
             return
 
-        match self.is_local:
-            case True:
-                self.save_local(trace_id, key, data)
-            case False:
-                self.save_s3(trace_id, key, data)
-
-    def save_s3(self, trace_id: str, key: str, data: object):
-        logger.info(f"Storing snapshot for trace: {trace_id}/{key}")
-        file_key = f"{trace_id}/{key}.json"
-        self._put_object_with_retry(file_key, json.dumps(data))
+        # serialize right away, the caller keeps mutating the data after this call
+        body = json.dumps(data).encode()
+        item = (trace_id, key)
+        with self._cond:
+            if item in self._pending:
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_pending and (dropped := self._droppable()) is not None:
+                del self._pending[dropped]
+                self.dropped += 1
+                logger.warning(
+                    f"Snapshot queue is full, dropping snapshot {dropped[0]}/{dropped[1]} ({self.dropped} dropped so far)"
+                )
+            self._pending[item] = body
+            self._start_workers()
+            self._cond.notify()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            return {
+                "saved": self.saved,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "pending": len(self._pending),
+            }
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every queued snapshot is stored, returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def close(self, timeout: float | None = 30.0):
+        """Flush pending snapshots and stop the workers, a later snapshot starts them again."""
+        if not self.flush(timeout):
+            logger.warning(f"Timed out flushing snapshots, {len(self._pending)} not saved")
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._cond:
+            self._threads = []
+            self._closed = False
+
+    def _start_workers(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"snapshot-saver-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _droppable(self) -> tuple[str, str] | None:
+        return next((item for item in self._pending if item[1].startswith(DROPPABLE_PREFIX)), None)
+
+    def _next_item(self) -> tuple[str, str] | None:
+        # a key being written is skipped so a newer version can't be overtaken by the older one
+        return next((item for item in self._pending if item not in self._in_flight), None)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while (item := self._next_item()) is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                body = self._pending.pop(item)
+                self._in_flight.add(item)
+
+            try:
+                self._write(item, body)
+            finally:
+                with self._cond:
+                    self._in_flight.discard(item)
+                    self._cond.notify_all()
+
+    def _write(self, item: tuple[str, str], body: bytes):
+        assert self.sink is not None
+        trace_id, key = item
+        try:
+            self.sink.put(trace_id, key, body)
+        except Exception:
+            with self._cond:
+                self.failed += 1
+            logger.exception(f"Failed to store snapshot {trace_id}/{key}")
+        else:
+            with self._cond:
+                self.saved += 1
 
-    @retry_s3_errors
-    def _put_object_with_retry(self, key: str, body: str):
-        boto3.resource('s3').Bucket(self.bucket_name).put_object(Key=key, Body=body)
 
-snapshot_saver = FSMSnapshotSaver()
+snapshot_saver = FSMSnapshotSaver(default_sink())
 
 
 if __name__ == "__main__":
@@ -80,3 +247,4 @@ if __name__ == "__main__":
         key="fsm_enter",
         data=data
     )
+    snapshot_saver.close()
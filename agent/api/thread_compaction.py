@@ -0,0 +1,125 @@
+"""
+Rolling compaction of the top-level agent thread.
+
+The thread used to be compacted after a response had already overflowed
+max_messages_tokens, by sending the whole history to the LLM and asking for a
+rewrite. That blocked the user on a 64k-token call which grew with every
+compaction. Now the thread is kept as a running summary (a user / assistant
+pair at its head) followed by the recent turns verbatim. Before each request the
+size is estimated locally (llm.scheduler.estimate_tokens, no provider call) and
+if the request would come close to the limit the turns that aged out of the
+recent window are folded into the summary. Only that segment and the previous
+summary are sent, never the full history.
+
+The recent window always starts at a user turn that carries no tool results, so
+every tool result stays next to the tool use it answers.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence
+import ujson as json
+from llm.common import AsyncLLM, InternalMessage, TextRaw, ToolUseResult
+from llm.scheduler import estimate_tokens, llm_priority, PRIORITY_INTERACTIVE
+from llm.utils import extract_tag
+from log import get_logger
+
+logger = get_logger(__name__)
+
+SUMMARY_TAG = "conversation_summary"
+SUMMARY_ACK = "Understood, I will continue from this summary."
+
+
+def read_summary(messages: Sequence[InternalMessage]) -> str | None:
+    """Running summary at the head of a compacted thread."""
+    if len(messages) < 2 or messages[0].role != "user":
+        return None
+    match list(messages[0].content):
+        case [TextRaw(text)] if text.startswith(f"<{SUMMARY_TAG}>"):
+            return extract_tag(text, SUMMARY_TAG)
+    return None
+
+
+def summary_messages(summary: str) -> list[InternalMessage]:
+    return [
+        InternalMessage(role="user", content=[TextRaw(f"<{SUMMARY_TAG}>\n{summary}\n</{SUMMARY_TAG}>")]),
+        InternalMessage(role="assistant", content=[TextRaw(SUMMARY_ACK)]),
+    ]
+
+
+def _is_turn_start(message: InternalMessage) -> bool:
+    return message.role == "user" and not any(isinstance(block, ToolUseResult) for block in message.content)
+
+
+@dataclass
+class ThreadCompactor:
+    max_tokens: int
+    # compact once a request is estimated to use this share of max_tokens
+    trigger: float = 0.75
+    # share of max_tokens kept verbatim after compaction
+    window: float = 0.3
+    summary_max_tokens: int = 8192
+
+    def should_compact(self, messages: Sequence[InternalMessage], reserve: int = 0) -> bool:
+        """Whether a request with these messages and `reserve` more tokens (system prompt, tools, output) comes close to the limit."""
+        return estimate_tokens(list(messages)) + reserve > self.trigger * self.max_tokens
+
+    def split(
+        self, messages: Sequence[InternalMessage]
+    ) -> tuple[str | None, list[InternalMessage], list[InternalMessage]]:
+        """Previous summary, the aged segment to fold into it and the recent window kept verbatim."""
+        summary = read_summary(messages)
+        rest = list(messages[2:] if summary is not None else messages)
+        sizes = [estimate_tokens([message]) for message in rest]
+        suffix = [0] * (len(rest) + 1)
+        for i in range(len(rest) - 1, -1, -1):
+            suffix[i] = suffix[i + 1] + sizes[i]
+        boundaries = [i for i in range(1, len(rest)) if _is_turn_start(rest[i])]
+        if not boundaries:
+            return summary, [], rest
+        # the longest window that fits, the latest turn alone if none does
+        budget = self.window * self.max_tokens
+        cut = next((i for i in boundaries if suffix[i] <= budget), boundaries[-1])
+        return summary, rest[:cut], rest[cut:]
+
+    async def summarize(self, summary: str | None, aged: list[InternalMessage], llm: AsyncLLM) -> str:
+        formatted = json.dumps([message.to_dict() for message in aged], indent=2, ensure_ascii=False)
+        previous = f"<previous_summary>\n{summary}\n</previous_summary>\n\n" if summary else ""
+        prompt = f"""You maintain a running summary of a conversation between a user and an assistant that generates an application.
+        Update the summary with the new part of the conversation below; the summary is all that will be kept of it.
+        Keep all the details about the user intent, requirements and decisions, and the current status of generation.
+        Code snippets and tool outputs are not crucial, drop them or summarize them in a sentence.
+        Drop details the new part makes outdated. Keep the summary concise.
+
+        {previous}<new_messages>
+        {formatted}
+        </new_messages>
+
+        Reply with the updated summary wrapped in <summary> tags.
+        """
+
+        with llm_priority(PRIORITY_INTERACTIVE):
+            result = await llm.completion(
+                messages=[InternalMessage(role="user", content=[TextRaw(prompt)])],
+                max_tokens=self.summary_max_tokens,
+            )
+        match list(result.content):
+            case [TextRaw(text)]:
+                updated = extract_tag(text, "summary")
+            case content:
+                raise ValueError(f"Unexpected content in LLM response: {content}")
+        if not updated:
+            raise ValueError("Summary response does not contain a summary.")
+        return updated
+
+    async def compact(self, messages: Sequence[InternalMessage], llm: AsyncLLM) -> list[InternalMessage]:
+        summary, aged, recent = self.split(messages)
+        if not aged:
+            logger.warning("Thread can't be compacted, no complete turn outside of the recent window")
+            return list(messages)
+        updated = await self.summarize(summary, aged, llm)
+        logger.info(
+            f"Compacted {len(aged)} messages into the summary, kept {len(recent)} recent messages "
+            f"(~{estimate_tokens(list(messages))} -> ~{estimate_tokens([*summary_messages(updated), *recent])} tokens)"
+        )
+        logger.debug(f"New summary: {updated}")
+        return [*summary_messages(updated), *recent]
@@ -0,0 +1,22 @@
+"""
+Micro-benchmarks of the agent internals.
+
+Usage:
+  uv run python -m bench <name> --help
+"""
+
+from fire import Fire
+from bench import actors, alloy, base_node, cache_storage, checkpoint, dagger_utils, error_condenser, event_stream, incremental
+
+if __name__ == "__main__":
+    Fire({
+        "actors": actors.benchmark,
+        "alloy": alloy.benchmark,
+        "base_node": base_node.benchmark,
+        "cache_storage": cache_storage.benchmark,
+        "checkpoint": checkpoint.benchmark,
+        "dagger_utils": dagger_utils.benchmark,
+        "error_condenser": error_condenser.benchmark,
+        "event_stream": event_stream.benchmark,
+        "incremental": incremental.benchmark,
+    })
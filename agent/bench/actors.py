@@ -0,0 +1,36 @@
+"""Cost of building the message history of a node at growing trajectory depth."""
+
+import time
+from core.actors import BaseData, message_history
+from core.base_node import Node
+from llm.common import Message, TextRaw
+
+
+def benchmark(depth: int = 200, messages_per_node: int = 2, rounds: int = 20):
+    """Compare per-call history construction along a deep trajectory: trajectory walk vs shared history."""
+
+    def make_node(parent: Node[BaseData] | None, i: int) -> Node[BaseData]:
+        messages = [
+            Message(role="user", content=[TextRaw(f"message {i}.{j}")])
+            for j in range(messages_per_node)
+        ]
+        node = Node(BaseData(None, messages), parent)  # pyright: ignore[reportArgumentType]
+        return parent.add_child(node) if parent else node
+
+    def run(build) -> list[float]:
+        timings = [0.0] * depth
+        for _ in range(rounds):
+            node = None
+            for i in range(depth):
+                node = make_node(node, i)
+                started = time.perf_counter()
+                build(node)
+                timings[i] += (time.perf_counter() - started) / rounds
+        return timings
+
+    naive = run(lambda node: [m for n in node.get_trajectory() for m in n.data.messages])
+    shared = run(message_history)
+    for label, timings in (("trajectory walk", naive), ("shared history", shared)):
+        first, last = timings[1] * 1e6, timings[-1] * 1e6
+        print(f"{label:16} depth 1: {first:6.1f}us  depth {depth - 1}: {last:6.1f}us")
+
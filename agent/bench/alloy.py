@@ -0,0 +1,90 @@
+"""Selection strategies of AlloyLLM on simulated providers."""
+
+import random
+import statistics
+import time
+import anyio
+from llm.alloy import BREAKER_COOLDOWN, AlloyLLM, SelectionStrategy
+from llm.common import AsyncLLM, Completion, Message, TextRaw
+
+
+class SimulatedLLM(AsyncLLM):
+    """Provider with log-normally distributed latency, occasional stalls and failures."""
+
+    def __init__(self, name: str, median: float, sigma: float, stall_rate: float = 0.0, error_rate: float = 0.0):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.stall_rate = stall_rate
+        self.error_rate = error_rate
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        stall = 10.0 if random.random() < self.stall_rate else 1.0
+        await anyio.sleep(random.lognormvariate(0, self.sigma) * self.median * stall)
+        if random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name} overloaded")
+        return Completion(
+            role="assistant",
+            content=[TextRaw(self.name)],
+            input_tokens=1,
+            output_tokens=1,
+            stop_reason="end_turn",
+        )
+
+    def __repr__(self):
+        return f"SimulatedLLM({self.name})"
+
+
+def benchmark(calls: int = 1000, concurrency: int = 8, scale: float = 0.01, seed: int = 0):
+    """Compare the strategies on simulated providers: fast but stalling on 8% of calls, steady, and degraded.
+
+    Latencies are in seconds multiplied by scale, a stall takes ten times as long, the degraded
+    provider fails 40% of its calls.
+    """
+    messages = [Message(role="user", content=[TextRaw("hello")])]
+
+    def providers() -> list[AsyncLLM]:
+        return [
+            SimulatedLLM("stalling", median=3.0 * scale, sigma=0.3, stall_rate=0.08),
+            SimulatedLLM("steady", median=5.0 * scale, sigma=0.3),
+            SimulatedLLM("degraded", median=2.5 * scale, sigma=0.5, error_rate=0.4),
+        ]
+
+    async def run(alloy: AlloyLLM) -> tuple[list[float], int]:
+        latencies: list[float] = []
+        errors = 0
+        limiter = anyio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal errors
+            async with limiter:
+                started = time.perf_counter()
+                try:
+                    await alloy.completion(messages=messages, max_tokens=16)
+                except RuntimeError:
+                    errors += 1
+                else:
+                    latencies.append((time.perf_counter() - started) / scale)
+
+        async with anyio.create_task_group() as tg:
+            for _ in range(calls):
+                tg.start_soon(one)
+        return latencies, errors
+
+    setups: list[tuple[str, SelectionStrategy, bool]] = [
+        ("random", "random", False),
+        ("round_robin", "round_robin", False),
+        ("latency", "latency", False),
+        ("latency+hedge", "latency", True),
+    ]
+    print(f"calls={calls} concurrency={concurrency} (latencies in unscaled seconds)")
+    for label, strategy, hedge in setups:
+        random.seed(seed)
+        alloy = AlloyLLM(providers(), strategy, hedge=hedge, breaker_cooldown=BREAKER_COOLDOWN * scale)
+        latencies, errors = anyio.run(run, alloy)
+        q = statistics.quantiles(latencies, n=100, method="inclusive")
+        print(
+            f"{label:>14}: p50 {q[49]:5.2f}s p90 {q[89]:5.2f}s p99 {q[98]:5.2f}s "
+            f"errors {errors:3d} hedges {alloy.hedges:3d} (won {alloy.hedge_wins:3d}) failovers {alloy.failovers:3d}"
+        )
+
@@ -0,0 +1,48 @@
+"""Beam selection on large search trees, cached Node bookkeeping vs full traversals."""
+
+import random
+import time
+from core.base_node import Node
+
+
+def benchmark(nodes: int = 10_000, branching: int = 3, rounds: int = 100):
+    """Compare beam selection via cached bookkeeping against full traversals on a large tree."""
+
+    def naive_depth(node: Node) -> int:
+        return naive_depth(node.parent) + 1 if node.parent else 0
+
+    rng = random.Random(0)
+    root = Node[int](0)
+    frontier = [root]
+    for i in range(1, nodes):
+        parent = frontier[rng.randrange(len(frontier))]
+        child = parent.add_child(Node[int](i, parent))
+        frontier.append(child)
+        if len(parent.children) >= branching:
+            frontier.remove(parent)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        # previous selection: full traversal, recursive depth per leaf, parent walk per trajectory
+        all_children = root.get_all_children()
+        for n in all_children:
+            if n.is_leaf and naive_depth(n) <= nodes:
+                _ = len(all_children) > naive_depth(n) + 1
+                stack = [n]
+                while stack[-1].parent:
+                    stack.append(stack[-1].parent)
+    naive = (time.perf_counter() - started) / rounds
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        size = root.subtree_size
+        for n in root.get_leaves():
+            if n.depth <= nodes:
+                _ = size > n.depth + 1
+                n.get_trajectory()
+    cached = (time.perf_counter() - started) / rounds
+
+    print(f"nodes={nodes} leaves={len(root.get_leaves())} max_depth={max(n.depth for n in root.get_leaves())}")
+    print(f"traversal selection: {naive * 1000:.2f}ms/iteration")
+    print(f"cached selection:    {cached * 1000:.2f}ms/iteration ({naive / cached:.1f}x)")
+
@@ -0,0 +1,57 @@
+"""Record / reopen / replay throughput of the LLM cache storage engines vs the legacy full-rewrite JSON file."""
+
+import tempfile
+import time
+from pathlib import Path
+import ujson as json
+from kv_storage import AppendLogStorage, SqliteStorage
+from llm.cache_storage import StorageBackend, open_cache_storage, storage_path
+
+
+def benchmark(entries: int = 10_000, backend: StorageBackend = "log", payload_size: int = 2048, fsync: bool = False):
+    """Measure one engine, the legacy file is written for at most 1000 entries."""
+    payload = "x" * payload_size
+    keys = [f"{i:032x}" for i in range(entries)]
+
+    def entry(i: int) -> dict:
+        return {"data": {"role": "assistant", "content": [{"type": "text", "text": payload}]}, "params": {"i": i}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "cache.json"
+
+        started = time.perf_counter()
+        if backend == "log":
+            storage = AppendLogStorage(storage_path(cache_path, backend), fsync=fsync)
+        else:
+            storage = SqliteStorage(storage_path(cache_path, backend))
+        for i, key in enumerate(keys):
+            storage[key] = entry(i)
+        record = time.perf_counter() - started
+        storage.close()
+
+        started = time.perf_counter()
+        storage = open_cache_storage(cache_path, backend)
+        reopen = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for key in keys:
+            storage[key]
+        replay = time.perf_counter() - started
+        storage.close()
+
+        # old behaviour: rewrite the whole file after every recorded entry
+        legacy_entries = min(entries, 1_000)
+        cache: dict = {}
+        started = time.perf_counter()
+        for i in range(legacy_entries):
+            cache[keys[i]] = entry(i)
+            with cache_path.open("w") as f:
+                json.dump(cache, f, indent=2)
+        legacy_record = time.perf_counter() - started
+
+    print(f"backend={backend} entries={entries} payload={payload_size}B fsync={fsync}")
+    print(f"record: {entries / record:,.0f} entries/s ({record:.2f}s)")
+    print(f"reopen: {reopen * 1000:.1f}ms")
+    print(f"replay: {entries / replay:,.0f} entries/s ({replay:.2f}s)")
+    print(f"legacy json record ({legacy_entries} entries): {legacy_entries / legacy_record:,.0f} entries/s ({legacy_record:.2f}s)")
+
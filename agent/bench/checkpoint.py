@@ -0,0 +1,38 @@
+"""Size and dump / load time of recorded checkpoints in the legacy and content-addressed formats."""
+
+import gzip
+import time
+from pathlib import Path
+import ujson as json
+from core.checkpoint import pack_checkpoint, unpack_nodes
+
+
+def benchmark(*paths: str, rounds: int = 5):
+    """Compare recorded checkpoints (e.g. *-fsm_exit.json snapshots) per format."""
+    checkpoints = []
+    for path in paths:
+        payload = Path(path).read_bytes()
+        if payload[:2] == b"\x1f\x8b":  # snapshots uploaded to S3 are gzipped
+            payload = gzip.decompress(payload)
+        checkpoints.append(json.loads(payload))
+    print(f"checkpoints={len(checkpoints)}")
+
+    def actor_nodes(checkpoint: dict) -> list[list[dict]]:
+        return [unpack_nodes(actor["data"]) for actor in checkpoint["actors"] if actor["data"]]
+
+    for name, packed in [("legacy", False), ("cas", True)]:
+        size = dump_time = load_time = 0.0
+        for checkpoint in checkpoints:
+            for _ in range(rounds):
+                started = time.perf_counter()
+                payload = json.dumps(pack_checkpoint(checkpoint) if packed else checkpoint)
+                dump_time += time.perf_counter() - started
+
+                started = time.perf_counter()
+                actor_nodes(json.loads(payload))
+                load_time += time.perf_counter() - started
+            size += len(payload)
+        print(
+            f"{name:>8}: {size / 1024:10.1f} KiB, dump {dump_time / rounds * 1000:8.1f}ms, "
+            f"load {load_time / rounds * 1000:8.1f}ms"
+        )
@@ -0,0 +1,45 @@
+"""Exec result collection with three queries vs the single-query capture, needs a Dagger engine."""
+
+import time
+import uuid
+import anyio
+import dagger
+from core.dagger_utils import ExecResult
+
+# base images of the check runners of each agent
+RUNNER_IMAGES = {
+    "trpc": "oven/bun:1.2.5-alpine",
+    "nicegui": "alpine:3.21.3",
+    "laravel": "php:8.2-fpm-alpine",
+    "playwright": "mcr.microsoft.com/playwright:v1.52.0",
+}
+
+
+async def _benchmark(rounds: int, output_lines: int):
+    # a failing check printing a long log, as tsc / pytest / composer do on errors
+    command = ["sh", "-c", f"seq 1 {output_lines}; echo 'error: check failed' >&2; exit 2"]
+    async with dagger.Connection(dagger.Config()) as client:
+        for runner, image in RUNNER_IMAGES.items():
+            base = await client.container().from_(image).sync()
+            timings = {"from_ctr": 0.0, "capture": 0.0}
+            sizes = {}
+            for _ in range(rounds):
+                # fresh exec every round, the engine would cache it otherwise
+                ctr = base.with_env_variable("BENCHMARK_RUN", uuid.uuid4().hex)
+                started = time.perf_counter()
+                result = await ExecResult.from_ctr(ctr.with_exec(command, expect=dagger.ReturnType.ANY))
+                timings["from_ctr"] += time.perf_counter() - started
+                sizes["from_ctr"] = len(result.stdout) + len(result.stderr)
+
+                started = time.perf_counter()
+                result = await ExecResult.capture(ctr, command)
+                timings["capture"] += time.perf_counter() - started
+                sizes["capture"] = len(result.stdout) + len(result.stderr)
+            for mode, total in timings.items():
+                print(f"{runner:>10} {mode:>8}: {total / rounds * 1000:8.1f}ms, output {sizes[mode] / 1024:8.1f} KiB")
+
+
+def benchmark(rounds: int = 5, output_lines: int = 500_000):
+    """Compare three-query and single-query exec result collection on the check runner images."""
+    anyio.run(_benchmark, rounds, output_lines)
+
@@ -0,0 +1,22 @@
+"""Condensing of captured check outputs, see core.error_condenser."""
+
+import os
+from core.error_condenser import CondenserStats, condense
+
+
+def benchmark(corpus: str | None = None, max_length: int = 4096):
+    """Compression ratio and LLM calls avoided over a directory of captured check outputs."""
+    corpus = corpus or os.path.join(os.path.dirname(__file__), "..", "tests", "data", "error_corpus")
+    stats = CondenserStats()
+    for name in sorted(os.listdir(corpus)):
+        with open(os.path.join(corpus, name)) as f:
+            original = f.read()
+        condensed = condense(original, max_length)
+        fallback = len(condensed) > max_length
+        # reports under budget never reached the LLM
+        if len(original) > max_length:
+            stats.record(original, condensed, fallback)
+        print(f"{name:<32} {len(original):>7} -> {len(condensed):>6} chars{'  LLM fallback' if fallback else ''}")
+    for key, value in stats.metrics().items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
+
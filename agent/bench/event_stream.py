@@ -0,0 +1,57 @@
+"""Bytes per session and encoding CPU of every SSE stream mode on a synthetic growing session."""
+
+import time
+from api.agent_server.models import AgentMessage, AgentSseEvent, AgentStatus, ExternalContentBlock, MessageKind
+from api.event_stream import COMPRESSED_EVENT, EventStreamDecoder, EventStreamEncoder
+
+
+def benchmark(steps: int = 100, files_per_step: int = 3, file_size: int = 4096, message_size: int = 2048):
+    """Measure bytes per session and server encoding CPU of every stream mode on a synthetic growing session."""
+
+    def session_events():
+        messages: list[dict] = [{"role": "user", "content": [{"type": "text", "text": "make a todo app"}]}]
+        files: dict[str, str] = {}
+        metadata = {"app_name": "todo-app", "template_diff_sent": True}
+        for step in range(steps):
+            for i in range(files_per_step):
+                files[f"src/step{step}/file{i}.ts"] = f"// step {step} file {i}\n" + "x" * file_size
+            messages.append({"role": "assistant", "content": [{"type": "text", "text": f"{step} " + "y" * message_size}]})
+            messages.append({"role": "user", "content": [{"type": "tool_result", "content": f"ok {step}"}]})
+            for kind in (MessageKind.WIP_UPDATE, MessageKind.STAGE_RESULT):
+                yield AgentSseEvent(
+                    status=AgentStatus.RUNNING,
+                    traceId="benchmark",
+                    message=AgentMessage(
+                        kind=kind,
+                        messages=[ExternalContentBlock(content=f"step {step}")],
+                        agentState={
+                            "fsm_state": {"current_state": "draft", "context": {"files": dict(files)}},
+                            "fsm_messages": [dict(m) for m in messages],
+                            "metadata": metadata,
+                        }
+                        if kind == MessageKind.STAGE_RESULT
+                        else None,
+                    ),
+                )
+
+    events = list(session_events())
+    print(f"steps={steps} events={len(events)} files={steps * files_per_step}x{file_size}B")
+    for mode, compression in (("full", None), ("full", "zlib"), ("delta", None), ("delta", "zlib")):
+        encoder = EventStreamEncoder(mode, compression)
+        started = time.process_time()
+        frames = [encoder.encode(event) for event in events]
+        encode = time.process_time() - started
+
+        decoder = EventStreamDecoder()
+        started = time.process_time()
+        for frame in frames:
+            *header, data = frame.rstrip("\n").split("\n")
+            decoder.decode(data.removeprefix("data: "), COMPRESSED_EVENT if header else "message")
+        decode = time.process_time() - started
+
+        total = sum(len(frame) for frame in frames)
+        print(
+            f"{mode:>5} {compression or '-':>4}: {total / 1024 / 1024:8.2f} MiB/session, "
+            f"server cpu {encode * 1000:8.1f}ms, client cpu {decode * 1000:8.1f}ms"
+        )
+
@@ -0,0 +1,46 @@
+"""Change-scoped validation on a template workspace, needs a Dagger engine."""
+
+import time
+from typing import Literal
+import anyio
+import dagger
+from core import base_images
+from core.incremental import tsc_caches, tsc_incremental
+from core.workspace import Workspace
+
+
+def benchmark(template: Literal["trpc", "nicegui"] = "trpc", rounds: int = 3):
+    """Time full against change-scoped checks after touching one source file of a template workspace."""
+    anyio.run(_benchmark, template, rounds)
+
+
+async def _benchmark(template: str, rounds: int):
+    if template == "trpc":
+        from trpc_agent.application import BASE_IMAGE, TEMPLATE_DIR
+        touched, cwd = "server/src/index.ts", "server"
+        full = ["bun", "run", "tsc", "--noEmit"]
+        scoped = tsc_incremental(full, "benchmark")
+    else:
+        from nicegui_agent.application import BASE_IMAGE, TEMPLATE_DIR
+        touched, cwd = "app/startup.py", "."
+        full = ["uv", "run", "pyright", "."]
+        scoped = ["uv", "run", "pyright", touched]
+
+    async with dagger.Connection(dagger.Config()) as client:
+        base, tag = await base_images.load(client, BASE_IMAGE, TEMPLATE_DIR)
+        workspace = await Workspace.create(client, base_image=tag, base=base, context=client.host().directory(TEMPLATE_DIR))
+        # warm the build info once, as the parent step would have
+        await workspace.exec(scoped, cwd=cwd, caches=tsc_caches())
+        timings = {"full": 0.0, "scoped": 0.0}
+        for i in range(rounds):
+            step = workspace.clone()
+            content = await step.read_file(touched)
+            step.write_file(touched, f"{content}\n{'//' if template == 'trpc' else '#'} step {i} {time.time()}\n")
+            for name, command in (("full", full), ("scoped", scoped)):
+                started = time.perf_counter()
+                await step.exec(command, cwd=cwd, caches=tsc_caches() if name == "scoped" else {})
+                timings[name] += time.perf_counter() - started
+        for name, total in timings.items():
+            print(f"{template} {name:>6}: {total / rounds:6.2f}s per step")
+        print(f"saved {(timings['full'] - timings['scoped']) / rounds:.2f}s per step")
+
@@ -109,6 +109,42 @@ def interactive():
     Fire(_run_interactive)
 
 
+def build_images():
+    Fire(_build_images)
+
+
+def _build_images(dest=None, force=False):
+    """Build the workspace base images of all agents and export them as OCI tarballs."""
+    from core.base_images import build_all
+    from trpc_agent import application as trpc_application
+    from nicegui_agent import application as nicegui_application
+    from laravel_agent import utils as laravel_utils
+    coloredlogs.install(level="INFO")
+    os.chdir(_current_dir())
+    dest = dest or os.getenv("BASE_IMAGE_DIR")
+    if not dest:
+        raise ValueError("Pass --dest or set BASE_IMAGE_DIR")
+    specs = {
+        "trpc": (trpc_application.BASE_IMAGE, trpc_application.TEMPLATE_DIR),
+        "nicegui": (nicegui_application.BASE_IMAGE, nicegui_application.TEMPLATE_DIR),
+        "laravel": (laravel_utils.BASE_IMAGE, laravel_utils.TEMPLATE_DIR),
+    }
+    for name, path in anyio.run(build_all, specs, dest, force).items():
+        print(f"{name}: {path}")
+
+
+def compact_cache():
+    Fire(_compact_cache)
+
+
+def _compact_cache(cache_path: str, backend="log"):
+    """Compact the storage file of an LLM cache in place, nothing else may write the cache meanwhile."""
+    from llm.cache_storage import open_cache_storage
+    storage = open_cache_storage(cache_path, backend)
+    storage.compact()
+    storage.close()
+
+
 def type_check():
     code = subprocess.run("uv run pyright .".split())
     sys.exit(code.returncode)
@@ -2,15 +2,17 @@ from typing import Protocol
 import dataclasses
 import anyio
 from anyio.streams.memory import MemoryObjectSendStream
-from core import statemachine
+from core import check_scheduler, checkpoint, error_condenser, statemachine, tool_engine
 from core.base_node import Node
-from llm.common import AsyncLLM, Message, InternalMessage
+from llm.common import AsyncLLM, Message, MessageHistory, InternalMessage
 from llm.utils import loop_completion, extract_tag
 from core.workspace import Workspace
+from core.tool_engine import Effect, EXCLUSIVE, PURE
 import hashlib
 from abc import ABC, abstractmethod
 from llm.common import Tool, ToolUse, ToolUseResult, TextRaw
 from llm.utils import get_ultra_fast_llm_client
+from llm.scheduler import llm_priority, PRIORITY_SEARCH
 from log import get_logger
 
 # ExceptionGroup support for Python 3.11+
@@ -34,6 +36,63 @@ class AgentSearchFailedException(Exception):
         super().__init__(user_message)
 
 
+def apply_files(workspace: Workspace, files: dict[str, str | None]) -> Workspace:
+    for file, content in files.items():
+        if content is not None:
+            workspace.write_file(file, content)
+        else:
+            workspace.rm(file)
+    return workspace
+
+
+@dataclasses.dataclass
+class _Rehydration:
+    """Workspace of a restored node that was not built yet: its parent's (or `base`) plus the node's files."""
+
+    parent: "BaseData | None"
+    base: Workspace | None
+
+
+class _LazyWorkspace:
+    """
+    Descriptor for BaseData.workspace, builds the workspace of a restored node on first access.
+
+    Installed on the class after the dataclass is built, so the field keeps no default and stays
+    in front of the other fields.
+
+    Materializing clones the nearest ancestor that has a workspace and replays the files of the nodes
+    in between, intermediate ancestors stay unmaterialized.
+    """
+
+    def __get__(self, obj: "BaseData | None", owner=None) -> Workspace:
+        if obj is None:
+            raise AttributeError("workspace")
+        if isinstance(workspace := obj.__dict__["_workspace"], _Rehydration):
+            workspace = obj.__dict__["_workspace"] = self._materialize(obj)
+        return workspace
+
+    def __set__(self, obj: "BaseData", value: Workspace) -> None:
+        obj.__dict__["_workspace"] = value
+
+    @staticmethod
+    def _materialize(data: "BaseData") -> Workspace:
+        chain: list[BaseData] = []
+        current: BaseData | None = data
+        while current is not None and isinstance(pending := current.__dict__["_workspace"], _Rehydration):
+            chain.append(current)
+            if pending.parent is None:
+                assert pending.base is not None
+                workspace = pending.base.clone()
+                break
+            current = pending.parent
+        else:
+            assert current is not None
+            workspace = current.workspace.clone()
+        for item in reversed(chain):
+            apply_files(workspace, item.files)
+        return workspace
+
+
 @dataclasses.dataclass
 class BaseData:
     workspace: Workspace
@@ -41,6 +100,9 @@ class BaseData:
     files: dict[str, str | None] = dataclasses.field(default_factory=dict)
     should_branch: bool = False
     context: str = "default"
+    _history: tuple[tuple, MessageHistory] | None = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def head(self) -> Message:
         if (num_messages := len(self.messages)) != 1:
@@ -49,6 +111,22 @@ class BaseData:
             raise ValueError(f"Expected assistant role in message: {self.messages}")
         return self.messages[0]
 
+    @classmethod
+    def rehydrating(
+        cls,
+        parent: "BaseData | None",
+        base: Workspace,
+        messages: list[Message],
+        files: dict[str, str | None],
+        should_branch: bool = False,
+    ) -> "BaseData":
+        """Restored node data whose workspace is built from `parent` (or `base` for a root) on first access."""
+        return cls(_Rehydration(parent, None if parent else base), messages, files, should_branch)  # pyright: ignore[reportArgumentType]
+
+    @property
+    def is_materialized(self) -> bool:
+        return not isinstance(self.__dict__["_workspace"], _Rehydration)
+
     @property
     def file_cache_key(self) -> str:
         s = ""
@@ -57,6 +135,34 @@ class BaseData:
         return hashlib.md5(s.encode()).hexdigest()
 
 
+setattr(BaseData, "workspace", _LazyWorkspace())
+
+
+def message_history(node: Node[BaseData]) -> MessageHistory:
+    """
+    Messages along the trajectory to `node`, sharing its parent's history instead of rebuilding it.
+
+    Only the node's own messages are checked for changes, messages of nodes that already have
+    children are not expected to change anymore. Moving the node to another parent resets its
+    memoized trajectory, which invalidates the history as well.
+    """
+    data, parent, path = node.data, node.parent, node._trajectory()
+    if data._history is not None:
+        cached_path, cached = data._history
+        if (
+            cached_path is path
+            and len(cached) - cached.prefix_len == len(data.messages)
+            and all(a is b for a, b in zip(cached[cached.prefix_len :], data.messages))
+        ):
+            return cached
+    if parent is None:
+        history = MessageHistory(data.messages)
+    else:
+        history = message_history(parent).extend(data.messages)
+    data._history = (path, history)
+    return history
+
+
 class BaseActor(statemachine.Actor):
     workspace: Workspace
 
@@ -68,17 +174,14 @@ class BaseActor(statemachine.Actor):
         }
 
     async def load_data(self, data: dict, workspace: Workspace) -> BaseData:
-        for file, content in data["files"].items():
-            if content is not None:
-                workspace.write_file(file, content)
-            else:
-                workspace.rm(file)
+        apply_files(workspace, data["files"])
         messages = [Message.from_dict(msg) for msg in data["messages"]]
         return BaseData(
             workspace, messages, data["files"], data.get("should_branch", False)
         )
 
-    async def dump_node(self, node: Node[BaseData]) -> list[dict]:
+    async def dump_node(self, node: Node[BaseData]) -> dict:
+        """Dump the tree under `node` in the content-addressed format of core.checkpoint."""
         stack, result = [node], []
         while stack:
             node = stack.pop()
@@ -90,18 +193,28 @@ class BaseActor(statemachine.Actor):
                 }
             )
             stack.extend(node.children)
-        return result
+        return checkpoint.pack_nodes(result)
 
-    async def load_node(self, data: list[dict]) -> Node[BaseData]:
+    async def load_node(self, data: list[dict] | dict) -> Node[BaseData]:
+        """
+        Load a tree dumped by dump_node, or a plain list of nodes from older checkpoints.
+
+        Workspaces are not built here, each node materializes its own when the search first uses it.
+        """
         root = None
         id_to_node: dict[str, Node[BaseData]] = {}
-        for item in data:
+        for item in checkpoint.unpack_nodes(data):
             parent = id_to_node[item["parent"]] if item["parent"] else None
-            workspace = parent.data.workspace if parent else self.workspace
-            node_data = await self.load_data(item["data"], workspace.clone())
+            node_data = BaseData.rehydrating(
+                parent.data if parent else None,
+                self.workspace,
+                [Message.from_dict(msg) for msg in item["data"]["messages"]],
+                item["data"]["files"],
+                item["data"].get("should_branch", False),
+            )
             node = Node(node_data, parent, item["id"])
             if parent:
-                parent.children.append(node)
+                parent.add_child(node)
             else:
                 root = node
             id_to_node[item["id"]] = node
@@ -123,15 +236,16 @@ class LLMActor(Protocol):
         async def node_fn(
             node: Node[BaseData], tx: MemoryObjectSendStream[Node[BaseData]]
         ):
-            history = [m for n in node.get_trajectory() for m in n.data.messages]
+            history = message_history(node)
+            # shallow nodes first, deep branches should not starve the rest of the beam
+            with llm_priority(PRIORITY_SEARCH + node.depth):
+                completion = await loop_completion(
+                    self.llm, history, system_prompt=system_prompt, **kwargs
+                )
             new_node = Node[BaseData](
                 data=BaseData(
                     workspace=node.data.workspace.clone(),
-                    messages=[
-                        await loop_completion(
-                            self.llm, history, system_prompt=system_prompt, **kwargs
-                        )
-                    ],
+                    messages=[completion],
                     files={},
                     should_branch=False,
                     context=getattr(node.data, "context", "default"),
@@ -149,7 +263,7 @@ class LLMActor(Protocol):
             tx.close()
             async with rx:
                 async for new_node in rx:
-                    new_node.parent.children.append(new_node)  # pyright: ignore[reportOptionalMemberAccess]
+                    new_node.parent.add_child(new_node)  # pyright: ignore[reportOptionalMemberAccess]
                     result.append(new_node)
         return result
 
@@ -279,6 +393,17 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
             return error_msg
 
         original_length = len(error_msg)
+        original = error_msg
+        condensed = error_condenser.condense(error_msg, max_length)
+        fallback = len(condensed) > max_length
+        error_condenser.condenser_stats.record(original, condensed, fallback)
+        if not fallback:
+            logger.info(
+                f"Condensed error message size: {len(condensed)}, original size: {original_length}"
+            )
+            return condensed
+        # the LLM only sees what the parsers couldn't shorten enough
+        error_msg = condensed
 
         prompt = f"""You need to compact an error message to be concise while keeping the most important information.
         The error message is expected be reduced to be less than {max_length} characters approximately.
@@ -401,205 +526,211 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
 
         return error_msg
 
+    def tool_effect(self, block: ToolUse) -> Effect:
+        """Paths a tool call reads and writes, calls without conflicts run concurrently."""
+        if not isinstance(block.input, dict):
+            return PURE
+        path = block.input.get("path")
+        match block.name:
+            case "read_file" if isinstance(path, str):
+                return Effect.read(path)
+            case "write_file" | "edit_file" | "delete_file" if isinstance(path, str):
+                return Effect.write(path)
+            case _:
+                # checks, custom tools and malformed calls (reported as error results) may look at
+                # or change the whole workspace
+                return EXCLUSIVE
+
     async def run_tools(
         self, node: Node[BaseData], user_prompt: str
     ) -> tuple[list[ToolUseResult], bool]:
         """Execute tools for a given node."""
         logger.info(f"Running tools for node {node._id}")
-        result, is_completed = [], False
-
+        blocks = []
         for block in node.data.head().content:
-            if not isinstance(block, ToolUse):
-                match block:
-                    case TextRaw(text=text):
-                        logger.info(f"LLM output: {text}")
-                    case _:
-                        pass
-                continue
+            match block:
+                case ToolUse():
+                    blocks.append(block)
+                case TextRaw(text=text):
+                    logger.info(f"LLM output: {text}")
+                case _:
+                    pass
+
+        outcomes = await tool_engine.execute(
+            blocks,
+            self.tool_effect,
+            lambda block: self._run_tool(block, node, user_prompt),
+        )
+        result = [tool_result for tool_result, _ in outcomes]
+        is_completed = any(completed for _, completed in outcomes)
+        return result, is_completed
 
-            try:
-                logger.info(
-                    f"Running tool {block.name} with input {self._short_dict_repr(block.input) if isinstance(block.input, dict) else str(block.input)}"
-                )
+    async def _run_tool(
+        self, block: ToolUse, node: Node[BaseData], user_prompt: str
+    ) -> tuple[ToolUseResult, bool]:
+        """Execute a single tool call, returns its result and whether it completed the task."""
+        try:
+            logger.info(
+                f"Running tool {block.name} with input {self._short_dict_repr(block.input) if isinstance(block.input, dict) else str(block.input)}"
+            )
 
-                match block.name:
-                    case "read_file":
-                        tool_content = await node.data.workspace.read_file(
-                            block.input["path"]  # pyright: ignore[reportIndexIssue]
+            match block.name:
+                case "read_file":
+                    tool_content = await node.data.workspace.read_file(
+                        block.input["path"]  # pyright: ignore[reportIndexIssue]
+                    )
+                    return ToolUseResult.from_tool_use(block, tool_content), False
+
+                case "write_file":
+                    path = block.input["path"]  # pyright: ignore[reportIndexIssue]
+                    content = block.input["content"]  # pyright: ignore[reportIndexIssue]
+                    try:
+                        node.data.workspace.write_file(path, content)
+                        node.data.files.update({path: content})
+                        logger.debug(f"Written file: {path}")
+                        return ToolUseResult.from_tool_use(block, "success"), False
+                    except FileNotFoundError as e:
+                        error_msg = (
+                            f"Directory not found for file '{path}': {str(e)}"
                         )
-                        result.append(ToolUseResult.from_tool_use(block, tool_content))
-
-                    case "write_file":
-                        path = block.input["path"]  # pyright: ignore[reportIndexIssue]
-                        content = block.input["content"]  # pyright: ignore[reportIndexIssue]
-                        try:
-                            node.data.workspace.write_file(path, content)
-                            node.data.files.update({path: content})
-                            result.append(ToolUseResult.from_tool_use(block, "success"))
-                            logger.debug(f"Written file: {path}")
-                        except FileNotFoundError as e:
-                            error_msg = (
-                                f"Directory not found for file '{path}': {str(e)}"
-                            )
-                            logger.info(
-                                f"File not found error writing file {path}: {str(e)}"
-                            )
-                            result.append(
-                                ToolUseResult.from_tool_use(
-                                    block, error_msg, is_error=True
-                                )
-                            )
-                        except PermissionError as e:
-                            error_msg = f"Permission denied writing file '{path}': {str(e)}. Probably this file is out of scope for this particular task."
-                            logger.info(
-                                f"Permission error writing file {path}: {str(e)}"
-                            )
-                            result.append(
-                                ToolUseResult.from_tool_use(
-                                    block, error_msg, is_error=True
-                                )
-                            )
-                        except ValueError as e:
-                            error_msg = str(e)
-                            logger.info(f"Value error writing file {path}: {error_msg}")
-                            result.append(
-                                ToolUseResult.from_tool_use(
-                                    block, error_msg, is_error=True
+                        logger.info(
+                            f"File not found error writing file {path}: {str(e)}"
+                        )
+                        return ToolUseResult.from_tool_use(
+                            block, error_msg, is_error=True
+                        ), False
+                    except PermissionError as e:
+                        error_msg = f"Permission denied writing file '{path}': {str(e)}. Probably this file is out of scope for this particular task."
+                        logger.info(
+                            f"Permission error writing file {path}: {str(e)}"
+                        )
+                        return ToolUseResult.from_tool_use(
+                            block, error_msg, is_error=True
+                        ), False
+                    except ValueError as e:
+                        error_msg = str(e)
+                        logger.info(f"Value error writing file {path}: {error_msg}")
+                        return ToolUseResult.from_tool_use(
+                            block, error_msg, is_error=True
+                        ), False
+
+                case "edit_file":
+                    path = block.input["path"]  # pyright: ignore[reportIndexIssue]
+                    search = block.input["search"]  # pyright: ignore[reportIndexIssue]
+                    replace = block.input["replace"]  # pyright: ignore[reportIndexIssue]
+                    replace_all = block.input.get("replace_all", False)  # pyright: ignore[reportAttributeAccessIssue]
+
+                    try:
+                        original = await node.data.workspace.read_file(path)
+                        search_count = original.count(search)
+                        match search_count:
+                            case 0:
+                                raise ValueError(
+                                    f"Search text not found in file '{path}'. Search:\n{search}"
                                 )
-                            )
-
-                    case "edit_file":
-                        path = block.input["path"]  # pyright: ignore[reportIndexIssue]
-                        search = block.input["search"]  # pyright: ignore[reportIndexIssue]
-                        replace = block.input["replace"]  # pyright: ignore[reportIndexIssue]
-                        replace_all = block.input.get("replace_all", False)  # pyright: ignore[reportAttributeAccessIssue]
-
-                        try:
-                            original = await node.data.workspace.read_file(path)
-                            search_count = original.count(search)
-                            match search_count:
-                                case 0:
-                                    raise ValueError(
-                                        f"Search text not found in file '{path}'. Search:\n{search}"
-                                    )
-                                case 1:
+                            case 1:
+                                new_content = original.replace(search, replace)
+                                node.data.workspace.write_file(path, new_content)
+                                node.data.files.update({path: new_content})
+                                logger.debug(f"Applied edit to file: {path}")
+                                return ToolUseResult.from_tool_use(block, "success"), False
+                            case num_hits:
+                                if replace_all:
                                     new_content = original.replace(search, replace)
-                                    node.data.workspace.write_file(path, new_content)
+                                    node.data.workspace.write_file(
+                                        path, new_content
+                                    )
                                     node.data.files.update({path: new_content})
-                                    result.append(
-                                        ToolUseResult.from_tool_use(block, "success")
+                                    logger.debug(
+                                        f"Applied bulk edit to file: {path} ({num_hits} occurrences)"
                                     )
-                                    logger.debug(f"Applied edit to file: {path}")
-                                case num_hits:
-                                    if replace_all:
-                                        new_content = original.replace(search, replace)
-                                        node.data.workspace.write_file(
-                                            path, new_content
-                                        )
-                                        node.data.files.update({path: new_content})
-                                        result.append(
-                                            ToolUseResult.from_tool_use(
-                                                block,
-                                                f"success - replaced {num_hits} occurrences",
-                                            )
-                                        )
-                                        logger.debug(
-                                            f"Applied bulk edit to file: {path} ({num_hits} occurrences)"
-                                        )
-                                    else:
-                                        raise ValueError(
-                                            f"Search text found {num_hits} times in file '{path}' (expected exactly 1). Use replace_all=true to replace all occurrences. Search:\n{search}"
-                                        )
-                        except FileNotFoundError as e:
-                            error_msg = f"File '{path}' not found for editing: {str(e)}"
-                            logger.info(
-                                f"File not found error editing file {path}: {str(e)}"
-                            )
-                            result.append(
-                                ToolUseResult.from_tool_use(
-                                    block, error_msg, is_error=True
-                                )
-                            )
-                        except PermissionError as e:
-                            error_msg = f"Permission denied editing file '{path}': {str(e)}. Probably this file is out of scope for this particular task."
-                            logger.info(
-                                f"Permission error editing file {path}: {str(e)}"
-                            )
-                            result.append(
-                                ToolUseResult.from_tool_use(
-                                    block, error_msg, is_error=True
-                                )
-                            )
-                        except ValueError as e:
-                            error_msg = str(e)
-                            logger.info(f"Value error editing file {path}: {error_msg}")
-                            result.append(
-                                ToolUseResult.from_tool_use(
-                                    block, error_msg, is_error=True
-                                )
-                            )
-
-                    case "delete_file":
-                        node.data.workspace.rm(block.input["path"])  # pyright: ignore[reportIndexIssue]
-                        node.data.files.update({block.input["path"]: None})  # pyright: ignore[reportIndexIssue]
-                        result.append(ToolUseResult.from_tool_use(block, "success"))
-
-                    case "complete":
-                        if not self.has_modifications(node):
-                            raise ValueError(
-                                "Can not complete without writing any changes."
-                            )
-                        check_err = await self.run_checks(node, user_prompt)
-                        if check_err:
-                            logger.info(f"Failed to complete: {check_err}")
-                        result.append(
-                            ToolUseResult.from_tool_use(block, check_err or "success")
+                                    return ToolUseResult.from_tool_use(
+                                        block,
+                                        f"success - replaced {num_hits} occurrences",
+                                    ), False
+                                else:
+                                    raise ValueError(
+                                        f"Search text found {num_hits} times in file '{path}' (expected exactly 1). Use replace_all=true to replace all occurrences. Search:\n{search}"
+                                    )
+                    except FileNotFoundError as e:
+                        error_msg = f"File '{path}' not found for editing: {str(e)}"
+                        logger.info(
+                            f"File not found error editing file {path}: {str(e)}"
                         )
-                        node.data.should_branch = True
-                        is_completed = check_err is None
-
-                    case _:
-                        # Handle custom tools via subclass
-                        if isinstance(block.input, dict):
-                            custom_result = await self.handle_custom_tool(block, node)
-                            result.append(custom_result)
-                        else:
-                            raise ValueError(
-                                f"Invalid input type for tool {block.name}: {type(block.input)}"
-                            )
-
-            except FileNotFoundError as e:
-                logger.info(f"File not found: {e}")
-                result.append(ToolUseResult.from_tool_use(block, str(e), is_error=True))
-            except PermissionError as e:
-                logger.info(f"Permission error: {e}")
-                result.append(ToolUseResult.from_tool_use(block, str(e), is_error=True))
-            except ValueError as e:
-                logger.info(f"Value error: {e}")
-                result.append(ToolUseResult.from_tool_use(block, str(e), is_error=True))
-            except Exception as e:
-                # handle ExceptionGroup by unpacking recursively
-                if isinstance(e, BaseExceptionGroup):
-                    all_exceptions = self._unpack_exception_group(e)
-                    error_messages = []
-                    for exc in all_exceptions:
-                        logger.error(f"Exception in group: {type(exc).__name__}: {exc}")
-                        error_messages.append(f"{type(exc).__name__}: {str(exc)}")
-                    combined_error = "Multiple errors occurred:\n" + "\n".join(
-                        error_messages
-                    )
-                    result.append(
-                        ToolUseResult.from_tool_use(
-                            block, combined_error, is_error=True
+                        return ToolUseResult.from_tool_use(
+                            block, error_msg, is_error=True
+                        ), False
+                    except PermissionError as e:
+                        error_msg = f"Permission denied editing file '{path}': {str(e)}. Probably this file is out of scope for this particular task."
+                        logger.info(
+                            f"Permission error editing file {path}: {str(e)}"
+                        )
+                        return ToolUseResult.from_tool_use(
+                            block, error_msg, is_error=True
+                        ), False
+                    except ValueError as e:
+                        error_msg = str(e)
+                        logger.info(f"Value error editing file {path}: {error_msg}")
+                        return ToolUseResult.from_tool_use(
+                            block, error_msg, is_error=True
+                        ), False
+
+                case "delete_file":
+                    node.data.workspace.rm(block.input["path"])  # pyright: ignore[reportIndexIssue]
+                    node.data.files.update({block.input["path"]: None})  # pyright: ignore[reportIndexIssue]
+                    return ToolUseResult.from_tool_use(block, "success"), False
+
+                case "complete":
+                    if not self.has_modifications(node):
+                        raise ValueError(
+                            "Can not complete without writing any changes."
+                        )
+                    # completing is the final validation of the node, report every failure
+                    check_err = await self.run_checks(node, user_prompt, fail_fast=False)
+                    if check_err:
+                        logger.info(f"Failed to complete: {check_err}")
+                    node.data.should_branch = True
+                    return ToolUseResult.from_tool_use(
+                        block, check_err or "success"
+                    ), check_err is None
+
+                case _:
+                    # Handle custom tools via subclass
+                    if isinstance(block.input, dict):
+                        return await self.handle_custom_tool(block, node), False
+                    else:
+                        raise ValueError(
+                            f"Invalid input type for tool {block.name}: {type(block.input)}"
                         )
-                    )
-                else:
-                    logger.error(f"Unknown error: {e}")
-                    result.append(
-                        ToolUseResult.from_tool_use(block, str(e), is_error=True)
-                    )
 
-        return result, is_completed
+        except FileNotFoundError as e:
+            logger.info(f"File not found: {e}")
+            return ToolUseResult.from_tool_use(block, str(e), is_error=True), False
+        except PermissionError as e:
+            logger.info(f"Permission error: {e}")
+            return ToolUseResult.from_tool_use(block, str(e), is_error=True), False
+        except ValueError as e:
+            logger.info(f"Value error: {e}")
+            return ToolUseResult.from_tool_use(block, str(e), is_error=True), False
+        except Exception as e:
+            # handle ExceptionGroup by unpacking recursively
+            if isinstance(e, BaseExceptionGroup):
+                all_exceptions = self._unpack_exception_group(e)
+                error_messages = []
+                for exc in all_exceptions:
+                    logger.error(f"Exception in group: {type(exc).__name__}: {exc}")
+                    error_messages.append(f"{type(exc).__name__}: {str(exc)}")
+                combined_error = "Multiple errors occurred:\n" + "\n".join(
+                    error_messages
+                )
+                return ToolUseResult.from_tool_use(
+                    block, combined_error, is_error=True
+                ), False
+            else:
+                logger.error(f"Unknown error: {e}")
+                return ToolUseResult.from_tool_use(
+                    block, str(e), is_error=True
+                ), False
 
     async def eval_node(self, node: Node[BaseData], user_prompt: str) -> bool:
         """Evaluate a node by running its tools."""
@@ -621,8 +752,13 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
         return False
 
     @abstractmethod
-    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
-        """Run validation checks. Must be implemented by subclasses."""
+    async def run_checks(
+        self, node: Node[BaseData], user_prompt: str, fail_fast: bool = check_scheduler.FAIL_FAST
+    ) -> str | None:
+        """Run validation checks. Must be implemented by subclasses.
+
+        With fail_fast the first blocking failure cancels the remaining checks.
+        """
         pass
 
     async def dump(self) -> object:
@@ -635,6 +771,7 @@ class FileOperationsActor(BaseActor, LLMActor, ABC):
         """Load the actor state."""
         if not data:
             return
-        if not isinstance(data, list):
-            raise ValueError(f"Expected list got {type(data)}")
+        if not isinstance(data, (list, dict)):
+            raise ValueError(f"Expected list or dict got {type(data)}")
         self.root = await self.load_node(data)
+
@@ -0,0 +1,152 @@
+"""
+Prebuilt base images for the agent workspaces.
+
+Workspaces used to install system packages and template dependencies (apk, php
+extensions, composer / npm / bun / uv installs) on every creation and relied on
+the Dagger layer cache to make that fast, which is lost whenever the engine
+restarts. A BaseImage describes that setup: system commands independent of the
+template, then dependency installs that only see the template lockfiles. The
+image tag is a hash of the recipe and the lockfile contents, so it changes
+exactly when the installed dependencies would.
+
+Setting BASE_IMAGE_DIR keeps built images as OCI tarballs named by tag. A cold
+workspace creation then imports the tarball instead of running the setup, and
+the first build for a new tag exports it for the next start. Images can be
+built ahead of time with `uv run build_images`.
+"""
+
+import hashlib
+import os
+import tempfile
+import weakref
+from dataclasses import dataclass, field
+import anyio
+import dagger
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# bump to rebuild every image, e.g. when the recipe semantics change
+VERSION = "v1"
+
+
+@dataclass(frozen=True)
+class BaseImage:
+    name: str
+    image: str
+    workdir: str
+    # run before any template file is present
+    setup: list[list[str]] = field(default_factory=list)
+    # (image, path) pairs copied from other images, e.g. the composer binary
+    files_from: list[tuple[str, str]] = field(default_factory=list)
+    # template files the installs depend on, paths relative to the template root
+    lockfiles: list[str] = field(default_factory=list)
+    install: list[list[str]] = field(default_factory=list)
+
+    def tag(self, template_dir: str) -> str:
+        digest = hashlib.sha256()
+        for part in (VERSION, self.image, self.workdir, repr(self.setup), repr(self.files_from), repr(self.install)):
+            digest.update(part.encode() + b"\0")
+        for path in self.lockfiles:
+            digest.update(path.encode() + b"\0")
+            try:
+                with open(os.path.join(template_dir, path), "rb") as f:
+                    digest.update(f.read())
+            except FileNotFoundError:
+                digest.update(b"\0missing")
+            digest.update(b"\0")
+        return f"{self.name}-{VERSION}-{digest.hexdigest()[:16]}"
+
+    def build(self, client: dagger.Client, template_dir: str) -> dagger.Container:
+        ctr = client.container().from_(self.image)
+        for cmd in self.setup:
+            ctr = ctr.with_exec(cmd)
+        for image, path in self.files_from:
+            ctr = ctr.with_file(path, client.container().from_(image).file(path))
+        ctr = ctr.with_workdir(self.workdir)
+        if self.lockfiles:
+            lockfiles = client.host().directory(template_dir, include=self.lockfiles)
+            ctr = ctr.with_directory(self.workdir, lockfiles)
+        for cmd in self.install:
+            ctr = ctr.with_exec(cmd)
+        return ctr
+
+
+def tarball_path(tag: str, image_dir: str | None = None) -> str | None:
+    image_dir = image_dir or os.getenv("BASE_IMAGE_DIR")
+    return os.path.join(image_dir, f"{tag}.tar") if image_dir else None
+
+
+async def export(ctr: dagger.Container, path: str) -> None:
+    """Export as OCI tarball, written next to the target and renamed so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # unique per call, concurrent exports of the same tag each write their own file and the last rename wins
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        await ctr.export(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# containers per client session, the engine resolves them once per session
+_loaded: dict[int, dict[str, dagger.Container]] = {}
+# loads in flight per (client session, tag), concurrent callers wait for the first one
+_loading: dict[tuple[int, str], anyio.Event] = {}
+
+
+async def load(client: dagger.Client, spec: BaseImage, template_dir: str) -> tuple[dagger.Container, str]:
+    """Base container and its tag, imported from BASE_IMAGE_DIR if present, built (and exported there) otherwise."""
+    tag = spec.tag(template_dir)
+    key = id(client)
+    if key not in _loaded:
+        _loaded[key] = {}
+        weakref.finalize(client, _loaded.pop, key, None)
+    loaded = _loaded[key]
+    while tag not in loaded and (pending := _loading.get((key, tag))) is not None:
+        await pending.wait()
+    if tag in loaded:
+        return loaded[tag], tag
+
+    # the first load failed or none ran yet, this call does it
+    done = _loading[(key, tag)] = anyio.Event()
+    try:
+        loaded[tag] = await _load(client, spec, template_dir, tag)
+    finally:
+        del _loading[(key, tag)]
+        done.set()
+    return loaded[tag], tag
+
+
+async def _load(client: dagger.Client, spec: BaseImage, template_dir: str, tag: str) -> dagger.Container:
+    path = tarball_path(tag)
+    if path is not None and os.path.exists(path):
+        logger.info(f"Importing base image {tag} from {path}")
+        ctr = client.container().import_(client.host().file(path)).with_workdir(spec.workdir)
+    else:
+        ctr = spec.build(client, template_dir)
+        if path is not None:
+            logger.info(f"Building base image {tag} into {path}")
+            try:
+                await export(ctr, path)
+            except (dagger.QueryError, OSError) as e:
+                # the image still works, it is just not kept for the next start
+                logger.warning(f"Failed to export base image {tag}: {e}")
+    return ctr
+
+
+async def build_all(specs: dict[str, tuple[BaseImage, str]], image_dir: str, force: bool = False) -> dict[str, str]:
+    """Build and export images ahead of time, returns the tarball path per name."""
+    paths = {}
+    async with dagger.Connection(dagger.Config()) as client:
+        for name, (spec, template_dir) in specs.items():
+            tag = spec.tag(template_dir)
+            path = tarball_path(tag, image_dir)
+            assert path is not None
+            if force or not os.path.exists(path):
+                logger.info(f"Building base image {tag}")
+                await export(spec.build(client, template_dir), path)
+            paths[name] = path
+    return paths
@@ -1,7 +1,60 @@
+from itertools import chain
 from typing import Self
 import uuid
 
 
+class _Tree:
+    """Bookkeeping shared by all nodes under one root: id index."""
+
+    __slots__ = ("nodes",)
+
+    def __init__(self):
+        self.nodes: dict[str, "Node"] = {}
+
+
+class _Children[T](list[T]):
+    """Child list notifying its owner on every mutation, so direct `children.append` keeps the bookkeeping right."""
+
+    def __init__(self, owner: "Node"):
+        super().__init__()
+        self._owner = owner
+
+    def _mutate(self, op, *args):
+        # apply to a copy first so an invalid insertion leaves both the list and the bookkeeping untouched
+        after = list(self)
+        result = op(after, *args)
+        self._owner._set_children(after)
+        return result
+
+    def append(self, item):
+        return self._mutate(list.append, item)
+
+    def extend(self, items):
+        return self._mutate(list.extend, list(items))
+
+    def insert(self, index, item):
+        return self._mutate(list.insert, index, item)
+
+    def remove(self, item):
+        return self._mutate(list.remove, item)
+
+    def pop(self, index=-1):
+        return self._mutate(list.pop, index)
+
+    def clear(self):
+        return self._mutate(list.clear)
+
+    def __setitem__(self, key, value):
+        return self._mutate(list.__setitem__, key, value)
+
+    def __delitem__(self, key):
+        return self._mutate(list.__delitem__, key)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+
 class Node[T]:
     _id: str
     data: T
@@ -12,22 +65,40 @@ class Node[T]:
         self._id = id if id else uuid.uuid4().hex
         self.data = data
         self.parent = parent
-        self.children = []
+        self.children = _Children(self)
+        # a node created with a parent joins the parent's tree once appended to its children
+        self._tree = _Tree()
+        self._tree.nodes[self._id] = self
+        self._depth = parent._depth + 1 if parent else 0
+        self._path: tuple[Self, ...] | None = None
+        self._size = 1
+        # leaves of the subtree, None once a change below this node made it stale
+        self._leaves: tuple[Self, ...] | None = None
 
     @property
     def is_leaf(self) -> bool:
         return not self.children
-    
+
     @property
     def depth(self) -> int:
-        return self.parent.depth + 1 if self.parent else 0
-    
+        return self._depth
+
+    @property
+    def subtree_size(self) -> int:
+        """Number of nodes in the subtree rooted here, same as `len(get_all_children())`."""
+        return self._size
+
     def get_trajectory(self) -> list[Self]:
-        stack = [self]
-        while stack[-1].parent:
-            stack.append(stack[-1].parent)
-        return stack[::-1]
-    
+        if self._path is None:
+            self._path = (*self.parent._trajectory(), self) if self.parent else (self,)
+        return list(self._path)
+
+    def _trajectory(self) -> tuple[Self, ...]:
+        if self._path is None:
+            self.get_trajectory()
+        assert self._path is not None
+        return self._path
+
     def get_all_children(self) -> list[Self]:
         children, stack = [], [self]
         while stack:
@@ -35,3 +106,93 @@ class Node[T]:
             children.append(node)
             stack.extend(node.children)
         return children
+
+    def get_leaves(self) -> list[Self]:
+        """Leaves of the subtree rooted here, in the order get_all_children visits them."""
+        # rebuild the stale subtree indexes bottom-up, the ones still valid are reused as they are
+        stale, stack = [], [self]
+        while stack:
+            node = stack.pop()
+            if node._leaves is None:
+                stale.append(node)
+                stack.extend(node.children)
+        for node in reversed(stale):
+            if node.children:
+                # get_all_children pops the last child first
+                node._leaves = tuple(chain.from_iterable(c._leaves for c in reversed(node.children)))
+            else:
+                node._leaves = (node,)
+        assert self._leaves is not None
+        return list(self._leaves)
+
+    def get_node(self, id: str) -> Self | None:
+        """Find a node of the same tree by id."""
+        return self._tree.nodes.get(id)
+
+    def add_child(self, child: Self) -> Self:
+        self.children.append(child)
+        return child
+
+    def prune(self) -> None:
+        """Detach this subtree from its parent, it becomes a tree of its own."""
+        if self.parent is not None and any(c is self for c in self.parent.children):
+            self.parent.children.remove(self)
+
+    def _set_children(self, after: list[Self]) -> None:
+        before_ids = {id(c) for c in self.children}
+        after_ids = {id(c) for c in after}
+        if len(after_ids) != len(after):
+            raise ValueError("Node can't be a child twice")
+        added = [c for c in after if id(c) not in before_ids]
+        for child in added:
+            if child._tree is self._tree:
+                raise ValueError(f"Node {child._id} is already part of this tree")
+            if child.parent is not None and child.parent is not self and any(c is child for c in child.parent.children):
+                raise ValueError(f"Node {child._id} already has a parent {child.parent._id}")
+
+        removed = [c for c in self.children if id(c) not in after_ids]
+        list.__setitem__(self.children, slice(None), after)
+        for child in removed:
+            self._detach(child)
+        for child in added:
+            self._attach(child)
+        # an index is only valid while the indexes below it are, so the walk stops at the first stale one
+        ancestor = self
+        while ancestor is not None and ancestor._leaves is not None:
+            ancestor._leaves = None
+            ancestor = ancestor.parent
+
+    def _attach(self, child: Self) -> None:
+        if child.parent is not self or child._depth != self._depth + 1:
+            child.parent = self
+            child._reset_subtree(self._depth + 1)
+        subtree = child._tree
+        for node in subtree.nodes.values():
+            node._tree = self._tree
+        self._tree.nodes.update(subtree.nodes)
+        ancestor = self
+        while ancestor is not None:
+            ancestor._size += child._size
+            ancestor = ancestor.parent
+
+    def _detach(self, child: Self) -> None:
+        tree = _Tree()
+        for node in child.get_all_children():
+            del self._tree.nodes[node._id]
+            tree.nodes[node._id] = node
+            node._tree = tree
+        ancestor = self
+        while ancestor is not None:
+            ancestor._size -= child._size
+            ancestor = ancestor.parent
+        child.parent = None
+        child._reset_subtree(0)
+
+    def _reset_subtree(self, depth: int) -> None:
+        stack = [(self, depth)]
+        while stack:
+            node, node_depth = stack.pop()
+            node._depth = node_depth
+            node._path = None
+            stack.extend((c, node_depth + 1) for c in node.children)
+
@@ -0,0 +1,192 @@
+"""
+Cache for validation check results keyed by workspace file state.
+
+Checks like tsc, bun test, pyright, ruff or migrations are pure functions of the
+files in the workspace, so sibling beam nodes or later iterations that end up
+with an identical file set can reuse an earlier result. Concurrent identical
+checks are deduplicated: the first caller runs the check, the others wait for
+its result.
+
+Results live in a bounded in-memory LRU. Setting CHECK_CACHE_PATH adds a
+persistent tier (append-only log, see kv_storage) so repeated benchmark
+runs skip checks that already passed. Only passing results are persisted, a
+failure might come from a flaky environment and is kept for the process only.
+
+track_lookups counts the hits and misses of the checks run in a context, so the
+check scheduler doesn't learn durations from results that were never computed.
+"""
+
+import contextlib
+import functools
+import hashlib
+import inspect
+import os
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, ParamSpec, TypeVar
+import anyio
+from kv_storage import AppendLogStorage
+from log import get_logger
+
+logger = get_logger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+@dataclass
+class Lookups:
+    hits: int = 0
+    misses: int = 0
+
+
+_lookups: ContextVar[Lookups | None] = ContextVar("check_cache_lookups", default=None)
+
+
+@contextlib.contextmanager
+def track_lookups() -> Iterator[Lookups]:
+    """Count the cache hits and misses of the cached checks run in this context."""
+    lookups = Lookups()
+    token = _lookups.set(lookups)
+    try:
+        yield lookups
+    finally:
+        _lookups.reset(token)
+
+
+@dataclass
+class _InFlight:
+    done: anyio.Event = field(default_factory=anyio.Event)
+    ok: bool = False
+    result: Any = None
+
+
+class CheckCache:
+    def __init__(self, path: str | None = None, max_entries: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._inflight: dict[str, _InFlight] = {}
+        self._disk: AppendLogStorage | None = None
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+
+    @property
+    def disk(self) -> AppendLogStorage | None:
+        if self._disk is None and self.path:
+            self._disk = AppendLogStorage(self.path, fsync=False)
+        return self._disk
+
+    @staticmethod
+    def make_key(state_key: str, check: str, *args: Any) -> str:
+        return hashlib.sha256("\0".join([state_key, check, *map(repr, args)]).encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return True, self._memory[key]
+        if (disk := self.disk) is not None and key in disk:
+            result = disk[key]["result"]
+            self._remember(key, result)
+            return True, result
+        return False, None
+
+    def put(self, key: str, result: Any) -> None:
+        self._remember(key, result)
+        if result is None and (disk := self.disk) is not None:
+            disk[key] = {"result": result}
+
+    def _remember(self, key: str, result: Any) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get_or_run(self, key: str, fn: Callable[[], Awaitable[R]]) -> R:
+        while True:
+            found, result = self.get(key)
+            if found:
+                self.hits += 1
+                self._track(hit=True)
+                return result
+            if (inflight := self._inflight.get(key)) is None:
+                break
+            self.deduplicated += 1
+            await inflight.done.wait()
+            if inflight.ok:
+                # computed by another caller, the wait isn't the duration of the check
+                self._track(hit=True)
+                return inflight.result
+            # the running check failed or was cancelled, try again ourselves
+
+        self.misses += 1
+        self._track(hit=False)
+        inflight = self._inflight[key] = _InFlight()
+        try:
+            result = await fn()
+            inflight.ok, inflight.result = True, result
+            self.put(key, result)
+            return result
+        finally:
+            del self._inflight[key]
+            inflight.done.set()
+
+    @staticmethod
+    def _track(hit: bool) -> None:
+        if (lookups := _lookups.get()) is not None:
+            if hit:
+                lookups.hits += 1
+            else:
+                lookups.misses += 1
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.wipe()
+
+
+check_cache = CheckCache(os.getenv("CHECK_CACHE_PATH"))
+
+
+def _check_identity(fn: Callable) -> str:
+    # the implementation is part of the identity so edited checks don't reuse stale results on disk
+    code = fn.__code__
+    return f"{fn.__module__}.{fn.__qualname__}:" + hashlib.sha256(code.co_code + repr(code.co_consts).encode()).hexdigest()[:16]
+
+
+def cached_check(fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """
+    Cache a check method `async def check(self, node, *args)` by the file state of `node.data.workspace`.
+
+    The method must only depend on the workspace files and its arguments, and must not mutate the node.
+    """
+    identity = _check_identity(fn)
+    signature = inspect.signature(fn)
+
+    async def cache_key(*args: Any, **kwargs: Any) -> str | None:
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        self, node, *rest = bound.arguments.values()
+        state_key = await node.data.workspace.state_key()
+        if state_key is None:
+            return None
+        return CheckCache.make_key(state_key, f"{type(self).__qualname__}/{identity}", *rest)
+
+    @functools.wraps(fn)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if (key := await cache_key(*args, **kwargs)) is None:
+            return await fn(*args, **kwargs)
+        return await check_cache.get_or_run(key, lambda: fn(*args, **kwargs))
+
+    wrapper.cache_key = cache_key  # pyright: ignore[reportAttributeAccessIssue]
+    return wrapper
+
+
+async def cached_result(check: Callable, node: Any, *args: Any) -> tuple[bool, Any]:
+    """Known result of a bound `cached_check` method for the node without running it: (found, result)."""
+    key = await check.cache_key(check.__self__, node, *args)  # pyright: ignore[reportFunctionMemberAccess]
+    if key is None:
+        return False, None
+    return check_cache.get(key)
@@ -0,0 +1,169 @@
+"""
+Scheduler for the validation checks of a node.
+
+Actors used to start every check and wait for all of them, even after a cheap
+one (ruff, tsc, ast-grep) had already failed and the node was going to be
+rejected anyway. The scheduler starts checks cheapest and most likely to fail
+first. In fail-fast mode the first blocking failure cancels the checks still
+running, which cancels their engine queries and the container work behind them.
+Final validations (the complete tool) pass fail_fast=False and wait for every
+check, since the complete picture matters more than the time there.
+CHECK_MODE=all turns off fail-fast for every other caller as well.
+
+Durations and failure rates are learned per check name over the process
+lifetime (starting from the declared cost hint) and exported with the number of
+cancellations and the estimated time saved, see CheckStats.metrics. Results
+served by the check cache (core.check_cache) are counted apart, they say nothing
+about how long the check takes.
+
+At most CHECK_CONCURRENCY checks run at once (3 by default), so the ordering
+decides which checks run before a failure cancels the rest. 0 starts all of
+them at once, then fail-fast only saves the remaining time of the running ones.
+"""
+
+import contextlib
+import os
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+import anyio
+from core.check_cache import track_lookups
+from log import get_logger
+
+logger = get_logger(__name__)
+
+FAIL_FAST = os.getenv("CHECK_MODE", "fail_fast") != "all"
+# 0 starts all checks at once, a limit makes the ordering decide what runs first
+CONCURRENCY = int(os.getenv("CHECK_CONCURRENCY", "3"))
+
+
+@dataclass
+class Check:
+    name: str
+    run: Callable[[], Awaitable[str | None]]
+    # heading of the errors in the report, None to report them as they are
+    label: str | None = None
+    # expected seconds before any history exists
+    cost: float = 10.0
+    # a failing non-blocking check is reported but doesn't cancel the others
+    blocking: bool = True
+
+
+@dataclass
+class _History:
+    cost: float
+    runs: int = 0
+    failures: int = 0
+    cancelled: int = 0
+    cached: int = 0
+    total_time: float = 0.0
+    saved_time: float = 0.0
+
+
+@dataclass
+class CheckStats:
+    # weight of the latest run in the duration estimate
+    alpha: float = 0.2
+    history: dict[str, _History] = field(default_factory=dict)
+
+    def _get(self, check: Check) -> _History:
+        if check.name not in self.history:
+            self.history[check.name] = _History(cost=check.cost)
+        return self.history[check.name]
+
+    def failure_rate(self, check: Check) -> float:
+        history = self._get(check)
+        return (history.failures + 1) / (history.runs + 2)
+
+    def priority(self, check: Check) -> float:
+        """Expected seconds spent per failure found, lower runs first."""
+        return self._get(check).cost / self.failure_rate(check)
+
+    def record(self, check: Check, duration: float, failed: bool) -> None:
+        history = self._get(check)
+        history.runs += 1
+        history.failures += failed
+        history.total_time += duration
+        history.cost += self.alpha * (duration - history.cost)
+
+    def record_cached(self, check: Check) -> None:
+        self._get(check).cached += 1
+
+    def record_cancelled(self, check: Check, elapsed: float) -> None:
+        history = self._get(check)
+        history.cancelled += 1
+        history.saved_time += max(history.cost - elapsed, 0.0)
+
+    def metrics(self) -> dict:
+        return {
+            name: {
+                "runs": h.runs,
+                "failures": h.failures,
+                "cancelled": h.cancelled,
+                "cached": h.cached,
+                "expected_duration": h.cost,
+                "avg_duration": h.total_time / h.runs if h.runs else 0.0,
+                "failure_rate": (h.failures + 1) / (h.runs + 2),
+                "saved_time": h.saved_time,
+            }
+            for name, h in sorted(self.history.items())
+        }
+
+
+check_stats = CheckStats()
+
+
+async def run_checks(
+    checks: list[Check],
+    fail_fast: bool = FAIL_FAST,
+    concurrency: int = CONCURRENCY,
+    stats: CheckStats | None = None,
+) -> list[tuple[Check, str]]:
+    """Failed checks with their errors, in the order the checks were given."""
+    stats = stats or check_stats
+    errors: dict[str, str] = {}
+    limiter = anyio.CapacityLimiter(concurrency) if concurrency > 0 else None
+    ordered = sorted(checks, key=stats.priority)
+
+    async with anyio.create_task_group() as tg:
+
+        async def run(check: Check):
+            started = None
+            try:
+                async with limiter or contextlib.nullcontext():
+                    started = anyio.current_time()
+                    with track_lookups() as lookups:
+                        try:
+                            error = await check.run()
+                        except Exception as e:
+                            logger.error(f"Error running check {check.name}: {e}")
+                            error = f"Internal error running check {check.name}: {e}"
+                    duration = anyio.current_time() - started
+                    if lookups.hits and not lookups.misses:
+                        # the result is known already, its failure was counted when it ran
+                        stats.record_cached(check)
+                    else:
+                        stats.record(check, duration, error is not None)
+                    logger.info(f"Check '{check.name}' {'failed' if error else 'passed'} in {duration:.2f} seconds")
+                    if error is not None:
+                        errors[check.name] = error
+                        # cancel before the slot is released so no waiting check starts
+                        if fail_fast and check.blocking:
+                            tg.cancel_scope.cancel()
+            except anyio.get_cancelled_exc_class():
+                # a check still waiting for its turn saves its whole cost
+                elapsed = anyio.current_time() - started if started is not None else 0.0
+                stats.record_cancelled(check, elapsed)
+                logger.info(f"Check '{check.name}' cancelled after {elapsed:.2f} seconds")
+                raise
+
+        for check in ordered:
+            tg.start_soon(run, check)
+
+    return [(check, errors[check.name]) for check in checks if check.name in errors]
+
+
+def format_errors(failures: list[tuple[Check, str]]) -> str:
+    return "".join(
+        f"{check.label}:\n{error}\n" if check.label else f"{error}\n"
+        for check, error in failures
+    )
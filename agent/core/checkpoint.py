@@ -0,0 +1,83 @@
+"""
+Content-addressed checkpoint format for search trees.
+
+BaseActor.dump_data stores the full files and messages of every node, and sibling beam nodes carry
+nearly the same files and prompts. A packed tree keeps every distinct file content and message once,
+in tables keyed by content hash, and nodes reference them by hash:
+
+    {
+        "format": "cas-v1",
+        "blobs": {hash: content},
+        "messages": {hash: message dict},
+        "nodes": [{"id", "parent", "data": {"files": {path: hash | None}, "messages": [hash], ...}}],
+    }
+
+unpack_nodes accepts both this and the original list of nodes, so existing JSON checkpoints still load.
+"""
+
+import hashlib
+import ujson as json
+
+FORMAT = "cas-v1"
+
+
+def content_hash(content: str) -> str:
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def pack_nodes(nodes: list[dict]) -> dict:
+    """Pack a list of dumped nodes into the content-addressed format."""
+    blobs: dict[str, str] = {}
+    messages: dict[str, dict] = {}
+    packed = []
+    for node in nodes:
+        data = dict(node["data"])
+        files: dict[str, str | None] = {}
+        for path, content in data["files"].items():
+            if content is None:
+                files[path] = None
+                continue
+            key = content_hash(content)
+            blobs.setdefault(key, content)
+            files[path] = key
+        refs = []
+        for msg in data["messages"]:
+            key = content_hash(json.dumps(msg, sort_keys=True))
+            messages.setdefault(key, msg)
+            refs.append(key)
+        data.update(files=files, messages=refs)
+        packed.append({**node, "data": data})
+    return {"format": FORMAT, "blobs": blobs, "messages": messages, "nodes": packed}
+
+
+def is_packed(data: object) -> bool:
+    return isinstance(data, dict) and data.get("format") == FORMAT
+
+
+def unpack_nodes(data: list[dict] | dict) -> list[dict]:
+    """List of dumped nodes from either format."""
+    if not is_packed(data):
+        if not isinstance(data, list):
+            raise ValueError(f"Expected list or {FORMAT} checkpoint got {type(data)}")
+        return data
+    assert isinstance(data, dict)
+    blobs, messages = data["blobs"], data["messages"]
+    nodes = []
+    for node in data["nodes"]:
+        node_data = dict(node["data"])
+        node_data.update(
+            files={path: None if key is None else blobs[key] for path, key in node_data["files"].items()},
+            messages=[messages[key] for key in node_data["messages"]],
+        )
+        nodes.append({**node, "data": node_data})
+    return nodes
+
+
+def pack_checkpoint(checkpoint: dict) -> dict:
+    """Pack the search trees of all actors of a recorded MachineCheckpoint."""
+    actors = [
+        {**actor, "data": pack_nodes(actor["data"])} if isinstance(actor["data"], list) and actor["data"] else actor
+        for actor in checkpoint["actors"]
+    ]
+    return {**checkpoint, "actors": actors}
+
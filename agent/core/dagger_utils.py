@@ -4,16 +4,52 @@ import dagger
 from pathlib import Path
 from typing import Self
 
+# per stream, longer outputs keep their head and tail
+DEFAULT_OUTPUT_LIMIT = 1 << 20
+RESULT_PATH = "/tmp/.exec_result"
+_STDERR_SEPARATOR = "\n--- exec stderr 6d1c3a9f ---\n"
+
+# sh -c _CAPTURE_SCRIPT sh <result path> <output limit> <command...>
+# writes "<exit code> <uptime before> <uptime after> <stdout bytes> <stderr bytes> <limit>\n<stdout><separator><stderr>"
+_CAPTURE_SCRIPT = """
+r=$1; limit=$2; shift 2
+{ read t0 _ < /proc/uptime; } 2>/dev/null || t0=0
+"$@" > "$r.out" 2> "$r.err"
+code=$?
+{ read t1 _ < /proc/uptime; } 2>/dev/null || t1=0
+emit() {
+    size=$(($(wc -c < "$1")))
+    if [ "$limit" -gt 0 ] && [ "$size" -gt "$limit" ]; then
+        head -c $((limit / 2)) "$1"
+        printf '\\n... [%d bytes truncated] ...\\n' $((size - limit / 2 * 2))
+        tail -c $((limit / 2)) "$1"
+    else
+        cat "$1"
+    fi
+}
+{
+    printf '%s %s %s %s %s %s\\n' "$code" "$t0" "$t1" $(($(wc -c < "$r.out"))) $(($(wc -c < "$r.err"))) "$limit"
+    emit "$r.out"
+    printf '\\n--- exec stderr 6d1c3a9f ---\\n'
+    emit "$r.err"
+} > "$r"
+rm -f "$r.out" "$r.err"
+"""
+
 
 class ExecResult:
     exit_code: int
     stdout: str
     stderr: str
+    duration: float | None
+    truncated: bool
 
-    def __init__(self, exit_code: int, stdout: str, stderr: str):
+    def __init__(self, exit_code: int, stdout: str, stderr: str, duration: float | None = None, truncated: bool = False):
         self.exit_code = exit_code
         self.stdout = stdout
         self.stderr = stderr
+        self.duration = duration
+        self.truncated = truncated
 
     @classmethod
     async def from_ctr(cls, ctr: dagger.Container) -> Self:
@@ -23,6 +59,46 @@ class ExecResult:
             stderr=await ctr.stderr(),
         )
 
+    @staticmethod
+    def with_capture(
+        ctr: dagger.Container,
+        command: list[str],
+        max_output: int | None = DEFAULT_OUTPUT_LIMIT,
+        result_path: str = RESULT_PATH,
+    ) -> dagger.Container:
+        """
+        Run the command recording exit code, output and duration in a single result file,
+        the file is read back by from_capture in one query instead of three.
+        Outputs over max_output bytes keep their first and last halves.
+        """
+        return ctr.with_exec(
+            ["sh", "-c", _CAPTURE_SCRIPT, "sh", result_path, str(max_output or 0), *command],
+            expect=dagger.ReturnType.ANY,
+        )
+
+    @classmethod
+    async def from_capture(cls, ctr: dagger.Container, result_path: str = RESULT_PATH) -> Self:
+        return cls.parse_capture(await ctr.file(result_path).contents())
+
+    @classmethod
+    def parse_capture(cls, content: str) -> Self:
+        header, _, body = content.partition("\n")
+        exit_code, started, finished, stdout_size, stderr_size, limit = header.split()
+        stdout, _, stderr = body.partition(_STDERR_SEPARATOR)
+        return cls(
+            exit_code=int(exit_code),
+            stdout=stdout,
+            stderr=stderr,
+            duration=float(finished) - float(started) if float(started) else None,
+            truncated=int(limit) > 0 and max(int(stdout_size), int(stderr_size)) > int(limit),
+        )
+
+    @classmethod
+    async def capture(
+        cls, ctr: dagger.Container, command: list[str], max_output: int | None = DEFAULT_OUTPUT_LIMIT
+    ) -> Self:
+        return await cls.from_capture(cls.with_capture(ctr, command, max_output))
+
 
 async def write_files_bulk(ctr: dagger.Container, files: dict[str, str], client: dagger.Client) -> dagger.Container:
     with tempfile.TemporaryDirectory() as temp_dir:
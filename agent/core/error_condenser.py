@@ -0,0 +1,495 @@
+"""
+Deterministic condensing of check output before it goes back to the model.
+
+compact_error_message used to ask the LLM to shorten every error report longer
+than its budget, which is most failing nodes: one type error repeated across a
+dozen call sites, a pytest run with its tracebacks, a composer lint table. The
+condenser parses the output of the tools the checks run (tsc, pyright, ruff,
+pytest, bun test, phpunit / artisan test, composer with phpstan, eslint) into
+diagnostics, drops the noise around them (progress, code frames, summaries),
+deduplicates repeated diagnostics and lists them grouped by file and rule,
+keeping the first N distinct ones. Lines no parser recognizes are kept verbatim,
+so nothing unknown is lost. The LLM is only asked when the result is still over
+budget.
+
+`uv run python -m bench error_condenser` reports the compression ratio
+and the LLM calls avoided over a corpus of captured outputs.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# distinct diagnostics kept, fewer are tried when the result is over budget
+MAX_ERRORS = (20, 10, 5)
+# context lines kept under a diagnostic
+MAX_DETAIL = 3
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_SECTION = re.compile(r"^[A-Z][A-Za-z\- ]*(?:errors|Errors|violations|failures)(?: \([\w ]+\))?:$")
+
+
+@dataclass
+class Diagnostic:
+    file: str
+    rule: str
+    message: str
+    line: int | None = None
+    col: int | None = None
+    detail: list[str] = field(default_factory=list)
+
+    @property
+    def location(self) -> str:
+        if self.line is None:
+            return ""
+        return f"{self.line}:{self.col}" if self.col is not None else str(self.line)
+
+
+# a parser takes the lines of a section and returns what it recognized and the lines left for others
+Parser = Callable[[list[str]], tuple[list[Diagnostic], list[str]]]
+
+
+def _relative(path: str) -> str:
+    for prefix in ("/app/", "/var/www/html/", "/var/www/"):
+        if path.startswith(prefix):
+            return path[len(prefix):]
+    return path.removeprefix("./")
+
+
+def _parse_lines(
+    lines: list[str],
+    patterns: list[re.Pattern],
+    make: Callable[[re.Match], Diagnostic | None],
+    noise: list[re.Pattern],
+    continuation: re.Pattern | None = None,
+) -> tuple[list[Diagnostic], list[str]]:
+    """Shared loop of the line oriented formats: one diagnostic per matching line, indented continuation lines as detail."""
+    diagnostics, rest, current = [], [], None
+    for line in lines:
+        if (match := next((m for p in patterns if (m := p.match(line))), None)) and (d := make(match)):
+            diagnostics.append(d)
+            current = d
+        elif current is not None and continuation is not None and continuation.match(line):
+            current.detail.append(line.strip())
+        elif any(p.match(line) for p in noise):
+            continue
+        else:
+            current = None
+            rest.append(line)
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+_TSC = [
+    re.compile(r"^(?P<file>[^\s(][^(]*?)\((?P<line>\d+),(?P<col>\d+)\): (?:error|warning) (?P<rule>TS\d+): (?P<msg>.*)$"),
+    re.compile(r"^(?P<file>[^\s:]+):(?P<line>\d+):(?P<col>\d+) - (?:error|warning) (?P<rule>TS\d+): (?P<msg>.*)$"),
+]
+_TSC_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^Found \d+ errors?"),
+    re.compile(r"^\s*\d+\s{2,}\S.*$"),  # pretty code frame
+    re.compile(r"^\s*~+\s*$"),
+    re.compile(r"^\s+\d+\s+\S+:\d+$"),  # errors per file table
+    re.compile(r"^Errors\s+Files$"),
+    re.compile(r"^error: script \".*\" exited with code \d+"),
+    re.compile(r"^\$ tsc"),
+]
+
+
+def parse_tsc(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    def make(m: re.Match) -> Diagnostic:
+        return Diagnostic(_relative(m["file"]), m["rule"], m["msg"], int(m["line"]), int(m["col"]))
+    return _parse_lines(lines, _TSC, make, _TSC_NOISE, continuation=re.compile(r"^\s{2,}\S"))
+
+
+_PYRIGHT = [
+    re.compile(r"^\s*(?P<file>\S+\.pyi?):(?P<line>\d+):(?P<col>\d+) - (?P<severity>error|warning|information): (?P<msg>.*?)(?: \((?P<rule>report\w+)\))?$"),
+]
+_PYRIGHT_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^\S+\.pyi?$"),  # file header
+    re.compile(r"^\d+ errors?, \d+ warnings?, \d+ informations?"),
+    re.compile(r"^(?:0 errors|No configuration file found|Searching for source files|Found \d+ source files?|pyright \d)"),
+]
+
+
+def parse_pyright(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    def make(m: re.Match) -> Diagnostic | None:
+        if m["severity"] == "information":
+            return None
+        return Diagnostic(_relative(m["file"]), m["rule"] or m["severity"], m["msg"], int(m["line"]), int(m["col"]))
+    diagnostics, rest = _parse_lines(lines, _PYRIGHT, make, _PYRIGHT_NOISE, continuation=re.compile(r"^\s{4,}\S"))
+    for d in diagnostics:
+        # long messages carry the rule at the end of their last line
+        if d.detail and (m := re.search(r" \((report\w+)\)$", d.detail[-1])):
+            d.rule = m[1]
+            d.detail[-1] = d.detail[-1][: m.start()]
+    return diagnostics, rest
+
+
+_RUFF = [
+    re.compile(r"^(?P<file>[^\s:]+\.pyi?):(?P<line>\d+):(?P<col>\d+): (?P<rule>[A-Z]+\d+) (?:\[\*\] )?(?P<msg>.*)$"),
+]
+_RUFF_RULE = re.compile(r"^(?P<rule>[A-Z]+\d+) (?:\[\*\] )?(?P<msg>.+)$")
+_RUFF_ARROW = re.compile(r"^\s*--> (?P<file>[^\s:]+):(?P<line>\d+):(?P<col>\d+)$")
+_RUFF_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^\s*\d*\s*\|"),  # code frame
+    re.compile(r"^Found \d+ errors?"),
+    re.compile(r"^\[\*\] \d+ fixable"),
+    re.compile(r"^No fixes available"),
+    re.compile(r"^All checks passed"),
+]
+
+
+def parse_ruff(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    # the newer full format puts the location on the line after the rule
+    joined, i = [], 0
+    while i < len(lines):
+        if i + 1 < len(lines) and (rule := _RUFF_RULE.match(lines[i])) and (arrow := _RUFF_ARROW.match(lines[i + 1])):
+            joined.append(f"{arrow['file']}:{arrow['line']}:{arrow['col']}: {rule['rule']} {rule['msg']}")
+            i += 2
+        else:
+            joined.append(lines[i])
+            i += 1
+
+    def make(m: re.Match) -> Diagnostic:
+        return Diagnostic(_relative(m["file"]), m["rule"], m["msg"], int(m["line"]), int(m["col"]))
+    diagnostics, rest = _parse_lines(joined, _RUFF, make, _RUFF_NOISE, continuation=re.compile(r"^\s*= help: "))
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+_PYTEST_FAILED = re.compile(r"^(?P<kind>FAILED|ERROR) (?P<file>[^\s:]+)(?:::(?P<test>\S+))?(?: - (?P<msg>.*))?$")
+_PYTEST_LOCATION = re.compile(r"^(?P<file>\S+\.py):(?P<line>\d+): (?P<rule>\w+)(?:: (?P<msg>.*))?$")
+_PYTEST_HEADER = re.compile(r"^={3,} ?(?P<title>.*?) ?={3,}$")
+_PYTEST_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^_{3,} .* _{3,}$"),
+    re.compile(r"^\S+\.py [.FEsxX]+"),
+    re.compile(r"^[.FEsxX]+\s*\[\s*\d+%\]$"),
+    re.compile(r"^(?:platform|rootdir|configfile|plugins|cachedir|collected|collecting)\b"),
+    re.compile(r"^-{3,} .* -{3,}$"),
+]
+
+
+def parse_pytest(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    diagnostics, rest = [], []
+    section, errors = "", []
+    for line in lines:
+        if header := _PYTEST_HEADER.match(line):
+            section, errors = header["title"].lower(), []
+            continue
+        if m := _PYTEST_FAILED.match(line):
+            # the summary cuts messages to the terminal width, the failure itself has them in full
+            reason = m["msg"] if m["msg"] and not m["msg"].endswith("...") else None
+            message = " - ".join(part for part in (m["test"], reason) if part)
+            diagnostics.append(Diagnostic(_relative(m["file"]), m["kind"], message))
+        elif m := _PYTEST_LOCATION.match(line):
+            errors = [e.removeprefix(f"{m['rule']}: ") for e in errors]
+            message = m["msg"] or (errors[0] if errors else "")
+            detail = [e for e in errors if e != message]
+            diagnostics.append(Diagnostic(_relative(m["file"]), m["rule"], message, int(m["line"]), detail=detail[:MAX_DETAIL]))
+            errors = []
+        elif line.startswith("E ") and section in ("failures", "errors"):
+            errors.append(line[1:].strip())
+        elif section in ("failures", "errors", "warnings summary") or any(p.match(line) for p in _PYTEST_NOISE):
+            # traceback source and captured output, the summary names every failure
+            continue
+        elif re.match(r"^\d+ (?:failed|passed|errors?)\b", line):
+            continue
+        else:
+            rest.append(line)
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+_BUN_FILE = re.compile(r"^(?P<file>\S+\.(?:test|spec)\.[cm]?[jt]sx?):$")
+_BUN_FAIL = re.compile(r"^\(fail\) (?P<name>.+?)(?: \[[\d.]+m?s\])?$")
+_BUN_AT = re.compile(r"^\s+at .*?\(?(?P<file>[^\s()]+):(?P<line>\d+):(?P<col>\d+)\)?$")
+_BUN_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^\(pass\) "),
+    re.compile(r"^\(skip\) "),
+    re.compile(r"^\s*\d+ \|"),  # code frame
+    re.compile(r"^\s*\^"),
+    re.compile(r"^\s*\d+ (?:pass|fail|skip)$"),
+    re.compile(r"^\s*\d+ expect\(\) calls?$"),
+    re.compile(r"^Ran \d+ tests?"),
+    re.compile(r"^bun test v"),
+    re.compile(r"^-+$"),
+]
+
+
+def parse_bun_test(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    diagnostics, rest = [], []
+    file, pending, location = "", [], None
+    for line in lines:
+        if m := _BUN_FILE.match(line):
+            file, pending, location = _relative(m["file"]), [], None
+        elif m := _BUN_FAIL.match(line):
+            message = f"{m['name']}: {pending[0]}" if pending else m["name"]
+            line_no, col = location or (None, None)
+            diagnostics.append(Diagnostic(file or "tests", "fail", message, line_no, col, detail=pending[1:MAX_DETAIL + 1]))
+            pending, location = [], None
+        elif line.startswith("error: ") and not line.startswith("error: script"):
+            pending = [line.removeprefix("error: ")]
+        elif pending and re.match(r"^\s*(?:Expected|Received|- Expected|\+ Received)", line):
+            pending.append(line.strip())
+        elif m := _BUN_AT.match(line):
+            if location is None and ".test." in m["file"]:
+                location = (int(m["line"]), int(m["col"]))
+        elif any(p.match(line) for p in _BUN_NOISE) or (pending and line.startswith(("-", "+", " "))):
+            continue
+        else:
+            rest.append(line)
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+_PHPUNIT_ENTRY = re.compile(r"^\d+\) (?P<test>\S+)$")
+_PHPUNIT_LOCATION = re.compile(r"^(?P<file>\S+\.php):(?P<line>\d+)$")
+_ARTISAN_FAILED = re.compile(r"^\s*FAILED\s+(?P<test>.+?)(?:\s{2,}(?P<rule>\w+))?\s*$")
+_ARTISAN_AT = re.compile(r"^\s*at (?P<file>\S+\.php):(?P<line>\d+)$")
+_PHPUNIT_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^There (?:was|were) \d+ (?:failures?|errors?|risky tests?):$"),
+    re.compile(r"^(?:FAILURES!|ERRORS!|OK \()"),
+    re.compile(r"^\s*Tests:\s+\d+"),
+    re.compile(r"^\s*(?:PHPUnit \d|Runtime:|Configuration:|Time:|Duration:)"),
+    re.compile(r"^[.FEWRSID]+\s+\d+ / \d+"),
+    re.compile(r"^\s*(?:PASS|FAIL|✓|⨯|✕)\s"),  # per test lines, the failures follow in full
+    re.compile(r"^\s*[─-]+\s*$"),
+    re.compile(r"^\s*➜?\s*\d+▕"),  # collision code frame
+    re.compile(r"^\s*\+?\d+ vendor frames"),
+    re.compile(r"^Stack trace:$"),
+    re.compile(r"^#\d+ "),  # php stack frames
+]
+
+
+def parse_phpunit(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    diagnostics, rest, current = [], [], None
+    for line in lines:
+        if m := _PHPUNIT_ENTRY.match(line) or _ARTISAN_FAILED.match(line):
+            current = Diagnostic("tests", m.groupdict().get("rule") or "failed", m["test"])
+            diagnostics.append(current)
+        elif current is not None and (m := _PHPUNIT_LOCATION.match(line.strip()) or _ARTISAN_AT.match(line)):
+            # the first frame outside vendor/ is where the test failed
+            if current.line is None or current.file.startswith("vendor/"):
+                current.file, current.line = _relative(m["file"]), int(m["line"])
+        elif any(p.match(line) for p in _PHPUNIT_NOISE):
+            continue
+        elif current is not None and current.line is None:
+            # message lines until the trace, JSON punctuation left out
+            if len(current.detail) < MAX_DETAIL + 1 and len(re.findall(r"\w", line)) >= 3:
+                current.detail.append(line.strip())
+        else:
+            current = None
+            rest.append(line)
+    for d in diagnostics:
+        # the first line under the test is its failure message
+        if d.detail:
+            d.message = f"{d.message}: {d.detail.pop(0)}"
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+_COMPOSER_PROBLEM = re.compile(r"^\s*Problem \d+$")
+_PHPSTAN_TABLE_FILE = re.compile(r"^\s*Line\s+(?P<file>\S+)\s*$")
+_PHPSTAN_ROW = re.compile(r"^\s*(?P<line>\d+)\s{2,}(?P<msg>\S.*?)\s*$")
+_PHPSTAN_IDENTIFIER = re.compile(r"^\s*(?:🪪|\S)?\s*(?P<rule>[a-zA-Z]+(?:\.[a-zA-Z]+)+)\s*$")
+_PHP_ERROR = re.compile(r"^(?:PHP )?(?P<rule>Parse|Fatal) error:\s+(?P<msg>.*) in (?P<file>\S+\.php)(?: on line |:)(?P<line>\d+)")
+_COMPOSER_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^\s*-{3,}(?:\s+-{3,})*\s*$"),
+    re.compile(r"^Script .* handling the .* event returned with error code \d+"),
+    re.compile(r"^> "),
+    re.compile(r"^Your requirements could not be resolved"),
+    re.compile(r"^(?:Loading composer repositories|Updating dependencies|Note: )"),
+    re.compile(r"^\s*\d+/\d+ \[.*\]\s+\d+%"),  # phpstan progress
+    re.compile(r"^\s*✏️"),
+    re.compile(r"^\s*💡"),
+]
+
+
+def parse_composer(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    diagnostics, rest = [], []
+    file, current, problem = None, None, None
+    for line in lines:
+        if _COMPOSER_PROBLEM.match(line):
+            problem, current = True, None
+        elif problem and (m := re.match(r"^\s*- (?P<msg>.*)$", line)):
+            if current is None:
+                current = Diagnostic("composer.json", "dependency", m["msg"])
+                diagnostics.append(current)
+            elif len(current.detail) < MAX_DETAIL:
+                current.detail.append(m["msg"])
+        elif m := _PHPSTAN_TABLE_FILE.match(line):
+            file, problem = _relative(m["file"]), None
+        elif re.match(r"^\s*\[(?:ERROR|OK)\] ", line):
+            # end of the phpstan report
+            file, current = None, None
+        elif file and (m := _PHPSTAN_ROW.match(line)):
+            current = Diagnostic(file, "phpstan", m["msg"], int(m["line"]))
+            diagnostics.append(current)
+        elif file and current is not None and (m := _PHPSTAN_IDENTIFIER.match(line)):
+            current.rule = m["rule"]
+        elif m := _PHP_ERROR.match(line):
+            diagnostics.append(Diagnostic(_relative(m["file"]), f"{m['rule']} error", m["msg"], int(m["line"])))
+        elif any(p.match(line) for p in _COMPOSER_NOISE):
+            continue
+        elif file and current is not None and re.match(r"^\s{4,}\S", line):
+            # wrapped message
+            current.message = f"{current.message} {line.strip()}"
+        else:
+            problem = None
+            rest.append(line)
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+_ESLINT_FILE = re.compile(r"^(?P<file>/?\S+\.(?:[cm]?[jt]sx?|vue))$")
+_ESLINT_ROW = re.compile(r"^\s+(?P<line>\d+):(?P<col>\d+)\s+(?:error|warning)\s+(?P<msg>.+?)(?:\s{2,}(?P<rule>[@\w/\-]+))?$")
+_ESLINT_NOISE = [
+    re.compile(r"^\s*$"),
+    re.compile(r"^✖ \d+ problems?"),
+    re.compile(r"^\s+\d+ errors? and \d+ warnings? potentially fixable"),
+    re.compile(r"^> "),
+]
+
+
+def parse_eslint(lines: list[str]) -> tuple[list[Diagnostic], list[str]]:
+    diagnostics, rest, file = [], [], None
+    for line in lines:
+        if m := _ESLINT_FILE.match(line):
+            file = _relative(m["file"])
+        elif file and (m := _ESLINT_ROW.match(line)):
+            diagnostics.append(Diagnostic(file, m["rule"] or "eslint", m["msg"], int(m["line"]), int(m["col"])))
+        elif any(p.match(line) for p in _ESLINT_NOISE):
+            continue
+        else:
+            rest.append(line)
+    return (diagnostics, rest) if diagnostics else ([], lines)
+
+
+# order matters where formats overlap, e.g. ruff before pytest for `file.py:1:2:` lines
+PARSERS: dict[str, Parser] = {
+    "tsc": parse_tsc,
+    "pyright": parse_pyright,
+    "ruff": parse_ruff,
+    "pytest": parse_pytest,
+    "bun_test": parse_bun_test,
+    "phpunit": parse_phpunit,
+    "composer": parse_composer,
+    "eslint": parse_eslint,
+}
+
+
+def parse(text: str) -> tuple[list[Diagnostic], list[str]]:
+    """Diagnostics every parser recognized and the remaining lines."""
+    lines = _ANSI.sub("", text).splitlines()
+    diagnostics = []
+    for parser in PARSERS.values():
+        found, lines = parser(lines)
+        diagnostics += found
+    return diagnostics, lines
+
+
+def render(diagnostics: list[Diagnostic], max_errors: int) -> str:
+    """Distinct diagnostics grouped by file and rule, the first `max_errors` of them listed."""
+    # same file, rule and message at several locations is one entry
+    entries: dict[tuple[str, str, str], list[Diagnostic]] = {}
+    for d in diagnostics:
+        same = entries.setdefault((d.file, d.rule, d.message), [])
+        if not any(o.line == d.line and o.col == d.col for o in same):
+            same.append(d)
+    by_file: dict[str, dict[str, list[list[Diagnostic]]]] = {}
+    for (file, rule, _), same in entries.items():
+        by_file.setdefault(file, {}).setdefault(rule, []).append(same)
+
+    out, shown = [], 0
+    for file, rules in by_file.items():
+        lines = []
+        for rule, group in rules.items():
+            listed = group[: max(max_errors - shown, 0)]
+            for same in listed:
+                same = sorted(same, key=lambda d: (d.line or 0, d.col or 0))
+                locations = ", ".join(loc for d in same[:5] if (loc := d.location))
+                more = f" (+{len(same) - 5} more locations)" if len(same) > 5 else ""
+                lines.append(f"  {locations + ' ' if locations else ''}{rule}: {same[0].message}{more}")
+                lines += [f"      {line}" for line in same[0].detail[:MAX_DETAIL]]
+            shown += len(listed)
+            if listed and len(group) > len(listed):
+                lines.append(f"  ... {len(group) - len(listed)} more {rule}")
+        if lines:
+            out += [f"{file}:", *lines]
+    if (hidden := len(entries) - shown) > 0:
+        out.append(f"... {hidden} more distinct errors not shown, fix the ones above first")
+    return "\n".join(out)
+
+
+def _squeeze(lines: list[str]) -> list[str]:
+    """Unrecognized lines without repeats and blank runs."""
+    seen, out = set(), []
+    for line in lines:
+        if not line.strip():
+            if out and out[-1]:
+                out.append("")
+        elif line not in seen or _SECTION.match(line):
+            seen.add(line)
+            out.append(line)
+    return out
+
+
+def _sections(text: str) -> list[tuple[str | None, str]]:
+    """Split a report at the headings the actors put above each check output."""
+    sections, heading, body = [], None, []
+    for line in text.splitlines():
+        if _SECTION.match(line.strip()):
+            if heading is not None or any(line.strip() for line in body):
+                sections.append((heading, "\n".join(body)))
+            heading, body = line.strip(), []
+        else:
+            body.append(line)
+    sections.append((heading, "\n".join(body)))
+    return sections
+
+
+def condense(text: str, max_length: int = 4096) -> str:
+    """Deterministically shortened report, may still exceed max_length if most of it is unrecognized."""
+    parsed = [(heading, *parse(body)) for heading, body in _sections(text)]
+    best = text
+    for max_errors in MAX_ERRORS:
+        parts = []
+        for heading, diagnostics, rest in parsed:
+            body = "\n".join(part for part in (render(diagnostics, max_errors), "\n".join(_squeeze(rest)).strip()) if part)
+            parts.append(f"{heading}\n{body}" if heading else body)
+        condensed = "\n\n".join(part for part in parts if part.strip())
+        if len(condensed) < len(best):
+            best = condensed
+        if len(best) <= max_length:
+            break
+    return best
+
+
+@dataclass
+class CondenserStats:
+    reports: int = 0
+    llm_fallbacks: int = 0
+    original_chars: int = 0
+    condensed_chars: int = 0
+
+    def record(self, original: str, condensed: str, fallback: bool) -> None:
+        self.reports += 1
+        self.llm_fallbacks += fallback
+        self.original_chars += len(original)
+        self.condensed_chars += len(condensed)
+
+    def metrics(self) -> dict:
+        return {
+            "reports": self.reports,
+            "llm_calls_avoided": self.reports - self.llm_fallbacks,
+            "llm_fallbacks": self.llm_fallbacks,
+            "compression_ratio": self.original_chars / self.condensed_chars if self.condensed_chars else 1.0,
+        }
+
+
+condenser_stats = CondenserStats()
+
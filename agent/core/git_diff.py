@@ -0,0 +1,1045 @@
+"""
+In-process unified diff engine producing the same output as `git diff`.
+
+The diff core is a port of git's xdiff (Myers with git's heuristics, record
+cleanup and the indent heuristic for sliding change groups), so hunks line up
+exactly with what `git diff HEAD` prints. On top of it we emit git's extended
+headers (new/deleted file modes, index lines with abbreviated blob ids, binary
+file markers, C-style path quoting) and honor `.gitignore` / `.gitattributes`
+the way `git add .` and userdiff drivers would. Renames are not detected, the
+output matches `git -c diff.renames=false diff`.
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Mapping
+
+NULL_OID = "0" * 40
+DEFAULT_ABBREV = 7
+CONTEXT_LINES = 3
+
+# xdiff tuning constants (xdiff/xdiffi.c, xdiff/xprepare.c)
+_MAX_COST_MIN = 256
+_HEUR_MIN_COST = 256
+_SNAKE_CNT = 20
+_K_HEUR = 4
+_LINE_MAX = (1 << 63) - 1
+_MAX_EQLIMIT = 1024
+_SIMSCAN_WINDOW = 100
+_KPDIS_RUN = 4
+
+# indent heuristic weights (xdiff/xdiffi.c)
+_MAX_INDENT = 200
+_MAX_BLANKS = 20
+_INDENT_HEURISTIC_MAX_SLIDING = 100
+_START_OF_FILE_PENALTY = 1
+_END_OF_FILE_PENALTY = 21
+_TOTAL_BLANK_WEIGHT = -30
+_POST_BLANK_WEIGHT = 6
+_RELATIVE_INDENT_PENALTY = -4
+_RELATIVE_INDENT_WITH_BLANK_PENALTY = 10
+_RELATIVE_OUTDENT_PENALTY = 24
+_RELATIVE_OUTDENT_WITH_BLANK_PENALTY = 17
+_RELATIVE_DEDENT_PENALTY = 23
+_RELATIVE_DEDENT_WITH_BLANK_PENALTY = 17
+_INDENT_WEIGHT = 60
+
+_FUNC_LINE_MAX = 80
+_FIRST_FEW_BYTES = 8000
+
+# git's sane ctype: only these count as whitespace
+_GIT_SPACE = frozenset(b" \t\n\r")
+
+
+@dataclass(frozen=True)
+class GitFile:
+    content: bytes
+    mode: str = "100644"
+
+    @property
+    def oid(self) -> str:
+        return blob_oid(self.content)
+
+    @property
+    def is_binary(self) -> bool:
+        return b"\0" in self.content[:_FIRST_FEW_BYTES]
+
+
+Tree = dict[str, GitFile]
+
+
+def blob_oid(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def as_tree(files: Mapping[str, str | bytes | GitFile]) -> Tree:
+    tree: Tree = {}
+    for path, content in files.items():
+        match content:
+            case GitFile():
+                tree[path] = content
+            case bytes():
+                tree[path] = GitFile(content)
+            case str():
+                tree[path] = GitFile(content.encode("utf-8"))
+    return tree
+
+
+def read_tree(root: str | Path) -> Tree:
+    """Read a host directory the way `git add` sees it: regular files, executables and symlinks, no `.git`."""
+    root = Path(root)
+    tree: Tree = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != ".git" and not os.path.islink(os.path.join(dirpath, d))]
+        links = [d for d in os.listdir(dirpath) if d not in filenames and os.path.islink(os.path.join(dirpath, d))]
+        for name in [*filenames, *links]:
+            full = os.path.join(dirpath, name)
+            rel = os.path.relpath(full, root).replace(os.sep, "/")
+            if os.path.islink(full):
+                tree[rel] = GitFile(os.fsencode(os.readlink(full)), "120000")
+            elif os.path.isfile(full):
+                mode = "100755" if os.stat(full).st_mode & 0o100 else "100644"
+                with open(full, "rb") as f:
+                    tree[rel] = GitFile(f.read(), mode)
+    return tree
+
+
+# ---------------------------------------------------------------------------
+# wildmatch / gitignore / gitattributes
+# ---------------------------------------------------------------------------
+
+
+def _wildmatch_regex(pattern: str, pathname: bool = True) -> re.Pattern:
+    """Translate a git wildmatch pattern to a regex (WM_PATHNAME semantics when pathname is set)."""
+    out = []
+    i, n = 0, len(pattern)
+    any_char = "[^/]" if pathname else "."
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i) and pathname:
+                at_start = i == 0 or pattern[i - 1] == "/"
+                at_end = i + 2 == n or pattern[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        out.append(".*")
+                        i += 2
+                    else:
+                        out.append("(?:.*/)?")
+                        i += 3
+                    continue
+            while i < n and pattern[i] == "*":
+                i += 1
+            out.append(any_char + "*")
+            continue
+        if c == "?":
+            out.append(any_char)
+        elif c == "[":
+            j = i + 1
+            negate = j < n and pattern[j] in "!^"
+            if negate:
+                j += 1
+            start = j
+            if j < n and pattern[j] == "]":
+                j += 1
+            while j < n and pattern[j] != "]":
+                j += 2 if pattern[j] == "\\" else 1
+            if j >= n:
+                out.append(re.escape(c))
+            else:
+                body = pattern[start:j].replace("\\", "\\\\")
+                body = re.sub(r"\[:(\w+):\]", lambda m: _POSIX_CLASSES.get(m.group(1), ""), body)
+                excl = "/" if pathname else ""
+                out.append(f"[^{body}{excl}]" if negate else f"(?![{excl}])[{body}]" if excl else f"[{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return re.compile("".join(out) + r"\Z", re.DOTALL)
+
+
+_POSIX_CLASSES = {
+    "alnum": "a-zA-Z0-9", "alpha": "a-zA-Z", "digit": "0-9", "lower": "a-z",
+    "upper": "A-Z", "space": " \\t\\n\\r\\f\\v", "xdigit": "0-9a-fA-F", "punct": "!-/:-@\\[-`{-~",
+}
+
+
+@dataclass(frozen=True)
+class _Pattern:
+    regex: re.Pattern
+    base: str  # directory of the defining file, "" for root
+    anchored: bool
+    dir_only: bool
+    negate: bool
+
+    def matches(self, path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not path.startswith(self.base + "/"):
+                return False
+            path = path[len(self.base) + 1:]
+        if not self.anchored:
+            path = path.rsplit("/", 1)[-1]
+        return self.regex.match(path) is not None
+
+
+def _parse_pattern(line: str, base: str) -> _Pattern | None:
+    if not line or line.startswith("#"):
+        return None
+    # trailing spaces are ignored unless escaped
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line:
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    anchored = "/" in line
+    line = line.lstrip("/")
+    return _Pattern(_wildmatch_regex(line, pathname=anchored), base, anchored, dir_only, negate)
+
+
+class GitIgnore:
+    """Evaluates `.gitignore` files of a tree the way `git add .` does."""
+
+    def __init__(self, tree: Mapping[str, GitFile]):
+        self._patterns: dict[str, list[_Pattern]] = {}
+        for path, file in tree.items():
+            if path == ".gitignore" or path.endswith("/.gitignore"):
+                base = path.rpartition("/")[0]
+                lines = file.content.decode("utf-8", errors="replace").splitlines()
+                self._patterns[base] = [p for line in lines if (p := _parse_pattern(line, base))]
+        self._dir_cache: dict[str, bool] = {}
+
+    def _excluded(self, path: str, is_dir: bool) -> bool:
+        parent = path.rpartition("/")[0]
+        bases = [""] + [parent[:i] for i, c in enumerate(parent) if c == "/"] + ([parent] if parent else [])
+        # deeper files take precedence, within a file the last matching pattern wins
+        for base in reversed(bases):
+            for pattern in reversed(self._patterns.get(base, [])):
+                if pattern.matches(path, is_dir):
+                    return not pattern.negate
+        return False
+
+    def _dir_excluded(self, directory: str) -> bool:
+        if directory not in self._dir_cache:
+            parent = directory.rpartition("/")[0]
+            self._dir_cache[directory] = (bool(parent) and self._dir_excluded(parent)) or self._excluded(directory, True)
+        return self._dir_cache[directory]
+
+    def is_ignored(self, path: str) -> bool:
+        parent = path.rpartition("/")[0]
+        if parent and self._dir_excluded(parent):
+            return True
+        return self._excluded(path, False)
+
+
+def tracked(tree: Tree, already_tracked: Iterable[str] = ()) -> Tree:
+    """Files `git add .` would stage: tracked paths plus everything not ignored."""
+    keep = set(already_tracked)
+    ignore = GitIgnore(tree)
+    return {p: f for p, f in tree.items() if p in keep or not ignore.is_ignored(p)}
+
+
+# builtin userdiff funcname patterns (userdiff.c), selected by `diff=<driver>` in .gitattributes
+_USERDIFF_FUNCNAME: dict[str, tuple[str, int]] = {
+    "css": ("![:;][[:space:]]*$\n^[:[@.#]?[_a-z0-9].*$", re.IGNORECASE),
+    "html": ("^[ \t]*(<[Hh][1-6]([ \t].*)?>.*)$", 0),
+    "markdown": ("^ {0,3}#{1,6}[ \t].*", 0),
+    "php": (
+        "^[\t ]*(((public|protected|private|static|abstract|final)[\t ]+)*function.*)$\n"
+        "^[\t ]*((((final|abstract)[\t ]+)?class|enum|interface|trait).*)$",
+        0,
+    ),
+    "python": ("^[ \t]*((class|(async[ \t]+)?def)[ \t].*)$", 0),
+    "bash": (
+        "^[ \t]*((([a-zA-Z_][a-zA-Z0-9_]*[ \t]*\\([ \t]*\\))|(function[ \t]+[a-zA-Z_][a-zA-Z0-9_]*(([ \t]*\\([ \t]*\\))|([ \t]+)))).*$)",
+        0,
+    ),
+}
+
+
+def _compile_funcname(driver: str) -> list[tuple[bool, re.Pattern]] | None:
+    if driver not in _USERDIFF_FUNCNAME:
+        return None
+    source, flags = _USERDIFF_FUNCNAME[driver]
+    regexes = []
+    for line in source.split("\n"):
+        negate = line.startswith("!")
+        line = line[1:] if negate else line
+        line = line.replace("[[:space:]]", "[ \t\n\r\f\v]")
+        regexes.append((negate, re.compile(line.encode(), flags)))
+    return regexes
+
+
+class GitAttributes:
+    """Resolves the `diff` attribute from `.gitattributes` files of a tree."""
+
+    def __init__(self, tree: Mapping[str, GitFile]):
+        self._rules: dict[str, list[tuple[_Pattern, str | bool]]] = {}
+        for path, file in tree.items():
+            if path == ".gitattributes" or path.endswith("/.gitattributes"):
+                base = path.rpartition("/")[0]
+                rules = []
+                for line in file.content.decode("utf-8", errors="replace").splitlines():
+                    parts = line.split()
+                    if not parts or parts[0].startswith("#"):
+                        continue
+                    pattern = _parse_pattern(parts[0], base)
+                    if pattern is None or pattern.negate:
+                        continue
+                    for attr in parts[1:]:
+                        if attr == "binary" or attr == "-diff":
+                            rules.append((pattern, False))
+                        elif attr == "diff":
+                            rules.append((pattern, True))
+                        elif attr.startswith("diff="):
+                            rules.append((pattern, attr[5:]))
+                self._rules[base] = rules
+
+    def diff_attr(self, path: str) -> str | bool | None:
+        parent = path.rpartition("/")[0]
+        bases = [""] + [parent[:i] for i, c in enumerate(parent) if c == "/"] + ([parent] if parent else [])
+        for base in reversed(bases):
+            for pattern, value in reversed(self._rules.get(base, [])):
+                if pattern.matches(path, False):
+                    return value
+        return None
+
+
+# ---------------------------------------------------------------------------
+# xdiff port
+# ---------------------------------------------------------------------------
+
+
+def _split_lines(content: bytes) -> list[bytes]:
+    lines = content.split(b"\n")
+    last = lines.pop()
+    recs = [line + b"\n" for line in lines]
+    if last:
+        recs.append(last)
+    return recs
+
+
+def _bogosqrt(n: int) -> int:
+    i = 1
+    while n > 0:
+        i <<= 1
+        n >>= 2
+    return i
+
+
+class _XdFile:
+    __slots__ = ("recs", "ha", "nrec", "rchg", "dstart", "dend", "rindex", "reff")
+
+    def __init__(self, recs: list[bytes], ha: list[int]):
+        self.recs = recs
+        self.ha = ha
+        self.nrec = len(recs)
+        # rchg[-1] and rchg[nrec] are sentinels, stored with an offset of one
+        self.rchg = bytearray(self.nrec + 2)
+        self.dstart = 0
+        self.dend = 0
+        self.rindex: list[int] = []
+        self.reff: list[int] = []
+
+    def changed(self, i: int) -> int:
+        return self.rchg[i + 1] if i >= -1 else 0
+
+    def mark(self, i: int, value: int) -> None:
+        self.rchg[i + 1] = value
+
+
+def _clean_mmatch(dis: bytearray, i: int, s: int, e: int) -> bool:
+    if i - s > _SIMSCAN_WINDOW:
+        s = i - _SIMSCAN_WINDOW
+    if e - i > _SIMSCAN_WINDOW:
+        e = i + _SIMSCAN_WINDOW
+
+    rdis0, rpdis0 = 0, 1
+    r = 1
+    while i - r >= s:
+        if not dis[i - r]:
+            rdis0 += 1
+        elif dis[i - r] == 2:
+            rpdis0 += 1
+        else:
+            break
+        r += 1
+    if rdis0 == 0:
+        return False
+    rdis1, rpdis1 = 0, 1
+    r = 1
+    while i + r <= e:
+        if not dis[i + r]:
+            rdis1 += 1
+        elif dis[i + r] == 2:
+            rpdis1 += 1
+        else:
+            break
+        r += 1
+    if rdis1 == 0:
+        return False
+    rdis1 += rdis0
+    rpdis1 += rpdis0
+    return rpdis1 * _KPDIS_RUN < rpdis1 + rdis1
+
+
+def _prepare(a: list[bytes], b: list[bytes]) -> tuple[_XdFile, _XdFile]:
+    classes: dict[bytes, int] = {}
+    len1: list[int] = []
+    len2: list[int] = []
+
+    def classify(recs: list[bytes], counts: list[int], other: list[int]) -> list[int]:
+        ha = []
+        for rec in recs:
+            idx = classes.get(rec)
+            if idx is None:
+                idx = classes[rec] = len(classes)
+                counts.append(0)
+                other.append(0)
+            counts[idx] += 1
+            ha.append(idx)
+        return ha
+
+    xdf1 = _XdFile(a, classify(a, len1, len2))
+    xdf2 = _XdFile(b, classify(b, len2, len1))
+
+    # trim common prefix and suffix
+    lim = min(xdf1.nrec, xdf2.nrec)
+    i = 0
+    while i < lim and xdf1.ha[i] == xdf2.ha[i]:
+        i += 1
+    xdf1.dstart = xdf2.dstart = i
+    lim -= i
+    j = 0
+    while j < lim and xdf1.ha[xdf1.nrec - 1 - j] == xdf2.ha[xdf2.nrec - 1 - j]:
+        j += 1
+    xdf1.dend = xdf1.nrec - j - 1
+    xdf2.dend = xdf2.nrec - j - 1
+
+    # discard records without a counterpart, and runs of too-frequent ones
+    for xdf, other_counts in ((xdf1, len2), (xdf2, len1)):
+        dis = bytearray(xdf.nrec + 1)
+        mlim = min(_bogosqrt(xdf.nrec), _MAX_EQLIMIT)
+        for k in range(xdf.dstart, xdf.dend + 1):
+            nm = other_counts[xdf.ha[k]]
+            dis[k] = 0 if nm == 0 else 2 if nm >= mlim else 1
+        for k in range(xdf.dstart, xdf.dend + 1):
+            if dis[k] == 1 or (dis[k] == 2 and not _clean_mmatch(dis, k, xdf.dstart, xdf.dend)):
+                xdf.rindex.append(k)
+                xdf.reff.append(xdf.ha[k])
+            else:
+                xdf.mark(k, 1)
+    return xdf1, xdf2
+
+
+class _Split:
+    __slots__ = ("i1", "i2", "min_lo", "min_hi")
+
+
+def _xdl_split(ha1, off1, lim1, ha2, off2, lim2, kvdf, kvdb, koff, need_min, mxcost) -> _Split:
+    spl = _Split()
+    dmin, dmax = off1 - lim2, lim1 - off2
+    fmid, bmid = off1 - off2, lim1 - lim2
+    odd = (fmid - bmid) & 1
+    fmin = fmax = fmid
+    bmin = bmax = bmid
+
+    kvdf[fmid + koff] = off1
+    kvdb[bmid + koff] = lim1
+
+    ec = 0
+    while True:
+        ec += 1
+        got_snake = False
+
+        if fmin > dmin:
+            fmin -= 1
+            kvdf[fmin - 1 + koff] = -1
+        else:
+            fmin += 1
+        if fmax < dmax:
+            fmax += 1
+            kvdf[fmax + 1 + koff] = -1
+        else:
+            fmax -= 1
+
+        for d in range(fmax, fmin - 1, -2):
+            if kvdf[d - 1 + koff] >= kvdf[d + 1 + koff]:
+                i1 = kvdf[d - 1 + koff] + 1
+            else:
+                i1 = kvdf[d + 1 + koff]
+            prev1 = i1
+            i2 = i1 - d
+            while i1 < lim1 and i2 < lim2 and ha1[i1] == ha2[i2]:
+                i1 += 1
+                i2 += 1
+            if i1 - prev1 > _SNAKE_CNT:
+                got_snake = True
+            kvdf[d + koff] = i1
+            if odd and bmin <= d <= bmax and kvdb[d + koff] <= i1:
+                spl.i1, spl.i2 = i1, i2
+                spl.min_lo = spl.min_hi = True
+                return spl
+
+        if bmin > dmin:
+            bmin -= 1
+            kvdb[bmin - 1 + koff] = _LINE_MAX
+        else:
+            bmin += 1
+        if bmax < dmax:
+            bmax += 1
+            kvdb[bmax + 1 + koff] = _LINE_MAX
+        else:
+            bmax -= 1
+
+        for d in range(bmax, bmin - 1, -2):
+            if kvdb[d - 1 + koff] < kvdb[d + 1 + koff]:
+                i1 = kvdb[d - 1 + koff]
+            else:
+                i1 = kvdb[d + 1 + koff] - 1
+            prev1 = i1
+            i2 = i1 - d
+            while i1 > off1 and i2 > off2 and ha1[i1 - 1] == ha2[i2 - 1]:
+                i1 -= 1
+                i2 -= 1
+            if prev1 - i1 > _SNAKE_CNT:
+                got_snake = True
+            kvdb[d + koff] = i1
+            if not odd and fmin <= d <= fmax and i1 <= kvdf[d + koff]:
+                spl.i1, spl.i2 = i1, i2
+                spl.min_lo = spl.min_hi = True
+                return spl
+
+        if need_min:
+            continue
+
+        if got_snake and ec > _HEUR_MIN_COST:
+            best = 0
+            for d in range(fmax, fmin - 1, -2):
+                dd = d - fmid if d > fmid else fmid - d
+                i1 = kvdf[d + koff]
+                i2 = i1 - d
+                v = (i1 - off1) + (i2 - off2) - dd
+                if (v > _K_HEUR * ec and v > best
+                        and off1 + _SNAKE_CNT <= i1 < lim1
+                        and off2 + _SNAKE_CNT <= i2 < lim2):
+                    k = 1
+                    while ha1[i1 - k] == ha2[i2 - k]:
+                        if k == _SNAKE_CNT:
+                            best = v
+                            spl.i1, spl.i2 = i1, i2
+                            break
+                        k += 1
+            if best > 0:
+                spl.min_lo, spl.min_hi = True, False
+                return spl
+
+            best = 0
+            for d in range(bmax, bmin - 1, -2):
+                dd = d - bmid if d > bmid else bmid - d
+                i1 = kvdb[d + koff]
+                i2 = i1 - d
+                v = (lim1 - i1) + (lim2 - i2) - dd
+                if (v > _K_HEUR * ec and v > best
+                        and off1 < i1 <= lim1 - _SNAKE_CNT
+                        and off2 < i2 <= lim2 - _SNAKE_CNT):
+                    k = 0
+                    while ha1[i1 + k] == ha2[i2 + k]:
+                        if k == _SNAKE_CNT - 1:
+                            best = v
+                            spl.i1, spl.i2 = i1, i2
+                            break
+                        k += 1
+            if best > 0:
+                spl.min_lo, spl.min_hi = False, True
+                return spl
+
+        if ec >= mxcost:
+            fbest = fbest1 = -1
+            for d in range(fmax, fmin - 1, -2):
+                i1 = min(kvdf[d + koff], lim1)
+                i2 = i1 - d
+                if lim2 < i2:
+                    i1, i2 = lim2 + d, lim2
+                if fbest < i1 + i2:
+                    fbest = i1 + i2
+                    fbest1 = i1
+
+            bbest = bbest1 = _LINE_MAX
+            for d in range(bmax, bmin - 1, -2):
+                i1 = max(off1, kvdb[d + koff])
+                i2 = i1 - d
+                if i2 < off2:
+                    i1, i2 = off2 + d, off2
+                if i1 + i2 < bbest:
+                    bbest = i1 + i2
+                    bbest1 = i1
+
+            if (lim1 + lim2) - bbest < fbest - (off1 + off2):
+                spl.i1, spl.i2 = fbest1, fbest - fbest1
+                spl.min_lo, spl.min_hi = True, False
+            else:
+                spl.i1, spl.i2 = bbest1, bbest - bbest1
+                spl.min_lo, spl.min_hi = False, True
+            return spl
+
+
+def _recs_cmp(xdf1: _XdFile, xdf2: _XdFile, kvdf, kvdb, koff, mxcost) -> None:
+    ha1, ha2 = xdf1.reff, xdf2.reff
+    stack = [(0, len(ha1), 0, len(ha2), False)]
+    while stack:
+        off1, lim1, off2, lim2, need_min = stack.pop()
+        while off1 < lim1 and off2 < lim2 and ha1[off1] == ha2[off2]:
+            off1 += 1
+            off2 += 1
+        while off1 < lim1 and off2 < lim2 and ha1[lim1 - 1] == ha2[lim2 - 1]:
+            lim1 -= 1
+            lim2 -= 1
+
+        if off1 == lim1:
+            for k in range(off2, lim2):
+                xdf2.mark(xdf2.rindex[k], 1)
+        elif off2 == lim2:
+            for k in range(off1, lim1):
+                xdf1.mark(xdf1.rindex[k], 1)
+        else:
+            spl = _xdl_split(ha1, off1, lim1, ha2, off2, lim2, kvdf, kvdb, koff, need_min, mxcost)
+            # order doesn't matter for the result, both halves only mark their own ranges
+            stack.append((spl.i1, lim1, spl.i2, lim2, spl.min_hi))
+            stack.append((off1, spl.i1, off2, spl.i2, spl.min_lo))
+
+
+def _get_indent(rec: bytes) -> int:
+    ret = 0
+    for c in rec:
+        if c not in _GIT_SPACE:
+            return ret
+        if c == 0x20:
+            ret += 1
+        elif c == 0x09:
+            ret += 8 - ret % 8
+        if ret >= _MAX_INDENT:
+            return _MAX_INDENT
+    return -1
+
+
+def _measure_split(xdf: _XdFile, split: int) -> tuple[bool, int, int, int, int, int]:
+    if split >= xdf.nrec:
+        end_of_file, indent = True, -1
+    else:
+        end_of_file, indent = False, _get_indent(xdf.recs[split])
+
+    pre_blank, pre_indent = 0, -1
+    for i in range(split - 1, -1, -1):
+        pre_indent = _get_indent(xdf.recs[i])
+        if pre_indent != -1:
+            break
+        pre_blank += 1
+        if pre_blank == _MAX_BLANKS:
+            pre_indent = 0
+            break
+
+    post_blank, post_indent = 0, -1
+    for i in range(split + 1, xdf.nrec):
+        post_indent = _get_indent(xdf.recs[i])
+        if post_indent != -1:
+            break
+        post_blank += 1
+        if post_blank == _MAX_BLANKS:
+            post_indent = 0
+            break
+    return end_of_file, indent, pre_blank, pre_indent, post_blank, post_indent
+
+
+def _score_add_split(m, score: list[int]) -> None:
+    end_of_file, indent, pre_blank, pre_indent, post_blank, post_indent = m
+    if pre_indent == -1 and pre_blank == 0:
+        score[1] += _START_OF_FILE_PENALTY
+    if end_of_file:
+        score[1] += _END_OF_FILE_PENALTY
+
+    post_blank = 1 + post_blank if indent == -1 else 0
+    total_blank = pre_blank + post_blank
+    score[1] += _TOTAL_BLANK_WEIGHT * total_blank
+    score[1] += _POST_BLANK_WEIGHT * post_blank
+
+    if indent == -1:
+        indent = post_indent
+    any_blanks = total_blank != 0
+    score[0] += indent
+
+    if indent == -1 or pre_indent == -1:
+        pass
+    elif indent > pre_indent:
+        score[1] += _RELATIVE_INDENT_WITH_BLANK_PENALTY if any_blanks else _RELATIVE_INDENT_PENALTY
+    elif indent == pre_indent:
+        pass
+    elif post_indent != -1 and post_indent > indent:
+        score[1] += _RELATIVE_OUTDENT_WITH_BLANK_PENALTY if any_blanks else _RELATIVE_OUTDENT_PENALTY
+    else:
+        score[1] += _RELATIVE_DEDENT_WITH_BLANK_PENALTY if any_blanks else _RELATIVE_DEDENT_PENALTY
+
+
+def _score_cmp(s1: list[int], s2: list[int]) -> int:
+    cmp_indents = (s1[0] > s2[0]) - (s1[0] < s2[0])
+    return _INDENT_WEIGHT * cmp_indents + (s1[1] - s2[1])
+
+
+class _Group:
+    __slots__ = ("start", "end")
+
+    def __init__(self, xdf: _XdFile):
+        self.start = self.end = 0
+        while xdf.changed(self.end):
+            self.end += 1
+
+    def next(self, xdf: _XdFile) -> bool:
+        if self.end == xdf.nrec:
+            return False
+        self.start = self.end + 1
+        self.end = self.start
+        while xdf.changed(self.end):
+            self.end += 1
+        return True
+
+    def previous(self, xdf: _XdFile) -> bool:
+        if self.start == 0:
+            return False
+        self.end = self.start - 1
+        self.start = self.end
+        while xdf.changed(self.start - 1):
+            self.start -= 1
+        return True
+
+    def slide_down(self, xdf: _XdFile) -> bool:
+        if self.end < xdf.nrec and xdf.ha[self.start] == xdf.ha[self.end]:
+            xdf.mark(self.start, 0)
+            xdf.mark(self.end, 1)
+            self.start += 1
+            self.end += 1
+            while xdf.changed(self.end):
+                self.end += 1
+            return True
+        return False
+
+    def slide_up(self, xdf: _XdFile) -> bool:
+        if self.start > 0 and xdf.ha[self.start - 1] == xdf.ha[self.end - 1]:
+            self.start -= 1
+            self.end -= 1
+            xdf.mark(self.start, 1)
+            xdf.mark(self.end, 0)
+            while xdf.changed(self.start - 1):
+                self.start -= 1
+            return True
+        return False
+
+
+def _change_compact(xdf: _XdFile, xdfo: _XdFile) -> None:
+    g = _Group(xdf)
+    go = _Group(xdfo)
+    while True:
+        if g.end != g.start:
+            while True:
+                groupsize = g.end - g.start
+                end_matching_other = -1
+                while g.slide_up(xdf):
+                    go.previous(xdfo)
+                earliest_end = g.end
+                if go.end > go.start:
+                    end_matching_other = g.end
+                while g.slide_down(xdf):
+                    go.next(xdfo)
+                    if go.end > go.start:
+                        end_matching_other = g.end
+                if groupsize == g.end - g.start:
+                    break
+
+            if g.end == earliest_end:
+                pass
+            elif end_matching_other != -1:
+                while go.end == go.start:
+                    g.slide_up(xdf)
+                    go.previous(xdfo)
+            else:
+                shift = max(earliest_end, g.end - groupsize - 1, g.end - _INDENT_HEURISTIC_MAX_SLIDING)
+                best_shift = -1
+                best_score = [0, 0]
+                while shift <= g.end:
+                    score = [0, 0]
+                    _score_add_split(_measure_split(xdf, shift), score)
+                    _score_add_split(_measure_split(xdf, shift - groupsize), score)
+                    if best_shift == -1 or _score_cmp(score, best_score) <= 0:
+                        best_score = score
+                        best_shift = shift
+                    shift += 1
+                while g.end > best_shift:
+                    g.slide_up(xdf)
+                    go.previous(xdfo)
+
+        if not g.next(xdf):
+            break
+        go.next(xdfo)
+
+
+def _build_script(xdf1: _XdFile, xdf2: _XdFile) -> list[tuple[int, int, int, int]]:
+    script = []
+    i1, i2 = xdf1.nrec, xdf2.nrec
+    while i1 >= 0 or i2 >= 0:
+        if xdf1.changed(i1 - 1) or xdf2.changed(i2 - 1):
+            l1, l2 = i1, i2
+            while xdf1.changed(i1 - 1):
+                i1 -= 1
+            while xdf2.changed(i2 - 1):
+                i2 -= 1
+            script.append((i1, i2, l1 - i1, l2 - i2))
+        i1 -= 1
+        i2 -= 1
+    script.reverse()
+    return script
+
+
+def xdiff(a: list[bytes], b: list[bytes]) -> tuple[_XdFile, _XdFile, list[tuple[int, int, int, int]]]:
+    """Compute git's edit script as (i1, i2, chg1, chg2) change atoms."""
+    xdf1, xdf2 = _prepare(a, b)
+    nreff1, nreff2 = len(xdf1.reff), len(xdf2.reff)
+    ndiags = nreff1 + nreff2 + 3
+    kvdf = [0] * ndiags
+    kvdb = [0] * ndiags
+    mxcost = max(_bogosqrt(ndiags), _MAX_COST_MIN)
+    _recs_cmp(xdf1, xdf2, kvdf, kvdb, nreff2 + 1, mxcost)
+    _change_compact(xdf1, xdf2)
+    _change_compact(xdf2, xdf1)
+    return xdf1, xdf2, _build_script(xdf1, xdf2)
+
+
+def _def_ff(rec: bytes) -> bytes | None:
+    if rec and (65 <= rec[0] <= 90 or 97 <= rec[0] <= 122 or rec[0] in b"_$"):
+        line = rec[:_FUNC_LINE_MAX]
+        end = len(line)
+        while end > 0 and line[end - 1] in _GIT_SPACE:
+            end -= 1
+        return line[:end]
+    return None
+
+
+def _regex_ff(regexes: list[tuple[bool, re.Pattern]]):
+    def ff(rec: bytes) -> bytes | None:
+        line = rec
+        if line.endswith(b"\n"):
+            line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+        for negate, regex in regexes:
+            if m := regex.search(line):
+                if negate:
+                    return None
+                found = m.group(1) if m.re.groups and m.group(1) is not None else m.group(0)
+                found = found[:_FUNC_LINE_MAX]
+                end = len(found)
+                while end > 0 and found[end - 1] in _GIT_SPACE:
+                    end -= 1
+                return found[:end]
+        return None
+    return ff
+
+
+def _range(start: int, count: int) -> bytes:
+    if count == 1:
+        return b"%d" % start
+    return b"%d,%d" % (start if count else start - 1, count)
+
+
+def unified_hunks(old: bytes, new: bytes, funcname=_def_ff, context: int = CONTEXT_LINES) -> bytes:
+    """Hunks of `git diff` for two blobs (everything after the `+++` header)."""
+    xdf1, xdf2, script = xdiff(_split_lines(old), _split_lines(new))
+    out: list[bytes] = []
+
+    def emit(prefix: bytes, rec: bytes) -> None:
+        out.append(prefix + rec)
+        if not rec.endswith(b"\n"):
+            out.append(b"\n\\ No newline at end of file\n")
+
+    func_line = b""
+    funclineprev = -1
+    idx = 0
+    while idx < len(script):
+        first = idx
+        while idx + 1 < len(script):
+            prev, nxt = script[idx], script[idx + 1]
+            if nxt[0] - (prev[0] + prev[2]) > 2 * context:
+                break
+            idx += 1
+        last = idx
+        idx += 1
+
+        xch, xche = script[first], script[last]
+        s1 = max(xch[0] - context, 0)
+        s2 = max(xch[1] - context, 0)
+        lctx = min(context, xdf1.nrec - (xche[0] + xche[2]), xdf2.nrec - (xche[1] + xche[3]))
+        e1 = xche[0] + xche[2] + lctx
+        e2 = xche[1] + xche[3] + lctx
+
+        # search the old file backwards for a function line, keeping the previous one if none found
+        line = s1 - 1
+        while line != funclineprev and 0 <= line < xdf1.nrec:
+            if (found := funcname(xdf1.recs[line])) is not None:
+                func_line = found
+                break
+            line -= 1
+        funclineprev = s1 - 1
+
+        header = b"@@ -" + _range(s1 + 1, e1 - s1) + b" +" + _range(s2 + 1, e2 - s2) + b" @@"
+        if func_line:
+            header += b" " + func_line
+        out.append(header + b"\n")
+
+        while s2 < xch[1]:
+            emit(b" ", xdf2.recs[s2])
+            s2 += 1
+        s1, s2 = xch[0], xch[1]
+        for k in range(first, last + 1):
+            i1, i2, chg1, chg2 = script[k]
+            while s1 < i1 and s2 < i2:
+                emit(b" ", xdf2.recs[s2])
+                s1 += 1
+                s2 += 1
+            for s1 in range(i1, i1 + chg1):
+                emit(b"-", xdf1.recs[s1])
+            for s2 in range(i2, i2 + chg2):
+                emit(b"+", xdf2.recs[s2])
+            s1, s2 = i1 + chg1, i2 + chg2
+        for s2 in range(xche[1] + xche[3], e2):
+            emit(b" ", xdf2.recs[s2])
+    return b"".join(out)
+
+
+# ---------------------------------------------------------------------------
+# git diff output
+# ---------------------------------------------------------------------------
+
+_CQ_ESCAPES = {7: "a", 8: "b", 9: "t", 10: "n", 11: "v", 12: "f", 13: "r", 34: '"', 92: "\\"}
+
+
+def quote_path(prefix: str, path: str) -> bytes:
+    """C-style quoting as done by git with core.quotePath enabled."""
+    raw = (prefix + path).encode("utf-8", errors="surrogateescape")
+    if not any(c < 0x20 or c >= 0x7f or c in (34, 92) for c in raw):
+        return raw
+    out = bytearray(b'"')
+    for c in raw:
+        if c in _CQ_ESCAPES:
+            out += b"\\" + _CQ_ESCAPES[c].encode()
+        elif c < 0x20 or c >= 0x7f:
+            out += b"\\%03o" % c
+        else:
+            out.append(c)
+    out += b'"'
+    return bytes(out)
+
+
+def _abbrev(oids: Iterable[str], length: int = DEFAULT_ABBREV) -> dict[str, str]:
+    """Shortest unique prefixes (at least `length`) among the given object ids."""
+    unique = sorted(set(oids) - {NULL_OID})
+    result = {NULL_OID: NULL_OID[:length]}
+    for i, oid in enumerate(unique):
+        n = length
+        for neighbour in (unique[i - 1] if i else None, unique[i + 1] if i + 1 < len(unique) else None):
+            if neighbour is not None:
+                common = 0
+                while common < 40 and oid[common] == neighbour[common]:
+                    common += 1
+                n = max(n, common + 1)
+        result[oid] = oid[:n]
+    return result
+
+
+def diff_trees(old: Mapping[str, GitFile], new: Mapping[str, GitFile], attributes: GitAttributes | None = None) -> str:
+    """Render `git diff` between two trees (files present in only one side are added/deleted)."""
+    attributes = attributes or GitAttributes(new)
+    paths = sorted(set(old) | set(new), key=lambda p: p.encode("utf-8", errors="surrogateescape"))
+    abbrev = _abbrev([f.oid for f in old.values()] + [f.oid for f in new.values()])
+    funcnames: dict[str, object] = {}
+    out: list[bytes] = []
+
+    for path in paths:
+        one, two = old.get(path), new.get(path)
+        if one is not None and two is not None and one == two:
+            continue
+        a_name, b_name = quote_path("a/", path), quote_path("b/", path)
+        out.append(b"diff --git " + a_name + b" " + b_name + b"\n")
+        if one is None:
+            out.append(b"new file mode " + two.mode.encode() + b"\n")
+        elif two is None:
+            out.append(b"deleted file mode " + one.mode.encode() + b"\n")
+        elif one.mode != two.mode:
+            out.append(b"old mode " + one.mode.encode() + b"\nnew mode " + two.mode.encode() + b"\n")
+
+        oid1 = one.oid if one else NULL_OID
+        oid2 = two.oid if two else NULL_OID
+        if oid1 == oid2:
+            continue
+        index = b"index " + abbrev[oid1].encode() + b".." + abbrev[oid2].encode()
+        if one is not None and two is not None and one.mode == two.mode:
+            index += b" " + one.mode.encode()
+        out.append(index + b"\n")
+
+        lbl1 = a_name if one else b"/dev/null"
+        lbl2 = b_name if two else b"/dev/null"
+        content1 = one.content if one else b""
+        content2 = two.content if two else b""
+        attr = attributes.diff_attr(path)
+        if attr is False or (attr is not True and (
+            (one is not None and one.is_binary) or (two is not None and two.is_binary)
+        )):
+            out.append(b"Binary files " + lbl1 + b" and " + lbl2 + b" differ\n")
+            continue
+
+        if isinstance(attr, str):
+            if attr not in funcnames:
+                regexes = _compile_funcname(attr)
+                funcnames[attr] = _regex_ff(regexes) if regexes else _def_ff
+            funcname = funcnames[attr]
+        else:
+            funcname = _def_ff
+        hunks = unified_hunks(content1, content2, funcname)
+        if hunks:
+            out.append(b"--- " + lbl1 + (b"\t" if b" " in lbl1 else b"") + b"\n")
+            out.append(b"+++ " + lbl2 + (b"\t" if b" " in lbl2 else b"") + b"\n")
+            out.append(hunks)
+    return b"".join(out).decode("utf-8", errors="replace")
+
+
+def diff_overlay(base: Mapping[str, str | bytes | GitFile], *layers: Mapping[str, str | bytes | GitFile], exclude=None) -> str:
+    """
+    Diff of committing `base` and then overlaying `layers` on the working tree, i.e. what
+
+        git add . && git commit; cp -r layers/* .; git add . && git diff HEAD
+
+    prints. Overlays never delete files, ignored files are only picked up when already tracked.
+    """
+    base_tree = as_tree(base)
+    if exclude is not None:
+        base_tree = {p: f for p, f in base_tree.items() if not exclude(p)}
+    head = tracked(base_tree)
+    worktree = dict(base_tree)
+    for layer in layers:
+        worktree.update(as_tree(layer))
+    if exclude is not None:
+        worktree = {p: f for p, f in worktree.items() if not exclude(p)}
+    index = tracked(worktree, already_tracked=head)
+    return diff_trees(head, index, GitAttributes(worktree))
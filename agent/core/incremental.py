@@ -0,0 +1,265 @@
+"""
+Change-scoped validation for beam steps.
+
+A beam step usually touches a handler or two, yet every check re-ran tsc, pyright
+and the whole test suite. When the parent node already passed a check (its
+result is in core.check_cache), only the files changed since the parent can
+introduce new failures, so the check can be narrowed to:
+
+- the files that import a changed file, directly or transitively (pyright), and
+- the tests among them (bun test, pytest).
+
+Dependencies come from an import graph parsed on the host from the exported
+sources. Anything the graph can't vouch for falls back to the full run: a root
+node, a parent that didn't pass or isn't in memory, a changed file outside the
+parsed sources (package.json, configs, removed files...). Files with imports that
+can't be resolved are always treated as affected.
+
+tsc needs no scoping, it keeps its build info in a cache volume mounted across
+steps and only re-checks what changed. INCREMENTAL_CHECKS=0 disables all of it.
+"""
+
+import fnmatch
+import os
+import posixpath
+import re
+import tempfile
+import tomllib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Literal
+import anyio
+import anyio.to_thread
+from core.actors import BaseData
+from core.base_node import Node
+from core.check_cache import cached_result
+from core.git_diff import read_tree
+from core.workspace import Workspace
+from log import get_logger
+
+logger = get_logger(__name__)
+
+ENABLED = os.getenv("INCREMENTAL_CHECKS", "1") != "0"
+
+TSC_CACHE_PATH = "/tmp/tsc-cache"
+TSC_CACHE_VOLUME = "tsc-build-info"
+
+Language = Literal["typescript", "python"]
+
+_TS_EXTENSIONS = (".ts", ".tsx", ".mts", ".cts", ".d.ts", ".js", ".jsx")
+_TS_IMPORT = re.compile(
+    r"""(?:\bimport\s+(?:[\w*{}\s,$]+?\s+from\s+)?|\bexport\s+[\w*{}\s,$]*?\s+from\s+|\bimport\s*\(\s*|\brequire\s*\(\s*)["']([^"']+)["']"""
+)
+_PY_IMPORT = re.compile(
+    r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+(?:\(([^)]*)\)|([\w*, ]+))|import\s+([\w., ]+))", re.MULTILINE
+)
+
+
+def tsc_incremental(command: list[str], name: str) -> list[str]:
+    """tsc command keeping its build info under `name` in the cache volume."""
+    if not ENABLED:
+        return command
+    return [*command, "--incremental", "--tsBuildInfoFile", f"{TSC_CACHE_PATH}/{name}.tsbuildinfo"]
+
+
+def tsc_caches() -> dict[str, str]:
+    return {TSC_CACHE_PATH: TSC_CACHE_VOLUME} if ENABLED else {}
+
+
+@dataclass
+class ImportGraph:
+    # file -> local files it imports
+    imports: dict[str, set[str]] = field(default_factory=dict)
+    # files with local imports that couldn't be resolved
+    uncertain: set[str] = field(default_factory=set)
+
+    @classmethod
+    def parse(cls, files: dict[str, str], language: Language, aliases: dict[str, str] = {}) -> "ImportGraph":
+        graph = cls()
+        resolve = _resolve_ts if language == "typescript" else _resolve_py
+        for path, content in files.items():
+            targets, ok = resolve(path, content, files, aliases)
+            graph.imports[path] = targets
+            if not ok:
+                graph.uncertain.add(path)
+        if language == "python":
+            # pytest imports conftest.py of the test directory and its parents implicitly
+            for path in files:
+                if _is_test(path, language):
+                    graph.imports[path] |= {
+                        conftest for parent in _parent_dirs(path)
+                        if (conftest := posixpath.join(parent, "conftest.py")) in files
+                    }
+        return graph
+
+    def dependents(self, changed: Iterable[str]) -> set[str]:
+        """Changed files and every file importing them transitively, uncertain files included."""
+        reverse: dict[str, set[str]] = {}
+        for path, targets in self.imports.items():
+            for target in targets:
+                reverse.setdefault(target, set()).add(path)
+        seen = set(changed) | self.uncertain
+        stack = list(seen)
+        while stack:
+            for dependent in reverse.get(stack.pop(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+        return seen
+
+
+def _suffixes(language: Language) -> tuple[str, ...]:
+    return (".py",) if language == "python" else _TS_EXTENSIONS
+
+
+def _parent_dirs(path: str) -> list[str]:
+    parents = []
+    while (path := posixpath.dirname(path)):
+        parents.append(path)
+    return [*parents, ""]
+
+
+def _is_test(path: str, language: Language) -> bool:
+    name = posixpath.basename(path)
+    if language == "typescript":
+        return re.search(r"\.(test|spec)\.[cm]?[jt]sx?$", name) is not None
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _resolve_ts(path: str, content: str, files: dict[str, str], aliases: dict[str, str]) -> tuple[set[str], bool]:
+    targets, ok = set(), True
+    for spec in _TS_IMPORT.findall(content):
+        for alias, target in aliases.items():
+            if spec.startswith(alias):
+                spec = target + spec[len(alias):]
+                break
+        else:
+            if not spec.startswith("."):
+                continue  # package import
+            spec = posixpath.join(posixpath.dirname(path), spec)
+        spec = posixpath.normpath(spec)
+        stem = re.sub(r"\.[cm]?jsx?$", "", spec)  # bundler resolution maps ./x.js to ./x.ts
+        candidates = [spec, *(stem + ext for ext in _TS_EXTENSIONS), *(f"{spec}/index{ext}" for ext in _TS_EXTENSIONS)]
+        if (found := next((c for c in candidates if c in files), None)) is not None:
+            targets.add(found)
+        elif not re.search(r"\.(css|scss|svg|png|jpe?g|gif|json)$", spec):
+            ok = False
+    return targets, ok
+
+
+def _resolve_py(path: str, content: str, files: dict[str, str], aliases: dict[str, str]) -> tuple[set[str], bool]:
+    def module_files(module: str) -> list[str]:
+        base = module.replace(".", "/")
+        parts = base.split("/")
+        # importing a.b.c runs the __init__ of every parent package
+        found = [init for i in range(1, len(parts)) if (init := "/".join(parts[:i]) + "/__init__.py") in files]
+        found += [f for f in (f"{base}.py", f"{base}/__init__.py") if f in files]
+        return found
+
+    targets, ok = set(), True
+    package = posixpath.dirname(path).replace("/", ".")
+    for from_module, grouped, names, plain in _PY_IMPORT.findall(content):
+        if plain:
+            for module in plain.split(","):
+                targets.update(module_files(module.split(" as ")[0].strip()))
+            continue
+        level = len(from_module) - len(from_module.lstrip("."))
+        module = from_module.lstrip(".")
+        if level:
+            base = package.split(".") if package else []
+            if level - 1 > len(base):
+                ok = False
+                continue
+            module = ".".join([*base[: len(base) - (level - 1)], *([module] if module else [])])
+        found = module_files(module) if module else []
+        # a relative import always names a local module, it has to resolve
+        own = module.replace(".", "/")
+        if level and not {f"{own}.py", f"{own}/__init__.py"} & set(found):
+            ok = False
+        # `from pkg import name` may import the submodule pkg.name
+        for name in re.split(r"[\s,]+", grouped or names):
+            if name and name not in ("*", "as"):
+                found += module_files(f"{module}.{name}" if module else name)
+        targets.update(found)
+    return targets, ok
+
+
+def changed_files(node: Node[BaseData]) -> set[str] | None:
+    """Files written since the parent node, None for a root."""
+    if node.parent is None:
+        return None
+    return set(node.data.files)
+
+
+async def passed_on_parent(check: Callable, node: Node[BaseData], *args: Any) -> bool:
+    """Whether the parent state is known to pass the cached check (see core.check_cache) with these arguments."""
+    parent = node.parent
+    if parent is None or not parent.data.is_materialized:
+        return False
+    found, result = await cached_result(check, parent, *args)
+    return found and result is None
+
+
+async def load_graph(
+    workspace: Workspace, roots: list[str], language: Language, aliases: dict[str, str] = {}
+) -> tuple[ImportGraph, set[str]]:
+    """Import graph of the sources under the roots and the set of parsed files, fetched in one export."""
+    suffixes = _suffixes(language)
+    include = [pattern for root in roots for pattern in (root, f"{root}/**")]
+    with tempfile.TemporaryDirectory() as tmp:
+        await workspace.container().directory(".").filter(include=include).export(tmp)
+        tree = await anyio.to_thread.run_sync(read_tree, tmp)
+    files = {
+        path: file.content.decode(errors="replace")
+        for path, file in tree.items()
+        if path.endswith(suffixes) and "node_modules/" not in path
+    }
+    return ImportGraph.parse(files, language, aliases), set(files)
+
+
+async def affected_files(
+    check: Callable,
+    node: Node[BaseData],
+    *args: Any,
+    roots: list[str],
+    language: Language,
+    aliases: dict[str, str] = {},
+) -> tuple[set[str], set[str]] | None:
+    """
+    Files a check has to look at given it passed on the parent, and all parsed files.
+    None when the check has to run in full.
+    """
+    if not ENABLED or (changed := changed_files(node)) is None:
+        return None
+    if not await passed_on_parent(check, node, *args):
+        return None
+    graph, parsed = await load_graph(node.data.workspace, roots, language, aliases)
+    # removed files are outside too, their importers are unknown now
+    if outside := changed - parsed:
+        logger.info(f"Full run, changes outside the import graph: {sorted(outside)[:5]}")
+        return None
+    affected = graph.dependents(changed)
+    logger.info(f"Incremental run: {len(changed)} changed, {len(affected)} of {len(parsed)} files affected")
+    return affected, parsed
+
+
+async def pyright_targets(workspace: Workspace, affected: set[str]) -> list[str]:
+    """Affected python files minus the ones pyright is configured to skip, files on the command line bypass the config."""
+    try:
+        config = tomllib.loads(await workspace.read_file("pyproject.toml")).get("tool", {}).get("pyright", {})
+    except (FileNotFoundError, tomllib.TOMLDecodeError):
+        config = {}
+    excluded = [pattern.removeprefix("./").rstrip("/") for pattern in config.get("exclude", [])]
+    return sorted(
+        path for path in affected
+        if path.endswith(".py") and not any(
+            fnmatch.fnmatch(path, pattern) or path.startswith(f"{pattern}/") for pattern in excluded
+        )
+    )
+
+
+def affected_tests(affected: set[str], language: Language, strip: str = "") -> list[str]:
+    """Test files among the affected ones, relative to `strip` (the directory the runner works in)."""
+    return sorted(
+        path.removeprefix(strip) for path in affected if _is_test(path, language) and path.startswith(strip)
+    )
+
@@ -0,0 +1,103 @@
+"""
+Concurrent execution of the tool calls of one model turn.
+
+Models often emit several read_file / edit_file calls in a turn and each of
+them may need a round trip to the container. Calls are independent unless they
+touch the same path and at least one of them writes it, so every call declares
+an Effect (the paths it reads and writes, or exclusive for anything that can see
+the whole workspace such as running checks or installing packages). A call
+waits only for the earlier calls it conflicts with, which keeps the sequential
+semantics for conflicting calls while independent reads and disjoint-path
+writes run concurrently. Results come back in the order of the calls.
+
+PARALLEL_TOOLS=0 runs every call exclusively, i.e. one after the other.
+"""
+
+import os
+import posixpath
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Sequence, TypeVar
+import anyio
+from log import get_logger
+
+logger = get_logger(__name__)
+
+ENABLED = os.getenv("PARALLEL_TOOLS", "1") != "0"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def _normalize(path: str) -> str:
+    return posixpath.normpath(path.removeprefix("./"))
+
+
+def _overlaps(a: str, b: str) -> bool:
+    # a path conflicts with itself and with anything below it
+    return a == b or a.startswith(f"{b}/") or b.startswith(f"{a}/")
+
+
+@dataclass(frozen=True)
+class Effect:
+    reads: frozenset[str] = frozenset()
+    writes: frozenset[str] = frozenset()
+    exclusive: bool = False
+
+    @classmethod
+    def read(cls, *paths: str) -> "Effect":
+        return cls(reads=frozenset(map(_normalize, paths)))
+
+    @classmethod
+    def write(cls, *paths: str) -> "Effect":
+        return cls(writes=frozenset(map(_normalize, paths)))
+
+    def conflicts(self, other: "Effect") -> bool:
+        if self.exclusive or other.exclusive:
+            return True
+        pairs = [(self.writes, other.writes), (self.writes, other.reads), (self.reads, other.writes)]
+        return any(_overlaps(a, b) for left, right in pairs for a in left for b in right)
+
+
+PURE = Effect()
+EXCLUSIVE = Effect(exclusive=True)
+
+
+def dependencies(effects: Sequence[Effect]) -> list[list[int]]:
+    """Indices of the earlier calls each call has to wait for."""
+    return [[j for j in range(i) if effects[j].conflicts(effect)] for i, effect in enumerate(effects)]
+
+
+async def execute(
+    calls: Sequence[T],
+    effect: Callable[[T], Effect],
+    run: Callable[[T], Awaitable[R]],
+    enabled: bool | None = None,
+) -> list[R]:
+    """Run the calls as their effects allow, results in call order."""
+    if not (ENABLED if enabled is None else enabled) or len(calls) < 2:
+        return [await run(call) for call in calls]
+
+    deps = dependencies([effect(call) for call in calls])
+    done = [anyio.Event() for _ in calls]
+    results: list[R | None] = [None] * len(calls)
+
+    async def run_one(i: int):
+        try:
+            for j in deps[i]:
+                await done[j].wait()
+            results[i] = await run(calls[i])
+        finally:
+            done[i].set()
+
+    if any(deps):
+        logger.debug(f"Tool call dependencies: {deps}")
+    try:
+        async with anyio.create_task_group() as tg:
+            for i in range(len(calls)):
+                tg.start_soon(run_one, i)
+    except BaseExceptionGroup as group:
+        # a single failure surfaces as itself, as it would running the calls one by one
+        if len(group.exceptions) == 1:
+            raise group.exceptions[0]
+        raise
+    return results  # pyright: ignore[reportReturnType]
@@ -0,0 +1,230 @@
+"""
+Persistent key-value storage engines.
+
+Both engines behave like a dict of key -> JSON value, keep only a key index in
+memory and persist every write as a single append instead of rewriting the whole
+file:
+
+- AppendLogStorage: append-only JSON lines file, the index maps keys to byte
+  offsets; torn trailing records from crashes are dropped on open, stale records
+  are removed by compaction (rewrite to a temp file + atomic rename), which only
+  runs on request since other processes may be appending to the file
+- SqliteStorage: single table in WAL mode, compaction is VACUUM
+
+Used by the LLM response caches (llm.cache_storage), the check cache and the API session store.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Iterator
+from collections.abc import MutableMapping
+from pathlib import Path
+import os
+import sqlite3
+import tempfile
+import ujson as json
+
+from log import get_logger
+
+logger = get_logger(__name__)
+
+TOMBSTONE = "__deleted__"
+
+
+class CacheStorage(MutableMapping[str, Any], ABC):
+    path: Path
+
+    @abstractmethod
+    def compact(self) -> None: ...
+
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def wipe(self) -> None: ...
+
+
+class AppendLogStorage(CacheStorage):
+    """JSON lines log with an in-memory key -> (offset, length) index."""
+
+    def __init__(self, path: str | Path, fsync: bool = True):
+        self.path = Path(path)
+        self.fsync = fsync
+        self._index: dict[str, tuple[int, int]] = {}
+        self._records = 0
+        self._fd: int | None = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._open()
+
+    def _open(self) -> None:
+        self._index.clear()
+        self._records = 0
+        valid_end = 0
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                offset = 0
+                for line in f:
+                    length = len(line)
+                    if not line.endswith(b"\n"):
+                        logger.warning(f"dropping torn record at {self.path}:{offset}")
+                        break
+                    try:
+                        record = json.loads(line)
+                        key = record["key"]
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"dropping corrupt record at {self.path}:{offset}")
+                        break
+                    if record.get(TOMBSTONE):
+                        self._index.pop(key, None)
+                    else:
+                        self._index[key] = (offset, length)
+                    self._records += 1
+                    offset += length
+                    valid_end = offset
+            if valid_end != self.path.stat().st_size:
+                os.truncate(self.path, valid_end)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def _append(self, record: dict) -> tuple[int, int]:
+        assert self._fd is not None
+        data = json.dumps(record, ensure_ascii=False).encode() + b"\n"
+        # single O_APPEND write per record so concurrent writers (e.g. xdist workers) never interleave lines
+        written = os.write(self._fd, data)
+        while written < len(data):
+            written += os.write(self._fd, data[written:])
+        if self.fsync:
+            os.fsync(self._fd)
+        self._records += 1
+        return os.lseek(self._fd, 0, os.SEEK_CUR) - len(data), len(data)
+
+    def __getitem__(self, key: str) -> Any:
+        offset, length = self._index[key]
+        assert self._fd is not None
+        return json.loads(os.pread(self._fd, length, offset))["entry"]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._index[key] = self._append({"key": key, "entry": value})
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._index:
+            raise KeyError(key)
+        self._append({"key": key, TOMBSTONE: True})
+        del self._index[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._index))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def stale_records(self) -> int:
+        return self._records - len(self._index)
+
+    def compact(self) -> None:
+        """
+        Rewrite the log without stale records.
+
+        Not safe while other processes write the file (xdist workers, a shared CHECK_CACHE_PATH): they
+        keep appending to the replaced file and those records are lost. Run it from `compact_cache`.
+        """
+        assert self._fd is not None
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for offset, length in sorted(self._index.values()):
+                    out.write(os.pread(self._fd, length, offset))
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        os.close(self._fd)
+        self._open()
+
+    def wipe(self) -> None:
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self._open()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SqliteStorage(CacheStorage):
+    """SQLite table in WAL mode with the key set mirrored in memory."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn: sqlite3.Connection | None = None
+        self._keys: set[str] = set()
+        self._open()
+
+    def _open(self) -> None:
+        self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        self._keys = {row[0] for row in self._conn.execute("SELECT key FROM entries")}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        assert self._conn is not None
+        return self._conn
+
+    def __getitem__(self, key: str) -> Any:
+        row = self.conn.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, entry) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+        self._keys.add(key)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._keys:
+            raise KeyError(key)
+        self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self._keys.discard(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update_many(self, items: dict[str, Any]) -> None:
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, entry) VALUES (?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in items.items()],
+            )
+        self._keys.update(items)
+
+    def compact(self) -> None:
+        self.conn.execute("VACUUM")
+
+    def wipe(self) -> None:
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+        self._open()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,8 +1,11 @@
 import jinja2
 import logging
-import anyio
 from typing import Callable, Awaitable
 from core.base_node import Node
+from core.check_cache import cached_check
+from core.check_scheduler import Check, format_errors
+from core import check_scheduler
+from core import incremental
 from core.workspace import Workspace
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
 from llm.common import AsyncLLM, Message, TextRaw, ToolUse, ToolUseResult
@@ -218,12 +221,12 @@ class LaravelActor(FileOperationsActor):
 
     def select(self, node: Node[BaseData]) -> list[Node[BaseData]]:
         candidates = []
-        all_children = node.get_all_children()
-        for n in all_children:
-            if n.is_leaf and n.depth <= self.max_depth:
+        tree_size = node.subtree_size
+        for n in node.get_leaves():
+            if n.depth <= self.max_depth:
                 if n.data.should_branch:
                     effective_beam_width = (
-                        1 if len(all_children) > (n.depth + 1) else self.beam_width
+                        1 if tree_size > (n.depth + 1) else self.beam_width
                     )  # meaning we already branched once
                     logger.info(
                         f"Selecting candidates with effective beam width: {effective_beam_width}, current depth: {n.depth}/{self.max_depth}"
@@ -234,15 +237,18 @@ class LaravelActor(FileOperationsActor):
         logger.info(f"Selected {len(candidates)} leaf nodes for evaluation")
         return candidates
 
+    @cached_check
     async def run_ts_type_checks(self, node: Node[BaseData]) -> str | None:
         # CRITICAL: Ziggy-js causes typecheck to fail, agent fixes this but template has to be updated
         type_check_result = await node.data.workspace.exec(
-            ["npm", "run", "types"]
+            incremental.tsc_incremental(["npm", "run", "types", "--"], "laravel"),
+            caches=incremental.tsc_caches(),
         )
         if type_check_result.exit_code != 0:
             return f"{type_check_result.stdout}\n{type_check_result.stderr}"
         return None
 
+    @cached_check
     async def run_ts_lint_checks(self, node: Node[BaseData]) -> str | None:
         ts_lint_result = await node.data.workspace.exec(
             ["npm", "run", "lint"]
@@ -251,6 +257,7 @@ class LaravelActor(FileOperationsActor):
             return f"{ts_lint_result.stdout}\n{ts_lint_result.stderr}"
         return None
 
+    @cached_check
     async def run_php_lint_checks(self, node: Node[BaseData]) -> str | None:
         php_lint_result = await node.data.workspace.exec(
             ["composer", "lint"]
@@ -259,8 +266,9 @@ class LaravelActor(FileOperationsActor):
             return f"{php_lint_result.stdout}\n{php_lint_result.stderr}"
         return None
 
+    @cached_check
     async def run_tests(self, node: Node[BaseData]) -> str | None:
-        composer_result = await run_tests(node.data.workspace.ctr)
+        composer_result = await run_tests(node.data.workspace.container())
         if composer_result.exit_code != 0:
             return f"{composer_result.stdout}\n{composer_result.stderr}"
         return None
@@ -282,49 +290,30 @@ class LaravelActor(FileOperationsActor):
             return "Migration syntax errors found:\n" + "\n".join(migration_errors)
         
         # If syntax is valid, run the migrations
-        migrations_result = await run_migrations(node.data.workspace.client, node.data.workspace.ctr)
+        return await self.run_migrations_apply_checks(node)
+
+    @cached_check
+    async def run_migrations_apply_checks(self, node: Node[BaseData]) -> str | None:
+        migrations_result = await run_migrations(node.data.workspace.client, node.data.workspace.container())
         if migrations_result.exit_code != 0:
             return f"{migrations_result.stdout}\n{migrations_result.stderr}"
         return None
 
-    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
+    async def run_checks(
+        self, node: Node[BaseData], user_prompt: str, fail_fast: bool = check_scheduler.FAIL_FAST
+    ) -> str | None:
         await notify_stage(self.event_callback, "🔍 Running validation checks", "in_progress")
 
-        all_errors = ""
-        results = {}
-
-        async with anyio.create_task_group() as tg:
-
-            async def run_and_store(key, coro):
-                """Helper to run a coroutine and store its result in the results dict."""
-                try:
-                    results[key] = await coro
-                except Exception as e:
-                    # Catch unexpected exceptions during check execution
-                    logger.error(f"Error running check {key}: {e}")
-                    results[key] = f"Internal error running check {key}: {e}"
-
-            tg.start_soon(run_and_store, "ts_lint", self.run_ts_lint_checks(node))
-            tg.start_soon(run_and_store, "php_lint", self.run_php_lint_checks(node))
-            tg.start_soon(run_and_store, "ts_type_check", self.run_ts_type_checks(node))
-            tg.start_soon(run_and_store, "tests", self.run_tests(node))
-            tg.start_soon(run_and_store, "migrations", self.run_migrations_checks(node))
-
-        if ts_lint_result := results.get("ts_lint"):
-            logger.info(f"TypeScript lint checks failed: {ts_lint_result}")
-            all_errors += f"TypeScript lint errors:\n{ts_lint_result}\n"
-        if php_lint_result := results.get("php_lint"):
-            logger.info(f"PHP lint checks failed: {php_lint_result[:200]}...")
-            all_errors += f"{php_lint_result}\n"
-        if ts_type_check_result := results.get("ts_type_check"):
-            logger.info(f"TypeScript type checks failed: {ts_type_check_result}")
-            all_errors += f"TypeScript type errors:\n{ts_type_check_result}\n"
-        if tests_result := results.get("tests"):
-            logger.info(f"Tests failed: {tests_result}")
-            all_errors += f"Test errors:\n{tests_result}\n"
-        if migrations_result := results.get("migrations"):
-            logger.info(f"Migrations failed: {migrations_result}")
-            all_errors += f"Migrations errors:\n{migrations_result}\n"
+        failures = await check_scheduler.run_checks([
+            Check("laravel/ts_lint", lambda: self.run_ts_lint_checks(node), "TypeScript lint errors", cost=5),
+            Check("laravel/php_lint", lambda: self.run_php_lint_checks(node), cost=3),
+            Check("laravel/ts_type_check", lambda: self.run_ts_type_checks(node), "TypeScript type errors", cost=10),
+            Check("laravel/tests", lambda: self.run_tests(node), "Test errors", cost=30),
+            Check("laravel/migrations", lambda: self.run_migrations_checks(node), "Migrations errors", cost=15),
+        ], fail_fast=fail_fast)
+        for check, error in failures:
+            logger.info(f"Check {check.name} failed: {error[:200]}...")
+        all_errors = format_errors(failures)
 
         if all_errors:
             await notify_stage(self.event_callback, "❌ Validation checks failed - fixing issues", "failed")
@@ -358,7 +347,8 @@ class LaravelActor(FileOperationsActor):
         
         # Combine and deduplicate
         all_dirs = list(set(directories_to_check + additional_dirs))
-        
+        await workspace.preload(dirs=all_dirs)
+
         for dir_path in all_dirs:
             try:
                 dir_files = await workspace.ls(dir_path)
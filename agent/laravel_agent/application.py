@@ -1,11 +1,12 @@
 import os
 import anyio
+import anyio.to_thread
 import logging
 import enum
 from typing import Dict, Self, Optional, Literal, Any
 from dataclasses import dataclass, field
 from core.statemachine import StateMachine, State, Context
-from core.dagger_utils import write_files_bulk
+from core.git_diff import diff_overlay, read_tree
 from llm.utils import get_best_coding_llm_client
 from core.actors import BaseData
 from core.base_node import Node
@@ -320,63 +321,32 @@ class FSMApplication:
         def should_exclude_from_diff(file_path: str) -> bool:
             return file_path.lower().endswith((".png", ".ico"))
 
-        # Start with empty directory and git init
-        start = self.client.container().from_("alpine/git").with_workdir("/app")
-        start = start.with_exec(["git", "init"]).with_exec(
-            ["git", "config", "--global", "user.email", "agent@appbuild.com"]
-        )
-
         if snapshot:
             # Sort keys for consistent sample logging, especially in tests
             sorted_snapshot_keys = sorted(snapshot.keys())
             logger.info(
                 f"SERVER get_diff_with: Snapshot sample paths (up to 5): {sorted_snapshot_keys[:5]}"
             )
-            start = await write_files_bulk(start, snapshot, self.client)
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'snapshot'"]
-            )
         else:
             logger.info(
                 "SERVER get_diff_with: Snapshot is empty. Diff will be against template + FSM context files."
             )
-            # If no snapshot, create an empty initial commit
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'initial'", "--allow-empty"]
-            )
 
-        # Add template files (they will appear in diff if not in snapshot)
-        template_dir = self.client.host().directory(self.template_path())
-        start = start.with_directory(".", template_dir)
-        # Bake template mount so the files persist independently of host
-        start = await start.sync()
+        # Same result as committing the snapshot, copying template + FSM context files on top
+        # and running `git add . && git diff HEAD`, computed in-process without a git container
+        template_files = await anyio.to_thread.run_sync(read_tree, self.template_path())
         logger.info("SERVER get_diff_with: Added template directory to workspace")
-
-        # Exclude .png and .ico files from being tracked by git
-        # Using || true to prevent failures if no files are found
-        start = start.with_exec(
-            [
-                "sh",
-                "-c",
-                "find . -name '*.png' -o -name '*.ico' | xargs -r git rm --cached || true",
-            ]
-        )
-
-        # Add FSM context files on top
         filtered_ctx_files = {
             k: v
             for k, v in self.fsm.context.files.items()
             if not should_exclude_from_diff(k)
         }
-        start = await write_files_bulk(start, filtered_ctx_files, self.client)
 
         logger.info(
             "SERVER get_diff_with: Calling workspace.diff() to generate final diff."
         )
-        diff = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD"])
-            .stdout()
+        diff = await anyio.to_thread.run_sync(
+            diff_overlay, snapshot, template_files, filtered_ctx_files
         )
         logger.info(
             f"SERVER get_diff_with: workspace.diff() Succeeded. Diff length: {len(diff)}"
@@ -1,7 +1,9 @@
-import uuid
+import os
 import dagger
+from core import base_images
+from core.base_images import BaseImage
 from core.workspace import Workspace, ExecResult
-from core.postgres_utils import create_postgres_service, pg_health_check_cmd
+from core.postgres_utils import PostgresDatabase, get_postgres_pool
 
 _BASE_PACKAGES = [
     "nginx",
@@ -36,45 +38,52 @@ _DOCKER_EXT_PACKAGES = [
     "soap",
 ]
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template")
+BASE_IMAGE = BaseImage(
+    name="laravel",
+    image="php:8.2-fpm-alpine",
+    workdir="/var/www/html",
+    # Install packages in smaller groups to avoid I/O errors
+    setup=[
+        ["apk", "update"],
+        ["apk", "add", "--no-cache", "nginx", "supervisor"],
+        ["apk", "add", "--no-cache", "postgresql-dev", "oniguruma-dev", "libzip-dev"],
+        ["apk", "add", "--no-cache", "freetype-dev", "libjpeg-turbo-dev", "libpng-dev"],
+        ["apk", "add", "--no-cache", "curl-dev", "libxml2-dev"],
+        ["apk", "add", "--no-cache", "nodejs", "npm"],
+        ["docker-php-ext-configure", "gd", "--with-freetype", "--with-jpeg"],
+        ["docker-php-ext-install", *_DOCKER_EXT_PACKAGES],
+    ],
+    files_from=[("composer:2", "/usr/bin/composer")],
+    lockfiles=["composer.json", "composer.lock", "package.json", "package-lock.json"],
+    # the autoloader and package discovery need the application code, they run per workspace
+    install=[
+        ["composer", "install", "--no-autoloader", "--no-scripts", "--no-interaction"],
+        ["npm", "install"],
+    ],
+)
+
 async def create_workspace(client: dagger.Client, context: dagger.Directory, protected: list[str] = [], allowed: list[str] = []):
-    ctr = (
-        client
-        .container()
-        .from_("php:8.2-fpm-alpine")
-        # Install packages in smaller groups to avoid I/O errors
-        .with_exec(["apk", "update"])
-        .with_exec(["apk", "add", "--no-cache", "nginx", "supervisor"])
-        .with_exec(["apk", "add", "--no-cache", "postgresql-dev", "oniguruma-dev", "libzip-dev"])
-        .with_exec(["apk", "add", "--no-cache", "freetype-dev", "libjpeg-turbo-dev", "libpng-dev"])
-        .with_exec(["apk", "add", "--no-cache", "curl-dev", "libxml2-dev"])
-        .with_exec(["apk", "add", "--no-cache", "nodejs", "npm"])
-        .with_exec(["docker-php-ext-configure", "gd", "--with-freetype", "--with-jpeg"])
-        .with_exec(["docker-php-ext-install", *_DOCKER_EXT_PACKAGES])
-        .with_file("/usr/bin/composer", client.container().from_("composer:2").file("/usr/bin/composer"))
-    )
-    ctr = ctr.with_workdir("/var/www/html").with_directory("/var/www/html", context)
-    ctr = (
-        ctr
-        .with_exec(["composer", "install", "--optimize-autoloader", "--no-interaction"])
-        .with_exec(["npm", "install"])
+    base, tag = await base_images.load(client, BASE_IMAGE, TEMPLATE_DIR)
+    # created like the other templates so the workspace has a state key for cached checks
+    workspace = await Workspace.create(
+        client=client,
+        base_image=tag,
+        base=base,
+        context=context,
+        setup_cmd=[["composer", "dump-autoload", "--optimize", "--no-interaction"]],
+        protected=protected,
+        allowed=allowed,
+        workdir="/var/www/html",
     )
-    ctr = ctr.with_env_variable("INSTANCE_ID", uuid.uuid4().hex)
-    
+
     # Generate a secure APP_KEY for Laravel
     import secrets
     import base64
     random_bytes = secrets.token_bytes(32)
     app_key = f"base64:{base64.b64encode(random_bytes).decode('utf-8')}"
-    ctr = ctr.with_env_variable("APP_KEY", app_key)
-    
-    workspace = Workspace(
-        ctr=ctr,
-        start=context,
-        protected=set(protected),
-        allowed=set(allowed),
-    )
-    # Attach client to workspace instance
-    workspace._client = client
+    # set on the container directly, like INSTANCE_ID it identifies the instance and is not part of the file state
+    workspace.ctr = workspace.ctr.with_env_variable("APP_KEY", app_key)
     return workspace
 
 async def run_tests(ctr: dagger.Container) -> ExecResult:
@@ -91,8 +100,8 @@ async def run_tests(ctr: dagger.Container) -> ExecResult:
 
     try:
         # First run npm build - this modifies the container with built assets
-        build_ctr = ctr.with_exec(["npm", "run", "build"], expect=dagger.ReturnType.ANY)
-        build_result = await ExecResult.from_ctr(build_ctr)
+        build_ctr = ExecResult.with_capture(ctr, ["npm", "run", "build"])
+        build_result = await ExecResult.from_capture(build_ctr)
         
         if build_result.exit_code != 0:
             # Return detailed npm build errors
@@ -103,8 +112,7 @@ async def run_tests(ctr: dagger.Container) -> ExecResult:
             )
         
         # If build succeeds, run tests in the same container that has the built assets
-        test_ctr = build_ctr.with_exec(["composer", "test"], expect=dagger.ReturnType.ANY)
-        test_result = await ExecResult.from_ctr(test_ctr)
+        test_result = await ExecResult.capture(build_ctr, ["composer", "test"])
         
         # If tests fail but build succeeded, include build output for context
         if test_result.exit_code != 0 and build_result.stdout:
@@ -117,25 +125,21 @@ async def run_tests(ctr: dagger.Container) -> ExecResult:
         # surface the error context without crashing the task-group.
         return ExecResult(exit_code=1, stdout="", stderr=str(exc))
 
-async def run_migrations(client: dagger.Client, ctr: dagger.Container, postgresdb: dagger.Service | None = None):
-    if postgresdb is None:
-        postgresdb = create_postgres_service(client)
-
-    # Override template defaults to match exec_with_pg TODO: Maybe alter template .env
-    push_ctr = (
-        ctr
-        .with_env_variable("DB_HOST", "postgres")
-        .with_env_variable("DB_DATABASE", "postgres")
-        .with_env_variable("DB_USERNAME", "postgres")
-        .with_env_variable("DB_PASSWORD", "postgres")
-        .with_exec(["apk", "add", "postgresql-client"])
-        .with_service_binding("postgres", postgresdb)
-        .with_exec(pg_health_check_cmd())
-        .with_exec(["php", "/var/www/html/artisan", "migrate", "--force"])
-    )
-
+async def run_migrations(client: dagger.Client, ctr: dagger.Container, postgresdb: PostgresDatabase | None = None):
     try:
-        return await ExecResult.from_ctr(push_ctr)
+        if postgresdb is None:
+            async with get_postgres_pool(client).database() as db:
+                return await run_migrations(client, ctr, db)
+
+        # Override template defaults to match exec_with_pg TODO: Maybe alter template .env
+        push_ctr = (
+            postgresdb.bind(ctr)
+            .with_env_variable("DB_HOST", "postgres")
+            .with_env_variable("DB_DATABASE", postgresdb.name)
+            .with_env_variable("DB_USERNAME", "postgres")
+            .with_env_variable("DB_PASSWORD", "postgres")
+        )
+        return await ExecResult.capture(push_ctr, ["php", "/var/www/html/artisan", "migrate", "--force"])
     except (dagger.TransportError, dagger.QueryError) as exc:
         # Similar to the test helper above, convert transport failures
         # into a regular ExecResult so that callers receive a concrete
@@ -1,21 +1,116 @@
 import random
-from typing import List, Literal
-from llm.common import AsyncLLM, Message, Completion, Tool
+import statistics
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Awaitable, Callable, List, Literal
+import anyio
+from llm.common import AsyncLLM, Message, MessageHistory, Completion, StreamEvent, Tool
 from log import get_logger
 
 logger = get_logger(__name__)
 
+SelectionStrategy = Literal["random", "round_robin", "latency"]
+
+# latencies kept per model for the percentiles
+LATENCY_WINDOW = 50
+# calls measured before a model is ranked by its latency
+MIN_SAMPLES = 3
+ERROR_RATE_ALPHA = 0.1
+# chance of sending a call to another healthy model, keeps the estimates of the others fresh
+EXPLORE_RATE = 0.05
+# consecutive failures, or the error rate, ejecting a model for the cooldown
+FAILURE_THRESHOLD = 3
+ERROR_RATE_THRESHOLD = 0.3
+BREAKER_COOLDOWN = 30.0
+# client errors worth another try: request timeout, conflict, rate limit
+TRANSIENT_CLIENT_STATUSES = (408, 409, 429)
+
+
+def is_request_error(exc: BaseException) -> bool:
+    """
+    Rejected because of the request itself (bad request, context length), another model won't do better.
+
+    Timeouts, connection errors, rate limits and server errors are transient and say something about the
+    model, as does anything without a status code.
+    """
+    # anthropic and openai errors carry status_code, google genai errors carry code
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in TRANSIENT_CLIENT_STATUSES
+
+
+@dataclass
+class _ModelHealth:
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    error_rate: float = 0.0
+    failures: int = 0
+    ejected: bool = False
+    open_until: float = 0.0
+    probing: bool = False
+    calls: int = 0
+    errors: int = 0
+
+    def percentile(self, q: int) -> float | None:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[q - 1]
+
+    def score(self) -> float:
+        # expected time until an answer when failures are retried elsewhere, the mean counts the tail in
+        mean = statistics.fmean(self.latencies) if self.latencies else 0.0
+        return mean / (1.0 - min(self.error_rate, 0.9))
+
+    def state(self, now: float) -> str:
+        if not self.ejected:
+            return "closed"
+        return "open" if now < self.open_until or self.probing else "half_open"
+
+    def started(self, now: float) -> None:
+        self.calls += 1
+        if self.state(now) == "half_open":
+            # a single call probes whether the model recovered
+            self.probing = True
+
+    def succeeded(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.error_rate *= 1 - ERROR_RATE_ALPHA
+        self.failures = 0
+        if self.probing:
+            self.ejected = self.probing = False
+            # one more failure must not eject it again right away
+            self.error_rate = min(self.error_rate, ERROR_RATE_THRESHOLD / 2)
+
+    def failed(self, now: float, cooldown: float) -> None:
+        self.errors += 1
+        self.error_rate = self.error_rate * (1 - ERROR_RATE_ALPHA) + ERROR_RATE_ALPHA
+        self.failures += 1
+        self.probing = False
+        if self.failures >= FAILURE_THRESHOLD or (self.calls >= MIN_SAMPLES and self.error_rate >= ERROR_RATE_THRESHOLD):
+            self.ejected = True
+            self.open_until = now + cooldown
+
 
 class AlloyLLM(AsyncLLM):
     """Alloy Agent implementation that combines multiple models in a single conversation thread.
 
     Models alternate generating responses, unaware they are part of an alloy.
+
+    The "latency" strategy routes each call to the model with the lowest expected latency, from the
+    mean of its recent calls and its error rate, and retries failed calls on the next model.
+    Models failing several times in a row or too often are ejected for a cooldown, after which one call probes
+    them again. With hedging a duplicate call goes to the next model once the first one runs longer
+    than its p90 latency; the first answer wins and the other call is cancelled. Streams are routed
+    the same way but neither hedged nor retried once they produced output.
     """
 
     def __init__(
         self,
         models: List[AsyncLLM],
-        selection_strategy: Literal["random", "round_robin"] = "random",
+        selection_strategy: SelectionStrategy = "random",
+        hedge: bool = False,
+        breaker_cooldown: float = BREAKER_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
     ):
         if not models:
             raise ValueError("At least one model must be provided")
@@ -23,30 +118,59 @@ class AlloyLLM(AsyncLLM):
         self.models = models
         self.selection_strategy = selection_strategy
         self.current_index = 0
+        self.hedge = hedge
+        self.breaker_cooldown = breaker_cooldown
+        self.clock = clock
+        self._health = [_ModelHealth() for _ in models]
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
         logger.info(
-            f"Initialized AlloyLLM with {len(models)} models, strategy: {selection_strategy}"
+            f"Initialized AlloyLLM with {len(models)} models, strategy: {selection_strategy}, hedge: {hedge}"
         )
 
     @classmethod
     def from_models(
         cls,
         models: List[AsyncLLM],
-        selection_strategy: Literal["random", "round_robin"] = "random",
+        selection_strategy: SelectionStrategy = "random",
+        hedge: bool = False,
     ) -> "AlloyLLM":
         """Create an AlloyLLM from a list of model instances.
 
         Args:
             models: List of AsyncLLM instances to combine
-            selection_strategy: How to select models ("random" or "round_robin")
+            selection_strategy: How to select models ("random", "round_robin" or "latency")
+            hedge: Send a duplicate call to the next model when the first is slow ("latency" only)
 
         Returns:
             An AlloyLLM instance
         """
-        return cls(models, selection_strategy)
+        return cls(models, selection_strategy, hedge=hedge)
+
+    def metrics(self) -> dict:
+        now = self.clock()
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "models": [
+                {
+                    "model": repr(model),
+                    "calls": health.calls,
+                    "errors": health.errors,
+                    "error_rate": round(health.error_rate, 3),
+                    "p50": health.percentile(50),
+                    "p90": health.percentile(90),
+                    "breaker": health.state(now),
+                }
+                for model, health in zip(self.models, self._health)
+            ],
+        }
 
     async def completion(
         self,
-        messages: list[Message],
+        messages: list[Message] | MessageHistory,
         max_tokens: int,
         model: str | None = None,
         temperature: float = 1.0,
@@ -56,21 +180,38 @@ class AlloyLLM(AsyncLLM):
         *args,
         **kwargs,
     ) -> Completion:
-        # select model based on strategy
-        if self.selection_strategy == "random":
-            selected_model = random.choice(self.models)
-            model_idx = self.models.index(selected_model)
-        else:  # round_robin
-            selected_model = self.models[self.current_index]
-            model_idx = self.current_index
-            self.current_index = (self.current_index + 1) % len(self.models)
-
-        logger.info(
-            f"AlloyLLM selected model index {model_idx} of {len(self.models)}, which is {repr(selected_model)}"
-        )
+        async def call(selected: AsyncLLM) -> Completion:
+            return await selected.completion(
+                messages=messages,
+                max_tokens=max_tokens,
+                model=model,
+                temperature=temperature,
+                tools=tools,
+                tool_choice=tool_choice,
+                system_prompt=system_prompt,
+                *args,
+                **kwargs,
+            )
 
+        if self.selection_strategy == "latency":
+            return await self._routed(call)
         # delegate to selected model
-        return await selected_model.completion(
+        return await call(self._select())
+
+    async def stream(
+        self,
+        messages: list[Message] | MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        selected = self._select()
+        stream = selected.stream(
             messages=messages,
             max_tokens=max_tokens,
             model=model,
@@ -81,3 +222,121 @@ class AlloyLLM(AsyncLLM):
             *args,
             **kwargs,
         )
+        health = self._health[self.models.index(selected)]
+        started = self.clock()
+        health.started(started)
+        try:
+            async with aclosing(stream) as events:
+                async for event in events:
+                    yield event
+        except Exception as exc:
+            if is_request_error(exc):
+                health.probing = False
+            else:
+                health.failed(self.clock(), self.breaker_cooldown)
+            raise
+        except BaseException:
+            # closed early by the consumer or cancelled, no verdict on the model
+            health.probing = False
+            raise
+        health.succeeded(self.clock() - started)
+
+    def _select(self) -> AsyncLLM:
+        # select model based on strategy
+        if self.selection_strategy == "latency":
+            model_idx = self._ranked()[0]
+            selected_model = self.models[model_idx]
+        elif self.selection_strategy == "random":
+            selected_model = random.choice(self.models)
+            model_idx = self.models.index(selected_model)
+        else:  # round_robin
+            selected_model = self.models[self.current_index]
+            model_idx = self.current_index
+            self.current_index = (self.current_index + 1) % len(self.models)
+
+        logger.info(
+            f"AlloyLLM selected model index {model_idx} of {len(self.models)}, which is {repr(selected_model)}"
+        )
+        return selected_model
+
+    def _ranked(self) -> list[int]:
+        """Model indices in the order they should be tried, ejected models only if no other is left."""
+        now = self.clock()
+        healthy = [i for i, health in enumerate(self._health) if health.state(now) != "open"]
+        if not healthy:
+            return sorted(range(len(self.models)), key=lambda i: self._health[i].open_until)
+        # models without enough samples are measured first, then the fastest expected answer wins
+        ranked = sorted(healthy, key=lambda i: (len(self._health[i].latencies) >= MIN_SAMPLES, self._health[i].score()))
+        if len(ranked) > 1 and random.random() < EXPLORE_RATE:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    async def _routed(self, call: Callable[[AsyncLLM], Awaitable[Completion]]) -> Completion:
+        """Try the ranked models in turn, the next one starts when the previous fails or, hedged, is slow."""
+        ranked = self._ranked()
+        hedge_after = self._health[ranked[0]].percentile(90) if self.hedge else None
+        completions: list[Completion] = []
+        errors: list[Exception] = []
+        request_errors: list[Exception] = []
+        failed_tx, failed_rx = anyio.create_memory_object_stream[int](len(ranked))
+
+        async def run(index: int, hedged: bool):
+            health = self._health[index]
+            started = self.clock()
+            health.started(started)
+            try:
+                completion = await call(self.models[index])
+            except anyio.get_cancelled_exc_class():
+                health.probing = False
+                if completions and index == ranked[0]:
+                    # the primary lost to its hedge: a censored sample, at least its p90 since the hedge
+                    # started then, leaving it out would hide the tail. A losing hedge or a call cancelled
+                    # by the caller says nothing about the latency of the model.
+                    health.latencies.append(max(self.clock() - started, health.percentile(90) or 0.0))
+                raise
+            except Exception as exc:
+                if is_request_error(exc):
+                    # no verdict on the model, nor a reason to try the others
+                    health.probing = False
+                    if not completions and not request_errors:
+                        request_errors.append(exc)
+                        tg.cancel_scope.cancel()
+                    return
+                logger.warning(f"AlloyLLM model {self.models[index]!r} failed: {exc!r}")
+                health.failed(self.clock(), self.breaker_cooldown)
+                errors.append(exc)
+                failed_tx.send_nowait(index)
+                return
+            health.succeeded(self.clock() - started)
+            if not completions:
+                completions.append(completion)
+                self.hedge_wins += hedged
+                tg.cancel_scope.cancel()
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(run, ranked[0], False)
+            in_flight = 1
+            for index in ranked[1:]:
+                hedged = False
+                while True:
+                    with anyio.move_on_after(hedge_after) as timer:
+                        await failed_rx.receive()
+                        in_flight -= 1
+                    if timer.cancelled_caught:
+                        # a single hedge per call
+                        hedged, hedge_after = True, None
+                        self.hedges += 1
+                        break
+                    if in_flight == 0:
+                        self.failovers += 1
+                        break
+                logger.info(f"AlloyLLM {'hedging' if hedged else 'retrying'} on {self.models[index]!r}")
+                tg.start_soon(run, index, hedged)
+                in_flight += 1
+
+        if completions:
+            return completions[0]
+        if request_errors:
+            raise request_errors[0]
+        raise errors[-1]
+
@@ -1,4 +1,4 @@
-from typing import Iterable, TypedDict, NotRequired
+from typing import AsyncGenerator, Iterable, TypedDict, NotRequired
 import anthropic
 from anthropic.types import (
     ToolParam,
@@ -13,6 +13,7 @@ from anthropic.types import (
     ToolChoiceParam,
 )
 from llm import common
+from llm.scheduler import is_scheduled
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 import logging
@@ -31,8 +32,10 @@ logger = get_logger(__name__)
 def is_retryable_error(exception: BaseException) -> bool:
     """Check if the exception is retryable (rate limit or server error)."""
     if isinstance(exception, anthropic.APIStatusError):
-        # Retry on rate limits (429) and server errors (>=500)
-        return exception.status_code == 429 or exception.status_code >= 500
+        # Retry on rate limits (429) and server errors (>=500), scheduled calls back off in the scheduler
+        return (
+            exception.status_code == 429 and not is_scheduled()
+        ) or exception.status_code >= 500
     return False
 
 
@@ -70,7 +73,7 @@ class AnthropicLLM(common.AsyncLLM):
 
     async def completion(
         self,
-        messages: list[common.Message],
+        messages: list[common.Message] | common.MessageHistory,
         max_tokens: int,
         model: str | None = None,
         temperature: float = 1.0,
@@ -78,12 +81,50 @@ class AnthropicLLM(common.AsyncLLM):
         tool_choice: str | None = None,
         system_prompt: str | None = None,
     ) -> common.Completion:
+        call_args = self._call_args(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        return await self._create_message_with_retry(call_args)
+
+    async def stream(
+        self,
+        messages: list[common.Message] | common.MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        call_args = self._call_args(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        async for event in common.retry_stream(
+            lambda: self._stream_message(call_args), is_retryable_error
+        ):
+            yield event
+
+    def _call_args(
+        self,
+        messages: list[common.Message] | common.MessageHistory,
+        max_tokens: int,
+        model: str | None,
+        temperature: float,
+        tools: list[common.Tool] | None,
+        tool_choice: str | None,
+        system_prompt: str | None,
+    ) -> AnthropicParams:
         call_args: AnthropicParams = {
             "model": model or self.default_model,
             "max_tokens": max_tokens or 8192,
             "temperature": temperature,
             "messages": self._messages_into(messages),
         }
+        if self.use_prompt_caching and isinstance(messages, common.MessageHistory):
+            # cache the shared prefix (read by sibling branches) and the whole history (read by our children)
+            self._mark_cache_points(
+                call_args["messages"], messages, {messages.prefix_len - 1, len(messages) - 1}
+            )
 
         if system_prompt is not None:
             if self.use_prompt_caching:
@@ -102,8 +143,7 @@ class AnthropicLLM(common.AsyncLLM):
             call_args["tools"] = tools  # type: ignore
         if tool_choice is not None:
             call_args["tool_choice"] = {"type": "tool", "name": tool_choice}
-
-        return await self._create_message_with_retry(call_args)
+        return call_args
 
     @retry_rate_limits
     async def _create_message_with_retry(
@@ -113,7 +153,40 @@ class AnthropicLLM(common.AsyncLLM):
         telemetry.start_timing()
 
         completion = await self.client.messages.create(**call_args)
+        self._log_telemetry(telemetry, call_args, completion)
+        return self._completion_from(completion)
+
+    async def _stream_message(
+        self, call_args: AnthropicParams
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        tool_uses: dict[int, ToolUseBlock] = {}
+        async with self.client.messages.stream(**call_args) as stream:
+            async for event in stream:
+                match event.type:
+                    case "content_block_start" if isinstance(event.content_block, ToolUseBlock):
+                        tool_uses[event.index] = event.content_block
+                        yield common.ToolUseDelta(event.content_block.id, event.content_block.name, "")
+                    case "content_block_delta":
+                        match event.delta.type:
+                            case "text_delta":
+                                yield common.TextDelta(event.delta.text)
+                            case "thinking_delta":
+                                yield common.ThinkingDelta(event.delta.thinking)
+                            case "input_json_delta" if event.index in tool_uses:
+                                block = tool_uses[event.index]
+                                yield common.ToolUseDelta(block.id, block.name, event.delta.partial_json)
+            completion = await stream.get_final_message()
+
+        self._log_telemetry(telemetry, call_args, completion)
+        yield self._completion_from(completion)
 
+    @staticmethod
+    def _log_telemetry(
+        telemetry: LLMTelemetry, call_args: AnthropicParams, completion: Message
+    ) -> None:
         # Log telemetry if usage data is available
         if hasattr(completion, "usage"):
             # extract cached tokens if available
@@ -145,8 +218,6 @@ class AnthropicLLM(common.AsyncLLM):
                 provider="Anthropic",
             )
 
-        return self._completion_from(completion)
-
     @staticmethod
     def _completion_from(completion: Message) -> common.Completion:
         ours_content: list[common.TextRaw | common.ToolUse | common.ThinkingBlock] = []
@@ -170,7 +241,26 @@ class AnthropicLLM(common.AsyncLLM):
         )
 
     @staticmethod
-    def _messages_into(messages: list[common.Message]) -> list[MessageParam]:
+    def _mark_cache_points(
+        theirs_messages: list[MessageParam],
+        messages: list[common.Message] | common.MessageHistory,
+        indices: set[int],
+    ) -> None:
+        # messages without content are dropped by _messages_into, map indices onto what is left
+        position = -1
+        for index, message in enumerate(messages):
+            if any(AnthropicLLM._has_content(block) for block in message.content):
+                position += 1
+            if index in indices and position >= 0:
+                content = theirs_messages[position]["content"]
+                content[-1]["cache_control"] = {"type": "ephemeral"}  # type: ignore
+
+    @staticmethod
+    def _has_content(block: common.ContentBlock) -> bool:
+        return not isinstance(block, common.TextRaw) or bool(block.text.rstrip())
+
+    @staticmethod
+    def _messages_into(messages: list[common.Message] | common.MessageHistory) -> list[MessageParam]:
         theirs_messages: list[MessageParam] = []
         for message in messages:
             theirs_content: list[
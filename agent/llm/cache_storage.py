@@ -0,0 +1,106 @@
+"""
+Storage for CachedLLM on top of the kv_storage engines:
+
+- log: AppendLogStorage, an append-only JSON lines file
+- sqlite: SqliteStorage, a single table in WAL mode
+
+Legacy caches (single JSON object written by the old CachedLLM) are imported on
+first open. Storage files are compacted with `uv run compact_cache <cache path>`.
+"""
+
+from typing import Any, Literal
+from pathlib import Path
+import sqlite3
+import ujson as json
+
+from kv_storage import TOMBSTONE, AppendLogStorage, CacheStorage, SqliteStorage
+from log import get_logger
+
+logger = get_logger(__name__)
+
+StorageBackend = Literal["log", "sqlite"]
+
+
+def storage_path(cache_path: str | Path, backend: StorageBackend) -> Path:
+    suffix = {"log": ".jsonl", "sqlite": ".sqlite"}[backend]
+    return Path(f"{Path(cache_path).with_suffix('')}{suffix}")
+
+
+def import_legacy_cache(storage: CacheStorage, legacy_path: Path) -> int:
+    """Copy entries from an old single-object JSON cache file into the storage."""
+    with legacy_path.open("r") as f:
+        content = f.read()
+    if not content:
+        return 0
+    entries = json.loads(content)
+    if isinstance(storage, SqliteStorage):
+        storage.update_many(entries)
+    else:
+        for key, entry in entries.items():
+            storage[key] = entry
+    logger.info(f"imported {len(entries)} legacy cache entries from {legacy_path}")
+    return len(entries)
+
+
+def open_cache_storage(cache_path: str | Path, backend: StorageBackend = "log") -> CacheStorage:
+    """
+    Open storage for a CachedLLM cache path, e.g. `llm/caches/<key>.json`.
+
+    The engine writes next to it with its own suffix; an existing legacy file at
+    `cache_path` is imported when the engine file doesn't exist yet.
+    """
+    path = storage_path(cache_path, backend)
+    legacy = Path(cache_path)
+    fresh = not path.exists()
+    match backend:
+        case "log":
+            storage = AppendLogStorage(path)
+        case "sqlite":
+            storage = SqliteStorage(path)
+        case _:
+            raise ValueError(f"unknown cache storage backend: {backend}")
+    # no compaction here, another process may be appending to the same file
+    if fresh and legacy != path and legacy.is_file():
+        try:
+            import_legacy_cache(storage, legacy)
+        except ValueError:
+            logger.warning(f"skipping unreadable legacy cache {legacy}")
+    return storage
+
+
+def _read_log(path: Path) -> dict[str, Any]:
+    entries: dict[str, Any] = {}
+    with path.open("rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                key = record["key"]
+            except (ValueError, KeyError, TypeError):
+                # torn or corrupt tail, the writer truncates it on its next open
+                break
+            if record.get(TOMBSTONE):
+                entries.pop(key, None)
+            else:
+                entries[key] = record["entry"]
+    return entries
+
+
+def _read_sqlite(path: Path) -> dict[str, Any]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return {key: json.loads(entry) for key, entry in conn.execute("SELECT key, entry FROM entries")}
+    finally:
+        conn.close()
+
+
+def read_cache_entries(cache_path: str | Path, backend: StorageBackend = "log") -> dict[str, Any]:
+    """Load all entries into memory without creating, migrating or compacting any files."""
+    path = storage_path(cache_path, backend)
+    if path.exists():
+        return _read_log(path) if backend == "log" else _read_sqlite(path)
+    if (legacy := Path(cache_path)).is_file():
+        with legacy.open("r") as f:
+            if content := f.read():
+                return json.loads(content)
+    return {}
+
@@ -1,7 +1,9 @@
-from typing import Literal, Dict, Any, List, Tuple
+from typing import AsyncGenerator, Literal, Dict, Any, List, Tuple, MutableMapping
 import ujson as json
+from contextlib import aclosing
 from pathlib import Path
-from llm.common import AsyncLLM, Completion, Message, Tool
+from llm.common import AsyncLLM, Completion, Message, MessageHistory, StreamEvent, Tool, deltas_from
+from llm.cache_storage import StorageBackend, open_cache_storage, read_cache_entries, storage_path
 import os
 import anyio
 from collections import OrderedDict
@@ -17,7 +19,7 @@ CacheMode = Literal["off", "record", "replay", "auto", "lru"]
 
 def normalize(obj):
     match obj:
-        case list() | tuple():
+        case list() | tuple() | MessageHistory():
             return [normalize(item) for item in obj]
         case dict():
             # Replace 'id' values with a placeholder
@@ -74,6 +76,11 @@ class CachedLLM(AsyncLLM):
     - record: Record all requests and responses to cache file
     - replay: Replay responses from cache file without making real requests
     - lru: Keep cache of N most recent invocations using LRU strategy; use cached response if available, otherwise call the model
+
+    Record persists entries through an append-only storage engine (see llm.cache_storage), replay
+    reads the engine file or a legacy JSON cache file at cache_path without writing anything.
+
+    Streamed requests share the cache with completion: a recorded completion is re-streamed on a hit.
     """
 
     def __init__(
@@ -82,6 +89,7 @@ class CachedLLM(AsyncLLM):
         cache_path: str,
         cache_mode: CacheMode = "off",
         max_cache_size: int = 256,
+        storage_backend: StorageBackend | None = None,
     ):
         self.client = client
         self.cache_mode = (
@@ -91,25 +99,31 @@ class CachedLLM(AsyncLLM):
             logger.info(f"Inferred cache mode {self.cache_mode}")
         self.cache_path = cache_path
         self.max_cache_size = max_cache_size
-        self._cache: Dict[str, Any] = {}
+        self.storage_backend: StorageBackend = storage_backend or self._infer_storage_backend()
+        self._cache: MutableMapping[str, Any] = {}
         self._cache_lru: OrderedDict[str, None] = OrderedDict()
         self.lock = anyio.Lock()
         self._pending_requests: Dict[str, anyio.Event] = {}
 
-        match (self.cache_mode, Path(self.cache_path)):
-            case ("replay", file) if not file.exists():
+        legacy_file = Path(self.cache_path)
+        match (self.cache_mode, storage_path(self.cache_path, self.storage_backend)):
+            case ("replay", file) if not file.exists() and not legacy_file.exists():
                 raise ValueError(f"cache file missing: {file}")
             case ("replay", file):
                 logger.info(f"cache file found: {file}")
-                self._cache = self._load_cache()
+                # read only, committed fixtures must not grow derived files next to them
+                self._cache = read_cache_entries(self.cache_path, self.storage_backend)
             case ("record", file):
-                if file.exists():
+                if file.exists() or legacy_file.exists():
                     logger.info(f"cache file already exists: {file}; wiping")
-                    file.unlink()
-                self._save_cache()
-            case ("lru", file) if file.exists():
+                    # legacy file would be re-imported otherwise
+                    legacy_file.unlink(missing_ok=True)
+                self._cache = open_cache_storage(self.cache_path, self.storage_backend)
+                self._cache.wipe()
+            case ("lru", file) if file.exists() or legacy_file.exists():
                 logger.info(f"loading lru cache from: {file}")
-                self._cache = self._load_cache()
+                # lru cache lives in memory, the storage only seeds it
+                self._cache = read_cache_entries(self.cache_path, self.storage_backend)
                 # Initialize LRU order from existing cache
                 for key in self._cache:
                     self._cache_lru[key] = None
@@ -122,20 +136,15 @@ class CachedLLM(AsyncLLM):
             raise ValueError(f"invalid cache mode from env: {env_mode}")
         return "off"
 
-    def _load_cache(self) -> Dict[str, Any]:
-        """load cache from file if it exists, otherwise return empty dict."""
-        if (cache_file := Path(self.cache_path)).exists():
-            with cache_file.open("r") as f:
-                if content := f.read():
-                    return json.loads(content)
-        return {}
-
-    def _save_cache(self) -> None:
-        """save cache to file."""
-        cache_file = Path(self.cache_path)
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        with cache_file.open("w") as f:
-            json.dump(self._cache, f, indent=2)
+    @staticmethod
+    def _infer_storage_backend() -> StorageBackend:
+        match os.getenv("LLM_VCR_CACHE_STORAGE", "log"):
+            case "log":
+                return "log"
+            case "sqlite":
+                return "sqlite"
+            case env_backend:
+                raise ValueError(f"invalid cache storage backend from env: {env_backend}")
 
     def _update_lru_cache(self, key: str) -> None:
         """Update the LRU cache order and ensure it stays within size limit."""
@@ -192,6 +201,42 @@ class CachedLLM(AsyncLLM):
         _compare(norm_params, cache_params)
         return cache_params
 
+    def _lookup(self, cache_key: str, use_lru: bool) -> Completion | None:
+        if cache_key not in self._cache:
+            return None
+        logger.info(f"cache hit: {cache_key}")
+        if use_lru:
+            self._update_lru_cache(cache_key)
+        return Completion.from_dict(self._cache[cache_key]["data"])
+
+    async def _claim(self, cache_key: str, use_lru: bool) -> Completion | anyio.Event:
+        """
+        Cached completion, or the pending event of a request this call now has to make.
+
+        Lookup and claim run without a checkpoint in between, so they need no lock: requests for other
+        keys never wait, requests for the same key wait on the event of the one in flight.
+        """
+        while True:
+            if (cached := self._lookup(cache_key, use_lru)) is not None:
+                return cached
+            pending = self._pending_requests.get(cache_key)
+            if pending is None:
+                if use_lru:
+                    logger.info(f"lru cache miss: {cache_key}")
+                event = self._pending_requests[cache_key] = anyio.Event()
+                return event
+            # being recorded by another request, it may also give up without a response
+            await pending.wait()
+
+    async def _store(self, cache_key: str, norm_params: dict, completion: Completion, use_lru: bool) -> None:
+        async with self.lock:
+            self._cache[cache_key] = {
+                "data": completion.to_dict(),
+                "params": norm_params,
+            }
+            if use_lru:
+                self._update_lru_cache(cache_key)
+
     async def _get_or_make_request(
         self,
         cache_key: str,
@@ -200,31 +245,9 @@ class CachedLLM(AsyncLLM):
         use_lru: bool = False,
     ) -> Completion:
         """handle cache lookup and request coordination."""
-        event = None
-        make_request = False
-
-        async with self.lock:
-            if cache_key in self._cache:
-                logger.info(f"cache hit: {cache_key}")
-                if use_lru:
-                    self._update_lru_cache(cache_key)
-                return Completion.from_dict(self._cache[cache_key]["data"])
-            elif cache_key in self._pending_requests:
-                event = self._pending_requests[cache_key]
-            else:
-                event = anyio.Event()
-                self._pending_requests[cache_key] = event
-                make_request = True
-
-        if use_lru:
-            logger.info(f"lru cache miss: {cache_key}")
-
-        if not make_request:
-            await event.wait()
-            async with self.lock:
-                if use_lru:
-                    self._update_lru_cache(cache_key)
-                return Completion.from_dict(self._cache[cache_key]["data"])
+        event = await self._claim(cache_key, use_lru)
+        if isinstance(event, Completion):
+            return event
 
         try:
             # Filter out parameters that the underlying client may not accept.
@@ -237,29 +260,44 @@ class CachedLLM(AsyncLLM):
             }
 
             response = await self.client.completion(**safe_request_params)
+            await self._store(cache_key, norm_params, response, use_lru)
+            return response
+        finally:
+            # on failure requests waiting on the key make the request themselves
+            del self._pending_requests[cache_key]
+            event.set()
 
-            async with self.lock:
-                self._cache[cache_key] = {
-                    "data": response.to_dict(),
-                    "params": norm_params,
-                }
-                if use_lru:
-                    self._update_lru_cache(cache_key)
-                else:
-                    self._save_cache()
-                del self._pending_requests[cache_key]
+    async def _stream_or_record(
+        self,
+        cache_key: str,
+        norm_params: dict,
+        request_params: dict,
+        use_lru: bool = False,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Streaming counterpart of _get_or_make_request."""
+        event = await self._claim(cache_key, use_lru)
+        if isinstance(event, Completion):
+            async for item in self._replay(event):
+                yield item
+            return
 
+        try:
+            safe_request_params = {
+                k: v for k, v in request_params.items() if k != "event_callback"
+            }
+            async with aclosing(self.client.stream(**safe_request_params)) as events:
+                async for item in events:
+                    if isinstance(item, Completion):
+                        await self._store(cache_key, norm_params, item, use_lru)
+                    yield item
+        finally:
+            # also when the consumer stops early, requests waiting on the key fall back to the model
+            del self._pending_requests[cache_key]
             event.set()
-            return response
-        except Exception:
-            async with self.lock:
-                del self._pending_requests[cache_key]
-            event.set()
-            raise
 
     async def completion(
         self,
-        messages: List[Message],
+        messages: List[Message] | MessageHistory,
         max_tokens: int = 8192,
         model: str | None = None,
         temperature: float = 1.0,
@@ -319,5 +357,55 @@ class CachedLLM(AsyncLLM):
             case _:
                 raise ValueError(f"unknown cache mode: {self.cache_mode}")
 
+    async def stream(
+        self,
+        messages: List[Message] | MessageHistory,
+        max_tokens: int = 8192,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[Tool] | None = None,
+        tool_choice: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """performs streamed LLM completion with caching support."""
+        if args:
+            raise RuntimeError(
+                "args are not expected in this method, use kwargs instead"
+            )
+
+        request_params = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            **kwargs,
+        }
+
+        match self.cache_mode:
+            case "off":
+                events = self.client.stream(**request_params)
+            case "record" | "lru":
+                norm_params, cache_key = self._get_cache_key(**request_params)
+                events = self._stream_or_record(
+                    cache_key, norm_params, request_params, use_lru=self.cache_mode == "lru"
+                )
+            case "replay":
+                events = self._replay(await self.completion(**request_params))
+            case _:
+                raise ValueError(f"unknown cache mode: {self.cache_mode}")
+
+        async with aclosing(events) as events:
+            async for event in events:
+                yield event
+
+    @staticmethod
+    async def _replay(completion: Completion) -> AsyncGenerator[StreamEvent, None]:
+        for delta in deltas_from(completion):
+            yield delta
+        yield completion
+
     def __repr__(self):
         return f"CachedLLM(client={self.client.__class__.__name__})"
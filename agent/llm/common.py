@@ -1,16 +1,26 @@
 from typing import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
     Literal,
     Protocol,
     Self,
     Iterable,
+    Iterator,
+    Sequence,
     TypedDict,
     TypeAlias,
     Union,
     Required,
     NotRequired,
 )
+from contextlib import aclosing
 from dataclasses import dataclass
+from itertools import count, islice
 import hashlib
+import json
+import random
+import anyio
 
 
 @dataclass
@@ -184,6 +194,151 @@ class Tool(TypedDict, total=False):
 # TODO: remove this alias after all clients are updated
 Message = InternalMessage
 
+
+class MessageHistory(Sequence[Message]):
+    """
+    Immutable message sequence, `history + tail` shares every message of `history` instead of copying.
+
+    A chain of extensions shares one backing list that only ever grows, so extending a history costs
+    O(len(tail)) no matter how long it is. Extending the same history twice (search branches) copies
+    the backing list once for the second branch.
+
+    `prefix_len` is the length of the history this one was extended from: every sibling branch sends
+    the same prefix, so providers can put a prompt cache breakpoint there. `prefix_id` and `id` are
+    content hashes chained through the extensions and identify the prefix and the whole history.
+    """
+
+    __slots__ = ("_items", "_len", "_parent", "_id", "prefix_len")
+
+    def __init__(self, messages: Iterable[Message] = ()):
+        self._items: list[Message] = list(messages)
+        self._len = len(self._items)
+        self._parent: MessageHistory | None = None
+        self._id: str | None = None
+        self.prefix_len = 0
+
+    def extend(self, tail: Iterable[Message]) -> "MessageHistory":
+        items = self._items
+        if len(items) != self._len:
+            # another branch already grew the shared list past our end
+            items = items[: self._len]
+        items.extend(tail)
+        child = MessageHistory.__new__(MessageHistory)
+        child._items, child._len = items, len(items)
+        child._parent, child._id = self, None
+        child.prefix_len = self._len
+        return child
+
+    def __add__(self, tail: Iterable[Message]) -> "MessageHistory":
+        return self.extend(tail)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Message]:
+        return islice(self._items, self._len)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._items[i] for i in range(*index.indices(self._len))]
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("history index out of range")
+        return self._items[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (MessageHistory, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None  # pyright: ignore[reportAssignmentType]
+
+    @property
+    def id(self) -> str:
+        if self._id is None:
+            start = self._parent._len if self._parent is not None else 0
+            h = hashlib.md5(self._parent.id.encode() if self._parent is not None else b"")
+            for message in islice(self._items, start, self._len):
+                h.update(json.dumps(message.to_dict(), sort_keys=True, default=str).encode())
+            self._id = h.hexdigest()
+        return self._id
+
+    @property
+    def parent(self) -> "MessageHistory | None":
+        return self._parent
+
+    @property
+    def prefix_id(self) -> str | None:
+        return self._parent.id if self._parent is not None else None
+
+    def __repr__(self) -> str:
+        return f"MessageHistory(len={self._len}, prefix_len={self.prefix_len})"
+
+# ----------------------------------
+# Streaming
+# ----------------------------------
+
+
+@dataclass
+class TextDelta:
+    text: str
+
+
+@dataclass
+class ThinkingDelta:
+    thinking: str
+
+
+@dataclass
+class ToolUseDelta:
+    """Part of a tool call, the first delta of a call has the name and an empty `partial_input`."""
+
+    id: str
+    name: str
+    partial_input: str
+
+
+StreamDelta: TypeAlias = Union[TextDelta, ThinkingDelta, ToolUseDelta]
+# a stream yields deltas and ends with the Completion they add up to
+StreamEvent: TypeAlias = Union[TextDelta, ThinkingDelta, ToolUseDelta, Completion]
+DeltaCallback: TypeAlias = Callable[[StreamDelta], Awaitable[None]]
+
+
+def deltas_from(completion: Completion) -> Iterator[StreamDelta]:
+    """Content of a finished completion as stream deltas, one per block."""
+    for block in completion.content:
+        match block:
+            case TextRaw(text) if text:
+                yield TextDelta(text)
+            case ThinkingBlock(thinking) if thinking:
+                yield ThinkingDelta(thinking)
+            case ToolUse(name, input, id):
+                yield ToolUseDelta(id, name, json.dumps(input))
+
+
+async def retry_stream(
+    open_stream: Callable[[], AsyncGenerator[StreamEvent, None]],
+    retryable: Callable[[BaseException], bool],
+    attempts: int = 5,
+    initial: float = 1.5,
+    max_wait: float = 30,
+) -> AsyncGenerator[StreamEvent, None]:
+    """Restart a failed stream with exponential backoff, unless it already yielded something."""
+    for attempt in count(1):
+        started = False
+        try:
+            async with aclosing(open_stream()) as events:
+                async for event in events:
+                    started = True
+                    yield event
+            return
+        except Exception as e:
+            if started or attempt >= attempts or not retryable(e):
+                raise
+            await anyio.sleep(min(max_wait, initial * 2 ** (attempt - 1)) + random.uniform(0, 1))
+
+
 # ----------------------------------
 # Async LLM protocol
 # ----------------------------------
@@ -192,7 +347,7 @@ Message = InternalMessage
 class AsyncLLM(Protocol):
     async def completion(
         self,
-        messages: list[Message],
+        messages: list[Message] | MessageHistory,
         max_tokens: int,
         model: str | None = None,
         temperature: float = 1.0,
@@ -202,3 +357,47 @@ class AsyncLLM(Protocol):
         *args,
         **kwargs,
     ) -> Completion: ...
+
+    async def stream(
+        self,
+        messages: list[Message] | MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Same request as completion, yields the output as it is generated and then the Completion.
+
+        Clients without a streaming API get this default: the whole output arrives at once.
+        """
+        completion = await self.completion(
+            messages=messages,
+            max_tokens=max_tokens,
+            model=model,
+            temperature=temperature,
+            tools=tools,
+            tool_choice=tool_choice,
+            system_prompt=system_prompt,
+            *args,
+            **kwargs,
+        )
+        for delta in deltas_from(completion):
+            yield delta
+        yield completion
+
+
+async def stream_completion(llm: AsyncLLM, on_delta: DeltaCallback, **kwargs) -> Completion:
+    """Completion of a streamed request, deltas go to `on_delta` as they arrive."""
+    # clients that don't derive from AsyncLLM may not have a stream method
+    stream = llm.stream(**kwargs) if hasattr(llm, "stream") else AsyncLLM.stream(llm, **kwargs)
+    async with aclosing(stream) as events:
+        async for event in events:
+            if isinstance(event, Completion):
+                return event
+            await on_delta(event)
+    raise RuntimeError(f"Stream of {llm!r} ended without a completion")
@@ -1,10 +1,12 @@
-from typing import List
+from typing import AsyncGenerator, List
 
 from google import genai
 from google.genai import types as genai_types
 from google.genai.errors import ServerError, ClientError
 import os
 from llm import common
+from llm.gemini_uploads import UploadRegistry
+from llm.scheduler import is_scheduled
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 import logging
@@ -16,6 +18,7 @@ from tenacity import (
     retry_if_exception,
     before_sleep_log,
 )
+import json
 import uuid
 
 
@@ -30,8 +33,8 @@ class RetryableError(RuntimeError):
 def is_retryable_error(exception: BaseException) -> bool:
     """Check if the exception is retryable (rate limit or server error)."""
     if isinstance(exception, ClientError):
-        # Retry on rate limits (429) and server errors (>=500)
-        return exception.code == 429 or exception.code >= 500
+        # Retry on rate limits (429) and server errors (>=500), scheduled calls back off in the scheduler
+        return (exception.code == 429 and not is_scheduled()) or exception.code >= 500
     # Keep existing retry behavior for ServerError, RetryableError, and RuntimeError
     return isinstance(exception, (ServerError, RetryableError, RuntimeError))
 
@@ -64,10 +67,11 @@ class GeminiLLM(common.AsyncLLM):
         )
         self._async_client = _client.aio
         self.model_name = model_name
+        self.uploads = UploadRegistry(self._upload_single_file)
 
     async def completion(
         self,
-        messages: list[common.Message],
+        messages: list[common.Message] | common.MessageHistory,
         max_tokens: int | None = 8192,
         model: str | None = None,
         temperature: float = 1.0,
@@ -79,6 +83,44 @@ class GeminiLLM(common.AsyncLLM):
         *args,  # consume unused args passed down
         **kwargs,  # consume unused kwargs passed down
     ) -> common.Completion:
+        config = self._config_into(
+            max_tokens, temperature, tools, tool_choice, system_prompt, force_tool_use
+        )
+        gemini_messages = await self._messages_into(messages, attach_files)
+        return await self._generate_content_with_retry(gemini_messages, config)
+
+    async def stream(
+        self,
+        messages: list[common.Message] | common.MessageHistory,
+        max_tokens: int | None = 8192,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        force_tool_use: bool = False,
+        attach_files: common.AttachedFiles | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        config = self._config_into(
+            max_tokens, temperature, tools, tool_choice, system_prompt, force_tool_use
+        )
+        gemini_messages = await self._messages_into(messages, attach_files)
+        async for event in common.retry_stream(
+            lambda: self._stream_content(gemini_messages, config), is_retryable_error
+        ):
+            yield event
+
+    @staticmethod
+    def _config_into(
+        max_tokens: int | None,
+        temperature: float,
+        tools: list[common.Tool] | None,
+        tool_choice: str | None,
+        system_prompt: str | None,
+        force_tool_use: bool,
+    ) -> genai_types.GenerateContentConfig:
         config = genai_types.GenerateContentConfig(
             max_output_tokens=max_tokens,
             temperature=temperature,
@@ -103,9 +145,7 @@ class GeminiLLM(common.AsyncLLM):
                         allowed_function_names=[tool_choice] if tool_choice else None,
                     )
                 )
-
-        gemini_messages = await self._messages_into(messages, attach_files)
-        return await self._generate_content_with_retry(gemini_messages, config)
+        return config
 
     @retry_gemini_errors
     async def _generate_content_with_retry(
@@ -122,6 +162,65 @@ class GeminiLLM(common.AsyncLLM):
             config=config,
         )
 
+        self._log_telemetry(telemetry, response, config)
+        return self._completion_from(response)
+
+    async def _stream_content(
+        self,
+        gemini_messages: List[genai_types.Content],
+        config: genai_types.GenerateContentConfig,
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        parts: List[genai_types.Part] = []
+        last = None
+        async for chunk in await self._async_client.models.generate_content_stream(
+            model=self.model_name,
+            contents=gemini_messages,
+            config=config,
+        ):
+            last = chunk
+            if not chunk.candidates or not chunk.candidates[0].content:
+                continue
+            for part in chunk.candidates[0].content.parts or []:
+                if part.text:
+                    yield common.ThinkingDelta(part.text) if part.thought else common.TextDelta(part.text)
+                    # text arrives in fragments, keep it as one part like a non-streamed response
+                    if parts and parts[-1].text and not parts[-1].function_call and parts[-1].thought == part.thought:
+                        parts[-1] = genai_types.Part(text=parts[-1].text + part.text, thought=part.thought)
+                        continue
+                if part.function_call and part.function_call.name:
+                    yield common.ToolUseDelta(
+                        part.function_call.id or "",
+                        part.function_call.name,
+                        json.dumps(part.function_call.args or {}),
+                    )
+                parts.append(part)
+
+        if last is None:
+            raise RetryableError("Empty stream")
+        self._log_telemetry(telemetry, last, config)
+        # the last chunk carries usage and finish reason, the content is spread over all of them
+        response = genai_types.GenerateContentResponse(
+            candidates=[
+                genai_types.Candidate(
+                    content=genai_types.Content(parts=parts, role="model"),
+                    finish_reason=last.candidates[0].finish_reason if last.candidates else None,
+                )
+            ]
+            if parts
+            else None,
+            usage_metadata=last.usage_metadata,
+        )
+        yield self._completion_from(response)
+
+    def _log_telemetry(
+        self,
+        telemetry: LLMTelemetry,
+        response: genai_types.GenerateContentResponse,
+        config: genai_types.GenerateContentConfig,
+    ) -> None:
         # Log telemetry - always call to ensure validation
         if hasattr(response, "usage_metadata"):
             usage = response.usage_metadata
@@ -148,17 +247,8 @@ class GeminiLLM(common.AsyncLLM):
                 provider="Gemini",
             )
 
-        return self._completion_from(response)
-
     async def upload_files(self, files: List[str]) -> List[genai_types.File]:
-        result = []
-        for f in files:
-            if not os.path.exists(f):
-                raise FileNotFoundError(f"File {f} does not exist")
-
-            uploaded = await self._upload_single_file(f)
-            result.append(uploaded)
-        return result
+        return await self.uploads.files(files)
 
     @retry_file_upload
     async def _upload_single_file(self, file_path: str) -> genai_types.File:
@@ -227,7 +317,7 @@ class GeminiLLM(common.AsyncLLM):
         )
 
     async def _messages_into(
-        self, messages: list[common.Message], files: common.AttachedFiles | None
+        self, messages: list[common.Message] | common.MessageHistory, files: common.AttachedFiles | None
     ) -> List[genai_types.Content]:
         theirs_messages: List[genai_types.Content] = []
         for message in messages:
@@ -259,15 +349,7 @@ class GeminiLLM(common.AsyncLLM):
             )
 
         if files:
-            uploaded = await self.upload_files(files.files)
-            files_parts = [
-                genai_types.Part.from_uri(
-                    file_uri=file.uri,
-                    mime_type=file.mime_type,
-                )
-                for file in uploaded
-                if file.uri and file.mime_type
-            ]
+            files_parts = await self.uploads.parts(files.files)
 
             match theirs_messages[-1].parts:
                 case list():
@@ -0,0 +1,125 @@
+"""
+Reuse of files uploaded to the Gemini files API.
+
+Attachments were uploaded one by one on every completion, although the same
+screenshots go out again on every retry and VLM call of a validation. The
+registry keys remote files by the SHA-256 of their content and hands out the
+handle again while it is live (Gemini keeps uploads for 48 hours). Files that
+are needed and not registered are uploaded concurrently, and a file already
+being uploaded by another request is awaited instead of uploaded twice.
+
+Small images are sent inline instead: a few hundred kilobytes in the request
+cost less than the extra round trip of an upload.
+
+GEMINI_INLINE_MAX_BYTES sets the size up to which images are inlined, 0 uploads everything.
+"""
+
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+import anyio
+from google.genai import types as genai_types
+from log import get_logger
+
+logger = get_logger(__name__)
+
+INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(512 * 1024)))
+# assumed lifetime when the API does not report one
+DEFAULT_TTL = timedelta(hours=47)
+# a handle must outlive the request it is used in
+EXPIRY_MARGIN = timedelta(minutes=10)
+
+
+@dataclass
+class _Upload:
+    file: genai_types.File
+    expires: datetime
+
+
+class UploadRegistry:
+    def __init__(
+        self,
+        upload: Callable[[str], Awaitable[genai_types.File]],
+        inline_max_bytes: int | None = None,
+        clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ):
+        self.upload = upload
+        self.inline_max_bytes = INLINE_MAX_BYTES if inline_max_bytes is None else inline_max_bytes
+        self.clock = clock
+        self._uploads: dict[str, _Upload] = {}
+        self._pending: dict[str, anyio.Event] = {}
+        self.uploaded = 0
+        self.reused = 0
+        self.inlined = 0
+
+    def metrics(self) -> dict:
+        return {
+            "uploaded": self.uploaded,
+            "reused": self.reused,
+            "inlined": self.inlined,
+            "live": len(self._uploads),
+        }
+
+    async def parts(self, paths: list[str]) -> list[genai_types.Part]:
+        """Parts referencing the files in order, inline data for small images and live uploads for the rest."""
+        parts: list[genai_types.Part | None] = [None] * len(paths)
+        remote: list[int] = []
+        for i, path in enumerate(paths):
+            mime_type, _ = mimetypes.guess_type(path)
+            if mime_type and mime_type.startswith("image/") and os.path.exists(path) and os.path.getsize(path) <= self.inline_max_bytes:
+                self.inlined += 1
+                parts[i] = genai_types.Part.from_bytes(data=await anyio.Path(path).read_bytes(), mime_type=mime_type)
+            else:
+                remote.append(i)
+        for i, file in zip(remote, await self.files([paths[i] for i in remote])):
+            if file.uri and file.mime_type:
+                parts[i] = genai_types.Part.from_uri(file_uri=file.uri, mime_type=file.mime_type)
+        return [part for part in parts if part is not None]
+
+    async def files(self, paths: list[str]) -> list[genai_types.File]:
+        """Live remote files for the paths, uploading the missing ones concurrently."""
+        for path in paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"File {path} does not exist")
+        files: list[genai_types.File | None] = [None] * len(paths)
+
+        async def resolve(i: int, path: str):
+            digest = hashlib.sha256(await anyio.Path(path).read_bytes()).hexdigest()
+            files[i] = await self._file(path, digest)
+
+        async with anyio.create_task_group() as tg:
+            for i, path in enumerate(paths):
+                tg.start_soon(resolve, i, path)
+        return files  # pyright: ignore[reportReturnType]
+
+    async def _file(self, path: str, digest: str) -> genai_types.File:
+        while True:
+            self._evict_expired()
+            if (entry := self._uploads.get(digest)) is not None:
+                self.reused += 1
+                logger.debug(f"Reusing upload {entry.file.name} for {path}")
+                return entry.file
+            if (pending := self._pending.get(digest)) is None:
+                break
+            # uploaded by another request, on failure the loop uploads it here
+            await pending.wait()
+
+        event = self._pending[digest] = anyio.Event()
+        try:
+            file = await self.upload(path)
+            self.uploaded += 1
+            if file.state != genai_types.FileState.FAILED:
+                expires = file.expiration_time or self.clock() + DEFAULT_TTL
+                self._uploads[digest] = _Upload(file, expires)
+            return file
+        finally:
+            del self._pending[digest]
+            event.set()
+
+    def _evict_expired(self) -> None:
+        deadline = self.clock() + EXPIRY_MARGIN
+        for digest in [d for d, entry in self._uploads.items() if entry.expires <= deadline]:
+            del self._uploads[digest]
@@ -1,5 +1,5 @@
 from langfuse.decorators import langfuse_context, observe
-from llm.common import AsyncLLM, Message, Tool, Completion
+from llm.common import AsyncLLM, Message, MessageHistory, Tool, Completion
 
 
 class LangfuseLLM(AsyncLLM):
@@ -10,7 +10,7 @@ class LangfuseLLM(AsyncLLM):
     async def completion(
         self,
         model: str,
-        messages: list[Message],
+        messages: list[Message] | MessageHistory,
         max_tokens: int,
         temperature: float = 1.0,
         tools: list[Tool] | None = None,
@@ -19,7 +19,7 @@ class LangfuseLLM(AsyncLLM):
         **kwargs,
     ) -> Completion:
         langfuse_context.update_current_observation(
-            input=messages,
+            input=list(messages),
             model=model,
             model_parameters={
                 "maxTokens": max_tokens,
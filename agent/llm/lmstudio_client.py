@@ -96,7 +96,7 @@ class LMStudioLLM(OpenAILLM):
 
     # _messages_into, _tools_into, and _completion_into inherited from OpenAILLM
     # We only override completion to preserve legacy behavior (parsing <tool_call> fallbacks).
-    def _messages_into(self, messages: List[common.Message]) -> List[Dict[str, Any]]:
+    def _messages_into(self, messages: List[common.Message] | common.MessageHistory) -> List[Dict[str, Any]]:
         # Delegate entirely to base class implementation
         return super()._messages_into(messages)  # type: ignore[attr-defined]
 
@@ -127,7 +127,7 @@ class LMStudioLLM(OpenAILLM):
 
     async def completion(
         self,
-        messages: List[common.Message],
+        messages: List[common.Message] | common.MessageHistory,
         max_tokens: int,
         model: str | None = None,
         temperature: float = 1.0,
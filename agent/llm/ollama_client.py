@@ -1,6 +1,8 @@
-from typing import List, Dict, Any
+from typing import AsyncGenerator, List, Dict, Any
+import json
 import ollama
 from llm import common
+from llm.scheduler import is_scheduled
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 import logging
@@ -9,11 +11,19 @@ from tenacity import (
     stop_after_attempt,
     wait_exponential_jitter,
     before_sleep_log,
+    retry_if_exception,
 )
 
 logger = get_logger(__name__)
 
 
+def is_retryable_error(exception: BaseException) -> bool:
+    """Anything but client errors, scheduled calls leave rate limits (429) to the scheduler."""
+    if isinstance(exception, ollama.ResponseError):
+        return (exception.status_code == 429 and not is_scheduled()) or exception.status_code >= 500
+    return True
+
+
 class OllamaLLM:
     def __init__(
         self, host: str = "http://localhost:11434", model_name: str = "devstral:latest"
@@ -22,7 +32,7 @@ class OllamaLLM:
         self.model_name = model_name
         self.default_model = model_name
 
-    def _messages_into(self, messages: List[common.Message]) -> List[Dict[str, Any]]:
+    def _messages_into(self, messages: List[common.Message] | common.MessageHistory) -> List[Dict[str, Any]]:
         ollama_messages = []
         for message in messages:
             content_parts = []
@@ -116,32 +126,22 @@ class OllamaLLM:
             stop_reason="end_turn",
         )
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential_jitter(initial=1, max=60, jitter=1),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
-        reraise=True,
-    )
-    async def completion(
+    def _request_into(
         self,
-        messages: List[common.Message],
+        messages: List[common.Message] | common.MessageHistory,
         max_tokens: int,
-        model: str | None = None,
-        temperature: float = 1.0,
-        tools: List[common.Tool] | None = None,
-        tool_choice: str | None = None,
-        system_prompt: str | None = None,
-        *args,
-        **kwargs,
-    ) -> common.Completion:
-        chosen_model = model or self.default_model
+        model: str | None,
+        temperature: float,
+        tools: List[common.Tool] | None,
+        system_prompt: str | None,
+    ) -> Dict[str, Any]:
         ollama_messages = self._messages_into(messages)
 
         if system_prompt:
             ollama_messages.insert(0, {"role": "system", "content": system_prompt})
 
         request_params = {
-            "model": chosen_model,
+            "model": model or self.default_model,
             "messages": ollama_messages,
             "options": {
                 "temperature": temperature,
@@ -152,30 +152,114 @@ class OllamaLLM:
         ollama_tools = self._tools_into(tools)
         if ollama_tools:
             request_params["tools"] = ollama_tools
+        return request_params
 
-        logger.info(f"Ollama request params: {request_params}")
-        telemetry = LLMTelemetry()
-        telemetry.start_timing()
-
-        response = await self.client.chat(**request_params)
-
+    @staticmethod
+    def _log_telemetry(
+        telemetry: LLMTelemetry, request_params: Dict[str, Any], response: Any
+    ) -> None:
         # log telemetry - ollama returns token counts in response dict
         # use None instead of 0 as default to trigger validation if tokens are missing
-        input_tokens = response.get("prompt_eval_count")
-        output_tokens = response.get("eval_count")
-
         telemetry.log_completion(
-            model=chosen_model,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            temperature=temperature,
-            has_tools=ollama_tools is not None,
+            model=request_params["model"],
+            input_tokens=response.get("prompt_eval_count"),
+            output_tokens=response.get("eval_count"),
+            temperature=request_params["options"]["temperature"],
+            has_tools="tools" in request_params,
             provider="Ollama",
         )
 
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(initial=1, max=60, jitter=1),
+        retry=retry_if_exception(is_retryable_error),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True,
+    )
+    async def completion(
+        self,
+        messages: List[common.Message] | common.MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> common.Completion:
+        request_params = self._request_into(
+            messages, max_tokens, model, temperature, tools, system_prompt
+        )
+
+        logger.info(f"Ollama request params: {request_params}")
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        response = await self.client.chat(**request_params)
+        self._log_telemetry(telemetry, request_params, response)
+
         logger.info(f"Ollama raw response: {response}")
-        completion = self._completion_into(response, input_tokens=input_tokens)
+        completion = self._completion_into(
+            response, input_tokens=response.get("prompt_eval_count")
+        )
         logger.info(
             f"Parsed completion: content_length={len(completion.content)}, stop_reason={completion.stop_reason}"
         )
         return completion
+
+    async def stream(
+        self,
+        messages: List[common.Message] | common.MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        request_params = self._request_into(
+            messages, max_tokens, model, temperature, tools, system_prompt
+        )
+        logger.info(f"Ollama streaming request params: {request_params}")
+        async for event in common.retry_stream(
+            lambda: self._stream_chunks(request_params),
+            is_retryable_error,
+            attempts=3,
+            initial=1,
+        ):
+            yield event
+
+    async def _stream_chunks(
+        self, request_params: Dict[str, Any]
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        text: List[str] = []
+        tool_calls: List[Any] = []
+        last: Any = {}
+        async for chunk in await self.client.chat(**request_params, stream=True):
+            last = chunk
+            message = chunk.get("message") or {}
+            if content := message.get("content"):
+                text.append(content)
+                yield common.TextDelta(content)
+            # ollama sends every tool call whole, in a single chunk
+            for tool_call in message.get("tool_calls") or []:
+                tool_calls.append(tool_call)
+                function = tool_call["function"]
+                yield common.ToolUseDelta(
+                    tool_call.get("id") or "", function["name"], json.dumps(dict(function["arguments"] or {}))
+                )
+
+        self._log_telemetry(telemetry, request_params, last)
+        # the last chunk carries the token counts, the content is spread over all of them
+        response = {
+            "message": {"content": "".join(text), "tool_calls": tool_calls},
+            "prompt_eval_count": last.get("prompt_eval_count") or 0,
+            "eval_count": last.get("eval_count") or 0,
+        }
+        yield self._completion_into(response)
@@ -8,6 +8,7 @@ LMStudio, OpenRouter style endpoints, etc.)
 Supports:
 - Tool / function calling
 - System prompts
+- Streaming
 - Token usage telemetry
 - Retry for transient errors
 - Provider name override for subclasses / alternative endpoints
@@ -15,8 +16,9 @@ Supports:
 
 from __future__ import annotations
 
-from typing import List, Dict, Any, Literal, cast
-from openai import AsyncOpenAI
+from types import SimpleNamespace
+from typing import AsyncGenerator, List, Dict, Any, Literal, cast
+from openai import AsyncOpenAI, APIStatusError
 import json
 import os
 import logging
@@ -25,15 +27,24 @@ from tenacity import (
     stop_after_attempt,
     wait_exponential_jitter,
     before_sleep_log,
+    retry_if_exception,
 )
 from llm import common
 from llm.common import ToolUseResult
+from llm.scheduler import is_scheduled
 from llm.telemetry import LLMTelemetry
 from log import get_logger
 
 logger = get_logger(__name__)
 
 
+def is_retryable_error(exception: BaseException) -> bool:
+    """Anything but client errors, scheduled calls leave rate limits (429) to the scheduler."""
+    if isinstance(exception, APIStatusError):
+        return (exception.status_code == 429 and not is_scheduled()) or exception.status_code >= 500
+    return True
+
+
 class OpenAILLM:
     """
     Thin wrapper around a Chat Completions API adapting it to the
@@ -86,7 +97,7 @@ class OpenAILLM:
 
     # ------------- Internal transforms -------------
 
-    def _messages_into(self, messages: List[common.Message]) -> List[Dict[str, Any]]:
+    def _messages_into(self, messages: List[common.Message] | common.MessageHistory) -> List[Dict[str, Any]]:
         """
         Convert internal messages to OpenAI-format chat messages.
 
@@ -266,26 +277,16 @@ class OpenAILLM:
             stop_reason=stop_reason,
         )
 
-    # ------------- Public API -------------
-
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential_jitter(initial=1, max=40, jitter=1),
-        before_sleep=before_sleep_log(logger, logging.WARNING),
-        reraise=True,
-    )
-    async def completion(
+    def _request_into(
         self,
-        messages: List[common.Message],
+        messages: List[common.Message] | common.MessageHistory,
         max_tokens: int,
-        model: str | None = None,
-        temperature: float = 1.0,
-        tools: List[common.Tool] | None = None,
-        tool_choice: str | None = None,
-        system_prompt: str | None = None,
-        *args,
-        **kwargs,
-    ) -> common.Completion:
+        model: str | None,
+        temperature: float,
+        tools: List[common.Tool] | None,
+        tool_choice: str | None,
+        system_prompt: str | None,
+    ) -> Dict[str, Any]:
         chosen_model = model or self.default_model
         openai_messages = self._messages_into(messages)
 
@@ -325,41 +326,22 @@ class OpenAILLM:
             f"tools={len(openai_tools) if openai_tools else 0} "
             f"{'tool_choice=' + tool_choice if tool_choice else ''}"
         )
+        return request
+
+    def _log_telemetry(
+        self, telemetry: LLMTelemetry, request: Dict[str, Any], usage: Any
+    ) -> None:
+        # always log telemetry to ensure validation, missing usage triggers validation errors
+        telemetry.log_completion(
+            model=request["model"],
+            input_tokens=usage.prompt_tokens if usage else None,
+            output_tokens=usage.completion_tokens if usage else None,
+            temperature=request["temperature"],
+            has_tools="tools" in request,
+            provider=self.provider_name,
+        )
 
-        telemetry = LLMTelemetry()
-        telemetry.start_timing()
-
-        try:
-            response = await self.client.chat.completions.create(**request)
-        except Exception as e:
-            logger.error(
-                f"{self.provider_name} API error for model '{chosen_model}': {e}"
-            )
-            raise
-
-        # always log telemetry to ensure validation
-        if hasattr(response, "usage") and response.usage:
-            telemetry.log_completion(
-                model=chosen_model,
-                input_tokens=response.usage.prompt_tokens,
-                output_tokens=response.usage.completion_tokens,
-                temperature=temperature,
-                has_tools=openai_tools is not None,
-                provider=self.provider_name,
-            )
-        else:
-            # always call telemetry even without usage data - this will trigger validation errors
-            telemetry.log_completion(
-                model=chosen_model,
-                input_tokens=None,
-                output_tokens=None,
-                temperature=temperature,
-                has_tools=openai_tools is not None,
-                provider=self.provider_name,
-            )
-
-        completion = self._completion_into(response)
-
+    def _log_response(self, completion: common.Completion) -> None:
         tool_use_blocks = [
             b for b in completion.content if isinstance(b, common.ToolUse)
         ]
@@ -373,7 +355,120 @@ class OpenAILLM:
             f"{self.provider_name} response stop_reason={completion.stop_reason} "
             f"input={completion.input_tokens} output={completion.output_tokens}"
         )
+
+    # ------------- Public API -------------
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential_jitter(initial=1, max=40, jitter=1),
+        retry=retry_if_exception(is_retryable_error),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True,
+    )
+    async def completion(
+        self,
+        messages: List[common.Message] | common.MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> common.Completion:
+        request = self._request_into(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        try:
+            response = await self.client.chat.completions.create(**request)
+        except Exception as e:
+            logger.error(
+                f"{self.provider_name} API error for model '{request['model']}': {e}"
+            )
+            raise
+
+        self._log_telemetry(telemetry, request, getattr(response, "usage", None))
+        completion = self._completion_into(response)
+        self._log_response(completion)
         return completion
 
+    async def stream(
+        self,
+        messages: List[common.Message] | common.MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: List[common.Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        request = self._request_into(
+            messages, max_tokens, model, temperature, tools, tool_choice, system_prompt
+        )
+        request.update(stream=True, stream_options={"include_usage": True})
+        async for event in common.retry_stream(
+            lambda: self._stream_chunks(request),
+            is_retryable_error,
+            attempts=3,
+            initial=1,
+        ):
+            yield event
+
+    async def _stream_chunks(
+        self, request: Dict[str, Any]
+    ) -> AsyncGenerator[common.StreamEvent, None]:
+        telemetry = LLMTelemetry()
+        telemetry.start_timing()
+
+        text: List[str] = []
+        # tool calls arrive in fragments keyed by their index, id and name come with the first one
+        calls: Dict[int, Dict[str, Any]] = {}
+        finish_reason, usage = None, None
+        stream = await self.client.chat.completions.create(**request)
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            delta = choice.delta
+            if delta.content:
+                text.append(delta.content)
+                yield common.TextDelta(delta.content)
+            for tc in delta.tool_calls or []:
+                call = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function and tc.function.name:
+                    call["name"] = tc.function.name
+                    yield common.ToolUseDelta(call["id"], call["name"], "")
+                if tc.function and tc.function.arguments:
+                    call["arguments"] += tc.function.arguments
+                    yield common.ToolUseDelta(call["id"], call["name"], tc.function.arguments)
+
+        self._log_telemetry(telemetry, request, usage)
+        # same shape as a non-streamed response so subclasses post-process it the same way
+        message = SimpleNamespace(
+            content="".join(text) or None,
+            tool_calls=[
+                SimpleNamespace(id=c["id"], function=SimpleNamespace(name=c["name"], arguments=c["arguments"]))
+                for _, c in sorted(calls.items())
+            ] or None,
+        )
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason=finish_reason)],
+            usage=usage,
+        )
+        completion = self._completion_into(response)
+        self._log_response(completion)
+        yield completion
+
 
 __all__ = ["OpenAILLM"]
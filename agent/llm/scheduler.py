@@ -0,0 +1,359 @@
+"""
+Process-wide scheduler for LLM requests.
+
+Beam searches for handlers, frontend and the FSM conversation all share the same provider quota.
+Every client created by get_llm_client is wrapped in ScheduledLLM, which takes a slot from the
+provider's queue before calling the model:
+
+- concurrency, requests-per-minute and tokens-per-minute budgets per provider
+  (LLM_<BACKEND>_MAX_CONCURRENCY, LLM_<BACKEND>_RPM, LLM_<BACKEND>_TPM, unset means unlimited)
+- waiting requests are granted by priority, see llm_priority: user-facing FSM calls first,
+  then beam nodes by depth so shallow nodes are not starved by deep ones
+- a rate limit error pauses the whole provider and halves its concurrency instead of letting
+  every in-flight request retry on its own; the request goes back to the queue
+"""
+
+import heapq
+import itertools
+import os
+import time
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterator, Iterator
+import anyio
+from llm.common import AsyncLLM, Completion, Message, MessageHistory, StreamEvent, Tool
+from log import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SEARCH = 10
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_SEARCH)
+_scheduled: ContextVar[bool] = ContextVar("llm_scheduled", default=False)
+
+
+@contextmanager
+def llm_priority(level: int) -> Iterator[None]:
+    """Set the priority of LLM requests made in this context, lower runs first."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_scheduled() -> bool:
+    """True inside a scheduled call: clients should leave rate limit errors to the scheduler."""
+    return _scheduled.get()
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    # anthropic and openai errors carry status_code, google genai errors carry code
+    return getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float(headers["retry-after"]) if headers and "retry-after" in headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages: list[Message] | MessageHistory, system_prompt: str | None = None, tools: list[Tool] | None = None) -> int:
+    """Rough input size (4 characters per token) used to reserve budget before the call."""
+    chars = len(system_prompt or "") + sum(len(str(tool)) for tool in tools or [])
+    for message in messages:
+        chars += sum(len(str(block)) for block in message.content)
+    return chars // 4 + 1
+
+
+@dataclass
+class Budget:
+    max_concurrency: int = 32
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+
+    @classmethod
+    def from_env(cls, provider: str) -> "Budget":
+        prefix = f"LLM_{provider.upper()}_"
+        rpm, tpm = os.getenv(prefix + "RPM"), os.getenv(prefix + "TPM")
+        return cls(
+            max_concurrency=int(os.getenv(prefix + "MAX_CONCURRENCY", cls.max_concurrency)),
+            requests_per_minute=float(rpm) if rpm else None,
+            tokens_per_minute=float(tpm) if tpm else None,
+        )
+
+
+class _Bucket:
+    """Token bucket refilled continuously up to one minute of budget."""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # requests bigger than the whole budget go through once the bucket is full
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    event: anyio.Event = field(compare=False, default_factory=anyio.Event)
+    granted: bool = field(compare=False, default=False)
+    cancelled: bool = field(compare=False, default=False)
+
+
+class _Provider:
+    def __init__(self, name: str, budget: Budget, clock):
+        now = clock()
+        self.name = name
+        self.budget = budget
+        self.clock = clock
+        self.limit = float(budget.max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.strikes = 0
+        self.requests = _Bucket(budget.requests_per_minute, now) if budget.requests_per_minute else None
+        self.tokens = _Bucket(budget.tokens_per_minute, now) if budget.tokens_per_minute else None
+        self.waiters: list[_Waiter] = []
+
+    def dispatch(self, caller: _Waiter | None = None) -> None:
+        """Grant slots to the queue head while budgets allow, wake a head that has to wait for time."""
+        now = self.clock()
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.refill(now)
+        while self.waiters:
+            head = self.waiters[0]
+            if head.cancelled:
+                heapq.heappop(self.waiters)
+                continue
+            # strict priority: a blocked head holds back everything behind it
+            if self.in_flight >= max(1, int(self.limit)):
+                return
+            if self._wait_time(head, now) > 0:
+                if head is not caller:
+                    # it may be sleeping without a timeout, let it schedule its own wakeup
+                    head.event.set()
+                return
+            heapq.heappop(self.waiters)
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= head.tokens
+            self.in_flight += 1
+            head.granted = True
+            head.event.set()
+
+    def _wait_time(self, waiter: _Waiter, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1) if self.requests is not None else 0.0,
+            self.tokens.wait_time(waiter.tokens) if self.tokens is not None else 0.0,
+        )
+
+    def wakeup_in(self, waiter: _Waiter) -> float | None:
+        """Seconds until the waiter may be granted if it heads the queue, None if it waits for a release."""
+        if not self.waiters or self.waiters[0] is not waiter or self.in_flight >= max(1, int(self.limit)):
+            return None
+        return max(self._wait_time(waiter, self.clock()), 0.001)
+
+    def release(self, reserved: int, used: int | None) -> None:
+        self.in_flight -= 1
+        if self.tokens is not None and used is not None:
+            self.tokens.level += reserved - used
+        self.dispatch()
+
+    def succeeded(self) -> None:
+        self.strikes = 0
+        if self.limit < self.budget.max_concurrency:
+            self.limit = min(self.budget.max_concurrency, self.limit + 1 / self.limit)
+
+    def rate_limited(self, retry_after: float | None) -> float:
+        now = self.clock()
+        if now < self.paused_until:
+            # requests sent before the pause started, the provider already backed off for them
+            return self.paused_until - now
+        self.strikes += 1
+        delay = retry_after if retry_after is not None else min(60.0, 1.5 * 2 ** (self.strikes - 1))
+        self.paused_until = now + delay
+        self.limit = max(1.0, self.limit / 2)
+        return delay
+
+
+class _Slot:
+    def __init__(self, provider: _Provider, tokens: int):
+        self.provider = provider
+        self.reserved = tokens
+        self.used: int | None = None
+
+
+class LLMScheduler:
+    def __init__(self, budgets: dict[str, Budget] | None = None, clock=time.monotonic):
+        self.budgets = budgets or {}
+        self.clock = clock
+        self._providers: dict[str, _Provider] = {}
+        self._seq = itertools.count()
+
+    def provider(self, name: str) -> _Provider:
+        if name not in self._providers:
+            budget = self.budgets.get(name) or Budget.from_env(name)
+            self._providers[name] = _Provider(name, budget, self.clock)
+        return self._providers[name]
+
+    @asynccontextmanager
+    async def slot(self, provider_name: str, tokens: int, priority: int | None = None) -> AsyncIterator[_Slot]:
+        provider = self.provider(provider_name)
+        waiter = _Waiter(_priority.get() if priority is None else priority, next(self._seq), tokens)
+        heapq.heappush(provider.waiters, waiter)
+        try:
+            while True:
+                provider.dispatch(waiter)
+                if waiter.granted:
+                    break
+                waiter.event = anyio.Event()
+                with anyio.move_on_after(provider.wakeup_in(waiter)):
+                    await waiter.event.wait()
+        except BaseException:
+            if waiter.granted:
+                provider.release(tokens, None)
+            else:
+                waiter.cancelled = True
+                provider.dispatch()
+            raise
+
+        slot = _Slot(provider, tokens)
+        try:
+            yield slot
+        finally:
+            provider.release(tokens, slot.used)
+
+
+scheduler = LLMScheduler()
+
+
+class ScheduledLLM(AsyncLLM):
+    """Wraps a client so its requests go through the provider queue of the shared scheduler."""
+
+    def __init__(self, client: AsyncLLM, provider: str, scheduler: LLMScheduler | None = None, max_rate_limit_retries: int = 8):
+        self.client = client
+        self.provider = provider
+        self._scheduler = scheduler
+        self.max_rate_limit_retries = max_rate_limit_retries
+
+    @property
+    def scheduler(self) -> LLMScheduler:
+        # resolved per call so tests can swap the module singleton
+        return self._scheduler or scheduler
+
+    async def completion(
+        self,
+        messages: list[Message] | MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> Completion:
+        tokens = estimate_tokens(messages, system_prompt, tools) + (max_tokens or 0)
+        for attempt in itertools.count():
+            async with self.scheduler.slot(self.provider, tokens) as slot:
+                marker = _scheduled.set(True)
+                try:
+                    completion = await self.client.completion(
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        model=model,
+                        temperature=temperature,
+                        tools=tools,
+                        tool_choice=tool_choice,
+                        system_prompt=system_prompt,
+                        *args,
+                        **kwargs,
+                    )
+                except Exception as exc:
+                    if not is_rate_limit_error(exc) or attempt >= self.max_rate_limit_retries:
+                        raise
+                    delay = slot.provider.rate_limited(_retry_after(exc))
+                    logger.warning(f"{self.provider} rate limited, pausing requests for {delay:.1f}s")
+                    continue
+                finally:
+                    _scheduled.reset(marker)
+                slot.used = completion.input_tokens + completion.output_tokens
+                slot.provider.succeeded()
+                return completion
+        raise AssertionError("unreachable")
+
+    async def stream(
+        self,
+        messages: list[Message] | MessageHistory,
+        max_tokens: int,
+        model: str | None = None,
+        temperature: float = 1.0,
+        tools: list[Tool] | None = None,
+        tool_choice: str | None = None,
+        system_prompt: str | None = None,
+        *args,
+        **kwargs,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Same as completion, the slot is held until the stream ends."""
+        tokens = estimate_tokens(messages, system_prompt, tools) + (max_tokens or 0)
+        for attempt in itertools.count():
+            started = limited = False
+            async with self.scheduler.slot(self.provider, tokens) as slot:
+                stream = self.client.stream(
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    model=model,
+                    temperature=temperature,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    system_prompt=system_prompt,
+                    *args,
+                    **kwargs,
+                )
+                async with aclosing(stream) as events:
+                    while True:
+                        # marked only while the client runs, not while the consumer handles an event
+                        marker = _scheduled.set(True)
+                        try:
+                            event = await anext(events)
+                        except StopAsyncIteration:
+                            break
+                        except Exception as exc:
+                            # a stream that already produced output can't be restarted transparently
+                            if started or not is_rate_limit_error(exc) or attempt >= self.max_rate_limit_retries:
+                                raise
+                            delay = slot.provider.rate_limited(_retry_after(exc))
+                            logger.warning(f"{self.provider} rate limited, pausing requests for {delay:.1f}s")
+                            limited = True
+                            break
+                        finally:
+                            _scheduled.reset(marker)
+                        started = True
+                        if isinstance(event, Completion):
+                            slot.used = event.input_tokens + event.output_tokens
+                            slot.provider.succeeded()
+                        yield event
+            if not limited:
+                return
+        raise AssertionError("unreachable")
+
+    def __repr__(self):
+        return f"ScheduledLLM(client={self.client!r}, provider={self.provider})"
@@ -2,8 +2,9 @@ import itertools
 import os
 import re
 from typing import Literal, Dict
-from llm.common import AsyncLLM, Message, TextRaw, ContentBlock, ToolUse
+from llm.common import AsyncLLM, DeltaCallback, Message, MessageHistory, TextRaw, ContentBlock, ToolUse, stream_completion
 from llm.cached import CachedLLM, CacheMode
+from llm.scheduler import ScheduledLLM
 from llm.models_config import ModelCategory, get_model_for_category
 from llm.providers import get_backend_for_model
 from llm.client import create_client
@@ -42,10 +43,12 @@ def extract_tag(source: str | None, tag: str):
 
 async def loop_completion(
     m_client: AsyncLLM,
-    messages: list[Message],
+    messages: list[Message] | MessageHistory,
     system_prompt: str | None = None,
+    on_delta: DeltaCallback | None = None,
     **kwargs,
 ) -> Message:
+    """Assistant message of a turn, continued while the model stops on max_tokens; streamed to `on_delta` if set."""
     content: list[ContentBlock] = []
     while True:
         payload = (
@@ -53,9 +56,14 @@ async def loop_completion(
             if content
             else messages
         )
-        completion = await m_client.completion(
-            messages=payload, system_prompt=system_prompt, **kwargs
-        )
+        if on_delta is not None:
+            completion = await stream_completion(
+                m_client, on_delta, messages=payload, system_prompt=system_prompt, **kwargs
+            )
+        else:
+            completion = await m_client.completion(
+                messages=payload, system_prompt=system_prompt, **kwargs
+            )
         content.extend(completion.content)
         # If the model returned any tool_use, stop immediately to allow tool_result to follow
         has_tool_use = any(isinstance(b, ToolUse) for b in completion.content)
@@ -117,7 +125,7 @@ def get_llm_client(
 
     # create new client
     logger.debug(f"Creating new LLM client for {backend}/{model_name}")
-    client = create_client(backend, model_name, client_params)
+    client = ScheduledLLM(create_client(backend, model_name, client_params), backend)
 
     # wrap with caching if enabled
     if cache_mode != "off":
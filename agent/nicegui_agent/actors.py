@@ -1,9 +1,13 @@
 import jinja2
 import logging
-import anyio
 from typing import Callable, Awaitable
 from core.base_node import Node
+from core.check_cache import cached_check
+from core.check_scheduler import Check, format_errors
+from core import check_scheduler
+from core import incremental
 from core.workspace import Workspace
+from core.tool_engine import Effect, PURE
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
 from llm.common import AsyncLLM, Message, TextRaw, Tool, ToolUse, ToolUseResult
 from nicegui_agent import playbooks
@@ -12,6 +16,9 @@ from integrations.dbrx import DatabricksClient
 
 logger = logging.getLogger(__name__)
 
+# sources covered by the import graph of incremental checks
+PYTHON_SOURCES = ["app", "tests", "main.py"]
+
 
 class NiceguiActor(FileOperationsActor):
     root: Node[BaseData] | None = None
@@ -153,12 +160,12 @@ class NiceguiActor(FileOperationsActor):
 
     def select(self, node: Node[BaseData]) -> list[Node[BaseData]]:
         candidates = []
-        all_children = node.get_all_children()
-        for n in all_children:
-            if n.is_leaf and n.depth <= self.max_depth:
+        tree_size = node.subtree_size
+        for n in node.get_leaves():
+            if n.depth <= self.max_depth:
                 if n.data.should_branch:
                     effective_beam_width = (
-                        1 if len(all_children) > (n.depth + 1) else self.beam_width
+                        1 if tree_size > (n.depth + 1) else self.beam_width
                     )  # meaning we already branched once
                     logger.info(
                         f"Selecting candidates with effective beam width: {effective_beam_width}, current depth: {n.depth}/{self.max_depth}"
@@ -258,6 +265,12 @@ class NiceguiActor(FileOperationsActor):
 
         return tools
 
+    def tool_effect(self, block: ToolUse) -> Effect:
+        # databricks lookups don't touch the workspace
+        if block.name.startswith("databricks_"):
+            return PURE
+        return super().tool_effect(block)
+
     async def handle_custom_tool(
         self, tool_use: ToolUse, node: Node[BaseData]
     ) -> ToolUseResult:
@@ -463,14 +476,21 @@ class NiceguiActor(FileOperationsActor):
             case _:
                 return await super().handle_custom_tool(tool_use, node)
 
+    @cached_check
     async def run_type_checks(self, node: Node[BaseData]) -> str | None:
+        targets = ["."]
+        if (scope := await incremental.affected_files(self.run_type_checks, node, roots=PYTHON_SOURCES, language="python")) is not None:
+            # the parent type checked, only files depending on the changes can break
+            if not (targets := await incremental.pyright_targets(node.data.workspace, scope[0])):
+                return None
         type_check_result = await node.data.workspace.exec(
-            ["uv", "run", "pyright", "."]
+            ["uv", "run", "pyright", *targets]
         )
         if type_check_result.exit_code != 0:
             return f"{type_check_result.stdout}\n{type_check_result.stderr}"
         return None
 
+    @cached_check
     async def run_lint_checks(self, node: Node[BaseData]) -> str | None:
         lint_result = await node.data.workspace.exec(
             ["uv", "run", "ruff", "check", ".", "--fix"]
@@ -479,12 +499,18 @@ class NiceguiActor(FileOperationsActor):
             return f"{lint_result.stdout}\n{lint_result.stderr}"
         return None
 
+    @cached_check
     async def run_tests(self, node: Node[BaseData]) -> str | None:
-        pytest_result = await node.data.workspace.exec_with_pg(["uv", "run", "pytest"])
+        tests = []
+        if (scope := await incremental.affected_files(self.run_tests, node, roots=PYTHON_SOURCES, language="python")) is not None:
+            if not (tests := incremental.affected_tests(scope[0], "python")):
+                return None
+        pytest_result = await node.data.workspace.exec_with_pg(["uv", "run", "pytest", *tests])
         if pytest_result.exit_code != 0:
             return f"{pytest_result.stdout}\n{pytest_result.stderr}"
         return None
 
+    @cached_check
     async def run_sqlmodel_checks(self, node: Node[BaseData]) -> str | None:
         try:
             await node.data.workspace.read_file("app/database.py")
@@ -499,6 +525,7 @@ class NiceguiActor(FileOperationsActor):
             )
         return None
 
+    @cached_check
     async def run_astgrep_checks(self, node: Node[BaseData]) -> str | None:
         astgrep_result = await node.data.workspace.exec(
             ["uv", "run", "ast-grep", "scan", "app/", "tests/"]
@@ -507,50 +534,23 @@ class NiceguiActor(FileOperationsActor):
             return f"{astgrep_result.stdout}\n{astgrep_result.stderr}"
         return None
 
-    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
+    async def run_checks(
+        self, node: Node[BaseData], user_prompt: str, fail_fast: bool = check_scheduler.FAIL_FAST
+    ) -> str | None:
         await notify_stage(
             self.event_callback, "🔍 Running validation checks", "in_progress"
         )
 
-        all_errors = ""
-        results = {}
-
-        async with anyio.create_task_group() as tg:
-
-            async def run_and_store(key, coro):
-                """Helper to run a coroutine and store its result in the results dict."""
-                start_time = anyio.current_time()
-                try:
-                    results[key] = await coro
-                except Exception as e:
-                    # Catch unexpected exceptions during check execution
-                    logger.error(f"Error running check {key}: {e}")
-                    results[key] = f"Internal error running check {key}: {e}"
-                finally:
-                    duration = anyio.current_time() - start_time
-                    logger.info(f"Check '{key}' completed in {duration:.2f} seconds")
-
-            tg.start_soon(run_and_store, "lint", self.run_lint_checks(node))
-            tg.start_soon(run_and_store, "type_check", self.run_type_checks(node))
-            tg.start_soon(run_and_store, "tests", self.run_tests(node))
-            tg.start_soon(run_and_store, "sqlmodel", self.run_sqlmodel_checks(node))
-            tg.start_soon(run_and_store, "astgrep", self.run_astgrep_checks(node))
-
-        if lint_result := results.get("lint"):
-            logger.info(f"Lint checks failed: {lint_result}")
-            all_errors += f"Lint errors:\n{lint_result}\n"
-        if type_check_result := results.get("type_check"):
-            logger.info(f"Type checks failed: {type_check_result}")
-            all_errors += f"Type errors:\n{type_check_result}\n"
-        if test_result := results.get("tests"):
-            logger.info(f"Tests failed: {test_result}")
-            all_errors += f"Test errors:\n{test_result}\n"
-        if sqlmodel_result := results.get("sqlmodel"):
-            logger.info(f"SQLModel checks failed: {sqlmodel_result}")
-            all_errors += f"SQLModel errors:\n{sqlmodel_result}\n"
-        if astgrep_result := results.get("astgrep"):
-            logger.info(f"AST-grep checks failed: {astgrep_result}")
-            all_errors += f"Code pattern violations:\n{astgrep_result}\n"
+        failures = await check_scheduler.run_checks([
+            Check("nicegui/lint", lambda: self.run_lint_checks(node), "Lint errors", cost=2),
+            Check("nicegui/type_check", lambda: self.run_type_checks(node), "Type errors", cost=10),
+            Check("nicegui/tests", lambda: self.run_tests(node), "Test errors", cost=20),
+            Check("nicegui/sqlmodel", lambda: self.run_sqlmodel_checks(node), "SQLModel errors", cost=15),
+            Check("nicegui/astgrep", lambda: self.run_astgrep_checks(node), "Code pattern violations", cost=2),
+        ], fail_fast=fail_fast)
+        for check, error in failures:
+            logger.info(f"{check.label} in {check.name}: {error}")
+        all_errors = format_errors(failures)
 
         if all_errors:
             await notify_stage(
@@ -570,6 +570,7 @@ class NiceguiActor(FileOperationsActor):
         self, workspace: Workspace, files: dict[str, str]
     ) -> list[str]:
         repo_files = set(files.keys())
+        await workspace.preload(dirs=["tests", "app", "."])
         repo_files.update(
             f"tests/{file_path}" for file_path in await workspace.ls("tests")
         )
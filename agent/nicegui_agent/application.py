@@ -1,18 +1,21 @@
 import os
 import anyio
+import anyio.to_thread
 import logging
 import enum
 from typing import Dict, Self, Optional, Literal, Any
 from dataclasses import dataclass
 from core.statemachine import StateMachine, State, Context
 from core.application import BaseApplicationContext
-from core.dagger_utils import write_files_bulk
+from core.git_diff import diff_overlay, read_tree
 from llm.utils import get_best_coding_llm_client, get_universal_llm_client
 from llm.alloy import AlloyLLM
 from core.actors import BaseData
 from core.base_node import Node
 from core.statemachine import MachineCheckpoint
 from core.workspace import Workspace
+from core import base_images
+from core.base_images import BaseImage
 from nicegui_agent.actors import NiceguiActor
 from nicegui_agent import playbooks
 import dagger
@@ -24,6 +27,35 @@ logging.basicConfig(level=logging.INFO)
 for package in ["urllib3", "httpx", "google_genai.models"]:
     logging.getLogger(package).setLevel(logging.WARNING)
 
+TEMPLATE_DIR = "./nicegui_agent/template"
+BASE_IMAGE = BaseImage(
+    name="nicegui",
+    image="alpine:3.21.3",
+    workdir="/app",
+    setup=[
+        [
+            "apk",
+            "add",
+            "--update",
+            "--no-cache",
+            "curl",
+            "python3",
+            "nodejs",
+            "gcc",
+            "musl-dev",
+            "linux-headers",
+        ],  # node for pyright, gcc/musl-dev for building ast-grep-cli
+        [
+            "sh",
+            "-c",
+            "curl -LsSf https://astral.sh/uv/install.sh | XDG_BIN_HOME=/usr/local/bin sh",
+        ],
+    ],
+    # the project itself is virtual (no build system), sync only installs the locked dependencies
+    lockfiles=["pyproject.toml", "uv.lock"],
+    install=[["uv", "sync"]],
+)
+
 
 class FSMState(str, enum.Enum):
     DATA_MODEL_GENERATION = "data_model_generation"
@@ -223,30 +255,12 @@ class FSMApplication:
         else:
             llm = get_best_coding_llm_client()
 
+        base, tag = await base_images.load(client, BASE_IMAGE, TEMPLATE_DIR)
         workspace = await Workspace.create(
             client=client,
-            base_image="alpine:3.21.3",
-            context=client.host().directory("./nicegui_agent/template"),
-            setup_cmd=[
-                [
-                    "apk",
-                    "add",
-                    "--update",
-                    "--no-cache",
-                    "curl",
-                    "python3",
-                    "nodejs",
-                    "gcc",
-                    "musl-dev",
-                    "linux-headers",
-                ],  # node for pyright, gcc/musl-dev for building ast-grep-cli
-                [
-                    "sh",
-                    "-c",
-                    "curl -LsSf https://astral.sh/uv/install.sh | XDG_BIN_HOME=/usr/local/bin sh",
-                ],
-                ["uv", "sync"],
-            ],
+            base_image=tag,
+            base=base,
+            context=client.host().directory(TEMPLATE_DIR),
         )
 
         # Extract event_callback from settings if provided
@@ -481,46 +495,27 @@ class FSMApplication:
         logger.info(
             f"SERVER get_diff_with: Received snapshot with {len(snapshot)} files."
         )
-
-        # Start with empty directory and git init
-        start = self.client.container().from_("alpine/git").with_workdir("/app")
-        start = start.with_exec(["git", "init"]).with_exec(
-            ["git", "config", "--global", "user.email", "agent@appbuild.com"]
-        )
         if snapshot:
             # Sort keys for consistent sample logging, especially in tests
             sorted_snapshot_keys = sorted(snapshot.keys())
             logger.info(
                 f"SERVER get_diff_with: Snapshot sample paths (up to 5): {sorted_snapshot_keys[:5]}"
             )
-            start = await write_files_bulk(start, snapshot, self.client)
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'snapshot'"]
-            )
         else:
             logger.info(
                 "SERVER get_diff_with: Snapshot is empty. Diff will be against template + FSM context files."
             )
-            # If no snapshot, create an empty initial commit
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'initial'", "--allow-empty"]
-            )
 
-        # Add template files (they will appear in diff if not in snapshot)
-        template_dir = self.client.host().directory("./nicegui_agent/template")
-        start = start.with_directory(".", template_dir)
+        # Same result as committing the snapshot, copying template + FSM context files on top
+        # and running `git add . && git diff HEAD`, computed in-process without a git container
+        template_files = await anyio.to_thread.run_sync(read_tree, "./nicegui_agent/template")
         logger.info("SERVER get_diff_with: Added template directory to workspace")
 
-        # Add FSM context files on top
-        start = await write_files_bulk(start, self.fsm.context.files, self.client)
-
         logger.info(
             "SERVER get_diff_with: Calling workspace.diff() to generate final diff."
         )
-        diff = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD"])
-            .stdout()
+        diff = await anyio.to_thread.run_sync(
+            diff_overlay, snapshot, template_files, self.fsm.context.files
         )
         logger.info(
             f"SERVER get_diff_with: workspace.diff() Succeeded. Diff length: {len(diff)}"
@@ -529,10 +524,10 @@ class FSMApplication:
             logger.warning(
                 "SERVER get_diff_with: Diff output is EMPTY. This might be expected if states match or an issue."
             )
-        diff_names_only = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD", "--name-only"])
-            .stdout()
+        diff_names_only = "\n".join(
+            line.split(" b/", 1)[-1]
+            for line in diff.splitlines()
+            if line.startswith("diff --git ")
         )
         logger.error(f"[diff] [names] {diff_names_only}")
 
@@ -30,8 +30,8 @@ class SimpleActor(BaseActor):
         return await self.dump_node(self.root)
 
     async def load(self, data: object):
-        if not isinstance(data, list):
-            raise ValueError(f"Expected list got {type(data)}")
+        if not isinstance(data, (list, dict)):
+            raise ValueError(f"Expected list or dict got {type(data)}")
         if not data:
             return
         self.root = await self.load_node(data)
@@ -66,3 +66,52 @@ async def test_actor_recovery():
         assert loaded_child.data.files == child.data.files
         assert loaded_child.data.messages == child.data.messages
         assert await loaded_child.data.workspace.read_file("test.txt") == "test"
+
+
+class FakeWorkspace:
+    clones = 0
+
+    def __init__(self, files: dict[str, str] | None = None):
+        self.files = dict(files or {})
+
+    def clone(self):
+        FakeWorkspace.clones += 1
+        return FakeWorkspace(self.files)
+
+    def write_file(self, path: str, contents: str):
+        self.files[path] = contents
+        return self
+
+    def rm(self, path: str):
+        self.files.pop(path, None)
+        return self
+
+
+async def test_workspaces_are_rehydrated_lazily():
+    base = FakeWorkspace({"template.txt": "template"})
+    root = Node[BaseData](BaseData(base.clone(), [Message(role="user", content=[TextRaw("root")])]))  # pyright: ignore[reportArgumentType]
+    parent = root
+    for depth in range(4):
+        for sibling in range(3):
+            files = {f"depth{depth}.txt": f"{depth}.{sibling}", "template.txt": None} if depth == 1 else {f"depth{depth}.txt": f"{depth}.{sibling}"}
+            node = Node[BaseData](BaseData(None, [Message(role="assistant", content=[TextRaw(f"{depth}.{sibling}")])], files), parent)  # pyright: ignore[reportArgumentType]
+            parent.add_child(node)
+        parent = node
+    dumped = await SimpleActor(base, root).dump()  # pyright: ignore[reportArgumentType]
+
+    FakeWorkspace.clones = 0
+    loaded = SimpleActor(base)  # pyright: ignore[reportArgumentType]
+    await loaded.load(dumped)
+    assert loaded.root is not None and FakeWorkspace.clones == 0
+    # the last node built, siblings of one depth are the same apart from their files
+    leaf = next(node for node in loaded.root.get_leaves() if node.depth == 4 and node.data.messages == parent.data.messages)
+
+    # the deepest leaf is built in one clone, its ancestors stay unmaterialized
+    assert leaf.data.workspace.files == {"depth0.txt": "0.2", "depth1.txt": "1.2", "depth2.txt": "2.2", "depth3.txt": "3.2"}
+    assert FakeWorkspace.clones == 1
+    assert not leaf.parent.data.is_materialized  # pyright: ignore[reportOptionalMemberAccess]
+    # a sibling builds on the nearest materialized ancestor
+    assert loaded.root.data.workspace.files == {"template.txt": "template"}
+    sibling = next(node for node in loaded.root.children if node.data.files == {"depth0.txt": "0.0"})
+    assert sibling.data.workspace.files == {"template.txt": "template", "depth0.txt": "0.0"}
+    assert FakeWorkspace.clones == 3
@@ -0,0 +1,170 @@
+import time
+import anyio
+import pytest
+from llm import alloy
+from llm.alloy import AlloyLLM
+from llm.common import AsyncLLM, Completion, Message, TextRaw, stream_completion
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(autouse=True)
+def no_exploration(monkeypatch):
+    monkeypatch.setattr(alloy, "EXPLORE_RATE", 0.0)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class TimedLLM(AsyncLLM):
+    """Answers with its name after the delay, or fails while failing is set."""
+
+    def __init__(self, name: str, delay: float, failing: bool = False, error: Exception | None = None):
+        self.name = name
+        self.delay = delay
+        self.failing = failing or error is not None
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        self.calls += 1
+        try:
+            await anyio.sleep(self.delay)
+        except anyio.get_cancelled_exc_class():
+            self.cancelled += 1
+            raise
+        if self.failing:
+            raise self.error or RuntimeError(f"{self.name} is down")
+        return Completion(role="assistant", content=[TextRaw(self.name)], input_tokens=1, output_tokens=1, stop_reason="end_turn")
+
+
+def request() -> list[Message]:
+    return [Message(role="user", content=[TextRaw("hi")])]
+
+
+async def answer(llm: AlloyLLM) -> str:
+    completion = await llm.completion(messages=request(), max_tokens=10)
+    (block,) = completion.content
+    return block.text  # pyright: ignore[reportAttributeAccessIssue]
+
+
+async def test_latency_routes_to_fastest_model_once_measured():
+    slow, fast = TimedLLM("slow", 0.02), TimedLLM("fast", 0.001)
+    llm = AlloyLLM([slow, fast], "latency")
+    answers = [await answer(llm) for _ in range(12)]
+    assert slow.calls == alloy.MIN_SAMPLES
+    assert answers[-5:] == ["fast"] * 5
+    models = llm.metrics()["models"]
+    assert models[1]["p50"] < models[0]["p50"]
+
+
+async def test_failing_model_is_ejected_and_probed_after_cooldown():
+    broken, backup = TimedLLM("broken", 0.0, failing=True), TimedLLM("backup", 0.001)
+    llm = AlloyLLM([broken, backup], "latency", breaker_cooldown=0.05)
+
+    # every call is answered, failed ones by the next model
+    assert [await answer(llm) for _ in range(6)] == ["backup"] * 6
+    assert broken.calls == alloy.FAILURE_THRESHOLD
+    assert llm.metrics()["models"][0]["breaker"] == "open"
+
+    await anyio.sleep(0.06)
+    broken.failing = False
+    assert llm.metrics()["models"][0]["breaker"] == "half_open"
+    await answer(llm)
+    # the probe went to the recovered model and closed the breaker
+    assert broken.calls == alloy.FAILURE_THRESHOLD + 1
+    assert llm.metrics()["models"][0]["breaker"] == "closed"
+
+
+async def test_all_models_failing_raises():
+    llm = AlloyLLM([TimedLLM("a", 0.0, failing=True), TimedLLM("b", 0.0, failing=True)], "latency")
+    with pytest.raises(RuntimeError, match="is down"):
+        await answer(llm)
+    assert llm.failovers == 1
+
+
+async def test_request_errors_are_raised_without_failover():
+    rejecting, backup = TimedLLM("rejecting", 0.0, error=StatusError(400)), TimedLLM("backup", 0.001)
+    llm = AlloyLLM([rejecting, backup], "latency")
+    for _ in range(alloy.FAILURE_THRESHOLD + 1):
+        with pytest.raises(StatusError):
+            await answer(llm)
+    assert backup.calls == 0 and llm.failovers == 0
+    models = llm.metrics()["models"]
+    assert models[0]["breaker"] == "closed"
+
+    # rate limits and server errors move on to the next model
+    for status in (429, 529):
+        rejecting.error = StatusError(status)
+        assert await answer(llm) == "backup"
+    assert llm.failovers == 2
+
+
+def measured(llm: AlloyLLM, *latencies: float) -> AlloyLLM:
+    for health, latency in zip(llm._health, latencies):
+        health.latencies.extend([latency] * alloy.MIN_SAMPLES)
+    return llm
+
+
+async def test_hedge_answers_from_second_model_and_cancels_the_first():
+    primary, secondary = TimedLLM("primary", 5.0), TimedLLM("secondary", 0.01)
+    llm = measured(AlloyLLM([primary, secondary], "latency", hedge=True), 0.001, 0.01)
+
+    started = time.perf_counter()
+    assert await answer(llm) == "secondary"
+    assert time.perf_counter() - started < 1.0
+    assert primary.cancelled == 1
+    assert (llm.hedges, llm.hedge_wins) == (1, 1)
+    # the cancelled primary counts with a lower bound of its latency
+    assert len(llm._health[0].latencies) == alloy.MIN_SAMPLES + 1
+    assert llm._health[0].latencies[-1] >= 0.01
+
+
+async def test_hedge_loses_to_primary_answering_first():
+    primary, secondary = TimedLLM("primary", 0.05), TimedLLM("secondary", 1.0)
+    llm = measured(AlloyLLM([primary, secondary], "latency", hedge=True), 0.001, 0.01)
+    assert await answer(llm) == "primary"
+    assert secondary.cancelled == 1
+    assert (llm.hedges, llm.hedge_wins) == (1, 0)
+    # the cancelled hedge leaves the latency of the secondary alone
+    assert list(llm._health[1].latencies) == [0.01] * alloy.MIN_SAMPLES
+
+
+async def test_cancelled_call_records_no_latency():
+    primary = TimedLLM("primary", 1.0)
+    llm = measured(AlloyLLM([primary, TimedLLM("secondary", 1.0)], "latency", hedge=True), 0.5, 0.5)
+    with anyio.move_on_after(0.01):
+        await answer(llm)
+    assert primary.cancelled == 1
+    assert list(llm._health[0].latencies) == [0.5] * alloy.MIN_SAMPLES
+
+
+async def test_without_hedging_waits_for_slow_model():
+    primary, secondary = TimedLLM("primary", 0.05), TimedLLM("secondary", 0.001)
+    llm = measured(AlloyLLM([primary, secondary], "latency"), 0.001, 0.01)
+    assert await answer(llm) == "primary"
+    assert secondary.calls == 0 and llm.hedges == 0
+
+
+async def test_stream_outcome_updates_health():
+    broken, backup = TimedLLM("broken", 0.0, failing=True), TimedLLM("backup", 0.001)
+    llm = AlloyLLM([broken, backup], "latency")
+
+    async def on_delta(delta):
+        pass
+
+    for _ in range(alloy.FAILURE_THRESHOLD):
+        with pytest.raises(RuntimeError):
+            await stream_completion(llm, on_delta, messages=request(), max_tokens=10)
+    completion = await stream_completion(llm, on_delta, messages=request(), max_tokens=10)
+    assert completion.content == [TextRaw("backup")]
+    assert llm.metrics()["models"][0]["breaker"] == "open"
@@ -206,13 +206,11 @@ async def test_get_diff_with_removed_files():
         # prominently featured in the diff output
 
 @pytest.mark.anyio
-async def test_get_diff_with_exception_handling():
+async def test_get_diff_with_exception_handling(monkeypatch):
     """Test error handling when something goes wrong during diff generation"""
-    # Mock the dagger client instead of creating a real connection
+    # Diffs are computed in-process, make the diff engine fail
     mock_client = Mock()
-    mock_container = Mock()
-    mock_client.container.return_value.from_.return_value.with_workdir.return_value = mock_container
-    mock_container.with_exec.side_effect = Exception("Test diff error")
+    monkeypatch.setattr("trpc_agent.application.diff_overlay", Mock(side_effect=Exception("Test diff error")))
     
     fsm_application = FSMApplication(mock_client, create_mock_fsm())
     
@@ -0,0 +1,103 @@
+import os
+import anyio
+import pytest
+from core import base_images
+from core.base_images import BaseImage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+SPEC = BaseImage(
+    name="test",
+    image="alpine",
+    workdir="/app",
+    lockfiles=["package.json", "bun.lock"],
+    install=[["bun", "install"]],
+)
+
+
+def test_tag_follows_lockfiles(tmp_path):
+    (tmp_path / "package.json").write_text('{"dependencies": {}}')
+    tag = SPEC.tag(str(tmp_path))
+    assert tag.startswith("test-v1-")
+    # sources other than the lockfiles don't change the dependencies
+    (tmp_path / "index.ts").write_text("console.log(1)")
+    assert SPEC.tag(str(tmp_path)) == tag
+
+    (tmp_path / "bun.lock").write_text("lock")
+    locked = SPEC.tag(str(tmp_path))
+    assert locked != tag
+    (tmp_path / "package.json").write_text('{"dependencies": {"zod": "3"}}')
+    assert SPEC.tag(str(tmp_path)) not in (tag, locked)
+
+    other_recipe = BaseImage(**{**SPEC.__dict__, "install": [["bun", "install", "--frozen-lockfile"]]})
+    assert other_recipe.tag(str(tmp_path)) != SPEC.tag(str(tmp_path))
+
+
+class FakeContainer:
+    exports = 0
+
+    def __init__(self, ops: list):
+        self.ops = ops
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: FakeContainer([*self.ops, name])
+
+    async def export(self, path: str) -> str:
+        FakeContainer.exports += 1
+        await anyio.sleep(0.01)
+        with open(path, "w") as f:
+            f.write(",".join(self.ops))
+        return path
+
+
+class FakeClient:
+    def container(self) -> FakeContainer:
+        return FakeContainer([])
+
+    def host(self):
+        return self
+
+    def directory(self, path: str, include: list[str]):
+        return path
+
+    def file(self, path: str):
+        return path
+
+
+async def test_load_imports_exported_tarball(tmp_path, monkeypatch):
+    monkeypatch.setenv("BASE_IMAGE_DIR", str(tmp_path / "images"))
+    template = str(tmp_path)
+
+    built, tag = await base_images.load(FakeClient(), SPEC, template)  # pyright: ignore[reportArgumentType]
+    assert "with_exec" in built.ops  # pyright: ignore[reportAttributeAccessIssue]
+    path = base_images.tarball_path(tag)
+    assert path is not None and open(path).read() == ",".join(built.ops)  # pyright: ignore[reportAttributeAccessIssue]
+
+    # a new session (e.g. after an engine restart) loads the image instead of building it
+    imported, imported_tag = await base_images.load(FakeClient(), SPEC, template)  # pyright: ignore[reportArgumentType]
+    assert imported_tag == tag
+    assert imported.ops == ["import_", "with_workdir"]  # pyright: ignore[reportAttributeAccessIssue]
+
+
+async def test_concurrent_loads_build_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("BASE_IMAGE_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(FakeContainer, "exports", 0)
+    client = FakeClient()
+    results = []
+
+    async def load():
+        results.append(await base_images.load(client, SPEC, str(tmp_path)))  # pyright: ignore[reportArgumentType]
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(4):
+            tg.start_soon(load)
+
+    assert FakeContainer.exports == 1
+    assert len({id(ctr) for ctr, _ in results}) == 1
+    assert os.listdir(tmp_path / "images") == [f"{results[0][1]}.tar"]
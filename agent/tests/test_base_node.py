@@ -0,0 +1,84 @@
+import random
+import pytest
+from core.base_node import Node
+
+
+def _check_tree(root: Node):
+    """Compare the incremental bookkeeping with a fresh traversal."""
+    nodes = root.get_all_children()
+    assert root.subtree_size == len(nodes)
+    assert root.get_leaves() == [n for n in nodes if n.is_leaf]
+    for n in nodes:
+        path, cur = [], n
+        while cur is not None:
+            path.append(cur)
+            cur = cur.parent
+        assert n.get_trajectory() == path[::-1]
+        assert n.depth == len(path) - 1
+        assert n.subtree_size == len(n.get_all_children())
+        assert root.get_node(n._id) is n
+        assert n.get_leaves() == [m for m in n.get_all_children() if m.is_leaf]
+
+
+def test_bookkeeping_under_insertion_and_pruning():
+    rng = random.Random(7)
+    root = Node[int](0)
+    alive = [root]
+    for i in range(1, 400):
+        if rng.random() < 0.1 and len(alive) > 1:
+            victim = rng.choice(alive[1:])
+            victim.prune()
+            assert victim.parent is None and victim.depth == 0
+            assert root.get_node(victim._id) is None
+            _check_tree(victim)
+            pruned = {id(n) for n in victim.get_all_children()}
+            alive = [n for n in alive if id(n) not in pruned]
+        else:
+            parent = rng.choice(alive)
+            alive.append(parent.add_child(Node[int](i, parent)))
+        if i % 50 == 0:
+            _check_tree(root)
+    _check_tree(root)
+
+
+def test_children_list_mutations_keep_index():
+    root = Node[str]("root")
+    a = Node[str]("a", root)
+    # a node created with a parent stays out of the tree until appended
+    assert root.get_node(a._id) is None
+    assert a.depth == 1 and a.get_trajectory() == [root, a]
+
+    root.children.append(a)
+    b = Node[str]("b", a)
+    a.children += [b]
+    assert root.get_leaves() == [b]
+    assert root.subtree_size == 3
+
+    # grafting a detached subtree fixes depths and memoized paths
+    other = Node[str]("other")
+    leaf = other.add_child(Node[str]("leaf", other))
+    b.children.append(other)
+    assert other.depth == 3 and leaf.depth == 4
+    assert leaf.get_trajectory() == [root, a, b, other, leaf]
+    assert root.get_node(leaf._id) is leaf
+    _check_tree(root)
+
+    del a.children[0]
+    assert root.get_leaves() == [a]
+    assert leaf.get_trajectory() == [b, other, leaf]
+    _check_tree(root)
+    _check_tree(b)
+
+
+def test_rejects_cycles_and_double_parents():
+    root = Node[int](0)
+    child = root.add_child(Node[int](1, root))
+    with pytest.raises(ValueError):
+        child.add_child(root)
+    with pytest.raises(ValueError):
+        root.add_child(child)
+    other = Node[int](2)
+    with pytest.raises(ValueError):
+        other.add_child(child)
+    assert other.is_leaf and root.children == [child]
+    _check_tree(root)
@@ -0,0 +1,133 @@
+import pytest
+import ujson as json
+from pathlib import Path
+from llm.cached import CachedLLM
+from llm.cache_storage import AppendLogStorage, open_cache_storage, storage_path
+from llm.common import Message, TextRaw
+from tests.test_cached_llm import StubLLM
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def _entry(i: int) -> dict:
+    return {"data": {"role": "assistant", "content": [{"type": "text", "text": f"answer {i}"}]}, "params": {"i": i}}
+
+
+@pytest.mark.parametrize("backend", ["log", "sqlite"])
+def test_storage_roundtrip(tmp_path: Path, backend):
+    cache_path = tmp_path / "cache.json"
+    storage = open_cache_storage(cache_path, backend)
+    for i in range(10):
+        storage[f"k{i}"] = _entry(i)
+    storage["k0"] = _entry(100)
+    del storage["k1"]
+    storage.close()
+
+    storage = open_cache_storage(cache_path, backend)
+    assert len(storage) == 9
+    assert "k1" not in storage
+    assert storage["k0"] == _entry(100)
+    assert storage["k9"] == _entry(9)
+    storage.compact()
+    assert storage["k0"] == _entry(100)
+    assert len(storage) == 9
+
+
+def test_log_storage_drops_torn_record(tmp_path: Path):
+    path = tmp_path / "cache.jsonl"
+    storage = AppendLogStorage(path)
+    storage["a"] = _entry(1)
+    storage["b"] = _entry(2)
+    storage.close()
+    # simulate a crash in the middle of writing a record
+    with path.open("ab") as f:
+        f.write(b'{"key": "c", "entry": {"da')
+
+    storage = AppendLogStorage(path)
+    assert set(storage) == {"a", "b"}
+    storage["c"] = _entry(3)
+    storage.close()
+
+    storage = AppendLogStorage(path)
+    assert storage["c"] == _entry(3)
+    assert storage["b"] == _entry(2)
+
+
+def test_log_storage_compaction(tmp_path: Path):
+    path = tmp_path / "cache.jsonl"
+    storage = AppendLogStorage(path, fsync=False)
+    for i in range(50):
+        storage["same"] = _entry(i)
+    storage["other"] = _entry(-1)
+    size_before = path.stat().st_size
+    assert storage.stale_records == 49
+
+    storage.compact()
+    assert path.stat().st_size < size_before
+    assert storage.stale_records == 0
+    assert storage["same"] == _entry(49)
+    assert storage["other"] == _entry(-1)
+    assert len(path.read_text().splitlines()) == 2
+
+
+@pytest.mark.parametrize("backend", ["log", "sqlite"])
+def test_storage_imports_legacy_json(tmp_path: Path, backend):
+    legacy = tmp_path / "cache.json"
+    legacy.write_text(json.dumps({"k1": _entry(1), "k2": _entry(2)}, indent=2))
+
+    storage = open_cache_storage(legacy, backend)
+    assert storage_path(legacy, backend).exists()
+    assert storage["k2"] == _entry(2)
+    storage["k3"] = _entry(3)
+    storage.close()
+
+    # the legacy file is only imported once
+    storage = open_cache_storage(legacy, backend)
+    assert sorted(storage) == ["k1", "k2", "k3"]
+
+
+@pytest.mark.parametrize("backend", ["log", "sqlite"])
+async def test_cached_llm_record_replay(tmp_path: Path, backend):
+    cache_path = str(tmp_path / "cache.json")
+    base_llm = StubLLM()
+    record_llm = CachedLLM(client=base_llm, cache_mode="record", cache_path=cache_path, storage_backend=backend)
+    requests = [
+        {"messages": [Message(role="user", content=[TextRaw(f"Hello {i}")])], "max_tokens": 100}
+        for i in range(5)
+    ]
+    recorded = [await record_llm.completion(**r) for r in requests]
+
+    replay_llm = CachedLLM(client=base_llm, cache_mode="replay", cache_path=cache_path, storage_backend=backend)
+    replayed = [await replay_llm.completion(**r) for r in requests]
+    assert base_llm.calls == 5
+    assert recorded == replayed
+
+    # re-recording starts from an empty cache
+    CachedLLM(client=base_llm, cache_mode="record", cache_path=cache_path, storage_backend=backend)
+    replay_llm = CachedLLM(client=base_llm, cache_mode="replay", cache_path=cache_path, storage_backend=backend)
+    with pytest.raises(ValueError):
+        await replay_llm.completion(**requests[0])
+
+
+async def test_cached_llm_replays_legacy_cache(tmp_path: Path):
+    cache_path = tmp_path / "cache.json"
+    base_llm = StubLLM()
+    request = {"messages": [Message(role="user", content=[TextRaw("Hello")])], "max_tokens": 100}
+    completion = await base_llm.completion(**request)
+    norm_params, cache_key = CachedLLM._get_cache_key(
+        model=None, temperature=1.0, tools=None, tool_choice=None, **request
+    )
+    cache_path.write_text(json.dumps({cache_key: {"data": completion.to_dict(), "params": norm_params}}))
+
+    replay_llm = CachedLLM(client=base_llm, cache_mode="replay", cache_path=str(cache_path))
+    assert await replay_llm.completion(**request) == completion
+    lru_llm = CachedLLM(client=base_llm, cache_mode="lru", cache_path=str(cache_path))
+    assert await lru_llm.completion(**request) == completion
+    assert base_llm.calls == 1
+    # replaying a committed fixture leaves no derived files next to it
+    assert [p.name for p in tmp_path.iterdir()] == ["cache.json"]
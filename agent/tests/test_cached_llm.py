@@ -1,3 +1,4 @@
+import anyio
 import pytest
 import tempfile
 from llm.cached import CachedLLM, AsyncLLM
@@ -117,6 +118,42 @@ async def test_cached_lru():
         assert json.dumps(new_resp.to_dict()) != responses["first"], "First request should not hit the cache"
         assert base_llm.calls == 4, "Base LLM should still be called four times"
 
+class FlakyLLM(StubLLM):
+    """Fails the first call after a delay, answers the others."""
+
+    async def completion(self, *args, **kwargs) -> Completion:
+        if self.calls == 0:
+            self.calls += 1
+            await anyio.sleep(0.01)
+            raise RuntimeError("first call fails")
+        return await super().completion(*args, **kwargs)
+
+
+async def test_waiters_make_the_request_when_the_first_one_fails():
+    base_llm = FlakyLLM()
+    llm = CachedLLM(client=base_llm, cache_mode="lru", cache_path="unused")
+    call_args: Dict[str, Any] = {
+        "messages": [Message(role="user", content=[TextRaw("Hello, world!")])],
+        "max_tokens": 100,
+    }
+    results, errors = [], []
+
+    async def run():
+        try:
+            results.append(await llm.completion(**call_args))
+        except RuntimeError as e:
+            errors.append(e)
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(3):
+            tg.start_soon(run)
+    # one request failed, one of the waiters made it again and the last one got its answer
+    assert len(errors) == 1
+    assert base_llm.calls == 2
+    assert len(results) == 2 and results[0] == results[1]
+    assert llm._pending_requests == {}
+
+
 @pytest.mark.skipif(requires_llm_provider(), reason=requires_llm_provider_reason)
 async def test_llm_text_completion():
     client = get_ultra_fast_llm_client()
@@ -0,0 +1,149 @@
+import pytest
+import anyio
+from unittest.mock import MagicMock
+from core import check_cache as check_cache_module
+from core.check_cache import CheckCache, cached_check
+from core.workspace import Workspace, _StateBase
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = CheckCache(str(tmp_path / "checks.jsonl"))
+    monkeypatch.setattr(check_cache_module, "check_cache", cache)
+    return cache
+
+
+class FakeDirectory:
+    def __init__(self, digest: str = "sha256:template"):
+        self._digest = digest
+
+    async def digest(self) -> str:
+        return self._digest
+
+
+def make_workspace(digest: str = "sha256:template") -> Workspace:
+    workspace = Workspace(ctr=MagicMock(), start=MagicMock(), protected=set(), allowed=set())
+    workspace._base = _StateBase(FakeDirectory(digest), "alpine")  # pyright: ignore[reportAttributeAccessIssue]
+    return workspace
+
+
+class FakeNode:
+    def __init__(self, workspace: Workspace):
+        self.data = MagicMock(workspace=workspace)
+
+
+class FakeActor:
+    def __init__(self, fail_with: str | None = None):
+        self.runs = 0
+        self.fail_with = fail_with
+
+    @cached_check
+    async def run_tsc(self, node, cwd: str = "server") -> str | None:
+        self.runs += 1
+        await anyio.sleep(0.05)
+        return self.fail_with
+
+
+async def test_workspace_state_key_tracks_files():
+    base = make_workspace()
+    a = base.clone().write_file("a.ts", "1").write_file("b.ts", "2")
+    b = base.clone().write_file("b.ts", "2").write_file("a.ts", "1")
+    assert await a.state_key() == await b.state_key()
+    assert await a.state_key() != await base.state_key()
+
+    c = b.clone().write_file("a.ts", "changed")
+    assert await c.state_key() != await a.state_key()
+    assert await c.rm("a.ts").state_key() != await a.state_key()
+    assert await make_workspace("sha256:other").write_file("a.ts", "1").write_file("b.ts", "2").state_key() != await a.state_key()
+    # workspaces not created through Workspace.create are never cached
+    assert await Workspace(ctr=MagicMock(), start=MagicMock(), protected=set(), allowed=set()).state_key() is None
+
+
+async def test_laravel_workspace_has_state_key(monkeypatch):
+    from laravel_agent import utils as laravel_utils
+
+    async def load(client, image, template_dir):
+        return MagicMock(), "laravel-base:tag"
+
+    monkeypatch.setattr(laravel_utils.base_images, "load", load)
+    first = await laravel_utils.create_workspace(MagicMock(), FakeDirectory())  # pyright: ignore[reportArgumentType]
+    second = await laravel_utils.create_workspace(MagicMock(), FakeDirectory())  # pyright: ignore[reportArgumentType]
+    # the random APP_KEY does not make every workspace unique
+    assert await first.state_key() is not None
+    assert await first.state_key() == await second.state_key()
+
+
+async def test_concurrent_identical_checks_run_once(cache: CheckCache):
+    actor = FakeActor(fail_with="error TS2322")
+    base = make_workspace()
+    # sibling beam nodes that ended up with the same files
+    nodes = [FakeNode(base.clone().write_file("server/src/index.ts", "x")) for _ in range(3)]
+    results = []
+
+    async with anyio.create_task_group() as tg:
+        for node in nodes:
+            async def run(node=node):
+                results.append(await actor.run_tsc(node))
+            tg.start_soon(run)
+
+    assert results == ["error TS2322"] * 3
+    assert actor.runs == 1
+    assert cache.deduplicated == 2
+
+    other = FakeNode(base.clone().write_file("server/src/index.ts", "y"))
+    await actor.run_tsc(other)
+    await actor.run_tsc(other, cwd="client")
+    assert actor.runs == 3
+
+
+async def test_failed_run_is_retried_by_waiters(cache: CheckCache):
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        await anyio.sleep(0.02)
+        if calls == 1:
+            raise RuntimeError("engine hiccup")
+        return None
+
+    results = []
+
+    async def run():
+        try:
+            results.append(await cache.get_or_run("key", flaky))
+        except RuntimeError:
+            results.append("raised")
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(run)
+        await anyio.sleep(0.005)
+        tg.start_soon(run)
+
+    assert results == ["raised", None]
+    assert calls == 2
+
+
+async def test_disk_tier_persists_passing_checks(tmp_path, monkeypatch):
+    path = str(tmp_path / "checks.jsonl")
+    node_ok = FakeNode(make_workspace().write_file("a.ts", "ok"))
+    node_bad = FakeNode(make_workspace().write_file("a.ts", "bad"))
+
+    monkeypatch.setattr(check_cache_module, "check_cache", CheckCache(path))
+    await FakeActor().run_tsc(node_ok)
+    await FakeActor(fail_with="boom").run_tsc(node_bad)
+
+    # next benchmark run: fresh process memory, same disk cache
+    monkeypatch.setattr(check_cache_module, "check_cache", CheckCache(path))
+    actor = FakeActor(fail_with="boom")
+    assert await actor.run_tsc(node_ok) is None
+    assert actor.runs == 0
+    assert await actor.run_tsc(node_bad) == "boom"
+    assert actor.runs == 1
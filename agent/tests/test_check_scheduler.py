@@ -0,0 +1,126 @@
+import anyio
+import pytest
+from core.check_cache import CheckCache
+from core.check_scheduler import Check, CheckStats, format_errors, run_checks
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def make_check(name: str, log: list[str], delay: float = 0.0, error: str | None = None, **kwargs) -> Check:
+    async def run():
+        log.append(f"start {name}")
+        await anyio.sleep(delay)
+        log.append(f"end {name}")
+        return error
+    return Check(name, run, **kwargs)
+
+
+async def test_cheap_checks_start_first():
+    log, stats = [], CheckStats()
+    checks = [
+        make_check("slow", log, cost=30),
+        make_check("fast", log, cost=1),
+        make_check("medium", log, cost=10),
+    ]
+    assert await run_checks(checks, concurrency=1, stats=stats) == []
+    assert [entry for entry in log if entry.startswith("start")] == ["start fast", "start medium", "start slow"]
+
+
+async def test_failure_history_changes_order():
+    stats = CheckStats()
+    flaky, stable = Check("flaky", None, cost=10), Check("stable", None, cost=5)
+    for _ in range(10):
+        stats.record(flaky, 10, failed=True)
+        stats.record(stable, 5, failed=False)
+    assert sorted([stable, flaky], key=stats.priority) == [flaky, stable]
+
+
+async def test_fail_fast_cancels_running_checks():
+    log, stats = [], CheckStats()
+    checks = [
+        make_check("lint", log, error="bad style", label="Lint errors", cost=1),
+        make_check("tests", log, delay=10, cost=20),
+    ]
+    with anyio.fail_after(5):
+        failures = await run_checks(checks, fail_fast=True, stats=stats)
+    assert [(check.name, error) for check, error in failures] == [("lint", "bad style")]
+    assert "end tests" not in log
+    metrics = stats.metrics()
+    assert metrics["tests"]["cancelled"] == 1
+    assert metrics["tests"]["runs"] == 0
+    assert metrics["tests"]["saved_time"] > 19
+    assert metrics["lint"]["failures"] == 1
+
+
+async def test_fail_fast_cancels_waiting_checks():
+    log, stats = [], CheckStats()
+    checks = [
+        make_check("lint", log, error="bad style", cost=1),
+        make_check("tests", log, cost=20),
+    ]
+    await run_checks(checks, fail_fast=True, concurrency=1, stats=stats)
+    assert "start tests" not in log
+    assert stats.metrics()["tests"]["saved_time"] == 20
+
+
+async def test_non_blocking_failure_keeps_going():
+    log, stats = [], CheckStats()
+    checks = [
+        make_check("astgrep", log, error="pattern", blocking=False, cost=1),
+        make_check("tests", log, delay=0.1, cost=20),
+    ]
+    failures = await run_checks(checks, fail_fast=True, stats=stats)
+    assert [check.name for check, _ in failures] == ["astgrep"]
+    assert "end tests" in log
+
+
+async def test_all_mode_reports_every_error_in_declared_order():
+    log, stats = [], CheckStats()
+    checks = [
+        make_check("tests", log, delay=0.1, error="1 failed", label="Test errors", cost=20),
+        make_check("lint", log, error="bad style", label="Lint errors", cost=1),
+        make_check("php", log, error="PHP lint: bad", cost=1),
+    ]
+    failures = await run_checks(checks, fail_fast=False, stats=stats)
+    assert [check.name for check, _ in failures] == ["tests", "lint", "php"]
+    assert format_errors(failures) == "Test errors:\n1 failed\nLint errors:\nbad style\nPHP lint: bad\n"
+    assert stats.metrics()["tests"]["cancelled"] == 0
+
+
+async def test_exception_becomes_failure():
+    async def broken():
+        raise RuntimeError("engine gone")
+
+    failures = await run_checks([Check("broken", broken)], stats=CheckStats())
+    assert len(failures) == 1
+    assert "Internal error running check broken: engine gone" in failures[0][1]
+
+
+async def test_durations_update_expected_cost():
+    stats = CheckStats(alpha=0.5)
+    check = Check("tsc", None, cost=10)
+    stats.record(check, 2, failed=False)
+    metrics = stats.metrics()["tsc"]
+    assert metrics["expected_duration"] == 6
+    assert metrics["avg_duration"] == 2
+    assert metrics["failure_rate"] == pytest.approx(1 / 3)
+
+
+async def test_cache_hits_leave_the_expected_cost_alone():
+    cache, stats = CheckCache(), CheckStats(alpha=0.5)
+
+    async def tsc():
+        await anyio.sleep(0.05)
+        return None
+
+    check = Check("tsc", lambda: cache.get_or_run("key", tsc), cost=10)
+    for _ in range(3):
+        await run_checks([check], stats=stats)
+    metrics = stats.metrics()["tsc"]
+    assert (metrics["runs"], metrics["cached"]) == (1, 2)
+    assert metrics["expected_duration"] == pytest.approx(5.025, abs=0.05)
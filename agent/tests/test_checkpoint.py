@@ -0,0 +1,34 @@
+import pytest
+import ujson as json
+from core import checkpoint
+
+
+def make_nodes() -> list[dict]:
+    template = {f"src/file{i}.ts": f"export const value{i} = {i};\n" * 50 for i in range(20)}
+    prompt = {"role": "user", "content": [{"type": "text", "text": "Implement the handlers"}]}
+    nodes = [{"id": "root", "parent": None, "data": {"messages": [prompt], "files": {}, "should_branch": True}}]
+    for i in range(5):
+        files = {**template, f"src/handler{i}.ts": f"// candidate {i}\n", "src/removed.ts": None}
+        reply = {"role": "assistant", "content": [{"type": "text", "text": f"candidate {i}"}]}
+        nodes.append({"id": f"beam{i}", "parent": "root", "data": {"messages": [prompt, reply], "files": files}})
+    return nodes
+
+
+def test_pack_round_trip():
+    nodes = make_nodes()
+    packed = checkpoint.pack_nodes(nodes)
+    assert checkpoint.unpack_nodes(packed) == nodes
+    # the shared template and prompt are stored once
+    assert len(packed["blobs"]) == 20 + 5
+    assert len(packed["messages"]) == 1 + 5
+    assert packed["nodes"][1]["data"]["files"]["src/removed.ts"] is None
+    assert len(json.dumps(packed)) * 3 < len(json.dumps(nodes))
+
+
+def test_legacy_checkpoints_load():
+    nodes = make_nodes()
+    assert checkpoint.unpack_nodes(nodes) is nodes
+    assert checkpoint.unpack_nodes(json.loads(json.dumps(nodes))) == nodes  # pyright: ignore[reportArgumentType]
+    with pytest.raises(ValueError):
+        checkpoint.unpack_nodes({"actors": []})
+
@@ -0,0 +1,184 @@
+import pytest
+import anyio
+import dagger
+from contextlib import asynccontextmanager
+from api.dagger_pool import DaggerSessionPool, PoolDrainingError
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeClient:
+    def __init__(self, idx: int):
+        self.idx = idx
+        self.healthy = True
+        self.closed = False
+
+    async def default_platform(self):
+        if not self.healthy:
+            raise dagger.TransportError("engine gone")
+        return "linux/amd64"
+
+
+class FakeConnector:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.clients: list[FakeClient] = []
+
+    @asynccontextmanager
+    async def __call__(self):
+        await anyio.sleep(self.delay)
+        client = FakeClient(len(self.clients))
+        self.clients.append(client)
+        try:
+            yield client
+        finally:
+            client.closed = True
+
+
+def make_pool(connector: FakeConnector, **kwargs) -> DaggerSessionPool:
+    return DaggerSessionPool(
+        connect=connector,
+        health_check=lambda client: client.default_platform(),
+        **kwargs,
+    )
+
+
+async def test_pool_reuses_sessions():
+    connector = FakeConnector()
+    async with make_pool(connector, max_size=2, min_idle=1) as pool:
+        # wait for the warm session to come up
+        with anyio.fail_after(1):
+            while pool.metrics()["idle"] < 1:
+                await anyio.sleep(0.001)
+        for _ in range(5):
+            async with pool.lease() as client:
+                assert client.idx == 0
+        metrics = pool.metrics()
+        assert metrics["total_leases"] == 5
+        assert metrics["sessions_created"] == 1
+        assert metrics["leased"] == 0
+    assert len(connector.clients) == 1
+    assert connector.clients[0].closed
+
+
+async def test_pool_multiplexes_leases_beyond_max_size():
+    connector = FakeConnector(delay=0.01)
+    pool = make_pool(connector, max_size=2, min_idle=0, session_leases=2)
+    clients = []
+    saturation = []
+
+    async def worker():
+        async with pool.lease() as client:
+            clients.append(client)
+            saturation.append(pool.metrics()["saturation"])
+            await anyio.sleep(0.05)
+
+    async with pool:
+        with anyio.fail_after(1):
+            async with anyio.create_task_group() as tg:
+                for _ in range(6):
+                    tg.start_soon(worker)
+        metrics = pool.metrics()
+
+    # no lease waited for another to end, the sessions were shared
+    assert len(clients) == 6
+    assert len(connector.clients) == 2
+    assert {client.idx for client in clients} == {0, 1}
+    assert max(saturation) == 1.5
+    assert metrics["total_leases"] == 6
+    assert metrics["lease_wait_max"] < 0.05
+    assert metrics["lease_wait_p95"] >= metrics["lease_wait_p50"]
+
+
+async def test_pool_discards_unhealthy_idle_session():
+    connector = FakeConnector()
+    async with make_pool(connector, max_size=2, min_idle=0, health_check_after=0.0) as pool:
+        async with pool.lease() as client:
+            first = client
+        first.healthy = False
+        async with pool.lease() as client:
+            assert client is not first
+        assert first.closed
+        assert pool.metrics()["sessions_discarded"] == 1
+
+
+async def test_pool_discards_session_on_transport_error():
+    connector = FakeConnector()
+    async with make_pool(connector, max_size=1, min_idle=0) as pool:
+        with pytest.raises(dagger.TransportError):
+            async with pool.lease() as client:
+                first = client
+                raise dagger.TransportError("connection reset")
+        async with pool.lease() as client:
+            assert client is not first
+
+
+async def test_pool_falls_back_to_ephemeral_connection():
+    connector = FakeConnector()
+    pool = make_pool(connector)
+    async with pool.lease() as client:
+        assert not client.closed
+    assert client.closed
+    assert pool.metrics()["ephemeral_leases"] == 1
+
+
+async def test_pool_drain_waits_for_leases():
+    connector = FakeConnector()
+    pool = make_pool(connector, max_size=2, min_idle=0)
+    finished = []
+
+    async def hold():
+        async with pool.lease():
+            await anyio.sleep(0.1)
+            finished.append(True)
+
+    async with pool:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(hold)
+            await anyio.sleep(0.01)
+            await pool.drain(timeout=5)
+            assert finished == [True]
+            assert pool.metrics()["leased"] == 0
+            with pytest.raises(PoolDrainingError):
+                async with pool.lease():
+                    pass
+    assert all(client.closed for client in connector.clients)
+
+
+async def test_pool_lease_waits_for_warming_session_at_capacity():
+    connector = FakeConnector(delay=0.05)
+    async with make_pool(connector, max_size=1, min_idle=1) as pool:
+        # the warm-up is still connecting and holds the only slot
+        await anyio.sleep(0.01)
+        async with pool.lease() as client:
+            assert client.idx == 0
+        assert pool.metrics()["sessions_created"] == 1
+    assert len(connector.clients) == 1
+
+
+async def test_pool_drain_timeout_fails_outstanding_leases():
+    connector = FakeConnector()
+    pool = make_pool(connector, max_size=1, min_idle=0)
+    errors = []
+
+    async def hold():
+        try:
+            async with pool.lease():
+                await anyio.sleep(10)
+        except PoolDrainingError as e:
+            errors.append(e)
+
+    async with pool:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(hold)
+            await anyio.sleep(0.01)
+            with anyio.fail_after(1):
+                await pool.drain(timeout=0.05)
+    assert len(errors) == 1
+    assert pool.metrics()["leased"] == 0
+    assert all(client.closed for client in connector.clients)
@@ -0,0 +1,68 @@
+import subprocess
+import pytest
+from core.dagger_utils import ExecResult
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class LocalFile:
+    def __init__(self, path: str):
+        self.path = path
+
+    async def contents(self) -> str:
+        with open(self.path) as f:
+            return f.read()
+
+
+class LocalContainer:
+    """Runs execs on the host, enough to exercise the capture script."""
+
+    def __init__(self):
+        self.execs = 0
+
+    def with_exec(self, args: list[str], expect=None) -> "LocalContainer":
+        self.execs += 1
+        subprocess.run(args, check=True)
+        return self
+
+    def file(self, path: str) -> LocalFile:
+        return LocalFile(path)
+
+
+async def capture(command: list[str], tmp_path, max_output: int | None = 1024) -> ExecResult:
+    ctr = LocalContainer()
+    result_path = str(tmp_path / "result")
+    ExecResult.with_capture(ctr, command, max_output, result_path)  # pyright: ignore[reportArgumentType]
+    assert ctr.execs == 1
+    return await ExecResult.from_capture(ctr, result_path)  # pyright: ignore[reportArgumentType]
+
+
+async def test_capture_collects_exit_code_and_output(tmp_path):
+    result = await capture(["sh", "-c", "echo out; echo err >&2; exit 3"], tmp_path)
+    assert (result.exit_code, result.stdout, result.stderr) == (3, "out\n", "err\n")
+    assert result.duration is not None and result.duration >= 0
+    assert not result.truncated
+
+    result = await capture(["printf", "no newline"], tmp_path)
+    assert (result.exit_code, result.stdout, result.stderr) == (0, "no newline", "")
+
+
+async def test_capture_bounds_output(tmp_path):
+    result = await capture(["sh", "-c", "seq 1 10000; echo failed >&2; exit 1"], tmp_path)
+    assert result.truncated
+    assert result.stdout.startswith("1\n2\n") and result.stdout.endswith("9999\n10000\n")
+    assert "bytes truncated" in result.stdout and len(result.stdout) < 1100
+    assert result.stderr == "failed\n"
+
+    result = await capture(["seq", "1", "10000"], tmp_path, max_output=None)
+    assert not result.truncated and result.stdout.count("\n") == 10000
+
+
+async def test_missing_command_is_a_failed_result(tmp_path):
+    result = await capture(["definitely-not-a-command"], tmp_path)
+    assert result.exit_code == 127 and result.stderr
@@ -0,0 +1,131 @@
+import os
+import pytest
+from core import error_condenser
+from core.actors import FileOperationsActor
+from llm.common import AsyncLLM, Completion, TextRaw
+
+pytestmark = pytest.mark.anyio
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "error_corpus")
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def corpus(name: str) -> str:
+    with open(os.path.join(CORPUS, name)) as f:
+        return f.read()
+
+
+def test_tsc_dedupes_and_groups_by_file_and_rule():
+    text = "\n".join([
+        "src/a.ts(1,7): error TS2307: Cannot find module '../db/schema'.",
+        "src/a.ts(3,1): error TS7006: Parameter 'row' implicitly has an 'any' type.",
+        "src/a.ts(9,2): error TS2307: Cannot find module '../db/schema'.",
+        "src/b.ts(4,4): error TS2307: Cannot find module '../db/schema'.",
+    ])
+    condensed = error_condenser.condense(text)
+    assert condensed.splitlines() == [
+        "src/a.ts:",
+        "  1:7, 9:2 TS2307: Cannot find module '../db/schema'.",
+        "  3:1 TS7006: Parameter 'row' implicitly has an 'any' type.",
+        "src/b.ts:",
+        "  4:4 TS2307: Cannot find module '../db/schema'.",
+    ]
+
+
+def test_pytest_keeps_failure_location():
+    diagnostics, _ = error_condenser.parse(corpus("pytest_long_tb.txt"))
+    assert diagnostics
+    assert all(d.file.startswith(("app/", "tests/")) for d in diagnostics)
+    # tracebacks give the location, the short summary the failed tests
+    assert {d.rule for d in diagnostics if d.line is not None} == {"RuntimeError", "AssertionError", "TypeError"}
+    assert {d.rule for d in diagnostics if d.line is None} == {"FAILED", "ERROR"}
+
+
+@pytest.mark.parametrize("name, file, rule", [
+    ("ruff.txt", ("app/", "tests/"), None),
+    ("pyright.txt", ("app/", "tests/"), "report"),
+    ("bun_test.txt", "src/tests/", "fail"),
+    ("phpunit.txt", "tests/", "failed"),
+    ("artisan_test.txt", "tests/Feature/", "failed"),
+    ("composer_phpstan.txt", "app/", None),
+    ("eslint.txt", "resources/js/", None),
+])
+def test_parsers_recognize_captured_output(name, file, rule):
+    diagnostics, rest = error_condenser.parse(corpus(name))
+    assert diagnostics
+    assert all(d.file.startswith(file) for d in diagnostics)
+    if rule:
+        assert all(d.rule.startswith(rule) for d in diagnostics)
+    # nothing of the report is left over but blank lines and summaries
+    assert len([line for line in rest if line.strip()]) <= 3
+
+
+def test_render_caps_distinct_errors():
+    diagnostics = [
+        error_condenser.Diagnostic(f"src/{i % 3}.ts", f"TS{i}", f"error {i}", line=i)
+        for i in range(12)
+    ]
+    rendered = error_condenser.render(diagnostics, max_errors=5)
+    assert sum(line.startswith("  ") and "error" in line for line in rendered.splitlines()) == 5
+    assert rendered.endswith("... 7 more distinct errors not shown, fix the ones above first")
+
+
+def test_unknown_lines_are_kept():
+    text = "src/a.ts(1,7): error TS2307: Cannot find module 'x'.\nSomething unexpected happened\n"
+    condensed = error_condenser.condense(text)
+    assert "Something unexpected happened" in condensed
+    assert "src/a.ts:" in condensed
+
+
+def test_sections_are_condensed_separately():
+    condensed = error_condenser.condense(corpus("trpc_report.txt"))
+    assert condensed.startswith("TypeScript errors (backend):")
+    assert "Test errors:" in condensed
+
+
+@pytest.mark.parametrize("name", sorted(set(os.listdir(CORPUS)) - {"vite_build.txt"}))
+def test_corpus_fits_budget(name):
+    assert len(error_condenser.condense(corpus(name), 4096)) <= 4096
+
+
+class CountingLLM(AsyncLLM):
+    def __init__(self):
+        self.calls = 0
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        self.calls += 1
+        return Completion(
+            role="assistant",
+            content=[TextRaw("<error>compacted</error>")],
+            input_tokens=1,
+            output_tokens=1,
+            stop_reason="end_turn",
+        )
+
+
+class SimpleActor(FileOperationsActor):
+    async def execute(self, *args, **kwargs):
+        pass
+
+    async def run_checks(self, node, user_prompt, fail_fast=True):
+        return None
+
+
+async def test_compact_error_message_uses_llm_only_over_budget(monkeypatch):
+    stats = error_condenser.CondenserStats()
+    monkeypatch.setattr(error_condenser, "condenser_stats", stats)
+    llm = CountingLLM()
+    actor = SimpleActor(llm, None, fast_llm=llm)  # pyright: ignore[reportArgumentType]
+
+    condensed = await actor.compact_error_message(corpus("nicegui_report.txt"))
+    assert llm.calls == 0
+    assert len(condensed) <= 4096 and "Lint errors:" in condensed
+
+    assert await actor.compact_error_message(corpus("vite_build.txt")) == "compacted"
+    assert llm.calls == 1
+    assert stats.metrics()["llm_calls_avoided"] == 1
+    assert stats.metrics()["llm_fallbacks"] == 1
@@ -0,0 +1,121 @@
+import pytest
+from api.agent_server.agent_client import AgentApiClient
+from api.agent_server.models import AgentMessage, AgentSseEvent, AgentStatus, MessageKind
+from api.event_stream import EventStreamDecoder, EventStreamEncoder, EventStreamError
+from api.session_store import make_delta
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def make_events() -> list[AgentSseEvent]:
+    metadata = {"app_name": None, "template_diff_sent": False}
+    messages: list[dict] = []
+    events = []
+    for step in range(5):
+        messages.append({"role": "assistant", "content": [{"type": "text", "text": f"step {step} " + "x" * 500}]})
+        if step == 2:
+            # the agent updates metadata in place after it was sent
+            metadata.update({"app_name": "todo", "template_diff_sent": True})
+        events.append(AgentSseEvent(
+            status=AgentStatus.RUNNING,
+            traceId="trace",
+            message=AgentMessage(kind=MessageKind.WIP_UPDATE, agentState=None),
+        ))
+        events.append(AgentSseEvent(
+            status=AgentStatus.IDLE if step == 4 else AgentStatus.RUNNING,
+            traceId="trace",
+            message=AgentMessage(
+                kind=MessageKind.STAGE_RESULT,
+                agentState={"fsm_messages": list(messages), "metadata": metadata, "fsm_state": {"step": step}},
+            ),
+        ))
+    return events
+
+
+class FakeResponse:
+    def __init__(self, frames: list[str]):
+        self.frames = frames
+
+    async def aiter_lines(self):
+        for frame in self.frames:
+            for line in frame.split("\n")[:-1]:
+                yield line
+
+
+@pytest.mark.parametrize("mode,compression", [("full", None), ("full", "zlib"), ("delta", None), ("delta", "zlib")])
+async def test_stream_round_trip(mode, compression):
+    encoder = EventStreamEncoder(mode, compression)
+    expected, frames = [], []
+    for event in make_events():
+        # frames are encoded as the agent emits them, before later in-place updates
+        expected.append(event.message.agent_state and AgentSseEvent.from_json(event.to_json()).message.agent_state)
+        frames.append(encoder.encode(event))
+
+    events = await AgentApiClient.parse_sse_events(FakeResponse(frames))
+    assert [event.message.agent_state for event in events] == expected
+    assert [event.status for event in events][-1] == AgentStatus.IDLE
+    if mode == "full" and compression is None:
+        assert all(event.seq is None for event in events)
+    else:
+        assert [event.seq for event in events] == list(range(len(events)))
+
+
+def test_delta_stream_is_smaller():
+    events = make_events()
+    full = list(map(EventStreamEncoder().encode, events))
+    delta = list(map(EventStreamEncoder("delta").encode, events))
+    compressed = list(map(EventStreamEncoder("delta", "zlib").encode, events))
+    assert full[0] == f"data: {events[0].to_json()}\n\n"
+    assert '"agentState":{' in delta[1] and '"agentState":{' not in delta[3]
+    assert sum(map(len, compressed)) < sum(map(len, delta)) < sum(map(len, full))
+
+
+def test_delta_stream_follows_in_place_updates():
+    encoder, decoder = EventStreamEncoder("delta"), EventStreamDecoder()
+    messages: list[dict] = [{"role": "user", "content": "make an app"}]
+
+    def send() -> dict | None:
+        event = AgentSseEvent(
+            status=AgentStatus.RUNNING,
+            traceId="trace",
+            message=AgentMessage(kind=MessageKind.STAGE_RESULT, agentState={"fsm_messages": list(messages)}),
+        )
+        return decoder.decode(encoder.encode(event).removeprefix("data: ").strip()).message.agent_state
+
+    send()
+    messages.append({"role": "assistant", "content": "draft"})
+    send()
+    # the message that went out in the last delta is edited in place
+    messages[1]["content"] = "final"
+    assert send() == {"fsm_messages": messages}
+
+
+def test_missing_event_is_detected():
+    encoder = EventStreamEncoder("delta")
+    frames = [encoder.encode(event).removeprefix("data: ").strip() for event in make_events()]
+    decoder = EventStreamDecoder()
+    decoder.decode(frames[0])
+    with pytest.raises(EventStreamError):
+        decoder.decode(frames[2])
+
+
+async def test_session_deltas_continue_from_the_stored_state():
+    stored = {"fsm_messages": [{"role": "user", "content": "make an app"}], "metadata": {"app_name": "todo"}}
+    new = {**stored, "fsm_state": {"step": 1}}
+    event = AgentSseEvent(
+        status=AgentStatus.IDLE,
+        traceId="trace",
+        message=AgentMessage(kind=MessageKind.STAGE_RESULT, agentState=None, stateDelta=make_delta(stored, new), sessionId="s", stateVersion=2),
+    )
+    frames = [f"data: {event.to_json()}\n\n"]
+
+    (restored,) = await AgentApiClient.parse_sse_events(FakeResponse(frames), state=stored)
+    assert restored.message.agent_state == new
+    # without the stored state nothing partial is exposed
+    (unknown,) = await AgentApiClient.parse_sse_events(FakeResponse(frames))
+    assert unknown.message.agent_state is None
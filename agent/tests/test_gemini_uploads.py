@@ -0,0 +1,139 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import anyio
+import pytest
+from google.genai import types as genai_types
+from llm.common import AttachedFiles, Message, TextRaw
+from llm.gemini import GeminiLLM
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class FakeFiles:
+    """Files API keeping uploads for a fixed lifetime, slow enough for uploads to overlap."""
+
+    def __init__(self, ttl: timedelta = timedelta(hours=48)):
+        self.ttl = ttl
+        self.uploads: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def upload(self, *, file, config=None) -> genai_types.File:
+        self.uploads.append(file)
+        name = f"files/{len(self.uploads)}"
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await anyio.sleep(0.01)
+        self.in_flight -= 1
+        return genai_types.File(
+            name=name,
+            uri=f"https://example.com/{name}",
+            mime_type="image/png",
+            expiration_time=NOW + self.ttl,
+            state=genai_types.FileState.ACTIVE,
+        )
+
+
+@pytest.fixture
+def tmp():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield tmp
+
+
+def write(tmp: str, name: str, data: bytes) -> str:
+    path = os.path.join(tmp, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def gemini(files: FakeFiles, inline_max_bytes: int = 0) -> GeminiLLM:
+    llm = GeminiLLM("gemini-test", api_key="test")
+    llm._async_client = SimpleNamespace(files=files)  # pyright: ignore[reportAttributeAccessIssue]
+    llm.uploads.inline_max_bytes = inline_max_bytes
+    llm.uploads.clock = lambda: NOW
+    return llm
+
+
+async def attach(llm: GeminiLLM, *paths: str) -> list[genai_types.Part]:
+    messages = [Message(role="user", content=[TextRaw("compare the screenshots")])]
+    contents = await llm._messages_into(messages, AttachedFiles(list(paths)))
+    return contents[-1].parts[1:]  # pyright: ignore[reportOptionalSubscript]
+
+
+async def test_same_content_is_uploaded_once(tmp):
+    files = FakeFiles()
+    llm = gemini(files)
+    chromium = write(tmp, "chromium.png", b"screenshot")
+    retry = write(tmp, "retry.png", b"screenshot")
+
+    first = await attach(llm, chromium)
+    second = await attach(llm, retry)
+    assert files.uploads == [chromium]
+    assert first == second
+    assert first[0].file_data.file_uri == "https://example.com/files/1"  # pyright: ignore[reportOptionalMemberAccess]
+    assert llm.uploads.metrics()["reused"] == 1
+
+
+async def test_expiring_upload_is_replaced(tmp):
+    files = FakeFiles(ttl=timedelta(minutes=30))
+    llm = gemini(files)
+    path = write(tmp, "chromium.png", b"screenshot")
+
+    await attach(llm, path)
+    await attach(llm, path)
+    assert len(files.uploads) == 1
+
+    # too close to the expiry to be used in a request
+    llm.uploads.clock = lambda: NOW + timedelta(minutes=25)
+    (part,) = await attach(llm, path)
+    assert len(files.uploads) == 2
+    assert part.file_data.file_uri == "https://example.com/files/2"  # pyright: ignore[reportOptionalMemberAccess]
+
+
+async def test_uploads_run_concurrently_and_dedupe_in_flight(tmp):
+    files = FakeFiles()
+    llm = gemini(files)
+    chromium = write(tmp, "chromium.png", b"chromium")
+    webkit = write(tmp, "webkit.png", b"webkit")
+    results = []
+
+    async def run():
+        results.append(await attach(llm, chromium, webkit))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(run)
+        tg.start_soon(run)
+    assert sorted(files.uploads) == sorted([chromium, webkit])
+    assert files.max_in_flight == 2
+    # the order of the attachments is kept
+    assert [p.file_data.file_uri for p in results[0]] == [p.file_data.file_uri for p in results[1]]  # pyright: ignore[reportOptionalMemberAccess]
+    assert {p.file_data.file_uri for p in results[0]} == {"https://example.com/files/1", "https://example.com/files/2"}  # pyright: ignore[reportOptionalMemberAccess]
+
+
+async def test_small_images_are_inlined(tmp):
+    files = FakeFiles()
+    llm = gemini(files, inline_max_bytes=16)
+    small = write(tmp, "small.png", b"tiny")
+    large = write(tmp, "large.png", b"x" * 64)
+    log = write(tmp, "server.log", b"log")
+
+    inline, uploaded, text = await attach(llm, small, large, log)
+    assert inline.inline_data.data == b"tiny" and inline.inline_data.mime_type == "image/png"  # pyright: ignore[reportOptionalMemberAccess]
+    assert uploaded.file_data is not None and text.file_data is not None
+    assert files.uploads == [large, log]
+    assert llm.uploads.metrics()["inlined"] == 1
+
+
+async def test_missing_file_raises(tmp):
+    with pytest.raises(FileNotFoundError):
+        await attach(gemini(FakeFiles(), inline_max_bytes=1024), os.path.join(tmp, "missing.png"))
@@ -0,0 +1,183 @@
+import random
+import shutil
+import subprocess
+from pathlib import Path
+import pytest
+from core.git_diff import GitFile, diff_overlay, diff_trees, quote_path, read_tree, tracked
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+TEMPLATES = Path(__file__).parent.parent
+TEMPLATE_DIRS = ["trpc_agent/template", "nicegui_agent/template", "laravel_agent/template"]
+
+
+def _git(cwd: Path, *args: str) -> bytes:
+    return subprocess.run(
+        ["git", "-c", "core.autocrlf=false", "-c", "diff.renames=false", *args],
+        cwd=cwd, check=True, capture_output=True,
+    ).stdout
+
+
+def _write(root: Path, files: dict[str, GitFile]):
+    for path, file in files.items():
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if file.mode == "120000":
+            target.symlink_to(file.content.decode())
+        else:
+            target.write_bytes(file.content)
+            target.chmod(0o755 if file.mode == "100755" else 0o644)
+
+
+def git_overlay_diff(tmp_path: Path, base: dict[str, GitFile], overlay: dict[str, GitFile]) -> str:
+    """Reference: commit base, copy overlay on top, stage everything and diff against HEAD."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    _write(repo, base)
+    _git(repo, "init", "-q")
+    _git(repo, "add", ".")
+    _git(repo, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "--allow-empty", "-m", "base")
+    for path in overlay:
+        target = repo / path
+        if target.is_symlink() or target.exists():
+            target.unlink()
+    _write(repo, overlay)
+    _git(repo, "add", ".")
+    return _git(repo, "diff", "HEAD").decode("utf-8", errors="replace")
+
+
+def _mutate(rng: random.Random, content: bytes) -> bytes:
+    lines = content.split(b"\n")
+    for _ in range(rng.randint(1, 6)):
+        op = rng.random()
+        pos = rng.randint(0, len(lines))
+        if op < 0.3 and lines:
+            del lines[min(pos, len(lines) - 1):min(pos, len(lines) - 1) + rng.randint(1, 4)]
+        elif op < 0.6:
+            chunk = [rng.choice([b"", b"}", b"    return x;", b"def helper():", b"  <div>"]) for _ in range(rng.randint(1, 5))]
+            lines[pos:pos] = chunk
+        elif op < 0.8 and lines:
+            idx = min(pos, len(lines) - 1)
+            lines[idx] = lines[idx] + b" // changed"
+        else:
+            # duplicate a block elsewhere to exercise sliding and the indent heuristic
+            start = rng.randint(0, max(0, len(lines) - 1))
+            lines[pos:pos] = lines[start:start + rng.randint(1, 6)]
+    return b"\n".join(lines)
+
+
+def _template_corpus() -> list[tuple[str, dict[str, GitFile]]]:
+    corpus = []
+    for template in TEMPLATE_DIRS:
+        tree = read_tree(TEMPLATES / template)
+        text = {p: f for p, f in tree.items() if not f.is_binary and len(f.content) < 200_000}
+        corpus.append((template, text))
+    return corpus
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_matches_git_on_template_edits(tmp_path: Path, seed: int):
+    rng = random.Random(seed)
+    name, base = _template_corpus()[seed % len(TEMPLATE_DIRS)]
+    paths = sorted(base)
+    overlay = {p: GitFile(_mutate(rng, base[p].content), base[p].mode) for p in rng.sample(paths, min(25, len(paths)))}
+    overlay["src/new_module.ts"] = GitFile(b"export const x = 1;\nexport const y = 2;")
+    overlay["empty.txt"] = GitFile(b"")
+    overlay["assets/logo.bin"] = GitFile(bytes(range(256)) * 4)
+    overlay["scripts/run.sh"] = GitFile(b"#!/bin/sh\necho hi\n", "100755")
+    overlay["node_modules/pkg/index.js"] = GitFile(b"ignored\n")
+
+    expected = git_overlay_diff(tmp_path, base, overlay)
+    assert expected, f"no changes generated for {name}"
+    assert diff_overlay(base, overlay) == expected
+
+
+def test_matches_git_on_edge_cases(tmp_path: Path):
+    base = {
+        "no_eol.txt": GitFile(b"one\ntwo"),
+        "gets_eol.txt": GitFile(b"alpha\nbeta"),
+        "loses_eol.txt": GitFile(b"alpha\nbeta\n"),
+        "mode.sh": GitFile(b"echo\n"),
+        "to_binary.dat": GitFile(b"text\n"),
+        "funcs.c": GitFile(b"".join(b"int f%d(void)\n{\n\treturn %d;\n}\n\n" % (i, i) for i in range(30))),
+        "quoted name.txt": GitFile(b"a\n"),
+        "ünïcode.txt": GitFile(b"a\n"),
+        "link": GitFile(b"no_eol.txt", "120000"),
+        ".gitignore": GitFile(b"*.log\n/build/\n!keep.log\nsub/**/tmp\n"),
+        "docs/.gitignore": GitFile(b"*.md\n!README.md\n"),
+    }
+    overlay = {
+        "no_eol.txt": GitFile(b"one\nTWO"),
+        "gets_eol.txt": GitFile(b"alpha\nbeta\n"),
+        "loses_eol.txt": GitFile(b"alpha\nbeta"),
+        "mode.sh": GitFile(b"echo\n", "100755"),
+        "to_binary.dat": GitFile(b"bin\0ary\n"),
+        "funcs.c": GitFile(b"".join(b"int f%d(void)\n{\n\treturn %d;\n}\n\n" % (i, i * (i % 7 != 3)) for i in range(30))),
+        "quoted name.txt": GitFile(b"b\n"),
+        "ünïcode.txt": GitFile(b"b\n"),
+        "link": GitFile(b"gets_eol.txt", "120000"),
+        "debug.log": GitFile(b"ignored\n"),
+        "keep.log": GitFile(b"kept\n"),
+        "build/out.js": GitFile(b"ignored\n"),
+        "sub/a/b/tmp": GitFile(b"ignored\n"),
+        "docs/guide.md": GitFile(b"ignored\n"),
+        "docs/README.md": GitFile(b"# kept\n"),
+        "tab\there.txt": GitFile(b"x\n"),
+    }
+    assert diff_overlay(base, overlay) == git_overlay_diff(tmp_path, base, overlay)
+
+
+def test_matches_git_on_random_line_edits(tmp_path: Path):
+    rng = random.Random(1234)
+    alphabet = [b"{", b"}", b"", b"  x = 1", b"  y = 2", b"return", b"if (a) {", b"\tfoo();"]
+    base, overlay = {}, {}
+    for i in range(60):
+        old = [rng.choice(alphabet) for _ in range(rng.randint(0, 80))]
+        new = list(old)
+        for _ in range(rng.randint(0, 10)):
+            pos = rng.randint(0, len(new))
+            if rng.random() < 0.5 and new:
+                del new[min(pos, len(new) - 1)]
+            else:
+                new.insert(pos, rng.choice(alphabet))
+        base[f"f{i:02}.txt"] = GitFile(b"\n".join(old) + b"\n" * rng.randint(0, 1))
+        overlay[f"f{i:02}.txt"] = GitFile(b"\n".join(new) + b"\n" * rng.randint(0, 1))
+    assert diff_overlay(base, overlay) == git_overlay_diff(tmp_path, base, overlay)
+
+
+def test_userdiff_funcname_drivers(tmp_path: Path):
+    php = b"<?php\n\nclass Foo\n{\n" + b"".join(
+        b"    public function m%d()\n    {\n        $a = 1;\n        $b = 2;\n        return %d;\n    }\n\n" % (i, i) for i in range(10)
+    ) + b"}\n"
+    md = b"".join(b"## Section %d\n\ntext\nmore\nlines\nhere\n\n" % i for i in range(10))
+    base = {
+        ".gitattributes": GitFile(b"*.php diff=php\n*.md diff=markdown\n*.css diff=css\n"),
+        "Foo.php": GitFile(php),
+        "README.md": GitFile(md),
+        "app.css": GitFile(b".a {\n  color: red;\n  margin: 0;\n  padding: 0;\n  border: 0;\n}\n"),
+    }
+    overlay = {
+        "Foo.php": GitFile(php.replace(b"return 7;", b"return 70;")),
+        "README.md": GitFile(md.replace(b"## Section 6\n\ntext\nmore", b"## Section 6\n\ntext\nless")),
+        "app.css": GitFile(b".a {\n  color: red;\n  margin: 0;\n  padding: 0;\n  border: 1px;\n}\n"),
+    }
+    ours = diff_overlay(base, overlay)
+    assert "@@ public function m7()" in ours
+    assert "@@ ## Section 5" in ours
+    assert ours == git_overlay_diff(tmp_path, base, overlay)
+
+
+def test_tracked_files_stay_tracked_when_ignored():
+    base = {"app.log": GitFile(b"a\n")}
+    head = tracked(base)
+    assert "app.log" in head
+    worktree = {**base, ".gitignore": GitFile(b"*.log\n"), "app.log": GitFile(b"b\n"), "new.log": GitFile(b"c\n")}
+    index = tracked(worktree, already_tracked=head)
+    assert set(index) == {"app.log", ".gitignore"}
+    assert "+b" in diff_trees(head, index)
+
+
+def test_quote_path():
+    assert quote_path("a/", "plain.txt") == b"a/plain.txt"
+    assert quote_path("a/", "tab\there") == b'"a/tab\\there"'
+    assert quote_path("b/", "ü") == b'"b/\\303\\274"'
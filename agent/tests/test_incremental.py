@@ -0,0 +1,119 @@
+import pytest
+from unittest.mock import MagicMock
+from core import check_cache as check_cache_module
+from core import incremental
+from core.actors import BaseData
+from core.base_node import Node
+from core.check_cache import CheckCache, cached_check
+from core.incremental import ImportGraph
+from core.workspace import Workspace, _StateBase
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+TS_FILES = {
+    "server/src/index.ts": "import { createTask } from './handlers/create_task';\nimport { z } from 'zod';\n",
+    "server/src/handlers/create_task.ts": "import { db } from '../db';\nimport { type Task } from '../schema.js';\n",
+    "server/src/handlers/get_tasks.ts": "import { db } from '../db';\n",
+    "server/src/db/index.ts": "export * from './schema';\n",
+    "server/src/db/schema.ts": "import { pgTable } from 'drizzle-orm/pg-core';\n",
+    "server/src/schema.ts": "export const x = 1;\n",
+    "server/src/tests/create_task.test.ts": "import { createTask } from '../handlers/create_task';\n",
+    "server/src/tests/get_tasks.test.ts": "import {\n  getTasks,\n} from \"../handlers/get_tasks\";\n",
+}
+
+PY_FILES = {
+    "app/__init__.py": "",
+    "app/models.py": "from sqlmodel import SQLModel\n",
+    "app/services.py": "from app.models import Task\nfrom . import database\n",
+    "app/database.py": "import os\n",
+    "app/startup.py": "import app.services\n",
+    "tests/__init__.py": "",
+    "tests/conftest.py": "import pytest\n",
+    "tests/test_models.py": "from app.models import Task\n",
+    "tests/test_services.py": "from app import (\n    services,\n)\n",
+    "tests/test_ui.py": "from .helpers import missing\n",
+}
+
+
+def test_typescript_graph():
+    graph = ImportGraph.parse(TS_FILES, "typescript")
+    assert graph.imports["server/src/handlers/create_task.ts"] == {"server/src/db/index.ts", "server/src/schema.ts"}
+    assert not graph.uncertain
+
+    affected = graph.dependents({"server/src/db/schema.ts"})
+    assert incremental.affected_tests(affected, "typescript", strip="server/") == [
+        "src/tests/create_task.test.ts",
+        "src/tests/get_tasks.test.ts",
+    ]
+    affected = graph.dependents({"server/src/schema.ts"})
+    assert incremental.affected_tests(affected, "typescript", strip="server/") == ["src/tests/create_task.test.ts"]
+
+
+def test_python_graph():
+    graph = ImportGraph.parse(PY_FILES, "python")
+    assert graph.imports["app/services.py"] == {"app/__init__.py", "app/models.py", "app/database.py"}
+    assert "app/services.py" in graph.imports["tests/test_services.py"]
+    assert "tests/conftest.py" in graph.imports["tests/test_models.py"]
+    # relative import that doesn't resolve: always affected
+    assert graph.uncertain == {"tests/test_ui.py"}
+
+    affected = graph.dependents({"app/database.py"})
+    assert incremental.affected_tests(affected, "python") == ["tests/test_services.py", "tests/test_ui.py"]
+    # everything goes through conftest
+    assert len(incremental.affected_tests(graph.dependents({"tests/conftest.py"}), "python")) == 3
+
+
+class FakeDirectory:
+    async def digest(self) -> str:
+        return "sha256:template"
+
+
+class FakeActor:
+    def __init__(self):
+        self.checked: list[set[str] | None] = []
+
+    @cached_check
+    async def run_tests(self, node) -> str | None:
+        scope = await incremental.affected_files(self.run_tests, node, roots=["server/src"], language="typescript")
+        self.checked.append(scope and scope[0])
+        return None
+
+
+async def test_checks_are_scoped_after_passing_parent(monkeypatch, tmp_path):
+    monkeypatch.setattr(check_cache_module, "check_cache", CheckCache(str(tmp_path / "checks.jsonl")))
+
+    async def load_graph(workspace, roots, language, aliases={}):
+        return ImportGraph.parse(TS_FILES, language), set(TS_FILES)
+
+    monkeypatch.setattr(incremental, "load_graph", load_graph)
+
+    workspace = Workspace(ctr=MagicMock(), start=MagicMock(), protected=set(), allowed=set())
+    workspace._base = _StateBase(FakeDirectory(), "bun")  # pyright: ignore[reportArgumentType]
+    root = Node(BaseData(workspace, []))
+
+    def step(parent: Node[BaseData], path: str, content: str | None = "changed") -> Node[BaseData]:
+        ws = parent.data.workspace.clone()
+        ws.write_file(path, content) if content is not None else ws.rm(path)
+        return parent.add_child(Node(BaseData(ws, [], {path: content}), parent))
+
+    actor = FakeActor()
+    assert await actor.run_tests(root) is None
+    assert actor.checked == [None]  # root: full run
+
+    child = step(root, "server/src/handlers/get_tasks.ts")
+    await actor.run_tests(child)
+    assert actor.checked[-1] == {"server/src/handlers/get_tasks.ts", "server/src/tests/get_tasks.test.ts"}
+
+    # changes outside the sources always run in full
+    await actor.run_tests(step(child, "server/package.json"))
+    assert actor.checked[-1] is None
+
+    # the parent of this one never ran the check
+    await actor.run_tests(step(step(child, "server/src/schema.ts"), "server/src/db/schema.ts"))
+    assert actor.checked[-1] is None
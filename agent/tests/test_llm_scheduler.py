@@ -0,0 +1,116 @@
+import time
+import pytest
+import anyio
+from llm.common import Completion, Message, TextRaw
+from llm.scheduler import Budget, LLMScheduler, ScheduledLLM, llm_priority
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("rate limited")
+        self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+
+class FakeProvider:
+    """Serves requests after a delay, rejects everything above `capacity` concurrent requests with 429."""
+
+    def __init__(self, delay: float = 0.01, capacity: int | None = None, usage: int = 10):
+        self.delay = delay
+        self.capacity = capacity
+        self.usage = usage
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.rejected = 0
+        self.order: list[str] = []
+
+    async def completion(self, messages, max_tokens, **kwargs) -> Completion:
+        self.calls += 1
+        if self.capacity is not None and self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise RateLimitError(retry_after=0.05)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await anyio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        self.order.append(messages[0].content[0].text)
+        return Completion("assistant", [TextRaw("ok")], self.usage // 2, self.usage - self.usage // 2, "end_turn")
+
+
+def request(text: str) -> list[Message]:
+    return [Message(role="user", content=[TextRaw(text)])]
+
+
+async def test_priority_decides_order_of_queued_requests():
+    provider = FakeProvider(delay=0.02)
+    llm = ScheduledLLM(provider, "fake", LLMScheduler({"fake": Budget(max_concurrency=1)}))  # pyright: ignore[reportArgumentType]
+
+    async def call(text: str, priority: int, after: float):
+        await anyio.sleep(after)
+        with llm_priority(priority):
+            await llm.completion(request(text), max_tokens=10)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(call, "first", 10, 0)
+        tg.start_soon(call, "deep node", 15, 0.005)
+        tg.start_soon(call, "shallow node", 11, 0.006)
+        tg.start_soon(call, "user facing", 0, 0.007)
+
+    assert provider.order == ["first", "user facing", "shallow node", "deep node"]
+    assert provider.peak == 1
+
+
+async def test_rate_limits_back_off_instead_of_retry_storm():
+    provider = FakeProvider(delay=0.01, capacity=2)
+    scheduler = LLMScheduler({"fake": Budget(max_concurrency=8)})
+    llm = ScheduledLLM(provider, "fake", scheduler)  # pyright: ignore[reportArgumentType]
+    results = []
+
+    async def call(i: int):
+        results.append(await llm.completion(request(f"request {i}"), max_tokens=10))
+
+    async with anyio.create_task_group() as tg:
+        for i in range(20):
+            tg.start_soon(call, i)
+
+    assert len(results) == 20
+    # the first burst is rejected, after that the provider runs at a concurrency it accepts
+    assert provider.rejected <= 8
+    assert scheduler.provider("fake").limit <= 4
+
+
+async def test_token_budget_applies_backpressure():
+    provider = FakeProvider(delay=0, usage=1000)
+    # 1000 tokens per second, the first minute of budget is available right away
+    llm = ScheduledLLM(provider, "fake", LLMScheduler({"fake": Budget(tokens_per_minute=60_000)}))  # pyright: ignore[reportArgumentType]
+
+    started = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        for i in range(61):
+            tg.start_soon(llm.completion, request(f"request {i}"), 990)
+
+    assert provider.calls == 61
+    assert time.perf_counter() - started >= 0.8
+
+
+async def test_non_rate_limit_errors_are_raised():
+    class Broken(FakeProvider):
+        async def completion(self, messages, max_tokens, **kwargs) -> Completion:
+            raise ValueError("bad request")
+
+    scheduler = LLMScheduler()
+    llm = ScheduledLLM(Broken(), "fake", scheduler)  # pyright: ignore[reportArgumentType]
+    with pytest.raises(ValueError):
+        await llm.completion(request("x"), max_tokens=10)
+    assert scheduler.provider("fake").in_flight == 0
@@ -0,0 +1,287 @@
+import os
+import tempfile
+from types import SimpleNamespace
+import anyio
+import httpx
+import ollama
+import openai
+import pytest
+from anthropic.types import Message as AnthropicMessage, TextBlock, ToolUseBlock, Usage
+from api.agent_server.models import AgentSseEvent, MessageKind
+from api.base_agent_session import BaseAgentSession
+from api.fsm_tools import FSMStatus, FSMToolProcessor
+from llm.anthropic_client import AnthropicLLM
+from llm.cached import CachedLLM
+from llm.common import (
+    AsyncLLM,
+    Completion,
+    Message,
+    TextDelta,
+    TextRaw,
+    ThinkingBlock,
+    ThinkingDelta,
+    ToolUse,
+    ToolUseDelta,
+    stream_completion,
+)
+from llm import ollama_client, openai_client, scheduler
+from llm.openai_client import OpenAILLM
+from llm.scheduler import Budget, LLMScheduler, ScheduledLLM
+from llm.utils import loop_completion
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class StreamingLLM(AsyncLLM):
+    """Streams each turn in fragments, the turns are served in order."""
+
+    def __init__(self, *turns: tuple[list[str], str], fail_first: int = 0):
+        self.turns = list(turns)
+        self.fail_first = fail_first
+        self.calls = 0
+        self.requests: list[list[Message]] = []
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        raise AssertionError("expected a streamed request")
+
+    async def stream(self, messages, max_tokens, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.fail_first:
+            raise RateLimitError("rate limited")
+        self.requests.append(list(messages))
+        fragments, stop_reason = self.turns.pop(0)
+        for fragment in fragments:
+            await anyio.sleep(0)
+            yield TextDelta(fragment)
+        yield Completion("assistant", [TextRaw("".join(fragments))], 10, len(fragments), stop_reason)  # pyright: ignore[reportArgumentType]
+
+
+class StubLLM(AsyncLLM):
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        return Completion(
+            "assistant",
+            [ThinkingBlock("hmm"), TextRaw("hello"), ToolUse("change", {"feedback": "x"}, "1")],
+            1,
+            1,
+            "tool_use",
+        )
+
+
+def request(text: str = "hi") -> list[Message]:
+    return [Message(role="user", content=[TextRaw(text)])]
+
+
+async def collect(llm: AsyncLLM, **kwargs) -> tuple[list, Completion]:
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    completion = await stream_completion(llm, on_delta, messages=request(), max_tokens=100, **kwargs)
+    return deltas, completion
+
+
+async def test_default_stream_emits_whole_blocks():
+    deltas, completion = await collect(StubLLM())
+    assert deltas == [ThinkingDelta("hmm"), TextDelta("hello"), ToolUseDelta("1", "change", '{"feedback": "x"}')]
+    assert completion.stop_reason == "tool_use"
+
+
+async def test_cached_stream_records_and_replays():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.json")
+        model = StreamingLLM((["Hel", "lo"], "end_turn"))
+        deltas, recorded = await collect(CachedLLM(model, path, cache_mode="record"))
+        assert deltas == [TextDelta("Hel"), TextDelta("lo")]
+
+        # a recorded request is re-streamed without calling the model, completion reads the same entry
+        replay = CachedLLM(model, path, cache_mode="replay")
+        deltas, replayed = await collect(replay)
+        assert model.calls == 1
+        assert deltas == [TextDelta("Hello")]
+        assert replayed == recorded
+        assert await replay.completion(messages=request(), max_tokens=100) == recorded
+
+
+async def test_lru_stream_waits_for_the_request_in_flight():
+    model = StreamingLLM((["a", "b", "c"], "end_turn"))
+    llm = CachedLLM(model, "unused", cache_mode="lru")
+    results = []
+
+    async def run():
+        results.append(await collect(llm))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(run)
+        tg.start_soon(run)
+    assert model.calls == 1
+    assert [completion for _, completion in results] == [results[0][1]] * 2
+
+
+async def test_scheduled_stream_retries_rate_limit_before_output():
+    model = StreamingLLM((["x", "y"], "end_turn"), fail_first=1)
+    llm = ScheduledLLM(model, "fake", LLMScheduler({"fake": Budget(max_concurrency=1)}))
+    deltas, completion = await collect(llm)
+    assert model.calls == 2
+    assert deltas == [TextDelta("x"), TextDelta("y")]
+    provider = llm.scheduler.provider("fake")
+    assert provider.in_flight == 0 and provider.limit == 1
+
+
+def test_clients_leave_rate_limits_of_scheduled_calls_to_the_scheduler():
+    response = httpx.Response(429, request=httpx.Request("POST", "http://llm"))
+    errors = {
+        openai_client: openai.APIStatusError("rate limited", response=response, body=None),
+        ollama_client: ollama.ResponseError("rate limited", 429),
+    }
+    for client, error in errors.items():
+        assert client.is_retryable_error(error)
+        token = scheduler._scheduled.set(True)
+        try:
+            assert not client.is_retryable_error(error)
+        finally:
+            scheduler._scheduled.reset(token)
+
+
+async def test_loop_completion_streams_continuations():
+    model = StreamingLLM((["long ", "ans"], "max_tokens"), (["wer"], "end_turn"))
+    deltas = []
+
+    async def on_delta(delta):
+        deltas.append(delta)
+
+    message = await loop_completion(model, request(), on_delta=on_delta, max_tokens=100)
+    assert [d.text for d in deltas] == ["long ", "ans", "wer"]
+    assert message.content == [TextRaw("long answer")]
+    # the continuation request carries the output so far
+    assert [m.role for m in model.requests[1]] == ["user", "assistant"]
+
+
+class FakeFSM:
+    @classmethod
+    def base_execution_plan(cls, settings=None) -> str:
+        return "plan"
+
+
+async def test_step_forwards_deltas_to_session_events():
+    events_tx, events_rx = anyio.create_memory_object_stream[AgentSseEvent](100)
+    session = BaseAgentSession.__new__(BaseAgentSession)
+    session.trace_id = "trace"
+
+    async def on_delta(delta):
+        await session.send_delta(events_tx, delta)
+
+    processor = FSMToolProcessor(None, FakeFSM, delta_callback=on_delta)  # pyright: ignore[reportArgumentType]
+    model = StreamingLLM((["What should ", "the app do?"], "end_turn"))
+    thread, status, _ = await processor.step(request("make an app"), model, {"max_tokens": 100})
+    assert status == FSMStatus.REFINEMENT_REQUEST
+    assert thread[0].content == [TextRaw("What should the app do?")]
+
+    events_tx.close()
+    events = [event async for event in events_rx]
+    assert [e.message.kind for e in events] == [MessageKind.STREAM_DELTA] * 2
+    assert [e.message.delta.text for e in events] == ["What should ", "the app do?"]  # pyright: ignore[reportOptionalMemberAccess]
+    assert all(e.message.agent_state is None for e in events)
+
+
+class FakeAnthropicStream:
+    def __init__(self, events, final):
+        self.events = events
+        self.final = final
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for event in self.events:
+            yield event
+
+    async def get_final_message(self):
+        return self.final
+
+
+async def test_anthropic_stream_deltas():
+    tool_use = ToolUseBlock(type="tool_use", id="toolu_1", name="change", input={"feedback": "blue"})
+    events = [
+        SimpleNamespace(type="content_block_start", index=0, content_block=TextBlock(type="text", text="")),
+        SimpleNamespace(type="content_block_delta", index=0, delta=SimpleNamespace(type="text_delta", text="Sure")),
+        SimpleNamespace(type="text", text="Sure"),
+        SimpleNamespace(type="content_block_start", index=1, content_block=tool_use),
+        SimpleNamespace(type="content_block_delta", index=1, delta=SimpleNamespace(type="input_json_delta", partial_json='{"feedback": ')),
+        SimpleNamespace(type="content_block_delta", index=1, delta=SimpleNamespace(type="input_json_delta", partial_json='"blue"}')),
+    ]
+    final = AnthropicMessage(
+        id="msg_1",
+        type="message",
+        role="assistant",
+        model="claude",
+        content=[TextBlock(type="text", text="Sure"), tool_use],
+        stop_reason="tool_use",
+        usage=Usage(input_tokens=5, output_tokens=7),
+    )
+    client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: FakeAnthropicStream(events, final)))
+    llm = AnthropicLLM(client, "claude")  # pyright: ignore[reportArgumentType]
+
+    deltas, completion = await collect(llm)
+    assert deltas == [
+        TextDelta("Sure"),
+        ToolUseDelta("toolu_1", "change", ""),
+        ToolUseDelta("toolu_1", "change", '{"feedback": '),
+        ToolUseDelta("toolu_1", "change", '"blue"}'),
+    ]
+    assert completion.content == [TextRaw("Sure"), ToolUse("change", {"feedback": "blue"}, "toolu_1")]
+    assert (completion.input_tokens, completion.output_tokens) == (5, 7)
+
+
+async def test_openai_stream_assembles_tool_calls():
+    def chunk(content=None, tool_calls=None, finish_reason=None, usage=None):
+        choices = [] if usage else [SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=tool_calls), finish_reason=finish_reason)]
+        return SimpleNamespace(choices=choices, usage=usage)
+
+    def call(index, id=None, name=None, arguments=None):
+        return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+    chunks = [
+        chunk(content="Let me "),
+        chunk(content="check."),
+        chunk(tool_calls=[call(0, "call_1", "read_file", "")]),
+        chunk(tool_calls=[call(0, arguments='{"path": ')]),
+        chunk(tool_calls=[call(0, arguments='"a.ts"}')]),
+        chunk(finish_reason="tool_calls"),
+        chunk(usage=SimpleNamespace(prompt_tokens=12, completion_tokens=8)),
+    ]
+    requests = []
+
+    async def create(**kwargs):
+        requests.append(kwargs)
+
+        async def stream():
+            for c in chunks:
+                yield c
+
+        return stream()
+
+    llm = OpenAILLM(model_name="gpt-4o-mini", api_key="test")
+    llm.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))  # pyright: ignore[reportAttributeAccessIssue]
+
+    deltas, completion = await collect(llm)
+    assert requests[0]["stream"] is True
+    assert [d for d in deltas if isinstance(d, TextDelta)] == [TextDelta("Let me "), TextDelta("check.")]
+    assert "".join(d.partial_input for d in deltas if isinstance(d, ToolUseDelta)) == '{"path": "a.ts"}'
+    assert completion.content == [ToolUse("read_file", {"path": "a.ts"}, "call_1"), TextRaw("Let me check.")]
+    assert (completion.stop_reason, completion.input_tokens, completion.output_tokens) == ("tool_use", 12, 8)
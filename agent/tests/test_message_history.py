@@ -0,0 +1,68 @@
+from core.actors import BaseData, message_history
+from core.base_node import Node
+from llm.anthropic_client import AnthropicLLM
+from llm.cached import normalize
+from llm.common import Message, MessageHistory, TextRaw
+
+
+def msg(text: str, role="user") -> Message:
+    return Message(role=role, content=[TextRaw(text)])
+
+
+def make_node(parent: Node[BaseData] | None, *texts: str) -> Node[BaseData]:
+    node = Node(BaseData(None, [msg(t) for t in texts]), parent)  # pyright: ignore[reportArgumentType]
+    return parent.add_child(node) if parent else node
+
+
+def flat(node: Node[BaseData]) -> list[Message]:
+    return [m for n in node.get_trajectory() for m in n.data.messages]
+
+
+def test_branches_share_prefix_without_interference():
+    root = MessageHistory([msg("a"), msg("b")])
+    left = root + [msg("c")]
+    right = root.extend([msg("d"), msg("e")])
+    deeper = left + [msg("f")]
+
+    assert list(root) == [msg("a"), msg("b")]
+    assert left == [msg("a"), msg("b"), msg("c")]
+    assert right == [msg("a"), msg("b"), msg("d"), msg("e")]
+    assert deeper == [msg("a"), msg("b"), msg("c"), msg("f")]
+    assert right[-1] == msg("e") and right[1:3] == [msg("b"), msg("d")]
+    assert left.prefix_len == right.prefix_len == 2 and deeper.prefix_len == 3
+
+    assert left.prefix_id == right.prefix_id == root.id
+    assert deeper.prefix_id == left.id != right.id
+    assert MessageHistory([msg("a"), msg("b"), msg("c")]).id != left.id  # ids are chained, not flat
+    assert (MessageHistory([msg("a"), msg("b")]) + [msg("c")]).id == left.id
+    assert normalize({"messages": left}) == normalize({"messages": list(left)})
+
+
+def test_node_history_matches_trajectory():
+    root = make_node(None, "task")
+    a = make_node(root, "a1")
+    b = make_node(a, "b1", "b2")
+    sibling = make_node(a, "s1")
+    assert message_history(b) == flat(b)
+    assert message_history(sibling) == flat(sibling)
+    assert message_history(b).parent is message_history(a)
+
+    # tool results are appended to a node after it was created
+    b.data.messages.append(msg("tool result"))
+    assert message_history(b) == flat(b)
+    history = message_history(b)
+    assert message_history(b) is history
+
+    # a reparented subtree picks up its new prefix
+    other = make_node(None, "other task")
+    a.prune()
+    other.add_child(a)
+    assert message_history(b) == flat(b)
+
+
+def test_anthropic_cache_points_skip_empty_messages():
+    history = MessageHistory([msg("a"), msg("   "), msg("b")]) + [msg("c")]
+    theirs = AnthropicLLM._messages_into(history)
+    AnthropicLLM._mark_cache_points(theirs, history, {history.prefix_len - 1, len(history) - 1})
+    marked = [m["content"][-1].get("cache_control") for m in theirs]  # type: ignore
+    assert marked == [None, {"type": "ephemeral"}, {"type": "ephemeral"}]
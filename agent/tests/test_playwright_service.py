@@ -0,0 +1,70 @@
+import pytest
+import anyio
+from trpc_agent import playwright
+from trpc_agent.playwright import PlaywrightJob, PlaywrightService
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class Engine:
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.builds = 0
+
+
+class FakeClient:
+    pass
+
+
+class FakeContainer:
+    def __init__(self, engine: Engine, ops: list[str]):
+        self.engine = engine
+        self.ops = ops
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: FakeContainer(self.engine, [*self.ops, name, *map(str, args)])
+
+    async def sync(self) -> "FakeContainer":
+        return self
+
+    def file(self, path: str) -> "FakeContainer":
+        return self
+
+    async def contents(self) -> str:
+        self.engine.running += 1
+        self.engine.peak = max(self.engine.peak, self.engine.running)
+        await anyio.sleep(0.01)
+        self.engine.running -= 1
+        return "0 1.00 2.50 3 0 1048576\nok\n\n--- exec stderr 6d1c3a9f ---\n"
+
+
+async def test_jobs_share_one_runner(monkeypatch):
+    engine = Engine()
+
+    async def load(client, spec, template_dir):
+        engine.builds += 1
+        return FakeContainer(engine, ["from_", spec.image, "npm install"]), "runner"
+
+    monkeypatch.setattr(playwright.base_images, "load", load)
+    client = FakeClient()
+    service = PlaywrightService(client, workers=2)  # pyright: ignore[reportArgumentType]
+    results = []
+
+    async def submit():
+        job = PlaywrightJob(tests="tests", config="config", app="app")  # pyright: ignore[reportArgumentType]
+        results.append(await service.submit(job))
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(5):
+            tg.start_soon(submit)
+
+    assert engine.builds == 1
+    assert engine.peak == 2
+    assert [r.exit_code for r in results] == [0] * 5
+    assert results[0].stdout == "ok\n" and results[0].duration == 1.5
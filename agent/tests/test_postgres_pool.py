@@ -0,0 +1,146 @@
+import gc
+import re
+import time
+import pytest
+import anyio
+import dagger
+from core.postgres_utils import PostgresPool, PG_TEMPLATE_DB, get_postgres_pool, _pools
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+SERVICE_STARTUP = 0.2  # postgres boot + client install + readiness polling
+ADMIN_ROUND_TRIP = 0.01  # single psql exec against a running service
+
+
+class FakeClient:
+    pass
+
+
+class FakeServer:
+    """In-memory stand-in for a running postgres service."""
+
+    def __init__(self):
+        self.databases: dict[str, dict] = {"postgres": {}, "template0": {}}
+        self.alive = True
+
+    def execute(self, statement: str):
+        if m := re.fullmatch(r'CREATE DATABASE "?(\w+)"? TEMPLATE "?(\w+)"?', statement):
+            name, template = m.groups()
+            assert name not in self.databases, f"database {name} already exists"
+            self.databases[name] = dict(self.databases[template])
+        elif m := re.fullmatch(r'DROP DATABASE IF EXISTS "(\w+)" WITH \(FORCE\)', statement):
+            self.databases.pop(m.group(1), None)
+        else:
+            raise AssertionError(f"unexpected statement: {statement}")
+
+
+class FakePostgresPool(PostgresPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.servers: list[FakeServer] = []
+        self.round_trips = 0
+
+    async def _start_service(self):
+        await anyio.sleep(SERVICE_STARTUP)
+        server = FakeServer()
+        self.servers.append(server)
+        return server
+
+    async def _psql(self, service, command):
+        self.round_trips += 1
+        await anyio.sleep(ADMIN_ROUND_TRIP)
+        if not service.alive:
+            raise dagger.TransportError("service is gone")
+        statements = [command[i + 1] for i, arg in enumerate(command) if arg == "-c"]
+        for statement in statements:
+            service.execute(statement)
+
+
+async def test_pool_isolates_databases():
+    client = FakeClient()
+    pool = FakePostgresPool(client, size=1)
+    seen = []
+
+    async def check(idx: int):
+        async with pool.database() as db:
+            server = db.service
+            server.databases[db.name]["marker"] = idx
+            await anyio.sleep(0.02)
+            # no other check has touched this database
+            assert server.databases[db.name] == {"marker": idx}
+            assert db.url.endswith(f"/{db.name}")
+            seen.append(db.name)
+
+    async with anyio.create_task_group() as tg:
+        for i in range(5):
+            tg.start_soon(check, i)
+
+    assert len(set(seen)) == 5
+    (server,) = pool.servers
+    # template stays clean and used databases are dropped
+    assert server.databases[PG_TEMPLATE_DB] == {}
+    assert not any(name in server.databases for name in seen)
+
+
+async def test_pool_recycles_spare_databases():
+    pool = FakePostgresPool(FakeClient(), size=1, spares=1)
+    async with pool.database():
+        pass
+    trips = pool.round_trips
+    # next lease takes the spare prepared on release, no round trip before use
+    async with pool.database() as db:
+        assert pool.round_trips == trips
+        assert db.name in db.service.databases
+
+
+async def test_pool_replaces_dead_service():
+    pool = FakePostgresPool(FakeClient(), size=1)
+    async with pool.database() as db:
+        first = db.service
+    first.alive = False
+    # the spare is handed out without a round trip, the failure surfaces when recycling
+    async with pool.database() as db:
+        assert db.service is first
+    async with pool.database() as db:
+        assert db.service is not first
+        assert db.name in db.service.databases
+    assert len(pool.servers) == 2
+
+
+async def test_pool_latency_savings():
+    checks = 6
+
+    async def cold_check():
+        # previous behaviour: fresh service + readiness wait for every check
+        await anyio.sleep(SERVICE_STARTUP)
+
+    started = time.monotonic()
+    for _ in range(checks):
+        await cold_check()
+    cold = time.monotonic() - started
+
+    pool = FakePostgresPool(FakeClient(), size=1)
+    started = time.monotonic()
+    for _ in range(checks):
+        async with pool.database():
+            pass
+    pooled = time.monotonic() - started
+
+    assert len(pool.servers) == 1
+    assert pooled < cold / 2, f"pooled {pooled:.3f}s vs cold {cold:.3f}s"
+
+
+async def test_pool_registry_follows_client_lifetime():
+    client = FakeClient()
+    pool = get_postgres_pool(client)
+    assert get_postgres_pool(client) is pool
+    key = id(client)
+    del client
+    gc.collect()
+    assert key not in _pools
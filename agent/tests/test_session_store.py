@@ -0,0 +1,112 @@
+import random
+import pytest
+from api.agent_server.async_server import SessionManager
+from api.agent_server.models import AgentRequest
+from api.session_store import SessionStore, StaleSessionError, apply_delta, make_delta
+from kv_storage import SqliteStorage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def test_delta_round_trip():
+    rng = random.Random(3)
+
+    def mutate(value, depth=0):
+        match value:
+            case dict():
+                result = {k: mutate(v, depth + 1) if rng.random() < 0.5 else v for k, v in value.items() if rng.random() < 0.9}
+                if rng.random() < 0.3:
+                    result[f"new{rng.randrange(5)}"] = rng.choice([None, 1, "x", {"a": None}, [1, 2]])
+                return result
+            case list():
+                return value + [rng.randrange(10)] if rng.random() < 0.7 else value[1:]
+            case _:
+                return rng.choice([value, None, "changed", {"nested": value}])
+
+    state = {
+        "fsm_messages": [{"role": "user", "content": "hi"}],
+        "fsm_state": {"context": {"files": {"a.ts": "1", "b.ts": "2"}, "errors": None}, "actors": [1, 2]},
+        "metadata": {"app_name": None, "template_diff_sent": False},
+    }
+    for _ in range(300):
+        new = mutate(state)
+        assert apply_delta(state, make_delta(state, new)) == new
+        state = new
+
+    old = {"fsm_messages": [1, 2], "metadata": {"app_name": "x"}}
+    delta = make_delta(old, {"fsm_messages": [1, 2, 3], "metadata": {"app_name": "x"}})
+    assert delta == {"fsm_messages": {"$append": [3]}}
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+async def test_versions_and_stale_clients(tmp_path, backend):
+    store = SessionStore(SqliteStorage(tmp_path / "sessions.sqlite") if backend == "sqlite" else None)
+    session = await store.resume("s1", 0)
+    version, delta = await store.commit(session, {"fsm_messages": [1], "metadata": {"app_name": "todo"}})
+    assert version == 1 and delta == {"fsm_messages": [1], "metadata": {"$set": {"app_name": "todo"}}}
+
+    resumed = await store.resume("s1", 1)
+    assert resumed.state == {"fsm_messages": [1], "metadata": {"app_name": "todo"}}
+    resumed.state["fsm_messages"].append("mutated by the agent")
+    assert (await store.resume("s1", 1)).state == {"fsm_messages": [1], "metadata": {"app_name": "todo"}}
+
+    await store.commit(await store.resume("s1", 1), {"fsm_messages": [1, 2], "metadata": {"app_name": "todo"}})
+    with pytest.raises(StaleSessionError):
+        await store.resume("s1", 1)
+    with pytest.raises(StaleSessionError):
+        await store.resume("unknown", 3)
+
+
+async def test_request_is_restored_from_session():
+    manager = SessionManager(SessionStore())
+
+    def request(**fields) -> AgentRequest:
+        return AgentRequest.model_validate({
+            "allMessages": [{"role": "user", "content": "make a todo app"}],
+            "applicationId": "app",
+            "traceId": "trace",
+            **fields,
+        })
+
+    # old clients are untouched
+    legacy = request(agentState={"metadata": {}}, allFiles=[{"path": "a.ts", "content": "1"}])
+    assert await manager.resume(legacy) is None and legacy.agent_state == {"metadata": {}}
+
+    first = request(sessionId="s", allFiles=[{"path": "a.ts", "content": "1"}, {"path": "b.ts", "content": "2"}])
+    session = await manager.resume(first)
+    assert session is not None and first.agent_state is None
+    version, _ = await manager.store.commit(session, {"fsm_state": {"context": {"files": {}}}, "metadata": {}})
+
+    follow_up = request(
+        sessionId="s",
+        stateVersion=version,
+        changedFiles=[{"path": "a.ts", "content": "edited"}, {"path": "c.ts", "content": "3"}],
+        deletedFiles=["b.ts"],
+    )
+    assert await manager.resume(follow_up) is not None
+    assert follow_up.agent_state == {"fsm_state": {"context": {"files": {}}}, "metadata": {}}
+    assert {f.path: f.content for f in follow_up.all_files or []} == {"a.ts": "edited", "c.ts": "3"}
+
+    with pytest.raises(StaleSessionError):
+        await manager.resume(request(sessionId="s", stateVersion=version - 1))
+    # a client holding the full state can always restart its session
+    restarted = request(sessionId="s", stateVersion=0, agentState={"metadata": {"app_name": "x"}})
+    assert (await manager.resume(restarted)).version == version  # pyright: ignore[reportOptionalMemberAccess]
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+async def test_concurrent_requests_do_not_overwrite_each_other(tmp_path, backend):
+    store = SessionStore(SqliteStorage(tmp_path / "sessions.sqlite") if backend == "sqlite" else None)
+    first, second = await store.resume("s1", 0), await store.resume("s1", 0)
+    assert await store.commit(first, {"fsm_messages": [1]}) == (1, {"fsm_messages": [1]})
+    # later states of the same request continue from its own commit
+    assert (await store.commit(first, {"fsm_messages": [1, 2]}))[0] == 2
+
+    with pytest.raises(StaleSessionError):
+        await store.commit(second, {"fsm_messages": ["other"]})
+    assert (await store.resume("s1", 2)).state == {"fsm_messages": [1, 2]}
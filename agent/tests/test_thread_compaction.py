@@ -0,0 +1,126 @@
+import pytest
+from api.fsm_tools import FSMStatus, FSMToolProcessor
+from api.thread_compaction import ThreadCompactor, read_summary, summary_messages
+from llm.common import AsyncLLM, Completion, InternalMessage, TextRaw, ToolUse, ToolUseResult
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class SummaryLLM(AsyncLLM):
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+        (text,) = [block.text for block in messages[0].content]
+        self.prompts.append(text)
+        return Completion(
+            role="assistant",
+            content=[TextRaw(f"<summary>summary {len(self.prompts)}</summary>")],
+            input_tokens=len(text) // 4,
+            output_tokens=10,
+            stop_reason="end_turn",
+        )
+
+
+def text(role: str, value: str) -> InternalMessage:
+    return InternalMessage(role=role, content=[TextRaw(value)])  # pyright: ignore[reportArgumentType]
+
+
+def turn(i: int, size: int = 400) -> list[InternalMessage]:
+    """User request, a tool call with its result and the final answer."""
+    tool_use = ToolUse("change", {"feedback": f"request {i}"}, f"tool-{i}")
+    return [
+        text("user", f"request {i} " + "x" * size),
+        InternalMessage(role="assistant", content=[tool_use]),
+        InternalMessage(role="user", content=[ToolUseResult.from_tool_use(tool_use, f"result {i} " + "y" * size)]),
+        text("assistant", f"answer {i}"),
+    ]
+
+
+def thread(turns: int) -> list[InternalMessage]:
+    return [message for i in range(turns) for message in turn(i)]
+
+
+def test_should_compact_includes_reserve():
+    compactor = ThreadCompactor(max_tokens=1000)
+    messages = thread(2)  # ~400 tokens
+    assert not compactor.should_compact(messages)
+    assert compactor.should_compact(messages, reserve=500)
+
+
+def test_split_keeps_tool_results_with_their_calls():
+    compactor = ThreadCompactor(max_tokens=1000, window=0.3)
+    summary, aged, recent = compactor.split(thread(5))
+    assert summary is None
+    # each turn is ~200 tokens, the window fits one
+    assert len(aged) == 16 and len(recent) == 4
+    assert recent[0].role == "user" and isinstance(list(recent[0].content)[0], TextRaw)
+
+
+def test_split_without_turn_boundary():
+    compactor = ThreadCompactor(max_tokens=100)
+    summary, aged, recent = compactor.split(turn(0, size=2000))
+    assert aged == [] and len(recent) == 4
+
+
+def test_summary_roundtrip():
+    messages = summary_messages("the user wants a todo app")
+    assert read_summary(messages) == "the user wants a todo app"
+    assert read_summary(thread(1)) is None
+
+
+async def test_rolling_compaction_only_sends_aged_segment():
+    llm = SummaryLLM()
+    compactor = ThreadCompactor(max_tokens=1000, window=0.3)
+
+    compacted = await compactor.compact(thread(5), llm)
+    assert read_summary(compacted) == "summary 1"
+    assert len(compacted) == 2 + 4
+    assert "request 0" in llm.prompts[0] and "request 3" in llm.prompts[0]
+    assert "request 4" not in llm.prompts[0]
+
+    # three more turns, the second compaction folds in only what aged out since
+    grown = compacted + [message for i in range(5, 8) for message in turn(i)]
+    compacted = await compactor.compact(grown, llm)
+    assert read_summary(compacted) == "summary 2"
+    prompt = llm.prompts[1]
+    assert "<previous_summary>\nsummary 1\n</previous_summary>" in prompt
+    assert "request 4" in prompt and "request 6" in prompt
+    assert "request 0" not in prompt and "request 7" not in prompt
+    assert [m.role for m in compacted] == ["user", "assistant", "user", "assistant", "user", "assistant"]
+
+
+async def test_nothing_to_compact_returns_thread():
+    llm = SummaryLLM()
+    messages = turn(0, size=4000)
+    assert await ThreadCompactor(max_tokens=100).compact(messages, llm) == messages
+    assert llm.prompts == []
+
+
+class FakeFSM:
+    @classmethod
+    def base_execution_plan(cls, settings=None) -> str:
+        return "plan"
+
+
+async def test_step_compacts_before_the_request():
+    class RecordingLLM(SummaryLLM):
+        async def completion(self, messages, max_tokens, *args, **kwargs) -> Completion:
+            if kwargs.get("tools"):
+                self.request = messages
+                return Completion(role="assistant", content=[TextRaw("done")], input_tokens=1, output_tokens=1, stop_reason="end_turn")
+            return await super().completion(messages, max_tokens)
+
+    llm = RecordingLLM()
+    processor = FSMToolProcessor(None, FakeFSM, max_messages_tokens=4000)  # pyright: ignore[reportArgumentType]
+    messages = thread(12) + [text("user", "one more thing")]
+    new, status, full = await processor.step(messages, llm, {"max_tokens": 500})
+    assert status == FSMStatus.REFINEMENT_REQUEST
+    assert len(llm.prompts) == 1
+    assert read_summary(llm.request) == "summary 1"
+    assert full == [*llm.request, *new]
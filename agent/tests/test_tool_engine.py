@@ -0,0 +1,195 @@
+import time
+import anyio
+import pytest
+from core.actors import BaseData, FileOperationsActor
+from core.base_node import Node
+from core.tool_engine import EXCLUSIVE, PURE, Effect, dependencies, execute
+from llm.common import Message, TextRaw, ToolUse
+
+pytestmark = pytest.mark.anyio
+
+LATENCY = 0.05
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def test_conflicts():
+    assert not Effect.read("a.ts").conflicts(Effect.read("a.ts"))
+    assert not Effect.write("a.ts").conflicts(Effect.write("b.ts"))
+    assert Effect.read("a.ts").conflicts(Effect.write("./a.ts"))
+    assert Effect.write("src/a.ts").conflicts(Effect.write("src/../src/a.ts"))
+    assert Effect.write("src").conflicts(Effect.read("src/a.ts"))
+    assert not Effect.write("src/a.ts").conflicts(Effect.read("src/a.tsx"))
+    assert EXCLUSIVE.conflicts(PURE)
+    assert not PURE.conflicts(Effect.write("a.ts"))
+
+
+def test_dependencies():
+    effects = [
+        Effect.read("a.ts"),
+        Effect.read("b.ts"),
+        Effect.write("a.ts"),
+        Effect.read("a.ts"),
+        EXCLUSIVE,
+        Effect.read("b.ts"),
+    ]
+    assert dependencies(effects) == [[], [], [0], [2], [0, 1, 2, 3], [4]]
+
+
+async def test_execute_keeps_order_of_conflicting_calls():
+    log = []
+
+    async def run(call):
+        name, delay = call
+        await anyio.sleep(delay)
+        log.append(name)
+        return name
+
+    calls = [("write a", 0.05), ("write b", 0.0), ("read a", 0.0)]
+    effects = {"write a": Effect.write("a"), "write b": Effect.write("b"), "read a": Effect.read("a")}
+    results = await execute(calls, lambda call: effects[call[0]], run, enabled=True)
+    assert results == ["write a", "write b", "read a"]
+    # the disjoint write finished first, the read waited for the write of its path
+    assert log == ["write b", "write a", "read a"]
+
+
+async def test_execute_raises_a_single_failure_unwrapped():
+    async def run(call):
+        if call == "bad":
+            raise KeyError("path")
+        return call
+
+    with pytest.raises(KeyError):
+        await execute(["good", "bad"], lambda call: PURE, run, enabled=True)
+
+
+class FakeWorkspace:
+    def __init__(self, files: dict[str, str]):
+        self.files = dict(files)
+
+    async def read_file(self, path: str) -> str:
+        await anyio.sleep(LATENCY)
+        if path not in self.files:
+            raise FileNotFoundError(f"File not found: {path}")
+        return self.files[path]
+
+    def write_file(self, path: str, contents: str):
+        self.files[path] = contents
+        return self
+
+    def rm(self, path: str):
+        self.files.pop(path, None)
+        return self
+
+
+class SimpleActor(FileOperationsActor):
+    def __init__(self):
+        super().__init__(None, None, fast_llm=object())  # pyright: ignore[reportArgumentType]
+
+    async def execute(self, *args, **kwargs):
+        pass
+
+    async def run_checks(self, node, user_prompt, fail_fast=True):
+        return None
+
+
+def recorded_turn() -> list[ToolUse]:
+    # shape of a typical handler step: look around, then edit several files
+    return [
+        ToolUse("read_file", {"path": "server/src/schema.ts"}, "1"),
+        ToolUse("read_file", {"path": "server/src/index.ts"}, "2"),
+        ToolUse("read_file", {"path": "server/src/handlers/create_todo.ts"}, "3"),
+        ToolUse("edit_file", {"path": "server/src/index.ts", "search": "// routes", "replace": "// routes\ncreateTodo,"}, "4"),
+        ToolUse("edit_file", {"path": "server/src/handlers/create_todo.ts", "search": "TODO", "replace": "done"}, "5"),
+        ToolUse("edit_file", {"path": "server/src/index.ts", "search": "createTodo,", "replace": "createTodo, listTodos,"}, "6"),
+        ToolUse("read_file", {"path": "server/src/index.ts"}, "7"),
+        ToolUse("read_file", {"path": "server/src/missing.ts"}, "8"),
+    ]
+
+
+def make_node(turn: list[ToolUse]) -> Node[BaseData]:
+    workspace = FakeWorkspace({
+        "server/src/schema.ts": "export const schema = {};",
+        "server/src/index.ts": "const router = {\n// routes\n};",
+        "server/src/handlers/create_todo.ts": "// TODO",
+    })
+    return Node[BaseData](BaseData(workspace, [Message(role="assistant", content=[TextRaw("editing"), *turn])]))  # pyright: ignore[reportArgumentType]
+
+
+async def run_turn(monkeypatch, enabled: bool) -> tuple[list, Node[BaseData], float]:
+    monkeypatch.setattr("core.tool_engine.ENABLED", enabled)
+    node = make_node(recorded_turn())
+    started = time.perf_counter()
+    results, _ = await SimpleActor().run_tools(node, "prompt")
+    return results, node, time.perf_counter() - started
+
+
+async def test_parallel_turn_matches_sequential_and_is_faster(monkeypatch):
+    sequential, seq_node, seq_time = await run_turn(monkeypatch, False)
+    parallel, par_node, par_time = await run_turn(monkeypatch, True)
+
+    assert [r.tool_use.id for r in parallel] == [str(i) for i in range(1, 9)]
+    assert [(r.tool_result.content, r.tool_result.is_error) for r in parallel] == [
+        (r.tool_result.content, r.tool_result.is_error) for r in sequential
+    ]
+    assert par_node.data.files == seq_node.data.files
+    assert par_node.data.workspace.files["server/src/index.ts"] == "const router = {\n// routes\ncreateTodo, listTodos,\n};"
+    assert parallel[6].tool_result.content == par_node.data.workspace.files["server/src/index.ts"]
+    assert parallel[7].tool_result.is_error
+
+    # 8 reads in sequence vs the longest chain: read, edit, edit, read of index.ts
+    assert seq_time >= 8 * LATENCY
+    assert par_time < 6 * LATENCY
+
+
+async def test_complete_waits_for_the_edits(monkeypatch):
+    monkeypatch.setattr("core.tool_engine.ENABLED", True)
+    seen = {}
+
+    class CheckingActor(SimpleActor):
+        async def run_checks(self, node, user_prompt, fail_fast=True):
+            seen.update(node.data.workspace.files)
+            return None
+
+    turn = [
+        ToolUse("edit_file", {"path": "server/src/handlers/create_todo.ts", "search": "TODO", "replace": "done"}, "1"),
+        ToolUse("complete", {}, "2"),
+    ]
+    node = make_node(turn)
+    results, is_completed = await CheckingActor().run_tools(node, "prompt")
+    assert is_completed
+    assert [r.tool_result.content for r in results] == ["success", "success"]
+    assert seen["server/src/handlers/create_todo.ts"] == "// done"
+
+
+async def test_complete_runs_all_checks():
+    modes = []
+
+    class CheckingActor(SimpleActor):
+        async def run_checks(self, node, user_prompt, fail_fast=True):
+            modes.append(fail_fast)
+            return None
+
+    turn = [
+        ToolUse("edit_file", {"path": "server/src/handlers/create_todo.ts", "search": "TODO", "replace": "done"}, "1"),
+        ToolUse("complete", {}, "2"),
+    ]
+    _, is_completed = await CheckingActor().run_tools(make_node(turn), "prompt")
+    assert is_completed
+    assert modes == [False]
+
+
+async def test_malformed_calls_come_back_as_errors(monkeypatch):
+    monkeypatch.setattr("core.tool_engine.ENABLED", True)
+    turn = [
+        ToolUse("read_file", {"file": "server/src/index.ts"}, "1"),
+        ToolUse("edit_file", {"path": 3, "search": "TODO", "replace": "done"}, "2"),
+        ToolUse("read_file", {"path": "server/src/schema.ts"}, "3"),
+    ]
+    actor = SimpleActor()
+    assert [actor.tool_effect(block) for block in turn] == [EXCLUSIVE, EXCLUSIVE, Effect.read("server/src/schema.ts")]
+    results, _ = await actor.run_tools(make_node(turn), "prompt")
+    assert [bool(r.tool_result.is_error) for r in results] == [True, True, False]
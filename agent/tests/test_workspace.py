@@ -0,0 +1,181 @@
+import os
+from fnmatch import fnmatchcase
+import pytest
+import dagger
+from core.workspace import Workspace, _line_range
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+class Engine:
+    """Counts the requests that would reach the Dagger engine."""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.layers = 0
+
+
+class FakeDirectory:
+    def __init__(self, engine: Engine, files: dict[str, str]):
+        self.engine = engine
+        self.files = dict(files)
+
+    def with_new_file(self, path: str, contents: str) -> "FakeDirectory":
+        return FakeDirectory(self.engine, {**self.files, path: contents})
+
+    def filter(self, include: list[str]) -> "FakeDirectory":
+        # include entries are glob patterns
+        return FakeDirectory(self.engine, {p: c for p, c in self.files.items() if any(fnmatchcase(p, i) for i in include)})
+
+    async def entries(self) -> list[str]:
+        self.engine.round_trips += 1
+        if not self.files:
+            raise dagger.QueryError.__new__(dagger.QueryError)
+        return sorted({path.split("/")[0] for path in self.files})
+
+    async def export(self, path: str) -> str:
+        self.engine.round_trips += 1
+        for name, contents in self.files.items():
+            os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+            with open(os.path.join(path, name), "w") as f:
+                f.write(contents)
+        return path
+
+
+class FakeFile:
+    def __init__(self, engine: Engine, contents: str | None):
+        self.engine = engine
+        self._contents = contents
+
+    async def contents(self) -> str:
+        self.engine.round_trips += 1
+        if self._contents is None:
+            raise dagger.QueryError.__new__(dagger.QueryError)
+        return self._contents
+
+
+class FakeContainer:
+    def __init__(self, engine: Engine, files: dict[str, str]):
+        self.engine = engine
+        self.files = files
+
+    def with_directory(self, path: str, directory: FakeDirectory) -> "FakeContainer":
+        self.engine.layers += 1
+        return FakeContainer(self.engine, {**self.files, **directory.files})
+
+    def with_new_file(self, path: str, contents: str) -> "FakeContainer":
+        self.engine.layers += 1
+        return FakeContainer(self.engine, {**self.files, path: contents})
+
+    def with_exec(self, args: list[str], expect=None) -> "FakeContainer":
+        # the capture script writes the exit code and outputs to the result file
+        self.engine.layers += 1
+        return FakeContainer(self.engine, {**self.files, args[4]: "0 0 0 3 0 0\nok\n\n--- exec stderr 6d1c3a9f ---\n"})
+
+    def without_file(self, path: str) -> "FakeContainer":
+        return self.without_files([path])
+
+    def without_files(self, paths: list[str]) -> "FakeContainer":
+        self.engine.layers += 1
+        return FakeContainer(self.engine, {p: c for p, c in self.files.items() if p not in paths})
+
+    def file(self, path: str) -> FakeFile:
+        return FakeFile(self.engine, self.files.get(os.path.normpath(path)))
+
+    def directory(self, path: str) -> FakeDirectory:
+        if path in (".", "./"):
+            return FakeDirectory(self.engine, self.files)
+        prefix = os.path.normpath(path) + "/"
+        return FakeDirectory(self.engine, {p[len(prefix):]: c for p, c in self.files.items() if p.startswith(prefix)})
+
+
+class FakeClient:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def directory(self) -> FakeDirectory:
+        return FakeDirectory(self.engine, {})
+
+
+def make_workspace(files: dict[str, str]) -> tuple[Workspace, Engine]:
+    engine = Engine()
+    workspace = Workspace(ctr=FakeContainer(engine, files), start=None, protected=set(), allowed=set())  # pyright: ignore[reportArgumentType]
+    workspace._client = FakeClient(engine)  # pyright: ignore[reportAttributeAccessIssue]
+    return workspace, engine
+
+
+async def test_reads_are_answered_locally():
+    workspace, engine = make_workspace({"app/main.py": "print(1)\n", "app/models.py": "a\nb\nc", "README.md": "hi"})
+
+    await workspace.preload(["app/main.py", "./app/models.py", "missing.py"], ["app", "."])
+    preloaded = engine.round_trips
+    assert preloaded == 3  # one export, listings fetched concurrently
+
+    assert await workspace.read_file("app/main.py") == "print(1)\n"
+    assert await workspace.read_file_lines("app/models.py", 2, 3) == "b\nc"
+    assert sorted(await workspace.ls("./app")) == ["main.py", "models.py"]
+    with pytest.raises(FileNotFoundError):
+        await workspace.read_file("missing.py")
+    assert engine.round_trips == preloaded
+
+
+async def test_writes_are_coalesced_into_one_layer():
+    workspace, engine = make_workspace({"app/main.py": "old", "app/old.py": "x"})
+    assert await workspace.ls("app") == ["main.py", "old.py"]
+
+    for i in range(10):
+        workspace.write_file(f"app/new{i}.py", str(i))
+    workspace.write_file("app/main.py", "new")
+    workspace.rm("app/old.py")
+    assert engine.layers == 0
+    # written files are known, listings of their directories are fetched again
+    assert await workspace.read_file("app/main.py") == "new"
+    with pytest.raises(FileNotFoundError):
+        await workspace.read_file("app/old.py")
+
+    clone = workspace.clone()
+    entries = await workspace.ls("app")
+    assert engine.layers == 2  # one merged directory, one removal
+    assert "new9.py" in entries and "old.py" not in entries
+    # the clone still carries the writes
+    assert (await clone.ls("app")) == entries
+
+
+async def test_preload_reads_paths_with_glob_characters_literally():
+    workspace, engine = make_workspace({"app/[id].tsx": "page", "app/i.tsx": "other", "app/main.tsx": "main"})
+    await workspace.preload(["app/[id].tsx", "app/main.tsx"])
+    assert engine.round_trips == 2  # the export and a single read
+    assert workspace._known == {"app/[id].tsx": "page", "app/main.tsx": "main"}
+
+
+async def test_pending_ops_on_the_same_file_use_one_key():
+    workspace, engine = make_workspace({"a": "old"})
+    workspace.rm("./a")
+    workspace.write_file("a", "new")
+    assert workspace._pending == {"a": "new"}
+    assert await workspace.container().file("a").contents() == "new"
+
+    other, _ = make_workspace({"a": "old"})
+    other.write_file("a", "new")
+    other.rm("./a")
+    # same operations in a different order give a different file state
+    assert workspace._overlay_digest() != other._overlay_digest()
+
+
+async def test_exec_mut_leaves_no_result_file():
+    workspace, _ = make_workspace({"app.py": "print(1)"})
+    result = await workspace.exec_mut(["python", "app.py"])
+    assert (result.exit_code, result.stdout) == (0, "ok\n")
+    assert set(workspace.ctr.files) == {"app.py"}  # pyright: ignore[reportAttributeAccessIssue]
+
+
+def test_line_range_matches_sed():
+    assert _line_range("a\nb\nc\n", 2, 100) == "b\nc\n"
+    assert _line_range("a\nb\nc", 1, 2) == "a\nb\n"
+    assert _line_range("a\nb\nc", 3, 3) == "c"
+    assert _line_range("", 1, 100) == ""
@@ -6,6 +6,10 @@ from typing import Optional, Callable, Awaitable
 from dataclasses import dataclass
 
 from core.base_node import Node
+from core.check_cache import cached_check
+from core.check_scheduler import Check
+from core import check_scheduler
+from core import incremental
 from core.workspace import Workspace
 from core.actors import BaseData, FileOperationsActor, AgentSearchFailedException
 from llm.common import AsyncLLM, Message, TextRaw, Tool, ToolUse, ToolUseResult
@@ -443,13 +447,13 @@ class TrpcActor(FileOperationsActor):
             logger.info(f"Selecting root node {self.beam_width} times (beam search)")
             return [node] * self.beam_width
 
-        all_children = node.get_all_children()
+        tree_size = node.subtree_size
         candidates = []
-        for n in all_children:
-            if n.is_leaf and n.depth <= self.max_depth:
+        for n in node.get_leaves():
+            if n.depth <= self.max_depth:
                 if n.data.should_branch:
                     effective_beam_width = (
-                        1 if len(all_children) > (n.depth + 1) else self.beam_width
+                        1 if tree_size > (n.depth + 1) else self.beam_width
                     )
                     logger.info(
                         f"Selecting candidates with effective beam width: {effective_beam_width}, current depth: {n.depth}/{self.max_depth}"
@@ -473,62 +477,36 @@ class TrpcActor(FileOperationsActor):
             node.data.messages.append(Message(role="user", content=content))
         return is_completed
 
-    async def _validate_draft(self, node: Node[BaseData]) -> bool:
-        """Validate draft: TypeScript compilation + Drizzle schema."""
-        errors = []
-
-        async with anyio.create_task_group() as tg:
-
-            async def check_tsc():
-                if error := await self.run_tsc_backend_check(node):
-                    errors.append(error)
-
-            async def check_drizzle():
-                if error := await self.run_drizzle_check(node):
-                    errors.append(error)
+    async def _run_quick_checks(self, checks: list[Check], fail_fast: bool) -> list[str]:
+        """Errors of the failed checks, each already carries its own heading."""
+        return [error for _, error in await check_scheduler.run_checks(checks, fail_fast=fail_fast)]
 
-            tg.start_soon(check_tsc)
-            tg.start_soon(check_drizzle)
+    async def _validate_draft(self, node: Node[BaseData], fail_fast: bool) -> bool:
+        """Validate draft: TypeScript compilation + Drizzle schema."""
+        errors = await self._run_quick_checks([
+            Check("trpc/backend_tsc", lambda: self.run_tsc_backend_check(node), cost=10),
+            Check("trpc/drizzle", lambda: self.run_drizzle_check(node), cost=15),
+        ], fail_fast)
 
         return await self._handle_validation_errors(node, errors)
 
-    async def _validate_handler(self, node: Node[BaseData]) -> bool:
+    async def _validate_handler(self, node: Node[BaseData], fail_fast: bool) -> bool:
         """Validate handler: TypeScript + tests only."""
-        errors = []
         handler_name = self._get_handler_name(node)
-
-        async with anyio.create_task_group() as tg:
-
-            async def check_tsc():
-                if error := await self.run_tsc_backend_check(node):
-                    errors.append(error)
-
-            async def check_tests():
-                if error := await self.run_test_check(node, handler_name):
-                    errors.append(error)
-
-            tg.start_soon(check_tsc)
-            tg.start_soon(check_tests)
+        errors = await self._run_quick_checks([
+            Check("trpc/backend_tsc", lambda: self.run_tsc_backend_check(node), cost=10),
+            Check("trpc/tests", lambda: self.run_test_check(node, handler_name), cost=15),
+        ], fail_fast)
 
         return await self._handle_validation_errors(node, errors)
 
-    async def _validate_frontend(self, node: Node[BaseData]) -> bool:
+    async def _validate_frontend(self, node: Node[BaseData], fail_fast: bool) -> bool:
         """Validate frontend: TypeScript + build + Playwright."""
-        errors = []
-
         # Quick checks first
-        async with anyio.create_task_group() as tg:
-
-            async def check_tsc():
-                if error := await self.run_tsc_frontend_check(node):
-                    errors.append(error)
-
-            async def check_build():
-                if error := await self.run_build_check(node):
-                    errors.append(error)
-
-            tg.start_soon(check_tsc)
-            tg.start_soon(check_build)
+        errors = await self._run_quick_checks([
+            Check("trpc/frontend_tsc", lambda: self.run_tsc_frontend_check(node), cost=10),
+            Check("trpc/build", lambda: self.run_build_check(node), cost=25),
+        ], fail_fast)
 
         if not await self._handle_validation_errors(node, errors):
             return False
@@ -542,52 +520,34 @@ class TrpcActor(FileOperationsActor):
 
         return True
 
-    async def _validate_edit(self, node: Node[BaseData]) -> bool:
+    async def _validate_edit(self, node: Node[BaseData], fail_fast: bool) -> bool:
         """Validate edit: Full validation including TypeScript, tests, build, and Playwright."""
         await notify_if_callback(
             self.event_callback, "🔍 Validating changes...", "validation start"
         )
 
-        errors = []
-
-        # Quick checks first
-        async with anyio.create_task_group() as tg:
-
-            async def check_backend_tsc():
-                if error := await self.run_tsc_backend_check(node):
-                    errors.append(error)
-
-            async def check_frontend_tsc():
+        async def check_frontend_tsc():
+            await notify_if_callback(
+                self.event_callback,
+                "🔧 Compiling frontend TypeScript...",
+                "frontend compile start",
+            )
+            if error := await self.run_tsc_frontend_check(node):
                 await notify_if_callback(
                     self.event_callback,
-                    "🔧 Compiling frontend TypeScript...",
-                    "frontend compile start",
+                    "❌ Frontend TypeScript compilation failed",
+                    "frontend compile failure",
                 )
-                if error := await self.run_tsc_frontend_check(node):
-                    await notify_if_callback(
-                        self.event_callback,
-                        "❌ Frontend TypeScript compilation failed",
-                        "frontend compile failure",
-                    )
-                    errors.append(error)
+            return error
 
-            async def check_tests():
-                if error := await self.run_test_check(node):
-                    errors.append(error)
-
-            async def check_build():
-                if error := await self.run_build_check(node):
-                    errors.append(error)
-
-            async def check_drizzle():
-                if error := await self.run_drizzle_check(node):
-                    errors.append(error)
-
-            tg.start_soon(check_drizzle)
-            tg.start_soon(check_backend_tsc)
-            tg.start_soon(check_frontend_tsc)
-            tg.start_soon(check_tests)
-            tg.start_soon(check_build)
+        # Quick checks first
+        errors = await self._run_quick_checks([
+            Check("trpc/drizzle", lambda: self.run_drizzle_check(node), cost=15),
+            Check("trpc/backend_tsc", lambda: self.run_tsc_backend_check(node), cost=10),
+            Check("trpc/frontend_tsc", check_frontend_tsc, cost=10),
+            Check("trpc/tests", lambda: self.run_test_check(node), cost=20),
+            Check("trpc/build", lambda: self.run_build_check(node), cost=25),
+        ], fail_fast)
 
         if not await self._handle_validation_errors(node, errors):
             return False
@@ -612,36 +572,46 @@ class TrpcActor(FileOperationsActor):
         )
         return True
 
+    @cached_check
     async def run_tsc_backend_check(self, node: Node[BaseData]) -> str | None:
         """Run TypeScript compilation check for backend."""
         result = await node.data.workspace.exec(
-            ["bun", "run", "tsc", "--noEmit"], cwd="server"
+            incremental.tsc_incremental(["bun", "run", "tsc", "--noEmit"], "trpc-server"),
+            cwd="server",
+            caches=incremental.tsc_caches(),
         )
         if result.exit_code != 0:
             error_output = f"{result.stdout}\n{result.stderr}"
             return f"TypeScript errors (backend):\n{error_output}"
         return None
 
+    @cached_check
     async def run_tsc_frontend_check(self, node: Node[BaseData]) -> str | None:
         """Run TypeScript compilation check for frontend."""
         result = await node.data.workspace.exec(
-            ["bun", "run", "tsc", "-p", "tsconfig.app.json", "--noEmit"], cwd="client"
+            incremental.tsc_incremental(
+                ["bun", "run", "tsc", "-p", "tsconfig.app.json", "--noEmit"], "trpc-client"
+            ),
+            cwd="client",
+            caches=incremental.tsc_caches(),
         )
         if result.exit_code != 0:
             error_output = f"{result.stdout}\n{result.stderr}"
             return f"TypeScript errors (frontend):\n{error_output}"
         return None
 
+    @cached_check
     async def run_drizzle_check(self, node: Node[BaseData]) -> str | None:
         """Run Drizzle schema validation."""
         result = await drizzle_push(
-            node.data.workspace.client, node.data.workspace.ctr, postgresdb=None
+            node.data.workspace.client, node.data.workspace.container(), postgresdb=None
         )
         if result.exit_code != 0:
             error_output = f"{result.stdout}\n{result.stderr}"
             return f"Drizzle errors:\n{error_output}"
         return None
 
+    @cached_check
     async def run_build_check(self, node: Node[BaseData]) -> str | None:
         """Run frontend build check."""
         result = await node.data.workspace.exec(["bun", "run", "build"], cwd="client")
@@ -650,6 +620,7 @@ class TrpcActor(FileOperationsActor):
             return f"Build errors:\n{error_output}"
         return None
 
+    @cached_check
     async def run_test_check(
         self, node: Node[BaseData], handler_name: str | None = None
     ) -> str | None:
@@ -659,6 +630,17 @@ class TrpcActor(FileOperationsActor):
         if handler_name:
             test_cmd = ["bun", "test", f"src/tests/{handler_name}.test.ts"]
             test_context = f"handler '{handler_name}'"
+        elif (
+            scope := await incremental.affected_files(
+                self.run_test_check, node, None, roots=["server/src"], language="typescript"
+            )
+        ) is not None:
+            # the parent passed all tests, only the ones depending on changed files can fail now
+            tests = incremental.affected_tests(scope[0], "typescript", strip="server/")
+            if not tests:
+                return None
+            test_cmd = ["bun", "test", *(f"./{test}" for test in tests)]
+            test_context = f"{len(tests)} affected test files"
         else:
             test_cmd = ["bun", "test"]
             test_context = "all tests"
@@ -679,20 +661,22 @@ class TrpcActor(FileOperationsActor):
         feedback = await self.playwright.evaluate(node, self._user_prompt, mode=mode)
         return feedback if feedback else None
 
-    async def run_checks(self, node: Node[BaseData], user_prompt: str) -> str | None:
+    async def run_checks(
+        self, node: Node[BaseData], user_prompt: str, fail_fast: bool = check_scheduler.FAIL_FAST
+    ) -> str | None:
         """Run context-aware validation checks based on node context."""
         context = node.data.context
 
         # Run validation based on context
         match context:
             case "draft":
-                success = await self._validate_draft(node)
+                success = await self._validate_draft(node, fail_fast)
             case "frontend":
-                success = await self._validate_frontend(node)
+                success = await self._validate_frontend(node, fail_fast)
             case "edit":
-                success = await self._validate_edit(node)
+                success = await self._validate_edit(node, fail_fast)
             case s if s.startswith("handler:"):
-                success = await self._validate_handler(node)
+                success = await self._validate_handler(node, fail_fast)
             case _:
                 logger.warning(f"Unknown context: {context}, skipping validation")
                 return None  # No validation for unknown context
@@ -796,6 +780,12 @@ class TrpcActor(FileOperationsActor):
             case _:
                 raise ValueError(f"Unknown context type: {context_type}")
 
+        # fetch everything the context needs in one batch, the reads below are answered locally
+        await workspace.preload(
+            relevant_files,
+            ["client/src/components/ui"] if context_type in ["frontend", "edit"] else [],
+        )
+
         # Add relevant files to context
         for path in relevant_files:
             try:
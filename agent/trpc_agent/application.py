@@ -1,17 +1,20 @@
 import os
 import anyio
+import anyio.to_thread
 import logging
 import enum
 from typing import Dict, Self, Optional, Literal, Any
 from dataclasses import dataclass
 from core.statemachine import StateMachine, State, Context
 from core.application import BaseApplicationContext
-from core.dagger_utils import write_files_bulk
 from llm.utils import get_vision_llm_client, get_best_coding_llm_client
 from core.actors import BaseData
 from core.base_node import Node
 from core.statemachine import MachineCheckpoint
 from core.workspace import Workspace
+from core import base_images
+from core.base_images import BaseImage
+from core.git_diff import diff_overlay, read_tree
 from trpc_agent.actors import TrpcActor
 import dagger
 
@@ -22,6 +25,15 @@ logging.basicConfig(level=logging.INFO)
 for package in ["urllib3", "httpx", "google_genai.models"]:
     logging.getLogger(package).setLevel(logging.WARNING)
 
+TEMPLATE_DIR = "./trpc_agent/template"
+BASE_IMAGE = BaseImage(
+    name="trpc",
+    image="oven/bun:1.2.5-alpine",
+    workdir="/app",
+    lockfiles=["package.json", "bun.lock", "client/package.json", "server/package.json"],
+    install=[["bun", "install"]],
+)
+
 
 class FSMState(str, enum.Enum):
     DATA_MODEL_GENERATION = "data_model_generation"
@@ -146,11 +158,12 @@ class FSMApplication:
         llm = get_best_coding_llm_client()
         vlm = get_vision_llm_client()
 
+        base, tag = await base_images.load(client, BASE_IMAGE, TEMPLATE_DIR)
         workspace = await Workspace.create(
             client=client,
-            base_image="oven/bun:1.2.5-alpine",
-            context=client.host().directory("./trpc_agent/template"),
-            setup_cmd=[["bun", "install"]],
+            base_image=tag,
+            base=base,
+            context=client.host().directory(TEMPLATE_DIR),
         )
 
         event_callback = settings.get("event_callback") if settings else None
@@ -368,45 +381,25 @@ class FSMApplication:
         logger.info(
             f"SERVER get_diff_with: Received snapshot with {len(snapshot)} files."
         )
-
-        # Start with empty directory and git init
-        start = self.client.container().from_("alpine/git").with_workdir("/app")
-        start = start.with_exec(["git", "init"]).with_exec(
-            ["git", "config", "--global", "user.email", "agent@appbuild.com"]
-        )
         if snapshot:
             # Sort keys for consistent sample logging, especially in tests
             sorted_snapshot_keys = sorted(snapshot.keys())
             logger.info(
                 f"SERVER get_diff_with: Snapshot sample paths (up to 5): {sorted_snapshot_keys[:5]}"
             )
-            start = await write_files_bulk(start, snapshot, self.client)
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'snapshot'"]
-            )
         else:
             logger.info(
                 "SERVER get_diff_with: Snapshot is empty. Diff will be against template + FSM context files."
             )
-            # If no snapshot, create an empty initial commit
-            start = start.with_exec(["git", "add", "."]).with_exec(
-                ["git", "commit", "-m", "'initial'", "--allow-empty"]
-            )
-
-        # Add template files (they will appear in diff if not in snapshot)
-        template_dir = self.client.host().directory("./trpc_agent/template")
-        start = start.with_directory(".", template_dir)
-
-        # Add FSM context files on top
-        start = await write_files_bulk(start, self.fsm.context.files, self.client)
 
+        # Same result as committing the snapshot, copying template + FSM context files on top
+        # and running `git add . && git diff HEAD`, computed in-process without a git container
         logger.info(
             "SERVER get_diff_with: Calling workspace.diff() to generate final diff."
         )
-        diff = (
-            await start.with_exec(["git", "add", "."])
-            .with_exec(["git", "diff", "HEAD"])
-            .stdout()
+        template_files = await anyio.to_thread.run_sync(read_tree, "./trpc_agent/template")
+        diff = await anyio.to_thread.run_sync(
+            diff_overlay, snapshot, template_files, self.fsm.context.files
         )
         logger.info(
             f"SERVER get_diff_with: workspace.diff() Succeeded. Diff length: {len(diff)}"